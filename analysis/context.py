@@ -0,0 +1,86 @@
+"""Trade frame shared by the modules of one analysis run.
+
+``RunContext.load`` reads ``recorder`` / ``recorder_steps`` once, coerces the
+numeric columns SQLite handed back as objects and parses the time columns.
+Activating it seeds the caches the modules already go through:
+``db.load_table`` serves the typed frame and ``db.to_datetime_series`` returns
+the parsed column when called on it, so ``run(conn, out)`` modules need no
+change.
+
+Worker processes forked by ``run_all`` inherit the active context.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas as pd
+
+from analysis import db, export
+
+TRADES_TABLE = "recorder"
+STEPS_TABLE = "recorder_steps"
+
+
+@dataclass
+class RunContext:
+    db_path: Optional[str]
+    trades: pd.DataFrame
+    steps: Optional[pd.DataFrame]
+    times: dict[str, pd.Series] = field(default_factory=dict)
+    step_times: dict[str, pd.Series] = field(default_factory=dict)
+    load_s: float = 0.0
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "RunContext":
+        t0 = time.perf_counter()
+        tables = set(db.list_tables(conn))
+        trades = _typed(conn, TRADES_TABLE) if TRADES_TABLE in tables else pd.DataFrame()
+        steps = _typed(conn, STEPS_TABLE) if STEPS_TABLE in tables else None
+        times = {c: db.parse_datetime_series(trades[c]) for c in _time_cols(trades)}
+        step_times = {} if steps is None else {c: db.parse_datetime_series(steps[c]) for c in _time_cols(steps)}
+        return cls(db.db_file(conn), trades, steps, times, step_times, time.perf_counter() - t0)
+
+    def activate(self) -> "RunContext":
+        db._PARSED.clear()
+        for frame, parsed in ((self.trades, self.times), (self.steps, self.step_times)):
+            for c, values in parsed.items():
+                db._PARSED.setdefault(c, []).append((frame[c], values))
+        return self
+
+    def deactivate(self) -> None:
+        db._PARSED.clear()
+
+
+def _time_cols(frame: pd.DataFrame) -> list[str]:
+    return [c for c in frame.columns
+            if (c.startswith("ts_") or c.endswith("_ts") or c in ("ts", "open_time", "close_time"))
+            and pd.api.types.is_numeric_dtype(frame[c])]
+
+
+def _typed(conn: sqlite3.Connection, table: str) -> pd.DataFrame:
+    """Cached frame of `table` with numeric columns held as objects coerced, when lossless."""
+    frame = db.load_table(conn, table)
+    decl = {r[1]: export._arrow_type(r[2]) for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    changed = {}
+    for c in frame.columns:
+        if decl.get(c) == "string" or pd.api.types.is_numeric_dtype(frame[c]):
+            continue
+        values = pd.to_numeric(frame[c], errors="coerce")
+        if values.notna().sum() == frame[c].notna().sum():
+            changed[c] = values
+    if not changed:
+        return frame
+    frame = frame.assign(**changed)
+    key = (db.db_file(conn), table)
+    if key in db._FRAMES:
+        db._FRAMES[key] = (db._FRAMES[key][0], frame)
+    return frame
@@ -52,8 +52,82 @@ def first_existing_table(conn: sqlite3.Connection, candidates: Iterable[str]) ->
     return pick_first(list_tables(conn), candidates)
 
 
-def load_table(conn: sqlite3.Connection, table: str) -> pd.DataFrame:
-    return pd.read_sql_query(f"SELECT * FROM {table}", conn)
+# (db file, table) -> (max rowid, DataFrame) ; see load_table
+_FRAMES: dict[tuple[str, str], tuple[int, pd.DataFrame]] = {}
+
+
+# column name -> [(raw series, parsed series)] registered by analysis.context ; see to_datetime_series
+_PARSED: dict[str, list[tuple[pd.Series, pd.Series]]] = {}
+
+
+def _copy(frame: pd.DataFrame | pd.Series) -> pd.DataFrame | pd.Series:
+    # under Copy-on-Write (pandas >= 3, opt-in on 2.x) a shallow copy cannot write back into the cache
+    cow = int(pd.__version__.split(".")[0]) >= 3 or getattr(pd.options.mode, "copy_on_write", False) is True
+    return frame.copy(deep=not cow)
+
+
+def db_file(conn: sqlite3.Connection) -> Optional[str]:
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1] == "main":
+            return row[2] or None
+    return None
+
+
+def _read_exported(conn: sqlite3.Connection, path: str, table: str,
+                   columns: Optional[list[str]] = None) -> Optional[pd.DataFrame]:
+    """Arrow export (memory-mapped) + rows recorded since, or None if unusable."""
+    from analysis import export
+
+    root = export.export_root(path)
+    state = export.read_state(root).get(table)
+    if export.pa is None or not state or list(state["columns"]) != table_columns(conn, table):
+        return None
+    arrow = export.load(root, table, columns)
+    if arrow is None:
+        return None
+    frame = arrow.drop_columns([export.ROWID_COL]).to_pandas()
+    cols = "*" if columns is None else ", ".join(f'"{c}"' for c in frame.columns)
+    tail = pd.read_sql_query(f"SELECT {cols} FROM {table} WHERE rowid > ?", conn, params=(state["rowid"],))
+    if not tail.empty:
+        frame = pd.concat([frame, tail], ignore_index=True) if len(frame) else tail
+    return frame
+
+
+def load_table(conn: sqlite3.Connection, table: str, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Whole table (or the existing `columns` of it) as a DataFrame.
+
+    recorder / recorder_steps are read from the analysis.export files when
+    they exist (memory-mapped Arrow, only the projected columns) plus the
+    rows recorded since, and full loads are cached per process until the
+    table grows. Callers always get their own copy.
+    """
+    from analysis import export
+
+    select = "*"
+    if columns is not None:
+        existing = set(table_columns(conn, table))
+        columns = [c for c in columns if c in existing]
+        if not columns:
+            return pd.DataFrame()
+        select = ", ".join(f'"{c}"' for c in columns)
+    path = db_file(conn)
+    if path is None or table not in export.TABLES:
+        return pd.read_sql_query(f"SELECT {select} FROM {table}", conn)
+
+    # recorder tables are insert-only (same assumption as the exporter watermark)
+    stamp = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+    cached = _FRAMES.get((path, table))
+    if cached is not None and cached[0] == stamp:
+        frame = cached[1]
+        return _copy(frame if columns is None else frame[columns])
+
+    frame = _read_exported(conn, path, table, columns)
+    if frame is None:
+        frame = pd.read_sql_query(f"SELECT {select} FROM {table}", conn)
+    if columns is None:
+        _FRAMES[(path, table)] = (stamp, frame)
+        frame = _copy(frame)
+    return frame
 
 
 def load_first_table(conn: sqlite3.Connection, candidates: Iterable[str]) -> tuple[Optional[pd.DataFrame], Optional[str]]:
@@ -118,6 +192,14 @@ def find_step_time_col(cols: Iterable[str]) -> Optional[str]:
 
 
 def to_datetime_series(s: pd.Series) -> pd.Series:
+    # columns already parsed by the run context (same values, same index)
+    for raw, parsed in _PARSED.get(s.name, ()):
+        if raw.dtype == s.dtype and raw.index.equals(s.index) and raw.equals(s):
+            return _copy(parsed)
+    return parse_datetime_series(s)
+
+
+def parse_datetime_series(s: pd.Series) -> pd.Series:
     if s.empty:
         return pd.to_datetime(s)
     numeric = pd.to_numeric(s, errors="coerce")
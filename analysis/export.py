@@ -0,0 +1,280 @@
+"""Incremental columnar export of recorder.db for the analysis modules.
+
+recorder.py only ever INSERTs into ``recorder`` / ``recorder_steps``, so each
+run appends the rows past the last exported rowid as Arrow IPC files (one
+directory per UTC day) that ``db.load_table`` memory-maps:
+
+    <db dir>/export/<db stem>/<table>/day=YYYY-MM-DD/part-<first>-<last>.arrow
+
+``_state.json`` keeps, per table, the rowid watermark and the column types
+the files were written with. A shrunk table or a changed column set triggers
+a full re-export of that table; days holding more than ``MAX_PARTS`` files
+are compacted into one.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+from typing import Optional
+
+try:
+    import pyarrow as pa
+except Exception:  # optional columnar dependency
+    pa = None
+
+from analysis import db
+
+# table -> column giving the day partition (first non-NULL)
+TABLES = {
+    "recorder": ["ts_close", "ts_recorded"],
+    "recorder_steps": ["ts_exec"],
+}
+ROWID_COL = "__rowid"
+STATE_FILE = "_state.json"
+MAX_PARTS = 32
+BATCH_ROWS = 50_000
+NO_DAY = "none"
+
+
+def export_root(db_path: str | Path) -> Path:
+    p = Path(db_path)
+    return p.parent / "export" / p.stem
+
+
+def read_state(root: Path) -> dict:
+    try:
+        return json.loads((root / STATE_FILE).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_state(root: Path, state: dict) -> None:
+    tmp = root / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, root / STATE_FILE)
+
+
+def _arrow_type(decl: str) -> str:
+    # SQLite affinity rules; NUMERIC / untyped columns start as float64 and widen if needed
+    d = (decl or "").upper()
+    if "INT" in d:
+        return "int64"
+    if "CHAR" in d or "CLOB" in d or "TEXT" in d:
+        return "string"
+    return "float64"
+
+
+def _schema(conn: sqlite3.Connection, table: str) -> dict[str, str]:
+    return {r[1]: _arrow_type(r[2]) for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+WIDEN = {"int64": ("int64", "float64", "string"), "float64": ("float64", "string"), "string": ("string",)}
+
+
+def _column(values: list, kind: str):
+    """Arrow array of the declared type, widened when SQLite stored something else."""
+    for t in WIDEN[kind][:-1]:
+        try:
+            return pa.array(values, type=getattr(pa, t)()), t
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+            continue
+    return pa.array([None if v is None else str(v) for v in values], type=pa.string()), "string"
+
+
+def _day(ms) -> str:
+    try:
+        v = float(ms)
+    except (TypeError, ValueError):
+        return NO_DAY
+    if v < 1e12:  # seconds (same heuristic as db.to_datetime_series)
+        v *= 1000.0
+    return time.strftime("%Y-%m-%d", time.gmtime(v / 1000.0))
+
+
+def _write(path: Path, table) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _parts(table_dir: Path) -> list[Path]:
+    """Part files in (day, rowid) order, skipping parts covered by a compacted one."""
+    out = []
+    for day_dir in sorted(p for p in table_dir.glob("day=*") if p.is_dir()):
+        covered = -1
+        for p in sorted(day_dir.glob("part-*.arrow"), key=lambda x: (_part_range(x)[0], -_part_range(x)[1])):
+            first, last = _part_range(p)
+            if first <= covered:
+                continue  # left behind by an interrupted compact()
+            out.append(p)
+            covered = last
+    return out
+
+
+def _part_range(path: Path) -> tuple[int, int]:
+    first, last = path.stem.split("-")[1:3]
+    return int(first), int(last)
+
+
+def _export_rows(conn: sqlite3.Connection, table: str, table_dir: Path, schema: dict[str, str],
+                 after: int) -> tuple[int, int, set[str]]:
+    """Append rows with rowid > after; returns (rows, new watermark, widened columns)."""
+    cols = list(schema)
+    day_idx = [1 + cols.index(c) for c in TABLES[table] if c in schema]
+    select = ", ".join([f"rowid AS {ROWID_COL}"] + [f'"{c}"' for c in cols])
+    cur = conn.execute(f"SELECT {select} FROM {table} WHERE rowid > ? ORDER BY rowid", (after,))
+    n = 0
+    wm = after
+    widened: set[str] = set()
+    while True:
+        rows = cur.fetchmany(BATCH_ROWS)
+        if not rows:
+            break
+        by_day: dict[str, list] = {}
+        for r in rows:
+            d = NO_DAY
+            for i in day_idx:
+                if r[i] is not None:
+                    d = _day(r[i])
+                    break
+            by_day.setdefault(d, []).append(r)
+        for d, day_rows in by_day.items():
+            arrays = [pa.array([r[0] for r in day_rows], type=pa.int64())]
+            for i, c in enumerate(cols, 1):
+                arr, t = _column([r[i] for r in day_rows], schema[c])
+                if t != schema[c]:
+                    widened.add(c)
+                    schema[c] = t
+                arrays.append(arr)
+            tbl = pa.Table.from_arrays(arrays, names=[ROWID_COL] + cols)
+            first, last = day_rows[0][0], day_rows[-1][0]
+            _write(table_dir / f"day={d}" / f"part-{first:012d}-{last:012d}.arrow", tbl)
+        n += len(rows)
+        wm = rows[-1][0]
+    return n, wm, widened
+
+
+def compact(table_dir: Path, max_parts: int = MAX_PARTS) -> int:
+    """Merge the files of days holding more than max_parts; returns #days compacted."""
+    done = 0
+    for day_dir in sorted(p for p in table_dir.glob("day=*") if p.is_dir()):
+        parts = sorted(day_dir.glob("part-*.arrow"))
+        if len(parts) <= max_parts:
+            continue
+        tables = [read_part(p) for p in parts]
+        merged = pa.concat_tables(tables).sort_by(ROWID_COL)
+        first, last = _part_range(parts[0])[0], _part_range(parts[-1])[1]
+        # written before the unlinks: an interrupted run leaves covered parts, skipped by _parts()
+        _write(day_dir / f"part-{first:012d}-{last:012d}.arrow", merged)
+        for p in parts:
+            if p.name != f"part-{first:012d}-{last:012d}.arrow":
+                p.unlink()
+        done += 1
+    return done
+
+
+def read_part(path: Path, columns: Optional[list[str]] = None):
+    """Memory-mapped Arrow IPC file (zero-copy), optionally restricted to `columns`."""
+    table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+
+def load(root: str | Path, table: str, columns: Optional[list[str]] = None):
+    """Exported rows of `table` as one Arrow table in rowid order, or None if not exported."""
+    state = read_state(Path(root)).get(table)
+    if pa is None or not state:
+        return None
+    parts = _parts(Path(root) / table)
+    wanted = None if columns is None else [ROWID_COL] + [c for c in columns if c != ROWID_COL]
+    tables = [read_part(p, wanted) for p in parts if _part_range(p)[0] <= state["rowid"]]
+    if not tables:
+        names = [ROWID_COL] + list(state["columns"])
+        schema = pa.schema([(c, pa.int64() if c == ROWID_COL else getattr(pa, state["columns"][c])())
+                            for c in names if wanted is None or c in wanted])
+        return schema.empty_table()
+    return pa.concat_tables(tables).sort_by(ROWID_COL)
+
+
+def update(db_path: Optional[str | Path] = None, root: Optional[str | Path] = None,
+           full: bool = False) -> dict:
+    """Export the rows recorded since the last run; returns per-table counters."""
+    if pa is None:
+        return {"status": "skipped", "reason": "pyarrow not installed"}
+    db_path = Path(db_path) if db_path else db.DEFAULT_DB_PATH
+    root = Path(root) if root else export_root(db_path)
+    root.mkdir(parents=True, exist_ok=True)
+    state = read_state(root)
+
+    summary = {"status": "ok", "root": str(root)}
+    conn = db.connect_db(db_path)
+    try:
+        tables = set(db.list_tables(conn))
+        for table in TABLES:
+            if table not in tables:
+                continue
+            t0 = time.perf_counter()
+            table_dir = root / table
+            schema = _schema(conn, table)
+            prev = state.get(table) or {}
+            max_rowid = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+
+            reset = (full or not prev or list(prev.get("columns", {})) != list(schema)
+                     or max_rowid < prev.get("rowid", 0))
+            if reset:
+                shutil.rmtree(table_dir, ignore_errors=True)
+                after = 0
+            else:
+                schema = dict(prev["columns"])
+                after = prev["rowid"]
+                # parts written after the last saved state (interrupted run) are exported again
+                for p in _parts(table_dir):
+                    if _part_range(p)[0] > after:
+                        p.unlink()
+
+            n, wm, widened = _export_rows(conn, table, table_dir, schema, after)
+            while widened:
+                # a column type was widened: files already written no longer share the schema
+                shutil.rmtree(table_dir, ignore_errors=True)
+                n, wm, widened = _export_rows(conn, table, table_dir, schema, 0)
+                reset = True
+            compacted = compact(table_dir) if table_dir.exists() else 0
+
+            state[table] = {"rowid": wm, "columns": schema, "ts_export": int(time.time() * 1000)}
+            _write_state(root, state)
+            summary[table] = {
+                "rows": n,
+                "rowid": wm,
+                "full": bool(reset),
+                "compacted_days": compacted,
+                "seconds": round(time.perf_counter() - t0, 3),
+            }
+    finally:
+        conn.close()
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export recorder.db to day-partitioned Arrow IPC files")
+    parser.add_argument("--db-path", default=None, help="Path to recorder.db")
+    parser.add_argument("--root", default=None, help="Export directory (default: <db dir>/export/<db stem>)")
+    parser.add_argument("--full", action="store_true", help="Rewrite every table from scratch")
+    args = parser.parse_args()
+    print(json.dumps(update(args.db_path, args.root, full=args.full), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,13 @@ if __package__ in (None, ""):
 
 import argparse
 import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from analysis import db
+from analysis import context, db, export
 from analysis import mfe_mae, expectancy, pyramiding, exit_reasons, leverage_analysis
 from analysis import coin_analysis, time_analysis, equity_curve, edge_decay, clustering
 from analysis import entry_efficiency, step_analysis, move_vs_fees, volatility_analysis, trade_clustering
@@ -63,22 +68,100 @@ MODULES = [
     ("edge_discovery", edge_discovery.run),
 ]
 
+WORK_DIR = ".work"
 
-def run_all(db_path: str | None = None, output_root: str | Path = "analysis_output") -> dict:
+
+def _run_module(name: str, conn, out: dict) -> tuple[dict, float]:
+    t0 = time.perf_counter()
+    try:
+        result = dict(MODULES)[name](conn, out)
+    except Exception as exc:  # robust orchestration
+        result = {"status": "error", "reason": str(exc)}
+    return result, time.perf_counter() - t0
+
+
+def _run_in_worker(name: str, db_path: str | None, work_root: str) -> tuple[dict, float]:
+    """Module in a pool worker: own connection, private output tree merged by the parent."""
+    out = db.ensure_output_dirs(Path(work_root) / name)
+    conn = db.connect_db(db_path)
+    try:
+        return _run_module(name, conn, out)
+    finally:
+        conn.close()
+
+
+def _merge(src: Path, root: Path) -> None:
+    for f in sorted(p for p in src.rglob("*") if p.is_file()):
+        dest = root / f.relative_to(src)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(f, dest)
+
+
+def _run_parallel(db_path: str | None, out: dict, workers: int) -> dict[str, tuple[dict, float]]:
+    work_root = out["root"] / WORK_DIR
+    shutil.rmtree(work_root, ignore_errors=True)
+    # fork: workers inherit the loaded run context instead of reading recorder.db again
+    methods = multiprocessing.get_all_start_methods()
+    mp = multiprocessing.get_context("fork" if "fork" in methods else None)
+    done: dict[str, tuple[dict, float]] = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp) as pool:
+            futures = {pool.submit(_run_in_worker, name, db_path, str(work_root)): name for name, _ in MODULES}
+            for fut in as_completed(futures):
+                try:
+                    done[futures[fut]] = fut.result()
+                except Exception as exc:  # worker died
+                    done[futures[fut]] = ({"status": "error", "reason": str(exc)}, 0.0)
+        # MODULES order: a file written by several modules ends as in a sequential run
+        for name, _ in MODULES:
+            if (work_root / name).exists():
+                _merge(work_root / name, out["root"])
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+    return done
+
+
+def run_all(db_path: str | None = None, output_root: str | Path = "analysis_output",
+            export_data: bool = True, workers: int | None = None) -> dict:
+    t_run = time.perf_counter()
+    workers = max(1, workers if workers is not None else (os.cpu_count() or 1))
     out = db.ensure_output_dirs(output_root)
     conn = db.connect_db(db_path)
     summary = {}
+    timings = {"workers": workers}
+    if export_data:
+        # append new trades to the Arrow export read by db.load_table
+        try:
+            summary["export"] = export.update(db_path)
+        except Exception as exc:
+            summary["export"] = {"status": "error", "reason": str(exc)}
+    ctx = None
     try:
-        for name, fn in MODULES:
-            try:
-                summary[name] = fn(conn, out)
-            except Exception as exc:  # robust orchestration
-                summary[name] = {"status": "error", "reason": str(exc)}
+        # recorder / recorder_steps loaded, typed and time-parsed once for every module
+        try:
+            ctx = context.RunContext.load(conn).activate()
+            timings["context_load_s"] = round(ctx.load_s, 3)
+        except Exception as exc:
+            summary["context"] = {"status": "error", "reason": str(exc)}
+        if workers > 1:
+            conn.close()
+            results = _run_parallel(db_path, out, workers)
+        else:
+            results = {name: _run_module(name, conn, out) for name, _ in MODULES}
     finally:
         conn.close()
+        if ctx is not None:
+            ctx.deactivate()
+    for name, _ in MODULES:
+        summary[name] = results[name][0]
+    timings["modules_s"] = {name: round(results[name][1], 3) for name, _ in MODULES}
 
+    t0 = time.perf_counter()
     dashboard_path = dashboard.generate_dashboard(out["root"])
     summary["dashboard"] = {"status": "ok", "path": str(dashboard_path)}
+    timings["dashboard_s"] = round(time.perf_counter() - t0, 3)
+    timings["total_s"] = round(time.perf_counter() - t_run, 3)
+    summary["timings"] = timings
 
     report_path = out["reports"] / "summary_report.json"
     report_path.write_text(json.dumps(summary, indent=2))
@@ -89,8 +172,12 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Run full quant diagnostics for recorder.db")
     parser.add_argument("--db-path", default=None, help="Path to recorder.db")
     parser.add_argument("--output-root", default="analysis_output", help="Output directory root")
+    parser.add_argument("--no-export", action="store_true", help="Read recorder.db without refreshing the Arrow export")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Module processes (default: CPU count; 1 runs sequentially in-process)")
     args = parser.parse_args()
-    summary = run_all(db_path=args.db_path, output_root=args.output_root)
+    summary = run_all(db_path=args.db_path, output_root=args.output_root, export_data=not args.no_export,
+                      workers=args.workers)
     print(json.dumps(summary, indent=2))
 
 
@@ -15,10 +15,10 @@ PRAGMA busy_timeout=5000;
 -- (Optionnel mais recommandé si non créés) Index pour accélérer l'agrégation
 -- CREATE INDEX IF NOT EXISTS idx_ohlcv_1m_inst_ts ON ohlcv_1m(instId, ts);
 
--- Nettoyage 3m
-DELETE FROM ohlcv_3m;
-
--- Agrégation 1m -> 3m sans fonctions analytiques (compat SQLite 3.37)
+-- Agrégation 1m -> 3m incrémentale : par instId, seulement depuis le dernier
+-- bucket 3m stocké (re-calculé, il peut être incomplet). OB_collect agrège déjà
+-- les 3m à chaque run (aggregate_3m) ; ce script ne sert qu'au rattrapage manuel.
+-- Sans fonctions analytiques (compat SQLite 3.37)
 WITH g AS (
   SELECT
     instId,
@@ -29,9 +29,12 @@ WITH g AS (
     MIN(l) AS l,
     SUM(v) AS v
   FROM ohlcv_1m
+  WHERE ts >= COALESCE(
+    (SELECT MAX(t3.ts) FROM ohlcv_3m t3 WHERE t3.instId = ohlcv_1m.instId), 0
+  )
   GROUP BY instId, ts3
 )
-INSERT INTO ohlcv_3m(instId, ts, o, h, l, c, v)
+INSERT OR REPLACE INTO ohlcv_3m(instId, ts, o, h, l, c, v)
 SELECT
   g.instId,
   g.ts3 AS ts,
@@ -8,7 +8,33 @@ echo "[PYTHON]"
 echo
 
 echo "[PROCESSES]"
-ps aux | grep -E "ticks.py|follower.py|universe" | grep -v grep || true
+ps aux | grep -E "ticks.py|follower.py|fsm_fused.py|universe" | grep -v grep || true
+echo
+
+# chaîne FSM : 5 daemons ou 1 fsm_fused.py selon conf/runtime.yaml (jamais les deux)
+echo "[FSM]"
+MODE="$(awk '/^fsm:/{f=1; next} f && /^[^ ]/{f=0} f && $1=="mode:"{print $2; exit}' "$ROOT/conf/runtime.yaml" 2>/dev/null || true)"
+MODE="${MODE:-daemons}"
+echo "mode=$MODE"
+FUSED="$(pgrep -f "$ROOT/scripts/fsm_fused.py" || true)"
+DAEMONS=""
+for r in gest opener exec closer follower; do
+    if pgrep -f "$ROOT/scripts/$r.py" >/dev/null; then
+        DAEMONS="$DAEMONS $r"
+    fi
+done
+if [ "$MODE" = "fused" ]; then
+    [ -n "$FUSED" ] && echo "fsm_fused OK pid=$(echo $FUSED)" || echo "[WARN] fsm_fused.py absent"
+    [ -n "$DAEMONS" ] && echo "[WARN] daemons actifs en mode fused (2 writers / DB):$DAEMONS"
+else
+    [ -n "$FUSED" ] && echo "[WARN] fsm_fused.py actif en mode daemons (2 writers / DB) pid=$(echo $FUSED)"
+    for r in gest opener exec closer follower; do
+        case " $DAEMONS " in
+            *" $r "*) echo "$r OK" ;;
+            *) echo "[WARN] $r.py absent" ;;
+        esac
+    done
+fi
 echo
 
 echo "[DISK]"
@@ -1,22 +1,16 @@
 #!/usr/bin/env bash
 set -euo pipefail
-DB="/opt/scalp/project/data/ob.db"
 LOG="/opt/scalp/project/logs/maint_ohlcv.log"
 echo "[$(date '+%F %T')] START maintenance" >>"$LOG"
 
-# --- Nettoyage (max rows) ---
-sqlite3 "$DB" <<'SQL'
-DELETE FROM ohlcv_1m WHERE ts NOT IN (
-  SELECT ts FROM ohlcv_1m ORDER BY ts DESC LIMIT 450
-);
-DELETE FROM ohlcv_3m WHERE ts NOT IN (
-  SELECT ts FROM ohlcv_3m ORDER BY ts DESC LIMIT 150
-);
-DELETE FROM ohlcv_5m WHERE ts NOT IN (
-  SELECT ts FROM ohlcv_5m ORDER BY ts DESC LIMIT 150
-);
-VACUUM;
-SQL
+# --- Nettoyage : rétention par instId (keyset) + incremental_vacuum ---
+# (l'ancien DELETE ... ts NOT IN (450 derniers ts) purgeait tous coins
+#  confondus, suivi d'un VACUUM complet bloquant)
+cd /opt/scalp/project/scripts
+# refusé tant que OB_collect tourne (1 DB = 1 writer) : la purge courante
+# est faite par OB_collect lui-même
+/opt/scalp/project/venv/bin/python3 retention.py --db ob --init-vacuum >>"$LOG" 2>&1 \
+  || echo "retention skipped" >>"$LOG"
 
 echo "[$(date '+%F %T')] CLEAN OK" >>"$LOG"
 
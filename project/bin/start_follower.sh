@@ -1,5 +1,21 @@
 #!/bin/bash
-LOG="/opt/scalp/project/logs/follower.log"
+# follower seul (layout daemons). En fsm.mode=fused le follower tourne dans
+# scripts/fsm_fused.py : la chaîne est relancée par bin/start_fsm.sh.
+ROOT="/opt/scalp/project"
+LOG="$ROOT/logs/follower.log"
+
+MODE="$(awk '/^fsm:/{f=1; next} f && /^[^ ]/{f=0} f && $1=="mode:"{print $2; exit}' "$ROOT/conf/runtime.yaml")"
+MODE="${MODE:-daemons}"
+
+if [ "$MODE" = "fused" ]; then
+    echo "[start_follower] fsm.mode=fused : follower dans fsm_fused.py -> start_fsm.sh fused"
+    exec "$ROOT/bin/start_fsm.sh" fused
+fi
+
+if pgrep -f "$ROOT/scripts/fsm_fused.py" >/dev/null 2>&1; then
+    echo "[start_follower] fsm_fused.py tourne encore (1 writer / DB) : bin/start_fsm.sh daemons" >&2
+    exit 1
+fi
 
 echo "[start_follower] Stopping existing follower…"
 pkill -f follower.py 2>/dev/null || true
@@ -14,4 +30,3 @@ ps aux | grep follower.py | grep -v grep
 
 echo "[start_follower] Tail log:"
 tail -n 10 "$LOG"
-
@@ -0,0 +1,49 @@
+#!/bin/bash
+# Chaîne FSM gest / opener / exec / closer / follower
+#   start_fsm.sh            -> mode lu dans conf/runtime.yaml (fsm.mode)
+#   start_fsm.sh daemons    -> 5 daemons séparés (layout historique)
+#   start_fsm.sh fused      -> 1 process scripts/fsm_fused.py
+# Les deux layouts ne tournent jamais ensemble (1 writer / DB).
+ROOT="/opt/scalp/project"
+SCRIPTS="$ROOT/scripts"
+ROLES="gest opener exec closer follower"
+
+MODE="${1:-$(awk '/^fsm:/{f=1; next} f && /^[^ ]/{f=0} f && $1=="mode:"{print $2; exit}' "$ROOT/conf/runtime.yaml")}"
+MODE="${MODE:-daemons}"
+
+stop_daemons() {
+    for r in $ROLES; do
+        pkill -TERM -f "$SCRIPTS/$r.py" 2>/dev/null || true
+    done
+}
+
+stop_fused() {
+    pkill -TERM -f "$SCRIPTS/fsm_fused.py" 2>/dev/null || true
+}
+
+case "$MODE" in
+    daemons)
+        echo "[start_fsm] mode=daemons"
+        stop_fused
+        stop_daemons
+        sleep 1
+        for r in $ROLES; do
+            nohup python3 "$SCRIPTS/$r.py" >> "$ROOT/logs/$r.log" 2>&1 &
+        done
+        ;;
+    fused)
+        echo "[start_fsm] mode=fused"
+        stop_daemons
+        stop_fused
+        sleep 1
+        nohup python3 "$SCRIPTS/fsm_fused.py" >> "$ROOT/logs/fsm_fused.log" 2>&1 &
+        ;;
+    *)
+        echo "[start_fsm] mode inconnu: $MODE (daemons|fused)" >&2
+        exit 1
+        ;;
+esac
+
+sleep 1
+echo "[start_fsm] Running:"
+ps aux | grep -E "scripts/(fsm_fused|gest|opener|exec|closer|follower)\.py" | grep -v grep
@@ -0,0 +1,13 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Compaction de l'archive binaire des ticks (jours UTC clos seulement)
+# à lancer une fois par jour, après minuit UTC
+LOG="/opt/scalp/project/logs/ticks_arch.log"
+
+echo "===== TICKS ARCH COMPACT $(date '+%F %T') =====" >> "$LOG"
+
+cd /opt/scalp/project/scripts
+/opt/scalp/project/venv/bin/python3 tick_archive.py >> "$LOG" 2>&1
+
+echo "===== END COMPACT =====" >> "$LOG"
@@ -3,6 +3,11 @@
 
 import sqlite3, time, logging, statistics
 import math
+import argparse
+
+from B_feat_engine import FeatStream, MAX_BARS, MIN_BARS, ensure_state_table, load_state, save_state
+from B_feat_vector import compute_feat_batch
+from retention import POLICIES, Retention
 
 ROOT = "/opt/scalp/project"
 DB_OB = f"{ROOT}/data/ob.db"
@@ -60,6 +65,42 @@ def load_ohlcv_incremental(tf, inst, last_ts):
     return rows
 
 
+# ---------------------------------------------------------
+# FULL SERIES (backfill vectorisé)
+# ---------------------------------------------------------
+def load_ohlcv_full(tf, inst):
+    table = f"ohlcv_{tf}"
+    co = conn(DB_OB)
+    rows = co.execute(
+        f"SELECT ts,o,h,l,c,v FROM {table} WHERE instId=? ORDER BY ts ASC",
+        (inst,)
+    ).fetchall()
+    co.close()
+    return rows
+
+
+def count_ohlcv(tf, inst):
+    table = f"ohlcv_{tf}"
+    co = conn(DB_OB)
+    n = co.execute(f"SELECT COUNT(*) FROM {table} WHERE instId=?", (inst,)).fetchone()[0]
+    co.close()
+    return n
+
+
+# ---------------------------------------------------------
+# WARMUP (pas d'état persistant : dernières bougies déjà traitées)
+# ---------------------------------------------------------
+def load_ohlcv_warmup(tf, inst, last_ts, n=200):
+    table = f"ohlcv_{tf}"
+    co = conn(DB_OB)
+    rows = co.execute(
+        f"SELECT ts,o,h,l,c,v FROM {table} WHERE instId=? AND ts<=? ORDER BY ts DESC LIMIT ?",
+        (inst, last_ts, n)
+    ).fetchall()
+    co.close()
+    return rows[::-1]
+
+
 # ---------------------------------------------------------
 # INDICATORS
 # ---------------------------------------------------------
@@ -184,79 +225,110 @@ def compute_feat(rows):
 
 
 # ---------------------------------------------------------
-# PURGE
+# WRITE
 # ---------------------------------------------------------
-def purge(co_b, table, inst, H, L):
-    cnt = co_b.execute(
-        f"SELECT COUNT(*) FROM {table} WHERE instId=?",
-        (inst,)
-    ).fetchone()[0]
+def write_feat(co_b, table, inst, tf, rows, st, verb="INSERT OR IGNORE"):
+    """Lignes feat + état streaming dans une seule transaction ; retourne le nb de lignes écrites."""
+    try:
+        co_b.execute("BEGIN")
+        before = co_b.total_changes
+        co_b.executemany(
+            f"{verb} INTO {table} VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            rows
+        )
+        # OR IGNORE : les doublons ignorés ne comptent pas
+        written = co_b.total_changes - before
+        save_state(co_b, inst, tf, st, int(time.time() * 1000))
+        co_b.execute("COMMIT")
+        return written
+    except Exception as e:
+        co_b.execute("ROLLBACK")
+        log.error(f"{inst} {tf} FAIL {e}")
+        return 0
 
-    if cnt <= H:
-        return
 
-    rows = co_b.execute(
-        f"SELECT ts FROM {table} WHERE instId=? ORDER BY ts DESC LIMIT ? OFFSET ?",
-        (inst, H, L)
-    ).fetchall()
+def backfill(co_b, table, inst, tf):
+    """Recalcul complet vectorisé d'un (coin, tf) depuis ohlcv_{tf}."""
+    ohlcv = load_ohlcv_full(tf, inst)
+    if not ohlcv:
+        return 0, []
 
-    if not rows:
-        return
+    rows = [(inst,) + feat for feat in compute_feat_batch(ohlcv)]
 
-    cutoff = rows[-1][0]
+    st = FeatStream()
+    for r in ohlcv[-MAX_BARS:]:
+        st.update(r)
+
+    return write_feat(co_b, table, inst, tf, rows, st, verb="INSERT OR REPLACE"), rows
 
-    co_b.execute(
-        f"DELETE FROM {table} WHERE instId=? AND ts < ?",
-        (inst, cutoff)
-    )
 
 # ---------------------------------------------------------
 # MAIN
 # ---------------------------------------------------------
-def main():
-    log.info("B_FEAT START")
+def main(force_backfill=False):
+    log.info("B_FEAT START" + (" (backfill)" if force_backfill else ""))
 
     coins = load_universe()
     co_b  = conn(DB_B)
+    ensure_state_table(co_b)
+    ret = Retention(co_b, POLICIES["b"], log)
 
     for inst in coins:
         for tf in ("1m", "3m", "5m"):
             table = f"feat_{tf}"
             last = last_ts_feat(co_b, table, inst)
+
+            # b.db vide / coin entrant / --backfill : série complète en NumPy
+            if force_backfill or not last:
+                # historique < MIN_BARS : aucune ligne feat possible, pas de
+                # relecture complète à chaque passage
+                n = count_ohlcv(tf, inst)
+                if n < MIN_BARS:
+                    log.info(f"{inst} {tf} → skip ({n} bougies < {MIN_BARS})")
+                    continue
+                inserted, rows = backfill(co_b, table, inst, tf)
+                if inserted:
+                    ret.added(table, rows)
+                log.info(f"{inst} {tf} → {inserted} (backfill)")
+                continue
+
+            # Etat streaming (B_feat_engine) : O(1) par bougie, reprise sans replay.
+            # Etat absent / désaligné avec feat_xm -> réamorçage sur l'historique OB.
+            st = load_state(co_b, inst, tf)
+            if st is None or st.ts_last != last:
+                st = FeatStream()
+                for r in load_ohlcv_warmup(tf, inst, last):
+                    st.update(r)
+
             ohlcv = load_ohlcv_incremental(tf, inst, last)
 
             if not ohlcv:
                 continue
 
-            # Build rolling windows
-            buf = []
-            inserted = 0
-
+            rows = []
             for r in ohlcv:
-                buf.append(r)
-                if len(buf) > 200:
-                    buf.pop(0)
-                feat = compute_feat(buf)
+                feat = st.update(r)
                 if feat:
-                    try:
-                        co_b.execute(
-                            f"INSERT INTO {table} VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-                            (inst,) + feat
-                        )
-                        inserted += 1
-                    except Exception as e:
-                        log.error(f"{inst} {tf} FAIL {e}")
+                    rows.append((inst,) + feat)
 
+            inserted = write_feat(co_b, table, inst, tf, rows, st)
+            if inserted:
+                ret.added(table, rows)
             log.info(f"{inst} {tf} → {inserted}")
 
-            # purge
-            if tf == "1m":
-                purge(co_b, table, inst, 1500, 450)
-            else:
-                purge(co_b, table, inst, 500, 150)
+    # purge : 1 DELETE par table pour tout l'univers (retention.py)
+    for tf in ("1m", "3m", "5m"):
+        try:
+            ret.purge(f"feat_{tf}")
+        except Exception as e:
+            log.error(f"purge feat_{tf} FAIL {e}")
 
     log.info("B_FEAT DONE")
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backfill", action="store_true",
+                    help="recalcul complet vectorisé de feat_xm pour tout l'univers")
+    args = ap.parse_args()
+    main(force_backfill=args.backfill)
 
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+B_feat_engine.py — moteur d'indicateurs streaming (O(1) par bougie)
+
+- Même sortie que B_feat_builder_incremental.compute_feat (fenêtres glissantes
+  sur les dernières bougies), mais sans recalcul : chaque indicateur porte
+  son accumulateur
+    EMA       : somme exponentielle tronquée W_p (ema fenêtrée = k*W + a^p*x_old)
+    RSI       : sommes gains / pertes sur 14 diffs
+    ATR / ADX : sommes TR, +DM, -DM sur 14 bougies
+    Bollinger : moyenne + M2 glissants (Welford) sur 20 closes
+- Etat persistant par (instId, tf) dans b.db (table feat_state) :
+  un redémarrage reprend sans rejouer l'historique
+- Resynchronisation exacte des accumulateurs toutes les RESYNC_EVERY bougies
+  (borne la dérive flottante)
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import sqlite3
+from collections import deque
+
+EMA_PERIODS = (9, 12, 21, 26, 50)
+PERIOD = 14          # RSI / ATR / ADX
+BB_PERIOD = 20
+MIN_BARS = 30        # compute_feat: len(rows) < 30 -> None
+MAX_BARS = 200       # taille du buffer historique de compute_feat
+KEEP_BARS = max(EMA_PERIODS) + 1
+RESYNC_EVERY = 500
+
+STATE_DDL = """
+CREATE TABLE IF NOT EXISTS feat_state (
+    instId TEXT NOT NULL,
+    tf TEXT NOT NULL,
+    ts_last INTEGER NOT NULL,
+    n_bars INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    ts_update INTEGER NOT NULL,
+    PRIMARY KEY (instId, tf)
+)
+"""
+
+
+def _step(prev, bar):
+    """(diff, tr, +dm, -dm) de `bar` par rapport à la bougie précédente."""
+    _, _, h, l, c, _ = bar
+    _, _, ph, pl, pc, _ = prev
+    up = h - ph
+    dn = pl - l
+    pdm = up if up > dn and up > 0 else 0
+    mdm = dn if dn > up and dn > 0 else 0
+    tr = max(h - l, abs(h - pc), abs(l - pc))
+    return c - pc, tr, pdm, mdm
+
+
+class FeatStream:
+    """Indicateurs d'un (instId, tf), alimentés bougie par bougie."""
+
+    def __init__(self):
+        self.bars: deque = deque(maxlen=KEEP_BARS)   # (ts, o, h, l, c, v)
+        self.n_bars = 0
+        self.since_sync = 0
+        self._reset_acc()
+
+    def _reset_acc(self):
+        self.w = {p: 0.0 for p in EMA_PERIODS}
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.loss_cnt = 0
+        self.tr_sum = 0.0
+        self.tr_nz = 0
+        self.pdm_sum = 0.0
+        self.mdm_sum = 0.0
+        self.bb_n = 0
+        self.bb_mean = 0.0
+        self.bb_m2 = 0.0
+        self.eq_run = 0
+
+    @property
+    def ts_last(self):
+        return self.bars[-1][0] if self.bars else None
+
+    # ------------------------------------------------------------------
+    # UPDATE
+    # ------------------------------------------------------------------
+    def update(self, bar):
+        """Ajoute une bougie (ts, o, h, l, c, v) ; retourne le tuple feat ou None."""
+        self._push(tuple(bar))
+        self.n_bars = min(self.n_bars + 1, MAX_BARS)
+
+        self.since_sync += 1
+        if self.since_sync >= RESYNC_EVERY:
+            self.resync()
+
+        return self.features()
+
+    def _push(self, bar):
+        bars = self.bars
+        prev = bars[-1] if bars else None
+        x = bar[4]
+
+        # EMA : W_p(t) = x_t + a*W_p(t-1) - a^p * x_(t-p)
+        for p in EMA_PERIODS:
+            a = 1 - 2 / (p + 1)
+            w = x + a * self.w[p]
+            if len(bars) >= p:
+                w -= a ** p * bars[-p][4]
+            self.w[p] = w
+
+        # Bollinger : fenêtre 20 closes
+        if len(bars) >= BB_PERIOD:
+            old = bars[-BB_PERIOD][4]
+            mean_new = self.bb_mean + (x - old) / BB_PERIOD
+            self.bb_m2 += (x - old) * (x - mean_new + old - self.bb_mean)
+            self.bb_mean = mean_new
+        else:
+            self.bb_n += 1
+            d = x - self.bb_mean
+            self.bb_mean += d / self.bb_n
+            self.bb_m2 += d * (x - self.bb_mean)
+        self.eq_run = self.eq_run + 1 if prev is not None and prev[4] == x else 1
+
+        # RSI / ATR / ADX : fenêtre 14 pas
+        if prev is not None:
+            self._add_step(_step(prev, bar), 1)
+            if len(bars) >= PERIOD + 1:
+                self._add_step(_step(bars[-PERIOD - 1], bars[-PERIOD]), -1)
+
+        bars.append(bar)
+
+    def _add_step(self, step, sign):
+        diff, tr, pdm, mdm = step
+        if diff >= 0:
+            self.gain_sum += sign * diff
+        else:
+            self.loss_sum += sign * -diff
+            self.loss_cnt += sign
+        self.tr_sum += sign * tr
+        if tr != 0:
+            self.tr_nz += sign
+        self.pdm_sum += sign * pdm
+        self.mdm_sum += sign * mdm
+
+    def resync(self):
+        """Recalcule exactement tous les accumulateurs depuis le buffer."""
+        bars = list(self.bars)
+        self._reset_acc()
+        self.bars = deque(maxlen=KEEP_BARS)
+        for bar in bars:
+            self._push(bar)
+        self.since_sync = 0
+
+    # ------------------------------------------------------------------
+    # FEATURES (même tuple que compute_feat)
+    # ------------------------------------------------------------------
+    def features(self):
+        if self.n_bars < MIN_BARS:
+            return None
+
+        bars = self.bars
+        last = bars[-1]
+        c = last[4]
+
+        emas = {}
+        for p in EMA_PERIODS:
+            if len(bars) < p:
+                emas[p] = None
+                continue
+            k = 2 / (p + 1)
+            emas[p] = k * self.w[p] + (1 - k) ** p * bars[-p][4]
+
+        ema12, ema26 = emas[12], emas[26]
+        macd = (ema12 - ema26) if ema12 and ema26 else None
+
+        # RSI
+        avg_gain = self.gain_sum / PERIOD
+        avg_loss = self.loss_sum / PERIOD if self.loss_cnt else 0.0000001
+        rsi_v = 100 - (100 / (1 + avg_gain / avg_loss))
+
+        # ATR
+        atr_v = self.tr_sum / PERIOD
+
+        # Bollinger
+        if self.eq_run >= BB_PERIOD:
+            bb_mid, bb_std = c, 0.0
+        else:
+            bb_mid = self.bb_mean
+            bb_std = math.sqrt(max(self.bb_m2, 0.0) / BB_PERIOD)
+        bb_up = bb_mid + 2 * bb_std if bb_mid and bb_std else None
+        bb_low = bb_mid - 2 * bb_std if bb_mid and bb_std else None
+        bb_width = (bb_up - bb_low) if bb_up and bb_low else None
+
+        mom = c - bars[-10][4]
+        roc = (c / bars[-10][4] - 1) * 100
+        slope = (c - bars[-5][4]) / 5
+
+        # ADX
+        if self.tr_nz:
+            atr_adx = self.tr_sum / PERIOD
+            plus_di = (self.pdm_sum / atr_adx) * 100
+            minus_di = (self.mdm_sum / atr_adx) * 100
+            adx_v = abs(plus_di - minus_di) / (plus_di + minus_di + 1e-6) * 100
+        else:
+            plus_di = minus_di = adx_v = None
+
+        return (
+            last[0],
+            last[1], last[2], last[3], last[4], last[5],
+            emas[9], ema12, emas[21], ema26, emas[50],
+            macd, None, None,
+            rsi_v, atr_v,
+            bb_mid, bb_std, bb_up, bb_low, bb_width,
+            mom, roc, slope,
+            "unknown",
+            plus_di, minus_di, adx_v,
+        )
+
+    # ------------------------------------------------------------------
+    # PERSISTENCE
+    # ------------------------------------------------------------------
+    def to_json(self) -> str:
+        return json.dumps({
+            "bars": list(self.bars),
+            "n_bars": self.n_bars,
+            "since_sync": self.since_sync,
+            "w": {str(p): v for p, v in self.w.items()},
+            "gain_sum": self.gain_sum,
+            "loss_sum": self.loss_sum,
+            "loss_cnt": self.loss_cnt,
+            "tr_sum": self.tr_sum,
+            "tr_nz": self.tr_nz,
+            "pdm_sum": self.pdm_sum,
+            "mdm_sum": self.mdm_sum,
+            "bb_n": self.bb_n,
+            "bb_mean": self.bb_mean,
+            "bb_m2": self.bb_m2,
+            "eq_run": self.eq_run,
+        })
+
+    @classmethod
+    def from_json(cls, raw: str) -> "FeatStream":
+        d = json.loads(raw)
+        st = cls()
+        st.bars = deque((tuple(b) for b in d["bars"]), maxlen=KEEP_BARS)
+        st.n_bars = int(d["n_bars"])
+        st.since_sync = int(d["since_sync"])
+        st.w = {int(p): float(v) for p, v in d["w"].items()}
+        for key in ("gain_sum", "loss_sum", "tr_sum", "pdm_sum", "mdm_sum", "bb_mean", "bb_m2"):
+            setattr(st, key, float(d[key]))
+        for key in ("loss_cnt", "tr_nz", "bb_n", "eq_run"):
+            setattr(st, key, int(d[key]))
+        return st
+
+
+# ==========================================================
+# b.db : feat_state
+# ==========================================================
+def ensure_state_table(co_b: sqlite3.Connection):
+    co_b.execute(STATE_DDL)
+
+
+def load_state(co_b: sqlite3.Connection, inst: str, tf: str) -> FeatStream | None:
+    r = co_b.execute(
+        "SELECT state FROM feat_state WHERE instId=? AND tf=?",
+        (inst, tf),
+    ).fetchone()
+    if not r:
+        return None
+    try:
+        return FeatStream.from_json(r[0])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def save_state(co_b: sqlite3.Connection, inst: str, tf: str, st: FeatStream, now_ms: int):
+    co_b.execute(
+        """
+        INSERT INTO feat_state (instId, tf, ts_last, n_bars, state, ts_update)
+        VALUES (?,?,?,?,?,?)
+        ON CONFLICT(instId, tf) DO UPDATE SET
+            ts_last=excluded.ts_last,
+            n_bars=excluded.n_bars,
+            state=excluded.state,
+            ts_update=excluded.ts_update
+        """,
+        (inst, tf, st.ts_last, st.n_bars, st.to_json(), now_ms),
+    )
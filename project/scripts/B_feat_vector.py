@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+B_feat_vector.py — backfill vectorisé feat_1m/3m/5m (NumPy)
+
+- Charge tout ohlcv_{tf} d'un coin en tableaux, calcule toutes les colonnes
+  de feat_xm par opérations sur fenêtres glissantes, écrit en 1 executemany
+- Même sortie que B_feat_builder_incremental.compute_feat (buffer 200 bougies) :
+    EMA       : EMA amorcée sur la 1re close de la fenêtre de p closes
+                = filtre FIR à p coefficients (pas de récursion infinie)
+    RSI / ATR / ADX : sommes sur 14 pas
+    Bollinger : mean / pstdev sur 20 closes (fenêtre plate -> std=0 exact)
+- Usage : premier remplissage de b.db, coin entrant dans l'univers,
+  ou `B_feat_builder_incremental.py --backfill`
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+EMA_PERIODS = (9, 12, 21, 26, 50)
+PERIOD = 14
+BB_PERIOD = 20
+MIN_BARS = 30
+
+
+def _ema_weights(p):
+    """Poids de compute_feat.ema sur une fenêtre de p closes (ancienne -> récente)."""
+    k = 2 / (p + 1)
+    a = 1 - k
+    w = k * a ** np.arange(p - 1, -1, -1, dtype=float)
+    w[0] = a ** (p - 1)
+    return w
+
+
+def _rolling_sum(x, n):
+    """Somme sur n éléments terminant en i (NaN si fenêtre incomplète)."""
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        out[n - 1:] = sliding_window_view(x, n).sum(axis=1)
+    return out
+
+
+def _lag(x, n):
+    out = np.full(len(x), np.nan)
+    if len(x) > n:
+        out[n:] = x[:-n]
+    return out
+
+
+def _column(values, valid):
+    """float64 -> liste Python, None là où la valeur n'existe pas."""
+    col = values.astype(object)
+    col[~valid] = None
+    return col.tolist()
+
+
+def compute_feat_batch(rows):
+    """Toutes les lignes feat d'une série (ts, o, h, l, c, v) triée par ts.
+
+    Retourne la liste des tuples 28 colonnes (sans instId) pour chaque bougie
+    où compute_feat produirait une ligne (au moins MIN_BARS bougies d'historique).
+    """
+    n = len(rows)
+    if n < MIN_BARS:
+        return []
+
+    arr = np.asarray(rows, dtype=float)
+    ts = [r[0] for r in rows]
+    o, h, l, c, v = arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4], arr[:, 5]
+
+    # EMA fenêtrées
+    emas = {}
+    for p in EMA_PERIODS:
+        e = np.full(n, np.nan)
+        e[p - 1:] = sliding_window_view(c, p) @ _ema_weights(p)
+        emas[p] = e
+
+    ema12, ema26 = emas[12], emas[26]
+    macd = ema12 - ema26
+    macd_ok = (ema12 != 0) & (ema26 != 0)
+
+    # pas bougie i-1 -> i (indice 0 : pas de précédent)
+    pc = _lag(c, 1)
+    diff = c - pc
+    tr = np.fmax(h - l, np.fmax(np.abs(h - pc), np.abs(l - pc)))
+    up = h - _lag(h, 1)
+    dn = _lag(l, 1) - l
+    pdm = np.where((up > dn) & (up > 0), up, 0.0)
+    mdm = np.where((dn > up) & (dn > 0), dn, 0.0)
+    diff[0] = tr[0] = pdm[0] = mdm[0] = 0.0
+
+    # RSI
+    gain_sum = _rolling_sum(np.where(diff >= 0, diff, 0.0), PERIOD)
+    loss_sum = _rolling_sum(np.where(diff < 0, -diff, 0.0), PERIOD)
+    avg_loss = np.where(loss_sum != 0, loss_sum / PERIOD, 0.0000001)
+    rsi = 100 - (100 / (1 + (gain_sum / PERIOD) / avg_loss))
+
+    # ATR / ADX
+    tr_sum = _rolling_sum(tr, PERIOD)
+    atr = tr_sum / PERIOD
+    adx_ok = tr_sum != 0
+    atr_adx = np.where(adx_ok, atr, 1.0)
+    plus_di = _rolling_sum(pdm, PERIOD) / atr_adx * 100
+    minus_di = _rolling_sum(mdm, PERIOD) / atr_adx * 100
+    adx = np.abs(plus_di - minus_di) / (plus_di + minus_di + 1e-6) * 100
+
+    # Bollinger
+    win = sliding_window_view(c, BB_PERIOD)
+    flat = win.max(axis=1) == win.min(axis=1)
+    bb_mid = np.full(n, np.nan)
+    bb_std = np.full(n, np.nan)
+    bb_mid[BB_PERIOD - 1:] = np.where(flat, win[:, -1], win.mean(axis=1))
+    bb_std[BB_PERIOD - 1:] = np.where(flat, 0.0, win.std(axis=1))
+    bb_up = bb_mid + 2 * bb_std
+    bb_low = bb_mid - 2 * bb_std
+    bb_width = bb_up - bb_low
+    bb_ok = (bb_mid != 0) & (bb_std != 0)
+    width_ok = bb_ok & (bb_up != 0) & (bb_low != 0)
+
+    # momentum / slope (mêmes décalages que compute_feat : -10 et -5)
+    c9 = _lag(c, 9)
+    mom = c - c9
+    roc = (c / c9 - 1) * 100
+    slope = (c - _lag(c, 4)) / 5
+
+    lo = MIN_BARS - 1
+    none = [None] * (n - lo)
+
+    def col(x, valid=None):
+        ok = ~np.isnan(x[lo:])
+        return _column(x[lo:], ok if valid is None else ok & valid)
+
+    return list(zip(
+        ts[lo:],
+        col(o), col(h), col(l), col(c), col(v),
+        col(emas[9]), col(ema12), col(emas[21]), col(ema26), col(emas[50]),
+        col(macd, macd_ok[lo:]), none, none,
+        col(rsi), col(atr),
+        col(bb_mid), col(bb_std), col(bb_up, bb_ok[lo:]), col(bb_low, bb_ok[lo:]),
+        col(bb_width, width_ok[lo:]),
+        col(mom), col(roc), col(slope),
+        ["unknown"] * (n - lo),
+        col(plus_di, adx_ok[lo:]), col(minus_di, adx_ok[lo:]), col(adx, adx_ok[lo:]),
+    ))
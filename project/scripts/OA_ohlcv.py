@@ -5,7 +5,9 @@ import sqlite3
 import time
 import logging
 import traceback
-import ccxt
+
+from ohlcv_fetch import last_ts_map, run_fetch, since_for
+from retention import POLICIES, Retention
 
 ROOT = "/opt/scalp/project"
 DB_U  = f"{ROOT}/data/universe.db"
@@ -32,9 +34,8 @@ def conn(path):
 # ============================================================
 # EXCHANGE
 # ============================================================
-exchange = ccxt.bitget({
-    "options": {"defaultType": "swap"},
-})
+EX_OPTIONS = {"defaultType": "swap"}
+FETCH_LIMIT = 100   # = défaut Bitget de l'ancien fetch sans since
 
 # Map TF → minutes
 TF_MAP = {
@@ -52,109 +53,91 @@ def load_universe():
     return [r[0] for r in rows]
 
 # ============================================================
-# FETCH OHLCV FROM EXCHANGE
+# FETCH OHLCV FROM EXCHANGE (async, incrémental)
 # ============================================================
-def fetch_ohlcv(instId, tf):
+def fetch_all(insts, c, exchange=None):
     """
-    Retourne une liste de bougies CCXT :
-      [ts_ms, open, high, low, close, volume]
+    Retourne {(instId, tf): bougies CCXT [ts_ms, open, high, low, close, volume]}
     """
-    try:
-        candles = exchange.fetch_ohlcv(instId.replace("/",""), timeframe=tf)
-        if not candles:
-            return []
-        return candles
-    except Exception as e:
-        log.error(f"{instId} {tf} fetch error: {e}")
-        return []
+    jobs = []
+    for tf in TF_MAP:
+        last = last_ts_map(c, f"ohlcv_{tf}")
+        for instId in insts:
+            jobs.append((instId, tf, since_for(last.get(instId), tf, FETCH_LIMIT), FETCH_LIMIT))
+    return run_fetch(jobs, exchange=exchange, options=EX_OPTIONS)
 
 # ============================================================
 # SAVE OHLCV → oa.db
 # ============================================================
-def save_candles(instId, tf, candles):
+def candle_rows(instId, candles):
     """
     candles = liste CCXT format standard
     """
-    if not candles:
-        return 0
-
-    table = f"ohlcv_{tf}"
-    c = conn(DB_OA)
-
-    cnt = 0
+    out = []
     for row in candles:
         ts = int(row[0])  # timestamp en ms
-        o = float(row[1])
-        h = float(row[2])
-        l = float(row[3])
-        pc = float(row[4])
-        v = float(row[5])
 
         # IMPÉRATIF : empêcher ts NULL
         if ts <= 0:
             continue
 
-        try:
-            c.execute(f"""
-                INSERT OR REPLACE INTO {table}(
-                    instId, ts, open, high, low, close, volume
-                ) VALUES (?,?,?,?,?,?,?)
-            """, (instId, ts, o, h, l, pc, v))
-            cnt += 1
-        except Exception as e:
-            log.error(f"{instId} {tf} insert error: {e}")
+        out.append((
+            instId, ts,
+            float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])
+        ))
+    return out
 
-    return cnt
 
-# ============================================================
-# PURGE : garder les 150 dernières bougies
-# ============================================================
-def purge_tf(tf):
+def save_tf(c, tf, rows):
+    """1 transaction, 1 executemany par TF."""
+    if not rows:
+        return 0
     table = f"ohlcv_{tf}"
-    c = conn(DB_OA)
-
-    insts = c.execute(f"SELECT DISTINCT instId FROM {table}").fetchall()
-    for (instId,) in insts:
-        try:
-            # Récupère tous les ts triés descendant
-            rows = c.execute(f"""
-                SELECT ts FROM {table}
-                WHERE instId=?
-                ORDER BY ts DESC
-                LIMIT 150
-            """, (instId,)).fetchall()
-
-            if len(rows) < 150:
-                continue
-
-            oldest_keep = rows[-1][0]  # ts du 150ème
-
-            c.execute(f"""
-                DELETE FROM {table}
-                WHERE instId=? AND ts < ?
-            """, (instId, oldest_keep))
-
-        except Exception as e:
-            log.error(f"purge {instId} {tf} error: {e}")
+    try:
+        c.execute("BEGIN")
+        c.executemany(f"""
+            INSERT OR REPLACE INTO {table}(
+                instId, ts, open, high, low, close, volume
+            ) VALUES (?,?,?,?,?,?,?)
+        """, rows)
+        c.execute("COMMIT")
+        return len(rows)
+    except Exception as e:
+        c.execute("ROLLBACK")
+        log.error(f"{tf} insert error: {e}")
+        return 0
 
 # ============================================================
 # MAIN
 # ============================================================
-def main():
+def main(exchange=None):
     log.info("OA START")
 
     insts = load_universe()
+    c = conn(DB_OA)
 
-    for instId in insts:
-        for tf in ("5m", "15m", "30m"):
-            candles = fetch_ohlcv(instId, tf)
-            n = save_candles(instId, tf, candles)
-            log.info(f"{instId} {tf} → {n} candles")
-
-    # PURGE
-    for tf in ("5m", "15m", "30m"):
-        purge_tf(tf)
+    fetched = fetch_all(insts, c, exchange)
+    ret = Retention(c, POLICIES["oa"], log)
+
+    for tf in TF_MAP:
+        rows = []
+        for instId in insts:
+            r = candle_rows(instId, fetched.get((instId, tf), []))
+            log.info(f"{instId} {tf} → {len(r)} candles")
+            rows += r
+        n = save_tf(c, tf, rows)
+        if n:
+            ret.added(f"ohlcv_{tf}", rows)
+        log.info(f"{tf} → {n} candles saved")
+
+    # PURGE : 150 dernières bougies par instId (retention.py, 1 DELETE / table)
+    for tf in TF_MAP:
+        try:
+            ret.purge(f"ohlcv_{tf}")
+        except Exception as e:
+            log.error(f"purge {tf} error: {e}")
 
+    c.close()
     log.info("OA END")
 
 
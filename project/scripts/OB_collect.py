@@ -2,10 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import sqlite3
-import ccxt
 import logging
 import time
 
+from candle_builder import TF_MS, fold_1m, upsert
+from ohlcv_fetch import last_ts_map, run_fetch, since_for
+from retention import POLICIES, Retention
+
 ROOT = "/opt/scalp/project"
 DB_OB = f"{ROOT}/data/ob.db"
 DB_U  = f"{ROOT}/data/universe.db"
@@ -32,150 +35,96 @@ def load_universe():
     cu.close()
     return xs
 
-def last_ts(conn, table, inst):
-    try:
-        r = conn.execute(
-            f"SELECT ts FROM {table} WHERE instId=? ORDER BY ts DESC LIMIT 1",
-            (inst,)
-        ).fetchone()
-        return r[0] if r else 0
-    except:
-        return 0
-
 # ==========================================================
-# FETCH CCXT
+# FETCH CCXT (async, incrémental depuis le dernier ts stocké)
 # ==========================================================
-EX = ccxt.bitget()
-
-def fetch_tf(inst, tf, limit=200):
-    try:
-        symbol = inst.replace("/", "")
-        rows = EX.fetch_ohlcv(symbol, timeframe=tf, limit=limit)
-        return [(ts, o, h, l, c, v) for ts,o,h,l,c,v in rows]
-    except Exception as e:
-        log.error(f"{inst} {tf} FAIL {e}")
-        return []
+FETCH_LIMIT = 200
+TFS = ("1m", "5m")
+
+def fetch_all(co, coins, exchange=None):
+    jobs = []
+    last = {}
+    for tf in TFS:
+        last[tf] = last_ts_map(co, f"ohlcv_{tf}")
+        for inst in coins:
+            since = since_for(last[tf].get(inst), tf, FETCH_LIMIT)
+            jobs.append((inst, tf, since, FETCH_LIMIT))
+    return run_fetch(jobs, exchange=exchange), last
 
 # ==========================================================
-# AGGREGATION 3m
-# ==========================================================
-def aggregate_3m(conn):
-    conn.execute("""
-    INSERT OR REPLACE INTO ohlcv_3m(instId, ts, o, h, l, c, v)
-    SELECT instId,
-           (ts/180000)*180000 AS ts,
-           FIRST_VALUE(o) OVER w,
-           MAX(h)          OVER w,
-           MIN(l)          OVER w,
-           LAST_VALUE(c)   OVER w,
-           SUM(v)          OVER w
-    FROM ohlcv_1m
-    WINDOW w AS (
-        PARTITION BY instId, (ts/180000)
-        ORDER BY ts
-        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-    );
-    """)
-
+# AGGREGATION 3m (seulement les buckets touchés par les nouvelles 1m)
 # ==========================================================
-# PURGE OB
-# ==========================================================
-PURGE_1M_HIGH = 1500
-PURGE_1M_LOW  = 450
-
-PURGE_HIGH = 500
-PURGE_LOW  = 150
-
-def purge_ob(conn, tf, inst):
-    table = f"ohlcv_{tf}"
-
-    r = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE instId=?", (inst,)).fetchone()
-    if not r:
-        return
-    count = r[0]
-
-    if tf == "1m":
-        H = PURGE_1M_HIGH
-        L = PURGE_1M_LOW
-    else:
-        H = PURGE_HIGH
-        L = PURGE_LOW
-
-    if count <= H:
-        return
-
-    rows = conn.execute(
-        f"SELECT ts FROM {table} WHERE instId=? ORDER BY ts DESC LIMIT ? OFFSET ?",
-        (inst, H, L)
-    ).fetchall()
-
-    if not rows:
-        return
-
-    cutoff = rows[-1][0]
-
-    conn.execute(
-        f"DELETE FROM {table} WHERE instId=? AND ts < ?",
-        (inst, cutoff)
-    )
-
-    log.info(f"{inst} PURGE {table}: kept {H}, deleted older")
-
+def aggregate_3m(conn, new_1m):
+    """
+    new_1m = [(instId, ts, ...)] upsertées ce run : on ne recalcule que les
+    buckets 3m qui contiennent ces 1m.
+    """
+    first = {}
+    for inst, ts, *_ in new_1m:
+        b = ts - ts % TF_MS["3m"]
+        if b < first.get(inst, b + 1):
+            first[inst] = b
+
+    n = 0
+    for inst, since in first.items():
+        rows = conn.execute(
+            "SELECT instId, ts, o, h, l, c, v FROM ohlcv_1m WHERE instId=? AND ts>=? ORDER BY ts",
+            (inst, since)
+        ).fetchall()
+        out = fold_1m(rows, ("3m",)).get("3m", [])
+        if out:
+            upsert(conn, "3m", out)
+            n += len(out)
+    return n
 
 # ==========================================================
 # MAIN
 # ==========================================================
-def main():
+def main(exchange=None):
     log.info("OB START")
 
     co = conn(DB_OB)
     coins = load_universe()
-
-    for inst in coins:
-
-        # -------------------------------
-        # 1m incremental
-        # -------------------------------
-        last = last_ts(co, "ohlcv_1m", inst)
-        rows = fetch_tf(inst, "1m")
-        new_1m = [r for r in rows if r[0] > last]
-
-        if new_1m:
-            co.executemany(
-                "INSERT INTO ohlcv_1m VALUES (?,?,?,?,?,?,?)",
-                [(inst,) + r for r in new_1m]
-            )
-
-        log.info(f"{inst} new1m={len(new_1m)}")
-
-        # purge 1m
-        purge_ob(co, "1m", inst)
-
-        # -------------------------------
-        # 5m incremental
-        # -------------------------------
-        last = last_ts(co, "ohlcv_5m", inst)
-        rows = fetch_tf(inst, "5m")
-        new_5m = [r for r in rows if r[0] > last]
-
-        if new_5m:
-            co.executemany(
-                "INSERT INTO ohlcv_5m VALUES (?,?,?,?,?,?,?)",
-                [(inst,) + r for r in new_5m]
-            )
-
-        log.info(f"{inst} new5m={len(new_5m)}")
-
-        # purge 5m
-        purge_ob(co, "5m", inst)
+    ret = Retention(co, POLICIES["ob"], log)
+
+    fetched, last = fetch_all(co, coins, exchange)
+    new_1m = []
+
+    for tf in TFS:
+        table = f"ohlcv_{tf}"
+        rows = []
+        for inst in coins:
+            lt = last[tf].get(inst) or 0
+            # fenêtre REST entière (depuis le dernier ts stocké) : la bougie
+            # stockée encore en cours au run précédent est corrigée
+            got = [(inst, ts, o, h, l, c, v) for ts, o, h, l, c, v in fetched.get((inst, tf), [])]
+            log.info(f"{inst} new{tf}={sum(1 for r in got if r[1] > lt)} upsert={len(got)}")
+            rows += got
+        if tf == "1m":
+            new_1m = rows
+
+        # 1 transaction par TF : upsert + purge (retention.py, 1 DELETE / table)
+        try:
+            co.execute("BEGIN")
+            if rows:
+                upsert(co, tf, rows)
+                ret.added(table, rows)
+            ret.purge(table)
+            co.execute("COMMIT")
+        except Exception as e:
+            co.execute("ROLLBACK")
+            log.error(f"{table} write FAIL {e}")
 
     # -------------------------------
-    # 3m aggregation
+    # 3m aggregation (incrémentale)
     # -------------------------------
     try:
-        aggregate_3m(co)
-        log.info("3m aggregation OK")
+        co.execute("BEGIN")
+        n = aggregate_3m(co, new_1m)
+        co.execute("COMMIT")
+        log.info(f"3m aggregation OK buckets={n}")
     except Exception as e:
+        co.execute("ROLLBACK")
         log.error(f"3m aggregation FAIL {e}")
 
     log.info("OB DONE")
@@ -183,4 +132,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -5,12 +5,31 @@ import sqlite3, time, traceback
 
 DB_A = "/opt/scalp/project/data/analytics.db"
 DB_R = "/opt/scalp/project/data/recorder.db"
+DB_OF = "/opt/scalp/project/data/orderflow.db"
+OF_MAX_AGE_MS = 60_000
 
 def conn(path):
     c = sqlite3.connect(path, timeout=5, isolation_level=None)
     c.execute("PRAGMA journal_mode=WAL;")
     return c
 
+def load_of_buckets(ts_now):
+    # bucket orderflow courant par instId (v_orderflow_bucket, lecture seule),
+    # features de moins de OF_MAX_AGE_MS seulement
+    try:
+        c = sqlite3.connect(f"file:{DB_OF}?mode=ro", uri=True, timeout=5)
+        try:
+            return dict(c.execute("""
+                SELECT b.instId, b.of_bucket
+                FROM v_orderflow_bucket b
+                JOIN ob_features f ON f.instId = b.instId
+                WHERE f.ts_ms > ?
+            """, (ts_now - OF_MAX_AGE_MS,)).fetchall())
+        finally:
+            c.close()
+    except sqlite3.OperationalError:
+        return {}
+
 # -------------------------------------------------------------------
 # FETCH RECORDED TRADES (base historique)
 # -------------------------------------------------------------------
@@ -102,6 +121,7 @@ def compute_scores(trades):
 
     rows = []
     ts_now = int(time.time() * 1000)
+    of_buckets = load_of_buckets(ts_now)
 
     for key, stats in agg.items():
         inst, side, reason, ctx, cB, sB, atrB, hB, wdB = key
@@ -124,7 +144,7 @@ def compute_scores(trades):
         rows.append((
             inst, side, reason,
             ctx, cB, sB,
-            atrB, None, hB, wdB,
+            atrB, of_buckets.get(inst), hB, wdB,
             win_rate, pnl_avg,
             score_H, score_H_final,
             ts_now
@@ -6,6 +6,8 @@ from statistics import mean
 
 DB_REC = "/opt/scalp/project/data/recorder.db"
 DB_A   = "/opt/scalp/project/data/analytics.db"
+DB_OF  = "/opt/scalp/project/data/orderflow.db"
+OF_MAX_AGE_MS = 60_000
 
 def conn(path):
     c = sqlite3.connect(path, timeout=3, isolation_level=None)
@@ -48,6 +50,29 @@ def bucket_of(of_strength):
     if of_strength < 0.66:  return "mid"
     return "strong"
 
+def load_of_buckets(now):
+    """of_bucket courant par instId (orderflow.db v_orderflow_bucket, lecture seule).
+
+    Seules les features matérialisées depuis moins de OF_MAX_AGE_MS comptent ;
+    orderflow.db absent ou pas encore peuplé -> {} (bucket "unknown").
+    """
+    try:
+        c = sqlite3.connect(f"file:{DB_OF}?mode=ro", uri=True, timeout=3)
+    except sqlite3.OperationalError:
+        return {}
+    try:
+        rows = c.execute("""
+            SELECT b.instId, b.of_bucket
+            FROM v_orderflow_bucket b
+            JOIN ob_features f ON f.instId = b.instId
+            WHERE f.ts_ms > ?
+        """, (now - OF_MAX_AGE_MS,)).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        c.close()
+    return dict(rows)
+
 # --------------------------------------------------------------------
 # MAIN : CALCUL H
 # --------------------------------------------------------------------
@@ -86,6 +111,7 @@ def compute_historical():
     cA.execute("DELETE FROM historical_scores;")
 
     now = int(time.time()*1000)
+    of_buckets = load_of_buckets(now)
 
     for (instId, side, reason), g in groups.items():
 
@@ -108,7 +134,7 @@ def compute_historical():
         atr_ref = g["atr"][-1]
         atr_b = bucket_atr(atr_ref)
 
-        of_b = "unknown"
+        of_b = of_buckets.get(instId, "unknown")
 
         cA.execute("""
             INSERT INTO historical_scores(
@@ -12,9 +12,22 @@ RÔLE STRICT :
 - AUCUNE vue inter-DB
 - SQLITE SAFE
 
+INCRÉMENTAL :
+- totaux courants (pnl recorder, fees exec) persistés dans budget_totals
+  avec leurs watermarks, dans la même transaction que budget_state
+- recorder : insert-only -> watermark rowid
+- exec : les lignes deviennent 'done' (ts_exec = instant du fill, writer
+  unique) -> watermark ts_exec, relu avec OVERLAP_MS de recouvrement ;
+  exec_id déjà comptés dans la fenêtre gardés dans budget_folded
+- budget_exposure : uids OUVERTS seulement (qty_open > QTY_EPS), mis à jour
+  pour les uids touchés par les nouveaux fills
+- reconcile() : recalcul complet (démarrage, toutes les RECONCILE_S,
+  recorder raccourci, --reconcile pour audit) ; loggue l'écart
+
 BOUCLE ~1 Hz
 """
 
+import argparse
 import sqlite3
 import time
 import logging
@@ -34,6 +47,10 @@ DB_BUDGET  = ROOT / "data/budget.db"
 LOG = ROOT / "logs/budget.log"
 LOOP_SLEEP = 1.0
 
+OVERLAP_MS  = 5_000       # recouvrement de la relecture exec (même ms / horloge)
+RECONCILE_S = 3600        # recalcul complet de contrôle
+QTY_EPS     = 1e-9
+
 # ============================================================
 # LOG
 # ============================================================
@@ -83,6 +100,20 @@ def init_budget_db():
         notional_engaged REAL NOT NULL,
         ts_update INTEGER NOT NULL
     );
+
+    CREATE TABLE IF NOT EXISTS budget_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        pnl_realized REAL NOT NULL,
+        fee_total REAL NOT NULL,
+        rec_rowid INTEGER NOT NULL,
+        exec_ts INTEGER NOT NULL,
+        ts_reconcile INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS budget_folded (
+        exec_id TEXT PRIMARY KEY,
+        ts_exec INTEGER NOT NULL
+    );
     """)
     b.commit()
     b.close()
@@ -91,7 +122,126 @@ def init_budget_db():
 # CORE
 # ============================================================
 
-def recompute_budget():
+def open_positions(e, uids=None):
+    """{uid: notional d'entrée} des uids encore ouverts (ledger done)."""
+    sql = """
+        SELECT uid,
+               SUM(CASE WHEN exec_type IN ('open','pyramide') THEN qty
+                        WHEN exec_type IN ('partial','close') THEN -qty ELSE 0 END) AS qty_open,
+               SUM(CASE WHEN exec_type IN ('open','pyramide') THEN ABS(qty * price_exec)
+                        ELSE 0 END) AS notional
+        FROM exec
+        WHERE status='done'
+    """
+    if uids is None:
+        rows = e.execute(sql + " GROUP BY uid").fetchall()
+    else:
+        # +status : index uid plutôt que status
+        by_uid = sql.replace("status='done'", "+status='done'") + " AND uid=? GROUP BY uid"
+        rows = [e.execute(by_uid, (u,)).fetchone() for u in uids]
+    return {r["uid"]: float(r["notional"] or 0.0)
+            for r in rows if r is not None and (r["qty_open"] or 0.0) > QTY_EPS}
+
+
+def reconcile(e, r, b, ts):
+    """Recalcul complet -> totaux + watermarks + exposition ; renvoie l'écart vs courant."""
+    pnl = float(r.execute("SELECT COALESCE(SUM(pnl_realized), 0.0) FROM recorder").fetchone()[0])
+    rec_rowid = r.execute("SELECT COALESCE(MAX(rowid), 0) FROM recorder").fetchone()[0]
+    fee = float(e.execute("SELECT COALESCE(SUM(fee), 0.0) FROM exec").fetchone()[0])
+    exec_ts = e.execute(
+        "SELECT COALESCE(MAX(ts_exec), 0) FROM exec WHERE status='done'"
+    ).fetchone()[0]
+    folded = e.execute(
+        "SELECT exec_id, ts_exec FROM exec WHERE status='done' AND ts_exec >= ?",
+        (exec_ts - OVERLAP_MS,),
+    ).fetchall()
+    exposures = open_positions(e)
+
+    old = b.execute("SELECT pnl_realized, fee_total FROM budget_totals WHERE id=1").fetchone()
+    old_margin = b.execute("SELECT COALESCE(SUM(notional_engaged), 0.0) FROM budget_exposure").fetchone()[0]
+    drift = {
+        "pnl": pnl - old["pnl_realized"] if old else None,
+        "fee": fee - old["fee_total"] if old else None,
+        "margin": sum(exposures.values()) - old_margin if old else None,
+    }
+
+    b.execute("""
+        INSERT INTO budget_totals(id, pnl_realized, fee_total, rec_rowid, exec_ts, ts_reconcile)
+        VALUES (1,?,?,?,?,?)
+        ON CONFLICT(id) DO UPDATE SET
+            pnl_realized=excluded.pnl_realized,
+            fee_total=excluded.fee_total,
+            rec_rowid=excluded.rec_rowid,
+            exec_ts=excluded.exec_ts,
+            ts_reconcile=excluded.ts_reconcile
+    """, (pnl, fee, rec_rowid, exec_ts, ts))
+    b.execute("DELETE FROM budget_folded")
+    b.executemany("INSERT INTO budget_folded(exec_id, ts_exec) VALUES (?,?)",
+                  [(x["exec_id"], x["ts_exec"]) for x in folded])
+    b.execute("DELETE FROM budget_exposure")
+    b.executemany("INSERT INTO budget_exposure(uid, notional_engaged, ts_update) VALUES (?,?,?)",
+                  [(u, n, ts) for u, n in exposures.items()])
+    log.info(
+        "[RECONCILE] pnl=%.4f fee=%.4f open=%d drift pnl=%s fee=%s margin=%s",
+        pnl, fee, len(exposures), drift["pnl"], drift["fee"], drift["margin"],
+    )
+    return drift
+
+
+def fold(e, r, b, ts):
+    """Nouvelles lignes recorder / exec depuis les watermarks -> totaux courants."""
+    t = b.execute("SELECT * FROM budget_totals WHERE id=1").fetchone()
+    pnl, fee = float(t["pnl_realized"]), float(t["fee_total"])
+
+    # recorder : insert-only
+    rec_rowid = t["rec_rowid"]
+    for row in r.execute(
+        "SELECT rowid, pnl_realized FROM recorder WHERE rowid > ? ORDER BY rowid", (rec_rowid,)
+    ):
+        pnl += float(row["pnl_realized"] or 0.0)
+        rec_rowid = row["rowid"]
+
+    # exec : fills done depuis exec_ts - OVERLAP_MS, hors exec_id déjà comptés
+    # (+status : index ts_exec posé par exec.py, pas l'index status)
+    exec_ts = t["exec_ts"]
+    lo = exec_ts - OVERLAP_MS
+    seen = {x[0] for x in b.execute("SELECT exec_id FROM budget_folded WHERE ts_exec >= ?", (lo,))}
+    touched = set()
+    new_folded = []
+    for row in e.execute("""
+        SELECT exec_id, uid, fee, ts_exec
+        FROM exec
+        WHERE ts_exec >= ? AND +status='done'
+        ORDER BY ts_exec
+    """, (lo,)):
+        if row["exec_id"] in seen:
+            continue
+        fee += float(row["fee"] or 0.0)
+        touched.add(row["uid"])
+        new_folded.append((row["exec_id"], row["ts_exec"]))
+        exec_ts = max(exec_ts, row["ts_exec"])
+
+    if touched:
+        exposures = open_positions(e, sorted(touched))
+        b.executemany("DELETE FROM budget_exposure WHERE uid=?",
+                      [(u,) for u in touched if u not in exposures])
+        b.executemany("""
+            INSERT INTO budget_exposure(uid, notional_engaged, ts_update) VALUES (?,?,?)
+            ON CONFLICT(uid) DO UPDATE SET
+                notional_engaged=excluded.notional_engaged,
+                ts_update=excluded.ts_update
+        """, [(u, n, ts) for u, n in exposures.items()])
+    b.executemany("INSERT OR IGNORE INTO budget_folded(exec_id, ts_exec) VALUES (?,?)", new_folded)
+    b.execute("DELETE FROM budget_folded WHERE ts_exec < ?", (exec_ts - OVERLAP_MS,))
+    b.execute("""
+        UPDATE budget_totals
+        SET pnl_realized=?, fee_total=?, rec_rowid=?, exec_ts=?
+        WHERE id=1
+    """, (pnl, fee, rec_rowid, exec_ts))
+    return len(new_folded), len(touched)
+
+
+def recompute_budget(force_reconcile=False):
     ts = now_ms()
 
     e = conn(DB_EXEC, ro=True)
@@ -108,42 +258,27 @@ def recompute_budget():
     balance_init = float(row["balance_usdt"])
 
     # --------------------------------------------------------
-    # PNL RÉALISÉ (RECORDER)
+    # TOTAUX COURANTS (reconcile si absents / périmés / recorder raccourci)
     # --------------------------------------------------------
-    row = r.execute("""
-        SELECT COALESCE(SUM(pnl_realized), 0.0) AS pnl
-        FROM recorder
-    """).fetchone()
-
-    pnl_realized = float(row["pnl"])
+    t = b.execute("SELECT rec_rowid, ts_reconcile FROM budget_totals WHERE id=1").fetchone()
+    rec_max = r.execute("SELECT COALESCE(MAX(rowid), 0) FROM recorder").fetchone()[0]
+    if (force_reconcile or t is None
+            or ts - t["ts_reconcile"] >= RECONCILE_S * 1000
+            or rec_max < t["rec_rowid"]):
+        reconcile(e, r, b, ts)
+    else:
+        fold(e, r, b, ts)
+
+    tot = b.execute("SELECT pnl_realized, fee_total FROM budget_totals WHERE id=1").fetchone()
+    pnl_realized = float(tot["pnl_realized"])
+    fee_total = float(tot["fee_total"])
 
     # --------------------------------------------------------
-    # FEES TOTALES (EXEC)
+    # MARGIN UTILISÉE (uids ouverts)
     # --------------------------------------------------------
-    row = e.execute("""
-        SELECT COALESCE(SUM(fee), 0.0) AS fee
-        FROM exec
-    """).fetchone()
-
-    fee_total = float(row["fee"])
-
-    # --------------------------------------------------------
-    # EXPOSITION PAR UID (EXEC)
-    # --------------------------------------------------------
-    exposures = {}
-    for row in e.execute("""
-        SELECT uid,
-               SUM(ABS(qty * price_exec)) AS notional
-        FROM exec
-        WHERE exec_type IN ('open','pyramide')
-        GROUP BY uid
-    """):
-        exposures[row["uid"]] = float(row["notional"] or 0.0)
-
-    # --------------------------------------------------------
-    # MARGIN UTILISÉE
-    # --------------------------------------------------------
-    margin_used = sum(exposures.values())
+    margin_used = float(b.execute(
+        "SELECT COALESCE(SUM(notional_engaged), 0.0) FROM budget_exposure"
+    ).fetchone()[0])
 
     # --------------------------------------------------------
     # EQUITY / FREE / RISK
@@ -152,16 +287,6 @@ def recompute_budget():
     free_balance = equity - margin_used
     risk_ratio = (margin_used / equity) if equity > 0 else 0.0
 
-    # --------------------------------------------------------
-    # WRITE budget_exposure
-    # --------------------------------------------------------
-    b.execute("DELETE FROM budget_exposure")
-    for uid, notion in exposures.items():
-        b.execute("""
-            INSERT INTO budget_exposure(uid, notional_engaged, ts_update)
-            VALUES (?,?,?)
-        """, (uid, notion, ts))
-
     # --------------------------------------------------------
     # WRITE budget_state (UPSERT)
     # --------------------------------------------------------
@@ -196,9 +321,17 @@ def recompute_budget():
 # ============================================================
 
 def main():
-    log.info("[START] budget aggregator")
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reconcile", action="store_true",
+                    help="recalcul complet unique (audit), écart loggué, puis sortie")
+    args = ap.parse_args()
+
     init_budget_db()
+    if args.reconcile:
+        recompute_budget(force_reconcile=True)
+        return
 
+    log.info("[START] budget aggregator")
     while True:
         try:
             recompute_budget()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CANDLE BUILDER — agrégation 1m -> 3m / 5m / 15m / 30m en un passage
+
+- fold() : O(nb TF) par bougie 1m, bougie courante par (instId, tf) en
+  mémoire, aucune relecture de table ni fonction fenêtre SQL
+- drain() : bougies modifiées depuis le dernier drain
+- upsert() / fold_1m() : bougies REST, schéma ob.db (o,h,l,c,v) ou
+  oa.db (open,high,low,close,volume), volume sommé
+- pas de bougies construites depuis le flux ticker : il ne donne pas le
+  volume échangé, et B_feat / A_feat en dérivent leurs features
+"""
+
+from __future__ import annotations
+
+TF_MS = {
+    "1m": 60_000,
+    "3m": 180_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "30m": 1_800_000,
+}
+TFS = tuple(TF_MS)
+
+# colonnes OHLCV par convention de DB
+COLS_OB = ("o", "h", "l", "c", "v")
+COLS_OA = ("open", "high", "low", "close", "volume")
+
+
+class CandleBuilder:
+    def __init__(self, tfs=TFS):
+        self.tfs = tuple((tf, TF_MS[tf]) for tf in tfs)
+        self.bars = {}          # (instId, tf) -> [ts, o, h, l, c, v]
+        self.dirty = {tf: {} for tf in tfs}
+
+    def fold(self, inst, ts_ms, o, h, l, c, v):
+        for tf, ms in self.tfs:
+            start = ts_ms - ts_ms % ms
+            key = (inst, tf)
+            b = self.bars.get(key)
+            if b is None or start > b[0]:
+                b = self.bars[key] = [start, o, h, l, c, v]
+            elif start < b[0]:
+                continue            # bougie en retard sur une bougie close : ignorée
+            else:
+                if h > b[2]:
+                    b[2] = h
+                if l < b[3]:
+                    b[3] = l
+                b[4] = c
+                b[5] += v
+            self.dirty[tf][(inst, start)] = b
+
+    def drain(self):
+        """{tf: [(instId, ts, o, h, l, c, v)]} des bougies modifiées depuis le dernier drain."""
+        out = {}
+        for tf, d in self.dirty.items():
+            if d:
+                out[tf] = [(inst, *b) for (inst, _), b in d.items()]
+                d.clear()
+        return out
+
+
+def upsert(c, tf, rows, cols=COLS_OB):
+    o, h, l, cl, v = cols
+    c.executemany(f"""
+        INSERT INTO ohlcv_{tf} (instId, ts, {o}, {h}, {l}, {cl}, {v})
+        VALUES (?,?,?,?,?,?,?)
+        ON CONFLICT(instId, ts) DO UPDATE SET
+            {o}=excluded.{o}, {h}=excluded.{h}, {l}=excluded.{l},
+            {cl}=excluded.{cl}, {v}=excluded.{v}
+    """, rows)
+
+
+def fold_1m(rows, tfs):
+    """Bougies 1m [(instId, ts, o, h, l, c, v)] triées -> {tf: lignes} agrégées."""
+    cb = CandleBuilder(tfs)
+    for inst, ts, o, h, l, c, v in rows:
+        cb.fold(inst, ts, o, h, l, c, v or 0.0)
+    return cb.drain()
@@ -16,6 +16,9 @@ import logging
 import yaml
 from pathlib import Path
 
+from db_notify import Listener, ring_if_changed
+from db_utils import SCHEMA, ConnPool
+
 ROOT = Path("/opt/scalp/project")
 
 DB_GEST   = ROOT / "data/gest.db"
@@ -59,12 +62,14 @@ def _load_sizing_cfg():
     }
 
 
+# Handles longue durée : closer.db en écriture, gest/exec en lecture seule.
+POOL = ConnPool()
+
+
 def conn(db):
-    c = sqlite3.connect(str(db), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL;")
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    if db == DB_CLOSER:
+        return POOL.rw(db)
+    return POOL.ro(db)
 
 
 def now_ms():
@@ -72,7 +77,8 @@ def now_ms():
 
 
 def _table_columns(c, table_name):
-    return {r["name"] for r in c.execute(f"PRAGMA table_info({table_name})")}
+    # Cache par handle, invalidé sur PRAGMA schema_version (db_utils.SCHEMA).
+    return SCHEMA.columns(c, table_name)
 
 
 def _insert_closer_row(c, row_values):
@@ -143,10 +149,12 @@ def ingest_from_gest():
             WHERE status IN ('close_req','partial_req')
         """).fetchall()
 
-        exec_pos = {
-            r["uid"]: float(r["qty_open"] or 0.0)
-            for r in e.execute("SELECT uid, qty_open FROM v_exec_position")
-        }
+        # lookup par uid (exec_position, PK) : seulement les uids demandés
+        exec_pos = {}
+        for uid in {r["uid"] for r in rows}:
+            x = e.execute("SELECT qty_open FROM v_exec_position WHERE uid=?", (uid,)).fetchone()
+            if x:
+                exec_pos[uid] = float(x["qty_open"] or 0.0)
 
         closer_cols = _table_columns(c, "closer")
         ts_col = "ts_exec" if "ts_exec" in closer_cols else "ts_create"
@@ -261,6 +269,7 @@ def ingest_from_gest():
         except Exception:
             pass
     finally:
+        ring_if_changed(c, DB_CLOSER)
         g.close()
         c.close()
         e.close()
@@ -398,6 +407,7 @@ def ack_exec_done():
         except Exception:
             pass
     finally:
+        ring_if_changed(c, DB_CLOSER)
         e.close()
         c.close()
 
@@ -405,13 +415,21 @@ def ack_exec_done():
 # ==========================================================
 # MAIN LOOP
 # ==========================================================
+def cycle():
+    POOL.begin_loop(log)
+    ingest_from_gest()
+    ack_exec_done()
+
+
 def main():
     log.info("[START] closer")
 
+    # Réveil sur commit gest/exec (sinon timeout 0.2s, comme avant).
+    listener = Listener("closer", (DB_GEST, DB_EXEC))
+
     while True:
-        ingest_from_gest()
-        ack_exec_done()
-        time.sleep(0.2)
+        cycle()
+        listener.wait(0.2)
 
 
 if __name__ == "__main__":
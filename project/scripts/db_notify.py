@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SCALP — DB NOTIFY (sonnette locale post-commit)
+
+RÔLE :
+- le writer unique d'une DB "sonne" après commit : ring(db)
+- les lecteurs bloquent sur Listener.wait() au lieu de time.sleep()
+- AUCUNE donnée transportée : l'état reste lu par SELECT read-only
+- pas de bus, pas de ATTACH : 1 socket Unix datagram par lecteur,
+  rangée à côté de la DB (data/.notify/<db>/<role>-<pid>.sock)
+
+FALLBACK :
+- si aucun ring n'arrive, wait() rend la main au timeout (= ancien LOOP_SLEEP)
+- PRAGMA data_version est relu toutes les FALLBACK_POLL_S pour capter
+  les commits des writers qui ne sonnent pas (scripts legacy / manuels)
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import select
+import socket
+import sqlite3
+import time
+from pathlib import Path
+
+log = logging.getLogger("DB_NOTIFY")
+
+FALLBACK_POLL_S = 0.05
+
+
+def notify_dir(db) -> Path:
+    p = Path(db)
+    return p.parent / ".notify" / p.stem
+
+
+# ==========================================================
+# WRITER SIDE
+# ==========================================================
+def ring(db) -> int:
+    """Réveille tous les lecteurs abonnés à `db` (best effort, non bloquant)."""
+    try:
+        targets = list(notify_dir(db).glob("*.sock"))
+    except OSError:
+        return 0
+    if not targets:
+        return 0
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    s.setblocking(False)
+    sent = 0
+    try:
+        for path in targets:
+            try:
+                s.sendto(b"1", str(path))
+                sent += 1
+            except BlockingIOError:
+                # buffer plein = sonnette déjà en attente côté lecteur
+                sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # lecteur mort : socket orphelin
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            except OSError:
+                pass
+    finally:
+        s.close()
+    return sent
+
+
+def ring_if_changed(c: sqlite3.Connection, db) -> bool:
+    """Sonne seulement si la connexion a réellement modifié des lignes.
+
+    total_changes est cumulatif : pour les connexions longues (ConnPool) on
+    mémorise le dernier total vu sur la connexion elle-même.
+    """
+    total = c.total_changes
+    mark = getattr(c, "_notify_mark", 0)
+    try:
+        c._notify_mark = total
+    except AttributeError:
+        pass  # sqlite3.Connection brute : connexion courte, mark=0
+    if total > mark:
+        ring(db)
+        return True
+    return False
+
+
+# ==========================================================
+# READER SIDE
+# ==========================================================
+class Listener:
+    def __init__(self, role: str, dbs, fallback_poll: float = FALLBACK_POLL_S):
+        self.role = role
+        self.fallback_poll = fallback_poll
+        self.wakeups = 0
+        self.timeouts = 0
+
+        self._socks: dict[socket.socket, tuple[Path, Path]] = {}
+        self._versions: dict[Path, list] = {}
+
+        for db in dbs:
+            db = Path(db)
+            self._bind(db)
+            self._watch_version(db)
+
+        atexit.register(self.close)
+
+    def _bind(self, db: Path):
+        path = notify_dir(db) / f"{self.role}-{os.getpid()}.sock"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                path.unlink()
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            s.setblocking(False)
+            s.bind(str(path))
+        except OSError as exc:
+            log.warning("[NOTIFY] bind failed db=%s err=%s (fallback polling)", db, exc)
+            return
+        self._socks[s] = (db, path)
+
+    def _watch_version(self, db: Path):
+        if not db.exists():
+            return
+        try:
+            c = sqlite3.connect(f"file:{db}?mode=ro", uri=True, timeout=1, isolation_level=None)
+            v = c.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as exc:
+            log.warning("[NOTIFY] data_version unavailable db=%s err=%s", db, exc)
+            return
+        self._versions[db] = [c, v]
+
+    def _changed_versions(self) -> set[Path]:
+        changed = set()
+        for db, state in self._versions.items():
+            try:
+                v = state[0].execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                continue
+            if v != state[1]:
+                state[1] = v
+                changed.add(db)
+        return changed
+
+    def wait(self, timeout: float) -> set[Path]:
+        """Bloque jusqu'à un ring / commit amont, ou au plus `timeout` secondes.
+
+        Retourne l'ensemble des DB amont qui ont bougé (vide = timeout).
+        """
+        deadline = time.monotonic() + timeout
+        fired: set[Path] = set()
+
+        while not fired:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            slice_s = min(remaining, self.fallback_poll) if self._versions else remaining
+
+            if self._socks:
+                ready, _, _ = select.select(list(self._socks), [], [], slice_s)
+            else:
+                time.sleep(slice_s)
+                ready = []
+
+            for s in ready:
+                try:
+                    while s.recv(64):
+                        pass
+                except (BlockingIOError, OSError):
+                    pass
+                fired.add(self._socks[s][0])
+
+            # toujours resynchroniser data_version pour éviter un double réveil
+            fired |= self._changed_versions()
+
+        if fired:
+            self.wakeups += 1
+        else:
+            self.timeouts += 1
+        return fired
+
+    def close(self):
+        for s, (_, path) in list(self._socks.items()):
+            try:
+                s.close()
+            except OSError:
+                pass
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        self._socks.clear()
+
+        for state in self._versions.values():
+            try:
+                state[0].close()
+            except sqlite3.Error:
+                pass
+        self._versions.clear()
@@ -7,6 +7,8 @@ from __future__ import annotations
 
 import logging
 import sqlite3
+import threading
+import time
 
 
 def table_columns(conn: sqlite3.Connection, table: str) -> set[str]:
@@ -20,6 +22,85 @@ def table_columns(conn: sqlite3.Connection, table: str) -> set[str]:
     return names
 
 
+# ==========================================================
+# SCHEMA REGISTRY (introspection cached per connection)
+# ==========================================================
+class SchemaRegistry:
+    """Cache `sqlite_master` / `PRAGMA table_info` results per connection.
+
+    The cache is dropped as soon as `PRAGMA schema_version` moves (ALTER,
+    view re-CREATE...), so a lookup costs one header read instead of a
+    catalog scan or a view compilation. It is stored on the connection
+    itself, which only works for long-lived `PooledConnection` handles;
+    plain sqlite3 connections fall back to uncached introspection.
+    """
+
+    def _state(self, conn: sqlite3.Connection) -> dict | None:
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        state = getattr(conn, "_schema_state", None)
+        if state is not None and state["version"] == version:
+            return state
+        state = {"version": version, "objects": None, "columns": {}, "queries": {}}
+        try:
+            conn._schema_state = state
+        except AttributeError:
+            return None
+        return state
+
+    def objects(self, conn: sqlite3.Connection) -> frozenset[str]:
+        """Names of tables and views."""
+        state = self._state(conn)
+        if state is not None and state["objects"] is not None:
+            return state["objects"]
+        names = frozenset(
+            r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table','view')"
+            ).fetchall()
+        )
+        if state is not None:
+            state["objects"] = names
+        return names
+
+    def columns(self, conn: sqlite3.Connection, table: str) -> frozenset[str]:
+        state = self._state(conn)
+        if state is not None and table in state["columns"]:
+            return state["columns"][table]
+        names = frozenset(table_columns(conn, table))
+        if state is not None:
+            state["columns"][table] = names
+        return names
+
+    def query(self, conn: sqlite3.Connection, key: str, build) -> str | None:
+        """SQL string built by `build(conn)` once per schema version."""
+        state = self._state(conn)
+        if state is not None and key in state["queries"]:
+            return state["queries"][key]
+        sql = build(conn)
+        if state is not None:
+            state["queries"][key] = sql
+        return sql
+
+
+SCHEMA = SchemaRegistry()
+
+
+def ensure_columns(
+    conn: sqlite3.Connection,
+    table: str,
+    required: dict[str, str],
+    logger: logging.Logger | None = None,
+) -> int:
+    """Ensure several columns exist with one cached lookup; returns #added."""
+    existing = SCHEMA.columns(conn, table)
+    added = 0
+    for column_name, column_type in required.items():
+        if column_name in existing:
+            continue
+        if ensure_column(conn, table, column_name, column_type, logger):
+            added += 1
+    return added
+
+
 def ensure_column(
     conn: sqlite3.Connection,
     table: str,
@@ -29,7 +110,7 @@ def ensure_column(
 ) -> bool:
     """Ensure a column exists; add it safely if missing."""
     try:
-        existing = table_columns(conn, table)
+        existing = SCHEMA.columns(conn, table)
         if column_name in existing:
             return False
         conn.execute(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type}")
@@ -40,3 +121,175 @@ def ensure_column(
         if logger:
             logger.warning("[SCHEMA] failed to add %s.%s: %s", table, column_name, exc)
         return False
+
+
+# ==========================================================
+# CONNECTION POOL (long-lived handles per process)
+# ==========================================================
+STATS_EVERY_S = 60.0
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection handed out by ConnPool.
+
+    `close()` only releases the handle (rolling back any uncommitted work) so
+    the historical `try/finally: c.close()` call sites keep their semantics.
+    """
+
+    _pool: "ConnPool | None" = None
+
+    def execute(self, sql, parameters=(), /):
+        if self._pool is not None:
+            self._pool.queries += 1
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        if self._pool is not None:
+            self._pool.queries += 1
+        return super().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+class ConnPool:
+    """Keep one read-only and one writer handle per DB (and per thread).
+
+    - read-only handles are opened with `mode=ro`
+    - PRAGMAs are issued once per physical open, not per loop
+    - compiled statements stay in the sqlite3 per-connection cache
+    - `begin_loop()` reopens handles whose `PRAGMA schema_version` moved and
+      keeps opens/queries counters
+    """
+
+    def __init__(self, busy_timeout_ms: int = 10000, cached_statements: int = 256):
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._handles: dict[tuple, PooledConnection] = {}
+        self._schema: dict[tuple, int] = {}
+        self._on_open: dict[tuple, object] = {}
+
+        self.opens = 0
+        self.queries = 0
+        self.reconnects = 0
+        self.loops = 0
+        self._mark = (0, 0, 0)
+        self._last_stats = time.monotonic()
+
+    def connect(
+        self,
+        path,
+        ro: bool = False,
+        isolation_level: str | None = "",
+        synchronous: str | None = None,
+        on_open=None,
+    ) -> PooledConnection:
+        key = (str(path), ro, isolation_level, synchronous, threading.get_ident())
+        c = self._handles.get(key)
+        if c is not None:
+            return c
+
+        if ro:
+            c = sqlite3.connect(
+                f"file:{path}?mode=ro",
+                uri=True,
+                timeout=self.busy_timeout_ms / 1000.0,
+                isolation_level=isolation_level,
+                factory=PooledConnection,
+                cached_statements=self.cached_statements,
+            )
+        else:
+            c = sqlite3.connect(
+                str(path),
+                timeout=self.busy_timeout_ms / 1000.0,
+                isolation_level=isolation_level,
+                factory=PooledConnection,
+                cached_statements=self.cached_statements,
+            )
+            c.execute("PRAGMA journal_mode=WAL;")
+            if synchronous:
+                c.execute(f"PRAGMA synchronous={synchronous};")
+        c.row_factory = sqlite3.Row
+        c.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)};")
+        c._pool = self
+        self.opens += 1
+
+        if on_open is not None:
+            on_open(c)
+            if c.in_transaction:
+                c.commit()
+            self._on_open[key] = on_open
+
+        self._schema[key] = c.execute("PRAGMA schema_version").fetchone()[0]
+        self._handles[key] = c
+        return c
+
+    def ro(self, path, **kw) -> PooledConnection:
+        return self.connect(path, ro=True, **kw)
+
+    def rw(self, path, **kw) -> PooledConnection:
+        return self.connect(path, ro=False, **kw)
+
+    def _drop(self, key):
+        c = self._handles.pop(key, None)
+        self._schema.pop(key, None)
+        if c is None:
+            return
+        try:
+            c.really_close()
+        except sqlite3.Error:
+            pass
+
+    def begin_loop(self, logger: logging.Logger | None = None) -> dict:
+        """Per-loop hook: schema change detection + counters.
+
+        Returns the opens/queries/reconnects done since the previous call.
+        """
+        me = threading.get_ident()
+        for key, c in list(self._handles.items()):
+            if key[-1] != me:
+                continue
+            try:
+                version = c.execute("PRAGMA schema_version").fetchone()[0]
+            except sqlite3.Error:
+                version = None
+            if version == self._schema.get(key):
+                continue
+            # schema changed (ALTER / view re-CREATE) or handle broken: reopen
+            on_open = self._on_open.get(key)
+            self._drop(key)
+            self.reconnects += 1
+            path, ro, isolation_level, synchronous, _ = key
+            try:
+                self.connect(path, ro=ro, isolation_level=isolation_level,
+                             synchronous=synchronous, on_open=on_open)
+            except sqlite3.Error as exc:
+                if logger:
+                    logger.warning("[POOL] reconnect failed %s: %s", path, exc)
+
+        self.loops += 1
+        prev_opens, prev_queries, prev_reconnects = self._mark
+        delta = {
+            "opens": self.opens - prev_opens,
+            "queries": self.queries - prev_queries,
+            "reconnects": self.reconnects - prev_reconnects,
+        }
+        self._mark = (self.opens, self.queries, self.reconnects)
+
+        now = time.monotonic()
+        if logger and now - self._last_stats >= STATS_EVERY_S:
+            logger.info(
+                "[POOL] loops=%d handles=%d opens=%d queries=%d reconnects=%d queries/loop=%.1f",
+                self.loops, len(self._handles), self.opens, self.queries,
+                self.reconnects, self.queries / max(self.loops, 1),
+            )
+            self._last_stats = now
+        return delta
+
+    def close_all(self):
+        for key in list(self._handles):
+            self._drop(key)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+DEC — SCORE S MATÉRIALISÉ (dec_score)
+
+- Même calcul que l'ancienne vue v_dec_score_s (sur v_dec_flags) et que
+  l'admission de v_dec_fire, fait une fois par cycle dec_writer, vectorisé
+  numpy sur tout l'univers (NULL SQL <-> NaN)
+- dec_score : 1 ligne par snap_ctx (instId PK, index uid), mise à jour par
+  diff (lignes modifiées seulement) dans la même transaction que snap_ctx
+- v_dec_score_s / v_dec_fire deviennent des SELECT minces sur dec_score
+  (v_dec_fire garde le JOIN ticks_live pour lastPr)
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+COLS = (
+    "uid", "instId", "side", "ctx", "score_C", "ctx_ok",
+    "lastPr", "tick_ts",
+    "high_20", "low_20", "atr", "bb_width", "compression_ok",
+    "atr_fast", "atr_slow", "vol_regime",
+    "cont_ok", "trend_ok", "drift_ok",
+    "s_struct", "s_timing", "s_quality", "s_vol", "s_confirm", "score_S",
+    "dec_mode", "fire", "ts_updated",
+)
+
+DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS dec_score (
+        uid TEXT,
+        instId TEXT PRIMARY KEY,
+        side TEXT,
+        ctx TEXT,
+        score_C REAL,
+        ctx_ok INTEGER,
+        lastPr REAL,
+        tick_ts INTEGER,
+        high_20 REAL,
+        low_20 REAL,
+        atr REAL,
+        bb_width REAL,
+        compression_ok INTEGER,
+        atr_fast REAL,
+        atr_slow REAL,
+        vol_regime TEXT,
+        cont_ok INTEGER,
+        trend_ok INTEGER,
+        drift_ok INTEGER,
+        s_struct REAL,
+        s_timing REAL,
+        s_quality REAL,
+        s_vol REAL,
+        s_confirm REAL,
+        score_S REAL,
+        dec_mode TEXT,
+        fire INTEGER,
+        ts_updated INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_dec_score_uid ON dec_score(uid)",
+)
+
+VIEWS = {
+    "v_dec_score_s": """
+        CREATE VIEW v_dec_score_s AS
+        SELECT *
+        FROM dec_score
+        WHERE ctx_ok = 1
+          AND side IS NOT NULL
+          AND lastPr IS NOT NULL
+    """,
+    "v_dec_fire": """
+        CREATE VIEW v_dec_fire AS
+        SELECT
+            s.uid, s.instId, s.side, t.lastPr, s.atr_fast AS atr,
+            s.dec_mode, s.score_C, s.ctx, s.fire
+        FROM dec_score s
+        JOIN ticks_live t
+          ON t.instId = s.instId
+        WHERE s.ctx_ok = 1
+          AND s.fire = 1
+    """,
+}
+
+UPSERT = (
+    "REPLACE INTO dec_score (" + ", ".join(COLS) + ") VALUES ("
+    + ",".join("?" for _ in COLS) + ")"
+)
+
+
+def _norm(sql):
+    return " ".join((sql or "").split())
+
+
+def ensure_schema(c, log=None):
+    """Crée dec_score ; remplace les vues seulement si leur SQL diffère."""
+    for ddl in DDL:
+        c.execute(ddl)
+    current = dict(c.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='view' AND name IN (?, ?)",
+        tuple(VIEWS),
+    ).fetchall())
+    for name, sql in VIEWS.items():
+        if _norm(current.get(name)) == _norm(sql):
+            continue
+        c.execute(f"DROP VIEW IF EXISTS {name}")
+        c.execute(sql)
+        if log:
+            log.info("[SCHEMA] %s -> dec_score", name)
+
+
+def _f(xs):
+    return np.array([np.nan if x is None else x for x in xs], dtype=float)
+
+
+def _clip01(x):
+    # MIN(1, MAX(0, x)) : NaN reste NaN (NULL)
+    return np.minimum(1.0, np.maximum(0.0, x))
+
+
+def dec_mode(ctx, vol_regime):
+    if ctx == "bullish" and vol_regime == "EXPAND":
+        return "MOMENTUM"
+    if ctx == "bullish" and vol_regime == "NORMAL":
+        return "CONT"
+    if ctx == "bearish" and vol_regime == "NORMAL":
+        return "DRIFT"
+    if ctx == "bearish" and vol_regime == "COMPRESS":
+        return "PREBREAK"
+    return "IGNORE"
+
+
+def admit(mode, score_C):
+    sc = abs(score_C) if score_C is not None else None
+    if mode == "PREBREAK":
+        return 1
+    if sc is None:
+        return 0
+    if mode == "MOMENTUM":
+        return int(sc >= 0.45)
+    if mode in ("DRIFT", "CONT"):
+        return int(sc >= 0.30)
+    return 0
+
+
+def compute(snaps, ranges, ticks):
+    """
+    snaps  : [(uid, instId, ctx, score_C, side, atr_fast, atr_slow, vol_regime, ctx_ok, ts)]
+    ranges : {instId: (high_20, low_20, atr, bb_width, compression_ok)}
+    ticks  : {instId: (lastPr, ts)}
+    -> lignes dec_score dans l'ordre de COLS
+    """
+    if not snaps:
+        return []
+
+    inst = [s[1] for s in snaps]
+    side = np.array([s[4] or "" for s in snaps])
+    buy, sell = side == "buy", side == "sell"
+    ctx_ok = np.array([s[8] == 1 for s in snaps])
+    score_c = _f(s[3] for s in snaps)
+
+    rg = [ranges.get(i) or (None,) * 5 for i in inst]
+    tk = [ticks.get(i) or (None, None) for i in inst]
+    hi, lo, atr = _f(r[0] for r in rg), _f(r[1] for r in rg), _f(r[2] for r in rg)
+    comp = np.array([r[4] == 1 for r in rg])
+    px = _f(t[0] for t in tk)
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        has_rng = ~(np.isnan(atr) | np.isnan(hi) | np.isnan(lo))
+        cont = has_rng & ((buy & (px > hi + atr * 0.60)) | (sell & (px < lo - atr * 0.60)))
+        trend = has_rng & ((sell & (px <= lo + atr * 0.20)) | (buy & (px >= hi - atr * 0.20)))
+        drift = ctx_ok & ((sell & (score_c <= -0.30)) | (buy & (score_c >= 0.30)))
+
+        s_struct = np.where(cont, 1.0, np.where(drift, 0.70, 0.0))
+
+        ref = np.where(buy, hi, np.where(sell, lo, px))
+        dist = np.abs(px - ref)
+        atr3 = np.where(atr * 3.0 == 0, np.nan, atr * 3.0)          # NULLIF
+        t_atr = np.exp(-1.0 * (dist / atr3))
+        t_atr = np.where(np.isnan(t_atr), 0.30, t_atr)
+
+        bad = np.isnan(hi) | np.isnan(lo) | ~(hi > lo)
+        width = hi - lo
+        t_rng = _clip01(1.0 - dist / width)
+        t_rng = np.where(bad | np.isnan(t_rng), 0.30, t_rng)
+
+        s_timing = _clip01(0.5 * t_atr + 0.5 * t_rng)
+
+        pos = np.where(buy, _clip01((hi - px) / width),
+              np.where(sell, _clip01((px - lo) / width), 0.30))
+        pos = np.where(bad, 0.30, pos)
+        s_quality = np.maximum(0.25, np.minimum(1.0, np.power(pos, 0.65) * s_timing))
+
+        s_vol = np.where(comp, 1.00, 0.70)
+        s_confirm = np.where(cont, 0.20, 0.0) + np.where(drift, 0.10, 0.0)
+
+        score_s = _clip01(0.40 * s_struct + 0.30 * s_quality + 0.20 * s_vol + 0.10 * s_confirm)
+
+    def opt(a):
+        return [None if np.isnan(x) else x for x in a.tolist()]
+
+    cols = (opt(s_timing), opt(s_quality), opt(score_s))
+    out = []
+    for k, s in enumerate(snaps):
+        uid, instId, ctx, sc, sd, atr_fast, atr_slow, vol, ok, ts = s
+        mode = dec_mode(ctx, vol)
+        out.append((
+            uid, instId, sd, ctx, sc, ok,
+            tk[k][0], tk[k][1],
+            *rg[k],
+            atr_fast, atr_slow, vol,
+            int(cont[k]), int(trend[k]), int(drift[k]),
+            float(s_struct[k]), cols[0][k], cols[1][k],
+            float(s_vol[k]), float(s_confirm[k]), cols[2][k],
+            mode, admit(mode, sc), ts,
+        ))
+    return out
+
+
+def load_inputs(c, tick_key):
+    """(ranges, ticks) depuis dec.db ; tick_key = colonne instId de snap_ticks."""
+    ranges = {
+        r[0]: tuple(r[1:])
+        for r in c.execute(
+            "SELECT instId, high_20, low_20, atr, bb_width, compression_ok FROM snap_range"
+        )
+    }
+    ticks = {
+        r[0]: (r[1], r[2])
+        for r in c.execute(
+            f"SELECT {tick_key}, lastPr, MAX(ts) FROM snap_ticks GROUP BY {tick_key}"
+        )
+    }
+    return ranges, ticks
+
+
+def write(c, rows, prev):
+    """
+    prev = {instId: ligne} du cycle précédent (relu de dec_score au démarrage).
+    REPLACE des lignes changées, DELETE des instId disparus -> (nouvel état, touchées).
+    """
+    cur = {r[1]: r for r in rows}
+    changed = [r for i, r in cur.items() if prev.get(i) != r]
+    gone = [(i,) for i in prev if i not in cur]
+    if gone:
+        c.executemany("DELETE FROM dec_score WHERE instId=?", gone)
+    if changed:
+        c.executemany(UPSERT, changed)
+    return cur, len(changed) + len(gone)
+
+
+def load_state(c):
+    return {
+        r[1]: tuple(r)
+        for r in c.execute("SELECT " + ", ".join(COLS) + " FROM dec_score")
+    }
@@ -6,6 +6,12 @@ SCALP — DEC WRITER (SPLIT / SAFE / DEBUG)
 
 - log AVANT tout
 - imports protégés
+- score S + admission calculés 1 fois par cycle -> dec_score (dec_score.py),
+  v_dec_score_s / v_dec_fire = SELECT minces, créées au démarrage
+- snap_ctx mis à jour par diff (upsert des lignes changées, delete des
+  disparues) : l'uid est conservé tant que (instId, side, ctx) ne change pas
+- dec_meta.generation incrémenté à chaque changement de snap_ctx : les
+  lecteurs de v_dec_fire sautent les cycles sans changement
 """
 
 import logging
@@ -32,6 +38,8 @@ try:
     from dec_ctx import load_ctx
     from dec_atr import load_atr_map, select_atr
     from dec_market import load_market_ok, market_pass
+    from db_utils import table_columns
+    import dec_score
 except Exception as e:
     log.exception("[BOOT_IMPORT_ERR]")
     raise
@@ -69,60 +77,74 @@ def ensure_uid_column(c):
         c.execute("ALTER TABLE snap_ctx ADD COLUMN uid TEXT")
 
 
-def ensure_v_dec_fire_view(c):
-    c.execute("DROP VIEW IF EXISTS v_dec_fire")
+SNAP_COLS = (
+    "uid", "instId", "ctx", "score_C", "side",
+    "atr_fast", "atr_slow", "vol_regime", "ctx_ok", "ts_updated",
+)
+
+
+def ensure_meta(c):
     c.execute("""
-        CREATE VIEW v_dec_fire AS
-        WITH base AS (
-            SELECT
-                s.uid,
-                s.instId,
-                s.side,
-                s.ctx,
-                s.score_C,
-                s.atr_fast,
-                s.atr_slow,
-                s.vol_regime,
-                t.lastPr,
-                s.ts_updated
-            FROM snap_ctx s
-            JOIN ticks_live t
-              ON t.instId = s.instId
-            WHERE s.ctx_ok = 1
-        ),
-        patterned AS (
-            SELECT *,
-                CASE
-                    WHEN ctx='bullish' AND vol_regime='EXPAND'  THEN 'MOMENTUM'
-                    WHEN ctx='bullish' AND vol_regime='NORMAL'  THEN 'CONT'
-                    WHEN ctx='bearish' AND vol_regime='NORMAL'  THEN 'DRIFT'
-                    WHEN ctx='bearish' AND vol_regime='COMPRESS' THEN 'PREBREAK'
-                    ELSE 'IGNORE'
-                END AS dec_mode
-            FROM base
-        ),
-        admission AS (
-            SELECT *,
-                CASE
-                    WHEN dec_mode='MOMENTUM' AND ABS(score_C)>=0.45 THEN 1
-                    WHEN dec_mode='PREBREAK' THEN 1
-                    WHEN dec_mode='DRIFT' AND ABS(score_C)>=0.30 THEN 1
-                    WHEN dec_mode='CONT'  AND ABS(score_C)>=0.30 THEN 1
-                    ELSE 0
-                END AS fire
-            FROM patterned
+        CREATE TABLE IF NOT EXISTS dec_meta (
+            k TEXT PRIMARY KEY,
+            v INTEGER NOT NULL
         )
-        SELECT
-            uid, instId, side, lastPr, atr_fast AS atr,
-            dec_mode, score_C, ctx, fire
-        FROM admission
-        WHERE fire=1
     """)
 
 
+def bump_generation(c):
+    c.execute("""
+        INSERT INTO dec_meta (k, v) VALUES ('generation', 1)
+        ON CONFLICT(k) DO UPDATE SET v = v + 1
+    """)
+
+
+def load_snap(c):
+    return {
+        r["instId"]: tuple(r)
+        for r in c.execute("SELECT " + ", ".join(SNAP_COLS) + " FROM snap_ctx")
+    }
+
+
+def diff_snap(prev, fresh, ts):
+    """
+    fresh = [(instId, ctx, score_C, side, atr_fast, atr_slow, vol_regime, ctx_ok)]
+    -> (état {instId: ligne snap_ctx}, upserts, deletes)
+    """
+    cur, upserts = {}, []
+    for body in fresh:
+        inst = body[0]
+        old = prev.get(inst)
+        if old is not None and old[1:9] == body:
+            cur[inst] = old
+            continue
+        if old is not None and old[4] == body[3] and old[2] == body[1]:
+            uid = old[0]                 # même setup : uid conservé
+        else:
+            uid = build_uid(inst, body[3])
+        row = (uid, *body, ts)
+        cur[inst] = row
+        upserts.append(row)
+    deletes = [(i,) for i in prev if i not in cur]
+    return cur, upserts, deletes
+
+
+def snap_ticks_key(c):
+    """snap_ticks est clé par instId_s (dec_ticks_writer) ou instId selon la DB."""
+    return "instId_s" if "instId_s" in table_columns(c, "snap_ticks") else "instId"
+
+
 def main():
     log.info("[START] dec_writer loop")
 
+    with conn() as c:
+        ensure_uid_column(c)
+        ensure_meta(c)
+        dec_score.ensure_schema(c, log)
+        tick_key = snap_ticks_key(c)
+        snap = load_snap(c)
+        scores = dec_score.load_state(c)
+
     while True:
         try:
             ts = now_ms()
@@ -131,39 +153,37 @@ def main():
             atr_map  = load_atr_map()
             market   = load_market_ok()
 
+            fresh = []
+            veto = 0
+
+            for r in ctx_rows:
+                m = market.get(r["instId"])
+                if not m or not market_pass(m, CFG["market_veto"]):
+                    veto += 1
+                    continue
+
+                atr_fast, atr_slow, vol = select_atr(
+                    r["ctx"],
+                    atr_map.get(r["instId"])
+                )
+
+                fresh.append((
+                    r["instId"],
+                    r["ctx"],
+                    r["score_C"],
+                    r["side"],
+                    atr_fast,
+                    atr_slow,
+                    vol,
+                    1,
+                ))
+
+            cur, upserts, deletes = diff_snap(snap, fresh, ts)
+
             with conn() as c:
-                ensure_uid_column(c)
-                ensure_v_dec_fire_view(c)
-                c.execute("DELETE FROM snap_ctx")
-
-                out = []
-                veto = 0
-
-                for r in ctx_rows:
-                    m = market.get(r["instId"])
-                    if not m or not market_pass(m, CFG["market_veto"]):
-                        veto += 1
-                        continue
-
-                    atr_fast, atr_slow, vol = select_atr(
-                        r["ctx"],
-                        atr_map.get(r["instId"])
-                    )
-
-                    out.append((
-                        build_uid(r["instId"], r["side"]),
-                        r["instId"],
-                        r["ctx"],
-                        r["score_C"],
-                        r["side"],
-                        atr_fast,
-                        atr_slow,
-                        vol,
-                        1,
-                        ts
-                    ))
-
-                if out:
+                if deletes:
+                    c.executemany("DELETE FROM snap_ctx WHERE instId=?", deletes)
+                if upserts:
                     c.executemany("""
                         INSERT INTO snap_ctx (
                             uid,
@@ -171,10 +191,34 @@ def main():
                             atr_fast, atr_slow, vol_regime,
                             ctx_ok, ts_updated
                         ) VALUES (?,?,?,?,?,?,?,?,?,?)
-                    """, out)
-
-            log.info("[UPDATE] ctx=%d snap=%d veto=%d",
-                     len(ctx_rows), len(out), veto)
+                        ON CONFLICT(instId) DO UPDATE SET
+                            uid=excluded.uid,
+                            ctx=excluded.ctx,
+                            score_C=excluded.score_C,
+                            side=excluded.side,
+                            atr_fast=excluded.atr_fast,
+                            atr_slow=excluded.atr_slow,
+                            vol_regime=excluded.vol_regime,
+                            ctx_ok=excluded.ctx_ok,
+                            ts_updated=excluded.ts_updated
+                    """, upserts)
+                if upserts or deletes:
+                    bump_generation(c)
+
+                # même transaction : dec_score reflète exactement snap_ctx
+                t0 = time.perf_counter()
+                ranges, ticks = dec_score.load_inputs(c, tick_key)
+                scored = dec_score.compute(list(cur.values()), ranges, ticks)
+                new_scores, touched = dec_score.write(c, scored, scores)
+                dt_score = (time.perf_counter() - t0) * 1000
+
+            # état mémoire avancé seulement après commit
+            snap, scores = cur, new_scores
+
+            log.info("[UPDATE] ctx=%d snap=%d veto=%d upsert=%d delete=%d "
+                     "score_touched=%d fire=%d score_ms=%.1f",
+                     len(ctx_rows), len(cur), veto, len(upserts), len(deletes),
+                     touched, sum(r[-2] for r in scored), dt_score)
 
         except Exception:
             log.exception("[RUNTIME_ERR]")
@@ -13,20 +13,24 @@ Rôle :
 """
 
 import time
-import sqlite3
 import logging
 from pathlib import Path
 
 from exec_from_opener import ingest_from_opener
 from exec_from_closer import ingest_from_closer
+from db_notify import Listener, ring_if_changed
+from db_utils import ConnPool
+import exec_position
 
 # ==================================================
 # CONFIG
 # ==================================================
 ROOT = Path("/opt/scalp/project")
 
-DB_EXEC = ROOT / "data/exec.db"
-DB_TICK = ROOT / "data/t.db"
+DB_EXEC   = ROOT / "data/exec.db"
+DB_TICK   = ROOT / "data/t.db"
+DB_OPENER = ROOT / "data/opener.db"
+DB_CLOSER = ROOT / "data/closer.db"
 
 LOG = ROOT / "logs/exec.log"
 
@@ -47,12 +51,19 @@ log = logging.getLogger("EXEC")
 # ==================================================
 # DB helpers
 # ==================================================
+# Handles longue durée : exec.db en écriture, t.db en lecture seule.
+POOL = ConnPool()
+
+
+def _ensure_position(c):
+    # exec_position + vues v_exec_position / v_exec_pnl_uid (1 fois par handle)
+    exec_position.ensure_schema(c, log)
+
+
 def conn(db):
-    c = sqlite3.connect(str(db), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL;")
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    if db == DB_EXEC:
+        return POOL.rw(db, on_open=_ensure_position)
+    return POOL.ro(db)
 
 
 def now_ms():
@@ -104,89 +115,102 @@ def apply_spread_and_fee(price, side, qty):
 # ==================================================
 # MAIN LOOP
 # ==================================================
-def main():
-    log.info("[START] exec")
+def cycle():
+    POOL.begin_loop(log)
 
-    while True:
+    # 1) ingest FSM
+    try:
+        ingest_from_opener()
+    except Exception:
+        log.exception("[ERR] ingest_from_opener")
 
-        # 1) ingest FSM
-        try:
-            ingest_from_opener()
-        except Exception:
-            log.exception("[ERR] ingest_from_opener")
+    try:
+        ingest_from_closer()
+    except Exception:
+        log.exception("[ERR] ingest_from_closer")
 
+    e = conn(DB_EXEC)
+
+    try:
+        rows = e.execute("""
+            SELECT *
+            FROM exec
+            WHERE status='open'
+        """).fetchall()
+
+        for r in rows:
+            uid       = r["uid"]
+            exec_id   = r["exec_id"]
+            instId    = r["instId"]
+            side      = r["side"]
+            exec_type = r["exec_type"]
+            qty       = float(r["qty"])
+
+            # -------------------------------
+            # PRICE DISCOVERY
+            # -------------------------------
+            last_price = get_last_price(instId)
+            if last_price is None:
+                log.warning(
+                    "[SKIP] no tick uid=%s inst=%s",
+                    uid, instId
+                )
+                continue
+
+            mkt_side = execution_side(side, exec_type)
+            price_exec, fee = apply_spread_and_fee(last_price, mkt_side, qty)
+
+            # -------------------------------
+            # EXEC DONE  (STEP +1 CANONIQUE)
+            # + exec_position dans la même transaction
+            # -------------------------------
+            ts_exec = now_ms()
+            cur = e.execute("""
+                UPDATE exec
+                SET status='done',
+                    price_exec=?,
+                    fee=?,
+                    step = step + 1,
+                    ts_exec=?,
+                    done_step=step + 1
+                WHERE exec_id=?
+            """, (
+                price_exec,
+                fee,
+                ts_exec,
+                exec_id
+            ))
+            if cur.rowcount:
+                exec_position.apply(e, uid, side, exec_type, qty, price_exec, fee,
+                                    int(r["step"]) + 1, ts_exec)
+
+            log.info(
+                "[EXEC_DONE] uid=%s inst=%s type=%s side=%s qty=%.6f px=%.8f fee=%.8f",
+                uid, instId, exec_type, side, qty, price_exec, fee
+            )
+
+        e.commit()
+
+    except Exception:
+        log.exception("[ERR] exec loop")
         try:
-            ingest_from_closer()
+            e.rollback()
         except Exception:
-            log.exception("[ERR] ingest_from_closer")
+            pass
+    finally:
+        ring_if_changed(e, DB_EXEC)
+        e.close()
 
-        e = conn(DB_EXEC)
 
-        try:
-            rows = e.execute("""
-                SELECT *
-                FROM exec
-                WHERE status='open'
-            """).fetchall()
-
-            for r in rows:
-                uid       = r["uid"]
-                exec_id   = r["exec_id"]
-                instId    = r["instId"]
-                side      = r["side"]
-                exec_type = r["exec_type"]
-                qty       = float(r["qty"])
-
-                # -------------------------------
-                # PRICE DISCOVERY
-                # -------------------------------
-                last_price = get_last_price(instId)
-                if last_price is None:
-                    log.warning(
-                        "[SKIP] no tick uid=%s inst=%s",
-                        uid, instId
-                    )
-                    continue
-
-                mkt_side = execution_side(side, exec_type)
-                price_exec, fee = apply_spread_and_fee(last_price, mkt_side, qty)
-
-                # -------------------------------
-                # EXEC DONE  (STEP +1 CANONIQUE)
-                # -------------------------------
-                e.execute("""
-                    UPDATE exec
-                    SET status='done',
-                        price_exec=?,
-                        fee=?,
-                        step = step + 1,
-                        ts_exec=?,
-                        done_step=step + 1
-                    WHERE exec_id=?
-                """, (
-                    price_exec,
-                    fee,
-                    now_ms(),
-                    exec_id
-                ))
-
-                log.info(
-                    "[EXEC_DONE] uid=%s inst=%s type=%s side=%s qty=%.6f px=%.8f fee=%.8f",
-                    uid, instId, exec_type, side, qty, price_exec, fee
-                )
+def main():
+    log.info("[START] exec")
 
-            e.commit()
+    # Réveil sur commit opener/closer (sinon timeout = LOOP_SLEEP).
+    listener = Listener("exec", (DB_OPENER, DB_CLOSER))
 
-        except Exception:
-            log.exception("[ERR] exec loop")
-            try:
-                e.rollback()
-            except Exception:
-                pass
-        finally:
-            e.close()
-
-        time.sleep(LOOP_SLEEP)
+    while True:
+        cycle()
+        listener.wait(LOOP_SLEEP)
 
 
 if __name__ == "__main__":
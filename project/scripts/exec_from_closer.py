@@ -11,6 +11,8 @@ import sqlite3
 import logging
 from pathlib import Path
 
+from db_notify import ring_if_changed
+
 log = logging.getLogger("EXEC_FROM_CLOSER")
 
 ROOT = Path("/opt/scalp/project")
@@ -101,6 +103,7 @@ def ingest_from_closer():
         e.rollback()
 
     finally:
+        ring_if_changed(e, DB_EXEC)
         c.close()
         e.close()
 
@@ -6,6 +6,8 @@ import time
 from pathlib import Path
 import logging
 
+from db_notify import ring_if_changed
+
 log = logging.getLogger("EXEC_FROM_OPENER")
 
 ROOT = Path("/opt/scalp/project")
@@ -117,5 +119,6 @@ def ingest_from_opener():
         except Exception:
             pass
     finally:
+        ring_if_changed(e, DB_EXEC)
         o.close()
         e.close()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+EXEC POSITION — position par uid tenue à jour fill par fill (exec.db)
+
+- exec_position : 1 ligne / uid, mise à jour par exec.py dans la même
+  transaction que le passage status='done' (apply)
+- totaux bruts gardés (qty / notionnel entrée et sortie, fees) :
+  avg_price_open et pnl_realized sont recalculés depuis ces totaux à chaque
+  fill, mêmes formules que les anciennes CTE (avg = prix moyen de TOUTES les
+  entrées, pnl = sorties valorisées à cet avg - fees)
+- v_exec_position / v_exec_pnl_uid deviennent des SELECT sur exec_position
+  (même colonnes, lookup par uid en O(1) quelle que soit la taille du ledger)
+- première ouverture : table reconstruite depuis v_exec_ledger (rebuild) ;
+  --rebuild après une correction manuelle du ledger
+- index exec(ts_exec) : lecture des nouveaux fills par watermark côté
+  budget (exec.py reste le seul writer de exec.db)
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import sqlite3
+
+ROOT = "/opt/scalp/project"
+DB_EXEC = f"{ROOT}/data/exec.db"
+
+IN_TYPES = ("open", "pyramide")
+OUT_TYPES = ("partial", "close")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS exec_position (
+    uid                TEXT PRIMARY KEY,
+    side               TEXT,
+    qty_open           REAL NOT NULL DEFAULT 0.0,
+    avg_price_open     REAL NOT NULL DEFAULT 0.0,
+    fee_total          REAL NOT NULL DEFAULT 0.0,
+    pnl_realized       REAL NOT NULL DEFAULT 0.0,
+    qty_in_total       REAL NOT NULL DEFAULT 0.0,
+    notional_in_total  REAL NOT NULL DEFAULT 0.0,
+    qty_out_total      REAL NOT NULL DEFAULT 0.0,
+    notional_out_total REAL NOT NULL DEFAULT 0.0,
+    n_fills            INTEGER NOT NULL DEFAULT 0,
+    last_exec_type     TEXT,
+    last_step          INTEGER,
+    last_price_exec    REAL,
+    last_ts_exec       INTEGER
+)
+"""
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_exec_ts ON exec(ts_exec)",
+)
+
+VIEWS = {
+    "v_exec_position": """CREATE VIEW v_exec_position AS
+SELECT
+  uid,
+  side,
+  qty_open,
+  avg_price_open,
+  fee_total,
+  last_exec_type,
+  last_step,
+  last_price_exec,
+  last_ts_exec
+FROM exec_position""",
+    "v_exec_pnl_uid": """CREATE VIEW v_exec_pnl_uid AS
+SELECT
+  uid,
+  pnl_realized
+FROM exec_position""",
+}
+
+UPSERT = """
+INSERT INTO exec_position (
+    uid, side, qty_open, fee_total,
+    qty_in_total, notional_in_total, qty_out_total, notional_out_total,
+    n_fills, last_exec_type, last_step, last_price_exec, last_ts_exec
+) VALUES (?,?,?,?,?,?,?,?,1,?,?,?,?)
+ON CONFLICT(uid) DO UPDATE SET
+    side               = MAX(COALESCE(side, excluded.side), excluded.side),
+    qty_open           = qty_open + excluded.qty_open,
+    fee_total          = fee_total + excluded.fee_total,
+    qty_in_total       = qty_in_total + excluded.qty_in_total,
+    notional_in_total  = notional_in_total + excluded.notional_in_total,
+    qty_out_total      = qty_out_total + excluded.qty_out_total,
+    notional_out_total = notional_out_total + excluded.notional_out_total,
+    n_fills            = n_fills + 1,
+    last_exec_type  = CASE WHEN (excluded.last_ts_exec, excluded.last_step) >= (last_ts_exec, last_step)
+                           OR last_ts_exec IS NULL THEN excluded.last_exec_type ELSE last_exec_type END,
+    last_price_exec = CASE WHEN (excluded.last_ts_exec, excluded.last_step) >= (last_ts_exec, last_step)
+                           OR last_ts_exec IS NULL THEN excluded.last_price_exec ELSE last_price_exec END,
+    last_step       = CASE WHEN (excluded.last_ts_exec, excluded.last_step) >= (last_ts_exec, last_step)
+                           OR last_ts_exec IS NULL THEN excluded.last_step ELSE last_step END,
+    last_ts_exec    = MAX(COALESCE(last_ts_exec, excluded.last_ts_exec), excluded.last_ts_exec)
+"""
+
+# avg = notionnel / qty d'entrée ; pnl = sorties valorisées à avg - fees
+DERIVE = """
+UPDATE exec_position SET
+    avg_price_open = CASE WHEN qty_in_total > 0 THEN notional_in_total / qty_in_total ELSE 0.0 END,
+    pnl_realized   = CASE
+        WHEN side='buy'  THEN notional_out_total
+                              - qty_out_total * (CASE WHEN qty_in_total > 0 THEN notional_in_total / qty_in_total ELSE 0.0 END)
+        WHEN side='sell' THEN qty_out_total * (CASE WHEN qty_in_total > 0 THEN notional_in_total / qty_in_total ELSE 0.0 END)
+                              - notional_out_total
+        ELSE 0.0
+    END - fee_total
+"""
+
+REBUILD = """
+INSERT INTO exec_position (
+    uid, side, qty_open, fee_total,
+    qty_in_total, notional_in_total, qty_out_total, notional_out_total, n_fills
+)
+SELECT
+    uid,
+    MAX(side),
+    SUM(CASE WHEN exec_type IN ('open','pyramide') THEN qty
+             WHEN exec_type IN ('partial','close') THEN -qty ELSE 0 END),
+    SUM(COALESCE(fee, 0.0)),
+    SUM(CASE WHEN exec_type IN ('open','pyramide') THEN qty ELSE 0 END),
+    SUM(CASE WHEN exec_type IN ('open','pyramide') THEN qty * price_exec ELSE 0 END),
+    SUM(CASE WHEN exec_type IN ('partial','close') THEN qty ELSE 0 END),
+    SUM(CASE WHEN exec_type IN ('partial','close') THEN qty * price_exec ELSE 0 END),
+    COUNT(*)
+FROM exec
+WHERE status='done'
+GROUP BY uid
+"""
+
+# dernier fill par uid (même ordre que l'ancien ROW_NUMBER) ; +status : force l'index uid
+REBUILD_LAST = """
+UPDATE exec_position SET (last_exec_type, last_step, last_price_exec, last_ts_exec) = (
+    SELECT exec_type, step, price_exec, ts_exec
+    FROM exec
+    WHERE exec.uid = exec_position.uid AND +status='done'
+    ORDER BY ts_exec DESC, step DESC
+    LIMIT 1
+)
+"""
+
+
+def _norm(sql):
+    return re.sub(r"\s+", " ", sql or "").strip()
+
+
+def rebuild(c, log=None):
+    """Reconstruit exec_position depuis le ledger (transaction de l'appelant si ouverte)."""
+    own = not c.in_transaction
+    if own:
+        c.execute("BEGIN")
+    c.execute("DELETE FROM exec_position")
+    c.execute(REBUILD)
+    c.execute(REBUILD_LAST)
+    c.execute(DERIVE)
+    n = c.execute("SELECT COUNT(*) FROM exec_position").fetchone()[0]
+    if own:
+        c.execute("COMMIT")
+    if log:
+        log.info("[POSITION] exec_position rebuilt uids=%d", n)
+    return n
+
+
+def ensure_schema(c, log=None):
+    """Crée exec_position (+ rebuild initial) ; remplace les vues si leur SQL diffère."""
+    exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='exec_position'"
+    ).fetchone()
+    c.execute(DDL)
+    for ddl in INDEXES:
+        c.execute(ddl)
+    if not exists:
+        rebuild(c, log)
+
+    current = dict(c.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='view' AND name IN (?, ?)",
+        tuple(VIEWS),
+    ).fetchall())
+    for name, sql in VIEWS.items():
+        if _norm(current.get(name)) == _norm(sql):
+            continue
+        c.execute(f"DROP VIEW IF EXISTS {name}")
+        c.execute(sql)
+        if log:
+            log.info("[SCHEMA] %s -> exec_position", name)
+
+
+def apply(c, uid, side, exec_type, qty, price_exec, fee, step, ts_exec):
+    """Un fill done -> exec_position (dans la transaction du UPDATE exec)."""
+    qty = float(qty)
+    px = float(price_exec)
+    q_in = qty if exec_type in IN_TYPES else 0.0
+    q_out = qty if exec_type in OUT_TYPES else 0.0
+    c.execute(UPSERT, (
+        uid, side, q_in - q_out, float(fee or 0.0),
+        q_in, q_in * px, q_out, q_out * px,
+        exec_type, step, px, ts_exec,
+    ))
+    c.execute(DERIVE + " WHERE uid=?", (uid,))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=DB_EXEC)
+    ap.add_argument("--rebuild", action="store_true", help="reconstruit depuis le ledger exec")
+    args = ap.parse_args()
+
+    c = sqlite3.connect(args.db, timeout=10, isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL;")
+    ensure_schema(c)
+    if args.rebuild:
+        print(f"[exec_position] rebuilt uids={rebuild(c)}")
+    c.close()
+
+
+if __name__ == "__main__":
+    main()
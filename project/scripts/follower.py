@@ -3,11 +3,11 @@
 
 import time
 import logging
-import sqlite3
 import yaml
 from pathlib import Path
 
-from db_utils import ensure_column
+from db_utils import ConnPool, ensure_column
+from db_notify import Listener, ring_if_changed
 
 from follower_ingest import ingest_open_done
 from follower_fsm_sync import sync_fsm_status
@@ -25,6 +25,7 @@ ROOT = Path("/opt/scalp/project")
 DB_FOLLOWER = ROOT / "data/follower.db"
 DB_GEST     = ROOT / "data/gest.db"
 DB_MFE_MAE  = ROOT / "data/mfe_mae.db"
+DB_EXEC     = ROOT / "data/exec.db"
 
 CONF = ROOT / "conf"
 LOG  = ROOT / "logs/follower.log"
@@ -37,32 +38,30 @@ logging.basicConfig(
 log = logging.getLogger("FOLLOWER")
 
 
-def conn_follower():
-    c = sqlite3.connect(str(DB_FOLLOWER), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL;")
-    c.execute("PRAGMA busy_timeout=10000;")
+# Handles longue durée : follower.db en écriture, gest/mfe_mae en lecture seule.
+POOL = ConnPool()
+
+
+def _ensure_follower_columns(c):
     ensure_column(c, "follower", "sl_hard", "REAL DEFAULT 0", log)
     ensure_column(c, "follower", "nb_pyramide_ack", "INTEGER DEFAULT 0", log)
     ensure_column(c, "follower", "entry_range_pos", "REAL", log)
     ensure_column(c, "follower", "entry_distance_atr", "REAL", log)
     ensure_column(c, "follower", "trigger_strength", "REAL", log)
     ensure_column(c, "follower", "market_regime", "TEXT", log)
-    return c
+
+
+def conn_follower():
+    # ensure_column n'est rejoué qu'à l'ouverture physique du handle
+    return POOL.rw(DB_FOLLOWER, on_open=_ensure_follower_columns)
 
 
 def conn_gest():
-    c = sqlite3.connect(str(DB_GEST), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    return POOL.ro(DB_GEST)
 
 
 def conn_mfe_mae():
-    c = sqlite3.connect(str(DB_MFE_MAE), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    return POOL.ro(DB_MFE_MAE)
 
 
 def load_cfg():
@@ -90,96 +89,105 @@ def load_cfg():
     return cfg
 
 
+def cycle(CFG):
+    now = int(time.time() * 1000)
+    POOL.begin_loop(log)
+
+    try:
+        # 1) INGEST open_done (gest → follower)
+        g = conn_gest()
+        f = conn_follower()
+        try:
+            ingest_open_done(g, f, now)
+            f.commit()
+        finally:
+            g.close()
+            f.close()
+
+        # 2) FSM STATUS SYNC
+        g = conn_gest()
+        f = conn_follower()
+        try:
+            sync_fsm_status(g, f, now)
+            # Garde-fou explicite pour débloquer les states pyramide_req
+            # désynchronisés avec gest (et appliquer la policy deep pyramide).
+            guard_pyramide_fsm(g=g, f=f, now=now)
+            f.commit()
+        finally:
+            g.close()
+            f.close()
+
+        # 3) DONE_STEP SYNC (exec → follower)
+        f = conn_follower()
+        try:
+            sync_done_steps(f=f)
+            f.commit()
+        finally:
+            f.close()
+
+        # 4) MFE / MAE
+        f = conn_follower()
+        m = conn_mfe_mae()
+        try:
+            sync_mfemae(f, m)
+            f.commit()
+        finally:
+            f.close()
+            m.close()
+
+        # 5) RISK (BE / TRAIL)
+        f = conn_follower()
+        try:
+            rows = f.execute("""
+                SELECT *
+                FROM follower
+                WHERE status IN ('follow','close_stdby')
+            """).fetchall()
+
+            for fr in rows:
+                manage_risk(f, fr, CFG, now)
+
+            f.commit()
+        finally:
+            f.close()
+
+        # 6) DECISIONS
+        f = conn_follower()
+        try:
+            decide_core(f, CFG, now)
+            f.commit()
+        finally:
+            f.close()
+
+        # 7) TIMEOUTS
+        check_timeouts(CFG)
+
+        # 8) PURGE CLOSED  (FIXED SIGNATURE: purge_closed(g, f, now))
+        g = conn_gest()
+        f = conn_follower()
+        try:
+            purge_closed(g, f, now)
+            f.commit()
+        finally:
+            g.close()
+            f.close()
+
+    except Exception:
+        log.exception("[ERR] follower loop")
+
+    ring_if_changed(conn_follower(), DB_FOLLOWER)
+
+
 def main():
     log.info("[START] follower")
     CFG = load_cfg()
 
-    while True:
-        now = int(time.time() * 1000)
+    # Réveil sur commit gest/exec (sinon timeout 1s, comme avant).
+    listener = Listener("follower", (DB_GEST, DB_EXEC))
 
-        try:
-            # 1) INGEST open_done (gest → follower)
-            g = conn_gest()
-            f = conn_follower()
-            try:
-                ingest_open_done(g, f, now)
-                f.commit()
-            finally:
-                g.close()
-                f.close()
-
-            # 2) FSM STATUS SYNC
-            g = conn_gest()
-            f = conn_follower()
-            try:
-                sync_fsm_status(g, f, now)
-                # Garde-fou explicite pour débloquer les states pyramide_req
-                # désynchronisés avec gest (et appliquer la policy deep pyramide).
-                guard_pyramide_fsm(g=g, f=f, now=now)
-                f.commit()
-            finally:
-                g.close()
-                f.close()
-
-            # 3) DONE_STEP SYNC (exec → follower)
-            f = conn_follower()
-            try:
-                sync_done_steps(f=f)
-                f.commit()
-            finally:
-                f.close()
-
-            # 4) MFE / MAE
-            f = conn_follower()
-            m = conn_mfe_mae()
-            try:
-                sync_mfemae(f, m)
-                f.commit()
-            finally:
-                f.close()
-                m.close()
-
-            # 5) RISK (BE / TRAIL)
-            f = conn_follower()
-            try:
-                rows = f.execute("""
-                    SELECT *
-                    FROM follower
-                    WHERE status IN ('follow','close_stdby')
-                """).fetchall()
-
-                for fr in rows:
-                    manage_risk(f, fr, CFG, now)
-
-                f.commit()
-            finally:
-                f.close()
-
-            # 6) DECISIONS
-            f = conn_follower()
-            try:
-                decide_core(f, CFG, now)
-                f.commit()
-            finally:
-                f.close()
-
-            # 7) TIMEOUTS
-            check_timeouts(CFG)
-
-            # 8) PURGE CLOSED  (FIXED SIGNATURE: purge_closed(g, f, now))
-            g = conn_gest()
-            f = conn_follower()
-            try:
-                purge_closed(g, f, now)
-                f.commit()
-            finally:
-                g.close()
-                f.close()
-
-        except Exception:
-            log.exception("[ERR] follower loop")
-
-        time.sleep(1)
+    while True:
+        cycle(CFG)
+        listener.wait(1.0)
 
 
 if __name__ == "__main__":
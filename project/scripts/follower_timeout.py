@@ -12,9 +12,14 @@ RÈGLE :
 
 import time
 import logging
+from pathlib import Path
+from sqlite3 import connect
 
 log = logging.getLogger("FOLLOWER_TIMEOUT")
 
+ROOT = Path("/opt/scalp/project")
+DB_FOLLOWER = ROOT / "data/follower.db"
+
 GRACE_OPEN_MS = 5000  # 5 secondes
 
 
@@ -55,15 +60,9 @@ def check_timeouts(CFG):
     Timeout engine.
     """
 
-    from sqlite3 import connect
-    from pathlib import Path
-
-    ROOT = Path("/opt/scalp/project")
-    DB = ROOT / "data/follower.db"
-
     now = int(time.time() * 1000)
 
-    f = connect(str(DB))
+    f = connect(str(DB_FOLLOWER))
     f.row_factory = lambda c, r: {col[0]: r[i] for i, col in enumerate(c.description)}
 
     try:
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SCALP — FSM FUSED (gest / opener / exec / closer / follower dans 1 process)
+
+RÔLE :
+- remplace les 5 daemons de la chaîne FSM par une seule boucle qui appelle
+  leur cycle() (mêmes modules, mêmes fonctions)
+- chaque rôle n'écrit toujours que sa propre DB : la règle 1 writer / DB
+  est conservée, l'état reste lu par SELECT comme avant
+- les transitions circulent en mémoire : après chaque cycle(), le
+  PRAGMA data_version des DB de rôle est relu ; une DB qui a bougé rend
+  immédiatement "pending" les rôles abonnés (mêmes abonnements que les
+  Listener des daemons) et ils tournent dans la même passe / la passe
+  suivante, sans sleep ni socket
+- amont externe (triggers.db) : Listener db_notify, timeout = prochaine
+  échéance LOOP_SLEEP d'un rôle (le polling de secours reste identique)
+
+BASCULE :
+- conf/runtime.yaml  fsm.mode: daemons | fused  (bin/start_fsm.sh)
+- refuse de démarrer si un des 5 daemons tourne déjà (1 writer / DB)
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from db_notify import Listener
+
+ROOT = Path("/opt/scalp/project")
+LOG = ROOT / "logs/fsm_fused.log"
+
+# rôle -> (DB écrite, DB amont abonnées) ; ordre = ordre d'une passe
+ROLES = (
+    ("gest", "gest", ("triggers", "opener", "closer", "follower")),
+    ("opener", "opener", ("gest", "exec")),
+    ("exec", "exec", ("opener", "closer")),
+    ("closer", "closer", ("gest", "exec")),
+    ("follower", "follower", ("gest", "exec")),
+)
+# période de secours (s) des daemons qui n'ont pas de LOOP_SLEEP
+DEFAULT_PERIOD = {"closer": 0.2, "follower": 1.0}
+
+MAX_PASSES = 8          # passes enchaînées sans attente (anti-boucle)
+STATS_EVERY_S = 60
+
+log = logging.getLogger("FSM_FUSED")
+
+
+def db_path(name):
+    return ROOT / f"data/{name}.db"
+
+
+def running_daemons(roles):
+    """PIDs des daemons `<role>.py` déjà lancés (hors process courant)."""
+    found = {}
+    me = os.getpid()
+    for p in Path("/proc").iterdir():
+        if not p.name.isdigit() or int(p.name) == me:
+            continue
+        try:
+            argv = (p / "cmdline").read_bytes().split(b"\0")
+        except OSError:
+            continue
+        for a in argv[1:3]:
+            name = os.path.basename(a.decode(errors="ignore"))
+            if name.endswith(".py") and name[:-3] in roles:
+                found.setdefault(name[:-3], []).append(int(p.name))
+    return found
+
+
+class Version:
+    """PRAGMA data_version d'une DB (connexion RO gardée ouverte)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.c = None
+        self.v = None
+
+    def changed(self):
+        if self.c is None:
+            if not self.path.exists():
+                return False
+            self.c = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True,
+                                     timeout=1, isolation_level=None)
+            self.v = self.c.execute("PRAGMA data_version").fetchone()[0]
+            return False
+        try:
+            v = self.c.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            return False
+        if v != self.v:
+            self.v = v
+            return True
+        return False
+
+    def close(self):
+        if self.c is not None:
+            self.c.close()
+            self.c = None
+
+
+class Fused:
+    def __init__(self, roles=ROLES):
+        import importlib
+
+        self.roles = []
+        for role, own, subs in roles:
+            mod = importlib.import_module(role)
+            period = float(getattr(mod, "LOOP_SLEEP", DEFAULT_PERIOD.get(role, 0.2)))
+            call = mod.cycle
+            if role == "follower":
+                cfg = mod.load_cfg()
+                call = (lambda f, c: lambda: f(c))(call, cfg)
+            # [rôle, cycle, période, échéance, pending, db écrite, abonnements]
+            self.roles.append([role, call, period, 0.0, True, own, set(subs)])
+
+        own = {r[5] for r in self.roles}
+        self.versions = {name: Version(db_path(name)) for name in own}
+        for v in self.versions.values():
+            v.changed()
+        external = sorted({s for r in self.roles for s in r[6]} - own)
+        self.listener = Listener("fsm_fused", [db_path(n) for n in external]) if external else None
+        self.external = {db_path(n): n for n in external}
+
+        self.stats = {r[0]: [0, 0.0] for r in self.roles}     # rôle -> [runs, ms]
+        self.passes = 0
+        self.chained = 0
+
+    def mark(self, dbs):
+        for r in self.roles:
+            if r[6] & dbs:
+                r[4] = True
+
+    def run_pass(self, chain_only=False):
+        """Une passe dans l'ordre ROLES ; renvoie les DB de rôle modifiées.
+
+        chain_only : seuls les rôles pending tournent (les polls périodiques
+        échus attendent la fin de la chaîne).
+        """
+        moved = set()
+        for r in self.roles:
+            role, call, period, due, pending = r[:5]
+            now = time.monotonic()
+            if not pending and (chain_only or now < due):
+                continue
+            r[4] = False
+            t0 = time.perf_counter()
+            try:
+                call()
+            except Exception:
+                log.exception("[ERR] %s cycle", role)
+            st = self.stats[role]
+            st[0] += 1
+            st[1] += (time.perf_counter() - t0) * 1000
+            r[3] = time.monotonic() + period
+
+            changed = {n for n, v in self.versions.items() if v.changed()}
+            if changed:
+                moved |= changed
+                self.mark(changed)
+        self.passes += 1
+        return moved
+
+    def step(self):
+        """Passes enchaînées tant qu'un rôle est pending (borné à MAX_PASSES)."""
+        for k in range(MAX_PASSES):
+            self.run_pass(chain_only=k > 0)
+            if not any(r[4] for r in self.roles):
+                break
+            self.chained += 1
+
+    def wait(self):
+        timeout = max(0.0, min(r[3] for r in self.roles) - time.monotonic())
+        if any(r[4] for r in self.roles):
+            timeout = 0.0
+        if self.listener is None:
+            time.sleep(timeout)
+            return
+        fired = self.listener.wait(timeout)
+        if fired:
+            self.mark({self.external[p] for p in fired if p in self.external})
+
+    def log_stats(self):
+        parts = [f"{role}={n}/{ms / max(1, n):.2f}ms" for role, (n, ms) in self.stats.items()]
+        log.info("[STATS] passes=%d chained=%d %s", self.passes, self.chained, " ".join(parts))
+
+    def run(self, seconds=None):
+        t_end = None if seconds is None else time.monotonic() + seconds
+        t_stats = time.monotonic() + STATS_EVERY_S
+        while t_end is None or time.monotonic() < t_end:
+            self.step()
+            if time.monotonic() >= t_stats:
+                self.log_stats()
+                t_stats = time.monotonic() + STATS_EVERY_S
+            self.wait()
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.close()
+        for v in self.versions.values():
+            v.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--force", action="store_true",
+                    help="démarre même si un daemon FSM tourne (déconseillé)")
+    args = ap.parse_args()
+
+    # avant les imports des rôles : leur basicConfig devient sans effet
+    logging.basicConfig(
+        filename=str(LOG),
+        level=logging.INFO,
+        format="%(asctime)s %(name)s %(levelname)s %(message)s",
+    )
+
+    busy = running_daemons({r[0] for r in ROLES})
+    if busy and not args.force:
+        log.error("[ABORT] daemons FSM actifs %s : 1 writer / DB", busy)
+        raise SystemExit(f"[fsm_fused] daemons FSM actifs {busy} (bin/start_fsm.sh daemons|fused)")
+
+    fused = Fused()
+    log.info("[START] fsm_fused roles=%s", ",".join(f"{r[0]}:{r[2]:g}s" for r in fused.roles))
+    try:
+        fused.run()
+    finally:
+        fused.log_stats()
+        fused.close()
+
+
+if __name__ == "__main__":
+    main()
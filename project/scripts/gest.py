@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import sqlite3
 import time
 import logging
 from pathlib import Path
 
-from db_utils import ensure_column
+from db_utils import SCHEMA, ConnPool, ensure_columns
+from db_notify import Listener, ring_if_changed
 
 ROOT = Path("/opt/scalp/project")
 
@@ -22,19 +22,26 @@ LOG_PATH = ROOT / "logs/gest.log"
 
 log = logging.getLogger("GEST")
 
+# Handles longue durée (1 par DB et par process) : plus de connect/PRAGMA par étape.
+POOL = ConnPool()
+
+
+def _ensure_gest_indexes(g):
+    # watermark du recorder : close_done relus par ts_status_update croissant
+    if "gest" in SCHEMA.objects(g):
+        g.execute("CREATE INDEX IF NOT EXISTS ix_gest_status_ts ON gest(status, ts_status_update)")
+
 
 def conn(path):
-    c = sqlite3.connect(str(path), timeout=10, isolation_level=None)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL;")
-    c.execute("PRAGMA synchronous=NORMAL;")
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    if Path(path) == DB_GEST:
+        return POOL.rw(path, isolation_level=None, synchronous="NORMAL",
+                       on_open=_ensure_gest_indexes)
+    return POOL.ro(path, isolation_level=None)
 
 
 def table_columns(conn_, table):
-    rows = conn_.execute(f"PRAGMA table_info({table})").fetchall()
-    return {r["name"] for r in rows}
+    # Cache par handle, invalidé sur PRAGMA schema_version (db_utils.SCHEMA).
+    return SCHEMA.columns(conn_, table)
 
 
 def clamp01(value, default=0.0):
@@ -79,58 +86,72 @@ def ensure_gest_score_columns(g):
         "spread_entry": "REAL",
         "signal_age_ms": "INTEGER",
     }
-    for col, col_type in required.items():
-        ensure_column(g, "gest", col, col_type, log)
+    ensure_columns(g, "gest", required, log)
+
+
+DEC_WANTED_COLS = [
+    "uid", "instId", "score_C", "ctx", "dec_mode", "compression_ok",
+    "momentum_ok", "prebreak_ok", "pullback_ok", "score_S",
+    "s_struct", "s_quality", "s_vol", "s_confirm",
+]
+
+
+def _build_dec_queries(d_conn):
+    """(query_by_uid, query_by_instId) sur v_dec_score_s, None si inexploitable."""
+    if "v_dec_score_s" not in SCHEMA.objects(d_conn):
+        return None
+
+    dec_cols = SCHEMA.columns(d_conn, "v_dec_score_s")
+    select_cols = [c for c in DEC_WANTED_COLS if c in dec_cols]
+    if not select_cols:
+        return None
+
+    by_uid = None
+    if "uid" in dec_cols:
+        by_uid = f"SELECT {', '.join(select_cols)} FROM v_dec_score_s WHERE uid=? LIMIT 1"
+
+    if "instId" in dec_cols:
+        id_col = "instId"
+    elif "instId_s" in dec_cols:
+        id_col = "instId_s"
+    else:
+        id_col = None
+
+    by_inst = None
+    if id_col:
+        by_inst = f"""
+            SELECT {', '.join(select_cols)}
+            FROM v_dec_score_s
+            WHERE {id_col}=?
+            ORDER BY COALESCE(ts_updated, 0) DESC
+            LIMIT 1
+        """
+    return by_uid, by_inst
 
 
 def load_dec_payload(d_conn, uid, inst_id):
     log.info("GEST DEC LOOKUP: uid=%s instId=%s", uid, inst_id)
 
     try:
-        objects = {
-            r["name"]
-            for r in d_conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table','view')").fetchall()
-        }
-        if "v_dec_score_s" not in objects:
-            log.info("GEST DEC MISSING")
-            return None
-
-        dec_cols = table_columns(d_conn, "v_dec_score_s")
-        wanted_cols = [
-            "uid", "instId", "score_C", "ctx", "dec_mode", "compression_ok",
-            "momentum_ok", "prebreak_ok", "pullback_ok", "score_S",
-            "s_struct", "s_quality", "s_vol", "s_confirm",
-        ]
-        select_cols = [c for c in wanted_cols if c in dec_cols]
-        if not select_cols:
+        queries = SCHEMA.query(d_conn, "gest.dec_payload", _build_dec_queries)
+        if queries is None:
             log.info("GEST DEC MISSING")
             return None
+        by_uid, by_inst = queries
 
         row = None
-        if "uid" in dec_cols:
-            query = f"SELECT {', '.join(select_cols)} FROM v_dec_score_s WHERE uid=? LIMIT 1"
-            row = d_conn.execute(query, (uid,)).fetchone()
+        if by_uid:
+            row = d_conn.execute(by_uid, (uid,)).fetchone()
         if row:
             log.info("GEST DEC OK")
             return row
 
-        if "instId" in dec_cols:
-            id_col = "instId"
-        elif "instId_s" in dec_cols:
-            id_col = "instId_s"
-        else:
+        if by_inst is None:
             log.warning("DEC payload missing for uid=%s instId=%s", uid, inst_id)
             log.info("GEST DEC MISSING")
             return None
 
-        query = f"""
-            SELECT {', '.join(select_cols)}
-            FROM v_dec_score_s
-            WHERE {id_col}=?
-            ORDER BY COALESCE(ts_updated, 0) DESC
-            LIMIT 1
-        """
-        row = d_conn.execute(query, (inst_id,)).fetchone()
+        row = d_conn.execute(by_inst, (inst_id,)).fetchone()
         if row:
             log.info("GEST DEC OK")
             return row
@@ -144,47 +165,49 @@ def load_dec_payload(d_conn, uid, inst_id):
         return None
 
 
-def resolve_score_h(t_conn, inst_id, trigger_type, dec_mode):
-    trig_tables = {r["name"] for r in t_conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table','view')")}
+def _build_score_h_queries(t_conn):
+    """(query historical_scores_v2, query v_score_H, filtres v_score_H)."""
+    trig_tables = SCHEMA.objects(t_conn)
+
+    hist_sql = None
     if "historical_scores_v2" in trig_tables:
-        hist_cols = table_columns(t_conn, "historical_scores_v2")
+        hist_cols = SCHEMA.columns(t_conn, "historical_scores_v2")
         h_col = "score_H" if "score_H" in hist_cols else ("score_H_final" if "score_H_final" in hist_cols else None)
         if h_col and all(c in hist_cols for c in ("instId", "type_signal", "ctx")):
-            row = t_conn.execute(
-                f"""
+            hist_sql = f"""
                 SELECT {h_col} AS score_H
                 FROM historical_scores_v2
                 WHERE instId=? AND type_signal=? AND ctx=?
                 ORDER BY COALESCE(ts_updated, 0) DESC
                 LIMIT 1
-                """,
-                (inst_id, trigger_type, dec_mode),
-            ).fetchone()
-            if row and row["score_H"] is not None:
-                return clamp01(row["score_H"], default=0.5)
+                """
 
+    view_sql = None
+    view_keys = ()
     if "v_score_H" in trig_tables:
-        v_cols = table_columns(t_conn, "v_score_H")
+        v_cols = SCHEMA.columns(t_conn, "v_score_H")
         if "score_H" in v_cols:
-            filters = []
-            params = []
-            if "instId" in v_cols:
-                filters.append("instId=?")
-                params.append(inst_id)
-            if "trigger_type" in v_cols:
-                filters.append("trigger_type=?")
-                params.append(trigger_type)
-            if "dec_mode" in v_cols:
-                filters.append("dec_mode=?")
-                params.append(dec_mode)
-
+            view_keys = tuple(k for k in ("instId", "trigger_type", "dec_mode") if k in v_cols)
+            filters = [f"{k}=?" for k in view_keys]
             where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
-            row = t_conn.execute(
-                f"SELECT score_H FROM v_score_H {where_clause} LIMIT 1",
-                tuple(params),
-            ).fetchone()
-            if row and row["score_H"] is not None:
-                return clamp01(row["score_H"], default=0.5)
+            view_sql = f"SELECT score_H FROM v_score_H {where_clause} LIMIT 1"
+
+    return hist_sql, view_sql, view_keys
+
+
+def resolve_score_h(t_conn, inst_id, trigger_type, dec_mode):
+    hist_sql, view_sql, view_keys = SCHEMA.query(t_conn, "gest.score_h", _build_score_h_queries)
+
+    if hist_sql:
+        row = t_conn.execute(hist_sql, (inst_id, trigger_type, dec_mode)).fetchone()
+        if row and row["score_H"] is not None:
+            return clamp01(row["score_H"], default=0.5)
+
+    if view_sql:
+        values = {"instId": inst_id, "trigger_type": trigger_type, "dec_mode": dec_mode}
+        row = t_conn.execute(view_sql, tuple(values[k] for k in view_keys)).fetchone()
+        if row and row["score_H"] is not None:
+            return clamp01(row["score_H"], default=0.5)
 
     return 0.5
 
@@ -199,9 +222,9 @@ def ingest_triggers():
 
     try:
         trig_cols = table_columns(t, "triggers")
-        gest_cols = table_columns(g, "gest")
         ensure_gest_score_columns(g)
         gest_cols = table_columns(g, "gest")
+        insert_sql = None
 
         rows = t.execute("""
             SELECT *
@@ -311,12 +334,12 @@ def ingest_triggers():
                 "ts_updated": now_ms,
             }
 
-            insert_cols = [c for c in values if c in gest_cols]
-            placeholders = ", ".join(["?"] * len(insert_cols))
-            g.execute(
-                f"INSERT INTO gest ({', '.join(insert_cols)}) VALUES ({placeholders})",
-                tuple(values[c] for c in insert_cols),
-            )
+            if insert_sql is None:
+                # Les clés de `values` sont fixes : colonnes/SQL résolus une fois par passe.
+                insert_cols = [c for c in values if c in gest_cols]
+                placeholders = ", ".join(["?"] * len(insert_cols))
+                insert_sql = f"INSERT INTO gest ({', '.join(insert_cols)}) VALUES ({placeholders})"
+            g.execute(insert_sql, tuple(values[c] for c in insert_cols))
             log.info(
                 "GEST INSERT OK: uid=%s instId=%s C=%.4f S=%.4f H=%.4f M=%.4f",
                 uid,
@@ -329,6 +352,7 @@ def ingest_triggers():
 
         g.commit()
     finally:
+        ring_if_changed(g, DB_GEST)
         t.close()
         d.close()
         g.close()
@@ -374,6 +398,7 @@ def ingest_opener_done():
                 if cur.rowcount:
                     log.info("[GEST ACK] uid=%s pyramide_req -> pyramide_done", uid)
     finally:
+        ring_if_changed(g, DB_GEST)
         o.close()
         g.close()
 
@@ -420,6 +445,7 @@ def ingest_closer_done():
             if cur.rowcount:
                 log.info("[GEST ACK] uid=%s partial_req -> partial_done", r["uid"])
     finally:
+        ring_if_changed(g, DB_GEST)
         c.close()
         g.close()
 
@@ -454,6 +480,7 @@ def mirror_follower_follow():
             if cur.rowcount:
                 log.info("[GEST FOLLOW] uid=%s -> follow", uid)
     finally:
+        ring_if_changed(g, DB_GEST)
         f.close()
         g.close()
 
@@ -577,10 +604,24 @@ def ingest_follower_requests():
                 if cur.rowcount:
                     log.info("[GEST REQ] uid=%s -> close_req mfe=%s mae=%s atr=%s", uid, r["mfe_price"], r["mae_price"], r["atr_signal"])
     finally:
+        ring_if_changed(g, DB_GEST)
         f.close()
         g.close()
 
 
+def cycle():
+    """Un tour de boucle gest (appelé par main et par replay.py)."""
+    POOL.begin_loop(log)
+    try:
+        ingest_triggers()
+        ingest_opener_done()
+        ingest_closer_done()
+        mirror_follower_follow()
+        ingest_follower_requests()
+    except Exception as e:
+        log.exception("[GEST ERROR] %s", e)
+
+
 def main():
     LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
     logging.basicConfig(
@@ -591,17 +632,12 @@ def main():
     )
     log.info("[START] gest loop sleep=%.3fs", LOOP_SLEEP)
 
+    # Réveil sur commit amont (sinon timeout = LOOP_SLEEP, comme avant).
+    listener = Listener("gest", (DB_TRIGGERS, DB_OPENER, DB_CLOSER, DB_FOLLOWER))
+
     while True:
-        try:
-            ingest_triggers()
-            ingest_opener_done()
-            ingest_closer_done()
-            mirror_follower_follow()
-            ingest_follower_requests()
-        except Exception as e:
-            log.exception("[GEST ERROR] %s", e)
-
-        time.sleep(LOOP_SLEEP)
+        cycle()
+        listener.wait(LOOP_SLEEP)
 
 
 if __name__ == "__main__":
@@ -11,6 +11,12 @@ RÔLE :
 - snapshot REST ccxt
 - calculer ticks_5s / spread / staleness
 - ÉCRIRE market_latest (SEUL writer)
+
+TICKS :
+- TickAgg consomme ticks_hist par watermark (id > dernier id lu)
+- ticks_5s = vrais ticks reçus sur TICK_WINDOW_MS (deque par instId, O(1) amorti)
+- spread depuis le dernier bid/ask tick (snapshot REST en repli)
+- market_latest écrit en UNE transaction par cycle
 """
 
 import sqlite3
@@ -38,6 +44,7 @@ DB_M = ROOT / "data/market.db"
 LOOP_SLEEP   = 1.0
 SNAPSHOT_TTL = 30.0
 BATCH_SIZE   = 5
+TICK_WINDOW_MS = 5000
 
 # ============================================================
 # LOG
@@ -148,22 +155,108 @@ def atr_1m(inst, period=14):
     return sum(trs) / period
 
 # ============================================================
-# TICKS BUFFER
+# TICKS AGGREGATOR (ticks_hist par watermark)
 # ============================================================
 
-tick_buf = defaultdict(lambda: deque(maxlen=500))
+class TickAgg:
+    def __init__(self, window_ms=TICK_WINDOW_MS):
+        self.window_ms = window_ms
+        self.last_id = None
+        self.ts: dict[str, deque] = defaultdict(deque)   # ts_ms des ticks de la fenêtre
+        self.last: dict[str, tuple] = {}                 # instId -> (ts_ms, lastPr, bidPr, askPr)
+
+    def poll(self, ct, now_ms):
+        """Consomme les nouveaux ticks ; retourne le nombre lu."""
+        cur = ct.cursor()
+        cur.row_factory = None   # tuples bruts : pas de sqlite3.Row par tick
+        top = cur.execute("SELECT MAX(id) FROM ticks_hist").fetchone()[0] or 0
+        if self.last_id is None or top < self.last_id:
+            # démarrage / t.db recréée : amorçage sur la fenêtre courante
+            self.ts.clear()
+            self.last.clear()
+            rows = cur.execute("""
+                SELECT id, instId, lastPr, bidPr, askPr, ts_ms
+                FROM ticks_hist
+                WHERE ts_ms > ? AND id <= ?
+                ORDER BY id
+            """, (now_ms - self.window_ms, top)).fetchall()
+        else:
+            rows = cur.execute("""
+                SELECT id, instId, lastPr, bidPr, askPr, ts_ms
+                FROM ticks_hist
+                WHERE id > ? AND id <= ?
+                ORDER BY id
+            """, (self.last_id, top)).fetchall()
+        self.last_id = top
+
+        win, last = self.ts, self.last
+        for _id, inst, px, bid, ask, ts in rows:
+            win[inst].append(ts)
+            prev = last.get(inst)
+            if prev is None or ts >= prev[0]:
+                last[inst] = (ts, px, bid, ask)
+
+        cutoff = now_ms - self.window_ms
+        for dq in self.ts.values():
+            while dq and dq[0] <= cutoff:
+                dq.popleft()
+        return len(rows)
+
+    def stats(self, inst, now_ms):
+        """(ticks_5s, staleness_ms, last, bid, ask) ou None si aucun tick vu."""
+        last = self.last.get(inst)
+        if last is None:
+            return None
+        ts, px, bid, ask = last
+        dq = self.ts.get(inst)
+        return (len(dq) if dq else 0), now_ms - ts, px, bid, ask
+
+
+def market_rows(agg, universe, now_ms):
+    rows = []
+    for inst in universe:
+        st = agg.stats(inst, now_ms)
+        snap = snapshot_cache.get(inst)
+
+        if st is None or not snap or snap["last"] <= 0:
+            continue
+
+        ticks_5s, staleness, last, bid, ask = st
+        if not (bid and ask and last and ask >= bid):
+            last, bid, ask = snap["last"], snap["bid"], snap["ask"]
 
-def update_ticks():
-    ct = conn(DB_T)
-    rows = ct.execute("""
-        SELECT instId, lastPr, ts_ms
-        FROM ticks
-        WHERE ts_ms > ?
-    """, (int(time.time() * 1000) - 5000,)).fetchall()
-    ct.close()
+        spread = ask - bid
+        spread_bps = (spread / last * 10000) if last else 0.0
+        rows.append((inst, ticks_5s, spread_bps, staleness, now_ms))
+    return rows
 
-    for r in rows:
-        tick_buf[r["instId"]].append((r["ts_ms"], r["lastPr"]))
+
+def write_market(cm, rows):
+    if not rows:
+        return
+    cm.execute("BEGIN")
+    try:
+        # ===============================
+        # 🔑 AUTHORITATIVE WRITE
+        # ===============================
+        cm.executemany("""
+            INSERT INTO market_latest (
+                instId,
+                ticks_5s,
+                spread_bps,
+                staleness_ms,
+                ts_update
+            ) VALUES (?,?,?,?,?)
+            ON CONFLICT(instId) DO UPDATE SET
+                ticks_5s     = excluded.ticks_5s,
+                spread_bps   = excluded.spread_bps,
+                staleness_ms = excluded.staleness_ms,
+                ts_update    = excluded.ts_update
+        """, rows)
+        cm.execute("COMMIT")
+    except Exception:
+        cm.execute("ROLLBACK")
+        raise
 
 # ============================================================
 # MAIN LOOP
@@ -174,51 +267,17 @@ def main():
 
     universe = load_universe()
     cm = conn(DB_M)
+    ct = conn(DB_T)
+    agg = TickAgg()
 
     while True:
         try:
             now_ms = int(time.time() * 1000)
 
-            update_ticks()
+            agg.poll(ct, now_ms)
             refresh_snapshots(universe)
 
-            for inst in universe:
-                buf  = tick_buf.get(inst)
-                snap = snapshot_cache.get(inst)
-
-                if not buf or not snap or snap["last"] <= 0:
-                    continue
-
-                ticks_5s = sum(1 for ts, _ in buf if ts > now_ms - 5000)
-                last_ts, _ = buf[-1]
-                staleness = now_ms - last_ts
-
-                spread = snap["ask"] - snap["bid"]
-                spread_bps = (spread / snap["last"] * 10000) if snap["last"] else 0.0
-
-                # ===============================
-                # 🔑 AUTHORITATIVE WRITE
-                # ===============================
-                cm.execute("""
-                    INSERT INTO market_latest (
-                        instId,
-                        ticks_5s,
-                        spread_bps,
-                        staleness_ms,
-                        ts_update
-                    ) VALUES (?,?,?,?,?)
-                    ON CONFLICT(instId) DO UPDATE SET
-                        ticks_5s     = excluded.ticks_5s,
-                        spread_bps   = excluded.spread_bps,
-                        staleness_ms = excluded.staleness_ms,
-                        ts_update    = excluded.ts_update
-                """, (
-                    inst,
-                    ticks_5s,
-                    spread_bps,
-                    staleness,
-                    now_ms
-                ))
+            write_market(cm, market_rows(agg, universe, now_ms))
 
             time.sleep(LOOP_SLEEP)
 
@@ -228,4 +287,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
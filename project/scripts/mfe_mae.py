@@ -9,13 +9,17 @@ RÔLE :
 - écrit UNIQUEMENT mfe_mae.db
 - calcule MFE / MAE par UID
 - AUCUNE logique métier
+- incrémental : extrema en mémoire, seuls les ticks d'id > last_id
+  (watermark ticks_hist.id, fenêtre ts_ms >= last_ts - LATE_MS) sont lus,
+  1 requête ticks_hist par instId, flush toutes les FLUSH_EVERY s
 """
 
-import sqlite3
 import time
 import logging
 from pathlib import Path
 
+from db_utils import ConnPool
+
 ###############################################################################
 # PATHS
 ###############################################################################
@@ -28,6 +32,8 @@ DB_MFE  = ROOT / "data/mfe_mae.db"
 
 LOG = ROOT / "logs/mfe_mae.log"
 LOOP_SLEEP = 0.5
+FLUSH_EVERY = 1.0   # s : écriture des extrema mémoire -> mfe_mae.db
+LATE_MS = 5000      # ms : tick commité après d'autres de ts_ms plus récent
 
 ###############################################################################
 # LOG
@@ -47,18 +53,109 @@ log = logging.getLogger("MFE_MAE")
 def now_ms():
     return int(time.time() * 1000)
 
+# Handles longue durée : mfe_mae.db en écriture, gest/t en lecture seule.
+POOL = ConnPool()
+
+
 def conn(p):
-    c = sqlite3.connect(str(p), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL;")
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    if p == DB_MFE:
+        return POOL.rw(p)
+    return POOL.ro(p)
+
+###############################################################################
+# STATE (extrema en mémoire, flush périodique)
+###############################################################################
+
+# uid -> état courant ; last_id = watermark ticks_hist.id (mémoire seulement),
+# last_ts = ts_ms du tick le plus récent consommé
+STATE: dict[str, dict] = {}
+_loaded = False
+_last_flush = 0.0
+
+
+def reset_state():
+    """Après une erreur (transaction annulée) : relecture depuis mfe_mae.db."""
+    global _loaded
+    STATE.clear()
+    _loaded = False
+
+
+def _state_from_row(r):
+    st = {k: r[k] for k in (
+        "uid", "instId", "side", "entry_price", "ts_open",
+        "mfe", "mfe_ts", "mae", "mae_ts", "last_price", "last_ts",
+    )}
+    st["mfe"] = st["mfe"] or 0.0
+    st["mae"] = st["mae"] or 0.0
+    # jamais mis à jour : inclure le tick exactement à ts_open (ts_ms>=ts_open)
+    if st["last_ts"] is None or st["last_ts"] <= st["ts_open"]:
+        st["last_ts"] = st["ts_open"] - 1
+    # reprise : ticks >= last_ts persisté (le tick frontière rejoué ne change pas les extrema)
+    st["ts_floor"] = max(st["last_ts"], st["ts_open"])
+    st["last_id"] = 0
+    st["dirty"] = False
+    return st
+
+
+def consume(st, ticks):
+    """Applique à `st` les ticks (lastPr, ts_ms, id) triés par ts_ms, d'id > son watermark."""
+    entry = st["entry_price"]
+    buy = st["side"] == "buy"
+    wm = st["last_id"]
+    floor = st["ts_floor"]
+    n = 0
+    for px, ts, tid in ticks:
+        if tid <= wm or ts < floor:
+            continue
+        move = px - entry if buy else entry - px
+        if move > st["mfe"]:
+            st["mfe"] = move
+            st["mfe_ts"] = ts
+        if move < st["mae"]:
+            st["mae"] = move
+            st["mae_ts"] = ts
+        if ts >= st["last_ts"]:
+            st["last_price"] = px
+            st["last_ts"] = ts
+        if tid > st["last_id"]:
+            st["last_id"] = tid
+        n += 1
+    if n:
+        st["dirty"] = True
+    return n
+
+
+def flush(m, now):
+    rows = [
+        (st["mfe"], st["mfe_ts"], st["mae"], st["mae_ts"],
+         st["last_price"], st["last_ts"], now, uid)
+        for uid, st in STATE.items() if st["dirty"]
+    ]
+    if not rows:
+        return 0
+    m.executemany("""
+        UPDATE mfe_mae
+        SET
+            mfe=?,
+            mfe_ts=?,
+            mae=?,
+            mae_ts=?,
+            last_price=?,
+            last_ts=?,
+            ts_updated=?
+        WHERE uid=?
+    """, rows)
+    for st in STATE.values():
+        st["dirty"] = False
+    return len(rows)
 
 ###############################################################################
 # CORE
 ###############################################################################
 
 def loop():
+    global _loaded, _last_flush
+
     g = conn(DB_GEST)
     t = conn(DB_TICK)
     m = conn(DB_MFE)
@@ -86,27 +183,26 @@ def loop():
     # ============================================================
     # 2) PURGE UID ABSENTS DE GEST
     # ============================================================
-    db_uids = {
-        r["uid"]
-        for r in m.execute("SELECT uid FROM mfe_mae")
-    }
-
-    for uid in db_uids - set(gest_map.keys()):
-        m.execute("DELETE FROM mfe_mae WHERE uid=?", (uid,))
-        log.info("[PURGE] uid=%s", uid)
+    if not _loaded:
+        # démarrage : reprise des extrema persistés
+        for r in m.execute("SELECT * FROM mfe_mae"):
+            STATE[r["uid"]] = _state_from_row(r)
+        _loaded = True
+
+    gone = [uid for uid in STATE if uid not in gest_map]
+    if gone:
+        m.executemany("DELETE FROM mfe_mae WHERE uid=?", [(u,) for u in gone])
+        for uid in gone:
+            del STATE[uid]
+            log.info("[PURGE] uid=%s", uid)
 
     # ============================================================
     # 3) INGEST NOUVEAUX UID
     # ============================================================
-    for uid, r in gest_map.items():
-        if m.execute(
-            "SELECT 1 FROM mfe_mae WHERE uid=?",
-            (uid,)
-        ).fetchone():
-            continue
-
+    new = [r for uid, r in gest_map.items() if uid not in STATE]
+    for r in new:
         m.execute("""
-            INSERT INTO mfe_mae (
+            INSERT OR IGNORE INTO mfe_mae (
                 uid, instId, side,
                 entry_price, ts_open,
                 mfe, mfe_ts,
@@ -116,7 +212,7 @@ def loop():
                 ts_updated
             ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
         """, (
-            uid,
+            r["uid"],
             r["instId"],
             r["side"],
             r["entry"],
@@ -128,68 +224,45 @@ def loop():
             r["atr_signal"],
             now
         ))
+        # ligne existante (redémarrage pendant un trade) : on garde ses extrema
+        row = m.execute("SELECT * FROM mfe_mae WHERE uid=?", (r["uid"],)).fetchone()
+        STATE[r["uid"]] = _state_from_row(row)
 
-        log.info("[INGEST] uid=%s inst=%s", uid, r["instId"])
+        log.info("[INGEST] uid=%s inst=%s", r["uid"], r["instId"])
 
     # ============================================================
-    # 4) UPDATE MFE / MAE (ticks_hist, fenêtre correcte)
+    # 4) UPDATE MFE / MAE : ticks d'id > watermark, 1 requête par instId
+    #    (un tick commité en retard, même ts_ms que le watermark ou jusqu'à
+    #    LATE_MS plus ancien, est encore lu)
     # ============================================================
-    for r in m.execute("SELECT * FROM mfe_mae"):
+    by_inst: dict[str, list] = {}
+    for st in STATE.values():
+        by_inst.setdefault(st["instId"], []).append(st)
+
+    for instId, states in by_inst.items():
+        # ts_floor (fixé au chargement) reste filtré par consume() ; la borne de
+        # lecture suit last_ts, qui avance à chaque tick consommé
+        since = min(st["last_ts"] for st in states) - LATE_MS
+        wm = min(st["last_id"] for st in states)
         ticks = t.execute("""
-            SELECT lastPr, ts_ms
+            SELECT lastPr, ts_ms, id
             FROM ticks_hist
             WHERE instId=?
               AND ts_ms>=?
-            ORDER BY ts_ms
-        """, (r["instId"], r["ts_open"])).fetchall()
+              AND id>?
+            ORDER BY ts_ms, id
+        """, (instId, since, wm)).fetchall()
 
         if not ticks:
             continue
 
-        mfe = r["mfe"]
-        mae = r["mae"]
-        mfe_ts = r["mfe_ts"]
-        mae_ts = r["mae_ts"]
-
-        for tk in ticks:
-            move = (
-                tk["lastPr"] - r["entry_price"]
-                if r["side"] == "buy"
-                else r["entry_price"] - tk["lastPr"]
-            )
+        ticks = [(tk["lastPr"], tk["ts_ms"], tk["id"]) for tk in ticks]
+        for st in states:
+            consume(st, ticks)
 
-            if move > mfe:
-                mfe = move
-                mfe_ts = tk["ts_ms"]
-
-            if move < mae:
-                mae = move
-                mae_ts = tk["ts_ms"]
-
-        last_price = ticks[-1]["lastPr"]
-        last_ts    = ticks[-1]["ts_ms"]
-
-        m.execute("""
-            UPDATE mfe_mae
-            SET
-                mfe=?,
-                mfe_ts=?,
-                mae=?,
-                mae_ts=?,
-                last_price=?,
-                last_ts=?,
-                ts_updated=?
-            WHERE uid=?
-        """, (
-            mfe,
-            mfe_ts,
-            mae,
-            mae_ts,
-            last_price,
-            last_ts,
-            now,
-            r["uid"]
-        ))
+    if time.monotonic() - _last_flush >= FLUSH_EVERY:
+        flush(m, now)
+        _last_flush = time.monotonic()
 
     m.commit()
     g.close()
@@ -200,13 +273,19 @@ def loop():
 # MAIN
 ###############################################################################
 
+def cycle():
+    POOL.begin_loop(log)
+    try:
+        loop()
+    except Exception:
+        log.exception("[ERR] mfe_mae loop")
+        reset_state()
+
+
 def main():
     log.info("[START] mfe_mae engine running (FINAL)")
     while True:
-        try:
-            loop()
-        except Exception:
-            log.exception("[ERR] mfe_mae loop")
+        cycle()
         time.sleep(LOOP_SLEEP)
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SCALP — OHLCV FETCH (async, partagé OA_ohlcv / OB_collect)
+
+- ccxt.async_support : au plus FETCH_CONCURRENCY requêtes en vol, throttle
+  ccxt (enableRateLimit) ; sur RateLimitExceeded la fenêtre est divisée par 2
+  (AIMD, +1 par fenêtre de succès) et la requête est rejouée après backoff
+- incrémental : since = dernier ts stocké (bougie en cours re-upsertée) ;
+  si le trou dépasse `limit` bougies, on reprend les `limit` dernières
+  (même fenêtre que l'ancien fetch sans since)
+- AUCUNE écriture DB : les scripts appelants font 1 executemany / TF
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+import ccxt
+import ccxt.async_support as ccxt_async
+
+FETCH_CONCURRENCY = 8
+FETCH_RETRIES = 3
+BACKOFF_S = 1.0
+
+TF_MS = {
+    "1m": 60_000,
+    "3m": 180_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "30m": 1_800_000,
+}
+
+log = logging.getLogger("OHLCV_FETCH")
+
+
+def make_exchange(options=None):
+    return ccxt_async.bitget({
+        "enableRateLimit": True,
+        "options": options or {},
+    })
+
+
+def since_for(last_ts, tf, limit, now_ms=None):
+    """`since` pour reprendre après last_ts, ou None (dernières bougies)."""
+    if not last_ts:
+        return None
+    now_ms = now_ms or int(time.time() * 1000)
+    if now_ms - last_ts > limit * TF_MS[tf]:
+        return None
+    return int(last_ts)
+
+
+class FetchStats:
+    def __init__(self):
+        self.requests = 0
+        self.candles = 0
+        self.retries = 0
+        self.errors = 0
+        self.t0 = time.monotonic()
+
+    def summary(self):
+        dt = time.monotonic() - self.t0
+        return (
+            f"requests={self.requests} candles={self.candles} retries={self.retries} "
+            f"errors={self.errors} elapsed={dt:.1f}s ({self.requests / dt if dt > 0 else 0:.1f} req/s)"
+        )
+
+
+class Window:
+    """Sémaphore à capacité variable (AIMD) : réduit sur rate-limit."""
+
+    def __init__(self, cap):
+        self.max = cap
+        self.cap = cap
+        self.used = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.used < int(self.cap))
+            self.used += 1
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.used -= 1
+            self._cond.notify_all()
+
+    def ok(self):
+        self.cap = min(self.max, self.cap + 1 / max(self.cap, 1))
+
+    def throttled(self):
+        self.cap = max(1, self.cap / 2)
+
+
+async def _fetch_one(ex, win, stats, inst, tf, since, limit):
+    symbol = inst.replace("/", "")
+    for attempt in range(FETCH_RETRIES + 1):
+        async with win:
+            try:
+                stats.requests += 1
+                rows = await ex.fetch_ohlcv(symbol, timeframe=tf, since=since, limit=limit)
+                stats.candles += len(rows or [])
+                win.ok()
+                return rows or []
+            except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+                win.throttled()
+                err = e
+            except ccxt.NetworkError as e:
+                err = e
+            except Exception as e:
+                stats.errors += 1
+                log.error(f"{inst} {tf} fetch error: {e}")
+                return []
+        # backoff hors fenêtre : les autres requêtes continuent
+        if attempt < FETCH_RETRIES:
+            stats.retries += 1
+            await asyncio.sleep(BACKOFF_S * (2 ** attempt))
+    stats.errors += 1
+    log.error(f"{inst} {tf} fetch error (retries exhausted): {err}")
+    return []
+
+
+async def fetch_many(ex, jobs, concurrency=FETCH_CONCURRENCY, stats=None):
+    """jobs = [(inst, tf, since, limit)] -> {(inst, tf): [[ts,o,h,l,c,v], ...]}"""
+    stats = stats or FetchStats()
+    win = Window(concurrency)
+    res = await asyncio.gather(*(
+        _fetch_one(ex, win, stats, inst, tf, since, limit)
+        for inst, tf, since, limit in jobs
+    ))
+    return {(j[0], j[1]): r for j, r in zip(jobs, res)}
+
+
+def run_fetch(jobs, exchange=None, concurrency=FETCH_CONCURRENCY, options=None):
+    """Point d'entrée synchrone : ouvre / ferme l'exchange async."""
+    async def _run():
+        ex = exchange or make_exchange(options)
+        stats = FetchStats()
+        try:
+            out = await fetch_many(ex, jobs, concurrency, stats)
+        finally:
+            if exchange is None:
+                await ex.close()
+        log.info(f"[FETCH] {stats.summary()}")
+        return out
+
+    return asyncio.run(_run())
+
+
+def last_ts_map(c, table, ts_col="ts"):
+    """{instId: dernier ts} en une requête."""
+    return {
+        r[0]: r[1]
+        for r in c.execute(f"SELECT instId, MAX({ts_col}) FROM {table} GROUP BY instId")
+    }
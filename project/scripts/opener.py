@@ -13,13 +13,19 @@ UPGRADE (non-breaking):
   (et inversement). Sinon tu peux rester bloqué en pyramide_req à vie.
 """
 
-import time
 import logging
+from pathlib import Path
 
+from db_notify import Listener
 from opener_from_exec import ingest_exec_done
-from opener_ingest_open import ingest_open_req
+from opener_ingest_open import POOL, ingest_open_req
 from opener_pyramide import ingest_pyramide_req
 
+ROOT = Path("/opt/scalp/project")
+
+DB_GEST = ROOT / "data/gest.db"
+DB_EXEC = ROOT / "data/exec.db"
+
 LOG = "/opt/scalp/project/logs/opener.log"
 LOOP_SLEEP = 0.3
 
@@ -32,26 +38,35 @@ logging.basicConfig(
 log = logging.getLogger("OPENER")
 
 
+def cycle():
+    POOL.begin_loop(log)
+
+    # 🔑 ORDRE CRITIQUE
+    try:
+        ingest_exec_done()      # exec → opener
+    except Exception:
+        log.exception("[ERR] ingest_exec_done")
+
+    try:
+        ingest_open_req()       # gest → opener (open)
+    except Exception:
+        log.exception("[ERR] ingest_open_req")
+
+    try:
+        ingest_pyramide_req()   # gest → opener (pyramide)
+    except Exception:
+        log.exception("[ERR] ingest_pyramide_req")
+
+
 def main():
     log.info("[START] opener daemon")
+
+    # Réveil sur commit gest/exec (sinon timeout = LOOP_SLEEP).
+    listener = Listener("opener", (DB_GEST, DB_EXEC))
+
     while True:
-        # 🔑 ORDRE CRITIQUE
-        try:
-            ingest_exec_done()      # exec → opener
-        except Exception:
-            log.exception("[ERR] ingest_exec_done")
-
-        try:
-            ingest_open_req()       # gest → opener (open)
-        except Exception:
-            log.exception("[ERR] ingest_open_req")
-
-        try:
-            ingest_pyramide_req()   # gest → opener (pyramide)
-        except Exception:
-            log.exception("[ERR] ingest_pyramide_req")
-
-        time.sleep(LOOP_SLEEP)
+        cycle()
+        listener.wait(LOOP_SLEEP)
 
 
 if __name__ == "__main__":
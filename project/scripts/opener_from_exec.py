@@ -14,6 +14,8 @@ import sqlite3
 from pathlib import Path
 import logging
 
+from db_notify import ring_if_changed
+
 log = logging.getLogger("OPENER_ACK")
 
 ROOT = Path("/opt/scalp/project")
@@ -161,6 +163,7 @@ def _ack_open_done():
         except Exception:
             pass
     finally:
+        ring_if_changed(o, DB_OPENER)
         e.close()
         o.close()
 
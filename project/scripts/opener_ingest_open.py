@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import sqlite3
 import time
 import logging
 from pathlib import Path
 
 from opener_sizing import compute_ticket_qty, apply_contract_constraints
+from db_notify import ring_if_changed
+from db_utils import SCHEMA, ConnPool
 
 ROOT = Path("/opt/scalp/project")
 
@@ -18,12 +19,15 @@ DB_BUDGET    = ROOT / "data/budget.db"
 log = logging.getLogger("OPENER")
 
 
+# Handles longue durée : le cache schéma (SCHEMA) vit sur la connexion.
+# opener.db en écriture, le reste en lecture seule (begin_loop : opener.cycle).
+POOL = ConnPool()
+
+
 def conn(db):
-    c = sqlite3.connect(str(db), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL;")
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    if db == DB_OPENER:
+        return POOL.rw(db)
+    return POOL.ro(db)
 
 
 def now_ms():
@@ -31,8 +35,7 @@ def now_ms():
 
 
 def _table_columns(conn_, table):
-    rows = conn_.execute(f"PRAGMA table_info({table})").fetchall()
-    return {r["name"] for r in rows}
+    return SCHEMA.columns(conn_, table)
 
 
 def _f(x, d=0.0):
@@ -67,6 +70,35 @@ def _get_contract(k, instId):
     return k.execute("SELECT * FROM contracts WHERE symbol=? LIMIT 1", (sym,)).fetchone()
 
 
+def _build_open_req_query(g):
+    gest_cols = _table_columns(g, "gest")
+
+    # Compat schémas historiques/finals + fallback de valeur:
+    # - price_signal puis entry
+    # - score_C puis dec_score_C
+    # - score_S puis score_of
+    # - score_H puis score_force
+    # Important: sur schéma final, score_C/score_S/score_H peuvent exister
+    # mais rester NULL (ingest écrit dec_score_C/score_of/score_force).
+    # On force donc un COALESCE sur colonnes disponibles.
+    price_expr = _coalesce_expr(gest_cols, "price_signal", "entry")
+    score_c_expr = _coalesce_expr(gest_cols, "score_C", "dec_score_C")
+    score_s_expr = _coalesce_expr(gest_cols, "score_S", "score_of")
+    score_h_expr = _coalesce_expr(gest_cols, "score_H", "score_force")
+    step_expr = "step" if "step" in gest_cols else "0"
+
+    return f"""
+        SELECT uid, instId, side,
+               {price_expr} AS price_signal,
+               {score_c_expr} AS score_C,
+               {score_s_expr} AS score_S,
+               {score_h_expr} AS score_H,
+               {step_expr} AS step
+        FROM gest
+        WHERE status='open_req'
+    """
+
+
 def ingest_open_req():
     g = conn(DB_GEST)
     o = conn(DB_OPENER)
@@ -74,32 +106,8 @@ def ingest_open_req():
     b = conn(DB_BUDGET)
 
     try:
-        gest_cols = _table_columns(g, "gest")
-
-        # Compat schémas historiques/finals + fallback de valeur:
-        # - price_signal puis entry
-        # - score_C puis dec_score_C
-        # - score_S puis score_of
-        # - score_H puis score_force
-        # Important: sur schéma final, score_C/score_S/score_H peuvent exister
-        # mais rester NULL (ingest écrit dec_score_C/score_of/score_force).
-        # On force donc un COALESCE sur colonnes disponibles.
-        price_expr = _coalesce_expr(gest_cols, "price_signal", "entry")
-        score_c_expr = _coalesce_expr(gest_cols, "score_C", "dec_score_C")
-        score_s_expr = _coalesce_expr(gest_cols, "score_S", "score_of")
-        score_h_expr = _coalesce_expr(gest_cols, "score_H", "score_force")
-        step_expr = "step" if "step" in gest_cols else "0"
-
-        rows = g.execute(f"""
-            SELECT uid, instId, side,
-                   {price_expr} AS price_signal,
-                   {score_c_expr} AS score_C,
-                   {score_s_expr} AS score_S,
-                   {score_h_expr} AS score_H,
-                   {step_expr} AS step
-            FROM gest
-            WHERE status='open_req'
-        """).fetchall()
+        # COALESCE résolus une fois par version de schéma (plus de table_info par passe)
+        rows = g.execute(SCHEMA.query(g, "opener.open_req", _build_open_req_query)).fetchall()
 
         if not rows:
             return
@@ -127,12 +135,6 @@ def ingest_open_req():
 
             contract = _get_contract(k, instId)
             if not contract:
-                g.execute("""
-                    UPDATE gest
-                    SET skipped_reason='no_contract',
-                        ts_status_update=?
-                    WHERE uid=? AND status='open_stdby'
-                """, (now_ms(), uid))
                 log.info("[OPEN_SKIP] uid=%s inst=%s reason=no_contract", uid, instId)
                 continue
 
@@ -166,12 +168,6 @@ def ingest_open_req():
             qty_norm = _f(qty_norm, 0.0)
 
             if qty_norm <= 0:
-                g.execute("""
-                    UPDATE gest
-                    SET skipped_reason='min_trade_filter',
-                        ts_status_update=?
-                    WHERE uid=? AND status='open_stdby'
-                """, (now_ms(), uid))
                 log.info("[OPEN_SKIP] uid=%s inst=%s qty_ticket=%.10f price=%.10f",
                          uid, instId, _f(qty_ticket, 0.0), price)
                 continue
@@ -198,26 +194,13 @@ def ingest_open_req():
                 "open", step, ratio, _f(qty_ticket, 0.0), qty_norm, None
             ))
 
-            margin = (qty_norm * price / float(lev)) if float(lev) > 0 else 0.0
-
-            g.execute("""
-                UPDATE gest
-                SET qty=?,
-                    lev=?,
-                    margin=?,
-                    entry=?,
-                    ts_open=?,
-                    ts_status_update=?
-                WHERE uid=? AND status='open_stdby'
-            """, (qty_norm, float(lev), margin, price, ts_open, ts_open, uid))
-
             log.info("[OPEN_STDBY] uid=%s inst=%s side=%s qty=%.10f lev=%s step=%d budget=%.2f",
                      uid, instId, side, qty_norm, lev, step, budget_usdt)
 
         o.commit()
-        g.commit()
 
     finally:
+        ring_if_changed(o, DB_OPENER)
         g.close()
         o.close()
         k.close()
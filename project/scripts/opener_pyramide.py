@@ -9,6 +9,7 @@ import yaml
 from pathlib import Path
 
 from opener_sizing import apply_contract_constraints
+from db_notify import ring_if_changed
 
 ROOT = Path("/opt/scalp/project")
 
@@ -220,6 +221,8 @@ def ingest_pyramide_req():
         g.commit()
 
     finally:
+        ring_if_changed(o, DB_OPENER)
+        ring_if_changed(g, DB_GEST)
         g.close()
         o.close()
         cdb.close()
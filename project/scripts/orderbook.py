@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+orderbook.py — moteur carnet top-N (books5 Bitget) -> features orderflow
+
+- BookTable : 1 ligne par instId dans des tableaux numpy préalloués
+  (prix / tailles des DEPTH niveaux bid + ask, features), pas de dict par book
+- update() par message WS, O(DEPTH) :
+    microprice = (bid * ask_sz + ask * bid_sz) / (bid_sz + ask_sz)
+    imb_l1     = (bid_sz - ask_sz) / (bid_sz + ask_sz)          niveau 1
+    imbalance  = (Σbid_sz - Σask_sz) / (Σbid_sz + Σask_sz)      top-N
+    bid_slope / ask_slope = profondeur cumulée / distance (bps) du dernier niveau
+    ofi        = order flow imbalance (Cont) cumulé depuis la dernière matérialisation
+    imb_ema    = EMA de imbalance (IMB_ALPHA par update)
+- flush() : seules les lignes modifiées depuis le dernier flush -> ob_features
+  (REPLACE, 1 transaction portée par l'appelant)
+- v_orderflow_features / v_orderflow_bucket (orderflow.db) exposent
+  `imbalance` ; analytics.py / analytics_historical.py lisent
+  v_orderflow_bucket (lecture seule) pour historical_scores.of_bucket.
+  dec ne consomme pas encore ces features
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+DEPTH = 5
+IMB_ALPHA = 0.2
+
+FEATS = (
+    "ts_ms", "mid", "microprice", "spread_bps",
+    "imb_l1", "imbalance", "imb_ema",
+    "bid_depth", "ask_depth", "bid_slope", "ask_slope",
+    "ofi", "updates",
+)
+F = {k: i for i, k in enumerate(FEATS)}
+
+DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS ob_features (
+        instId TEXT PRIMARY KEY,
+        ts_ms INTEGER NOT NULL,
+        mid REAL,
+        microprice REAL,
+        spread_bps REAL,
+        imb_l1 REAL,
+        imbalance REAL,
+        imb_ema REAL,
+        bid_depth REAL,
+        ask_depth REAL,
+        bid_slope REAL,
+        ask_slope REAL,
+        ofi REAL,
+        updates INTEGER
+    )
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS v_orderflow_features AS
+    SELECT instId, ts_ms, mid, microprice, spread_bps,
+           imb_l1, imbalance, imb_ema,
+           bid_depth, ask_depth, bid_slope, ask_slope, ofi
+    FROM ob_features
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS v_orderflow_bucket AS
+    SELECT
+        instId,
+        CASE
+            WHEN imbalance >= 0.20 THEN 'strong_buy'
+            WHEN imbalance <= -0.20 THEN 'strong_sell'
+            ELSE 'neutral'
+        END AS of_bucket
+    FROM v_orderflow_features
+    """,
+)
+
+UPSERT = (
+    "REPLACE INTO ob_features(instId, " + ", ".join(FEATS) + ") VALUES ("
+    + ",".join("?" for _ in range(len(FEATS) + 1)) + ")"
+)
+
+
+def ensure_schema(c):
+    for ddl in DDL:
+        c.execute(ddl)
+
+
+def parse_levels(levels, depth=DEPTH):
+    """[["px","sz"], ...] Bitget -> [(px, sz)] float, tronqué à depth."""
+    return [(float(p), float(s)) for p, s, *_ in levels[:depth]]
+
+
+class BookTable:
+    def __init__(self, depth=DEPTH, capacity=256):
+        self.depth = depth
+        self.index = {}
+        self.inst = []
+        self.prev = []          # niveau 1 précédent (OFI), lu à chaque update
+        self.feat = None
+        self._alloc(capacity)
+
+    def _alloc(self, n):
+        d = self.depth
+        old = self.feat
+        levels = np.full((n, 4, d), np.nan)     # bid_px, bid_sz, ask_px, ask_sz
+        feat = np.zeros((n, len(FEATS)))
+        dirty = np.zeros(n, dtype=bool)
+        if old is not None:
+            k = len(self.inst)
+            levels[:k] = self.levels[:k]
+            feat[:k] = old[:k]
+            dirty[:k] = self.dirty[:k]
+        self.levels, self.feat, self.dirty = levels, feat, dirty
+        self.prev += [None] * (n - len(self.prev))
+
+    def row(self, inst):
+        i = self.index.get(inst)
+        if i is None:
+            i = len(self.inst)
+            if i == len(self.feat):
+                self._alloc(2 * i)
+            self.index[inst] = i
+            self.inst.append(inst)
+        return i
+
+    def update(self, inst, ts_ms, bids, asks):
+        """bids / asks : [(px, sz)] meilleurs niveaux d'abord (snapshot books5)."""
+        if not bids or not asks:
+            return False
+        i = self.row(inst)
+        n_b, n_a = len(bids), len(asks)
+
+        lv = self.levels[i]
+        lv.fill(np.nan)
+        lv[0, :n_b], lv[1, :n_b] = zip(*bids)
+        lv[2, :n_a], lv[3, :n_a] = zip(*asks)
+
+        bb, bs = bids[0]
+        ba, as_ = asks[0]
+        mid = (bb + ba) / 2
+        top = bs + as_
+        bid_depth = sum(s for _, s in bids)
+        ask_depth = sum(s for _, s in asks)
+        depth = bid_depth + ask_depth
+
+        imb = (bid_depth - ask_depth) / depth if depth > 0 else 0.0
+        d_bid = (mid - bids[-1][0]) / mid * 1e4 if mid > 0 else 0.0
+        d_ask = (asks[-1][0] - mid) / mid * 1e4 if mid > 0 else 0.0
+
+        f = self.feat[i]
+        prev = self.prev[i]
+        if prev is None:
+            ofi = 0.0
+            imb_ema = imb
+        else:
+            pbb, pbs, pba, pas = prev
+            e = 0.0
+            if bb >= pbb:
+                e += bs
+            if bb <= pbb:
+                e -= pbs
+            if ba <= pba:
+                e -= as_
+            if ba >= pba:
+                e += pas
+            ofi = f[F["ofi"]] + e
+            imb_ema = f[F["imb_ema"]] + IMB_ALPHA * (imb - f[F["imb_ema"]])
+        self.prev[i] = (bb, bs, ba, as_)
+
+        f[:] = (
+            ts_ms, mid,
+            (bb * as_ + ba * bs) / top if top > 0 else mid,
+            (ba - bb) / mid * 1e4 if mid > 0 else 0.0,
+            (bs - as_) / top if top > 0 else 0.0,
+            imb, imb_ema,
+            bid_depth, ask_depth,
+            bid_depth / d_bid if d_bid > 0 else 0.0,
+            ask_depth / d_ask if d_ask > 0 else 0.0,
+            ofi, f[F["updates"]] + 1,
+        )
+        self.dirty[i] = True
+        return True
+
+    def get(self, inst):
+        i = self.index.get(inst)
+        if i is None:
+            return None
+        return dict(zip(FEATS, self.feat[i].tolist()))
+
+    def flush(self, c):
+        """REPLACE des lignes modifiées ; ofi / updates repartent à 0 par fenêtre."""
+        idx = np.flatnonzero(self.dirty[:len(self.inst)])
+        if not len(idx):
+            return 0
+        rows = self.feat[idx].tolist()
+        c.executemany(UPSERT, [
+            (self.inst[i], int(r[0]), *r[1:-1], int(r[-1]))
+            for i, r in zip(idx.tolist(), rows)
+        ])
+        self.feat[idx, F["ofi"]] = 0.0
+        self.feat[idx, F["updates"]] = 0
+        self.dirty[idx] = False
+        return len(idx)
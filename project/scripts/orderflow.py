@@ -1,9 +1,25 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+"""
+ORDERFLOW — books5 Bitget -> orderflow.db (books1 + ob_features)
+
+- callback WS : parse + file (Queue) uniquement, jamais de SQLite
+- BookWriter : 1 connexion, 1 transaction par FLUSH_EVERY ; seul le
+  dernier book par instId de la fenêtre est écrit (coalescing)
+- carnet top-DEPTH tenu par orderbook.BookTable (features à chaque update),
+  matérialisé dans ob_features toutes les FEAT_EVERY s
+- subscribe / unsubscribe par frames de SUB_CHUNK args
+- v_active_coins relu toutes les REFRESH_EVERY s : resubscribe à chaud
+- compteurs reçus / écrits loggés toutes les STATS_EVERY s
+"""
+
 import sqlite3, json, time, threading, logging, traceback
+from queue import Queue, Empty, Full
 import websocket
 
+from orderbook import BookTable, ensure_schema, parse_levels
+
 ROOT = "/opt/scalp/project"
 DB_G = f"{ROOT}/data/gest.db"
 DB_OF = f"{ROOT}/data/orderflow.db"
@@ -48,18 +64,121 @@ def load_active_coins():
         return set()
 
 
+# ============================================================
+# BOOK WRITER (thread unique, coalescing)
+# ============================================================
+QUEUE_MAX = 20000
+FLUSH_EVERY = 0.25
+FEAT_EVERY = 1.0
+STATS_EVERY = 60.0
+
+
+class BookWriter(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.q = Queue(maxsize=QUEUE_MAX)
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.feat_rows = 0
+        self.book = BookTable()
+
+    def put(self, row):
+        self.received += 1
+        try:
+            self.q.put_nowait(row)
+        except Full:
+            self.dropped += 1
+
+    def apply(self, pending, inst, ts, bids, asks):
+        self.book.update(inst, ts, bids, asks)
+        prev = pending.get(inst)
+        if prev is None or ts >= prev[1]:
+            bb, bs = bids[0] if bids else (None, None)
+            ba, as_ = asks[0] if asks else (None, None)
+            pending[inst] = (inst, ts, bb, ba, bs, as_)
+
+    def flush(self, c, pending, feats):
+        if not pending and not feats:
+            return
+        try:
+            c.execute("BEGIN")
+            c.executemany("""
+                REPLACE INTO books1(instId, ts_ms, best_bid, best_ask, bid_size, ask_size)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, list(pending.values()))
+            n_feat = self.book.flush(c) if feats else 0
+            c.execute("COMMIT")
+            self.written += len(pending)
+            self.feat_rows += n_feat
+            self.flushes += 1
+        except Exception as e:
+            c.execute("ROLLBACK")
+            log.error(f"[ERR] flush {e}")
+        pending.clear()
+
+    def run(self):
+        c = conn(DB_OF)
+        ensure_schema(c)
+        pending = {}
+        last_flush = last_feat = time.time()
+        last_stats = last_flush
+        mark = (0, 0)
+
+        while True:
+            timeout = max(0.0, FLUSH_EVERY - (time.time() - last_flush))
+            try:
+                self.apply(pending, *self.q.get(timeout=timeout))
+            except Empty:
+                pass
+
+            now = time.time()
+            if now - last_flush >= FLUSH_EVERY:
+                feats = now - last_feat >= FEAT_EVERY
+                self.flush(c, pending, feats)
+                last_flush = now
+                if feats:
+                    last_feat = now
+
+            if now - last_stats >= STATS_EVERY:
+                rec, wr = self.received - mark[0], self.written - mark[1]
+                log.info(
+                    f"[STATS] received={rec} written={wr} "
+                    f"coalesced={rec - wr - self.q.qsize()} dropped={self.dropped} "
+                    f"flushes={self.flushes} feat_rows={self.feat_rows} ({rec / (now - last_stats):.1f} msg/s)"
+                )
+                mark = (self.received, self.written)
+                last_stats = now
+
+
 # ============================================================
 # ORDERFLOW CLIENT
 # ============================================================
 BITGET_WS = "wss://ws.bitget.com/v2/ws/public"
+BOOK_CHANNEL = "books5"
+SUB_CHUNK = 10          # args par frame subscribe / unsubscribe
+SUB_INTERVAL = 0.1      # Bitget : max 10 messages / s
+REFRESH_EVERY = 10.0
+
+
+def book_arg(inst):
+    return {
+        "instType": "USDT-FUTURES",
+        "channel": BOOK_CHANNEL,
+        "instId": inst,
+        "debounce": "true"
+    }
 
 
 class OrderFlowClient:
-    def __init__(self):
+    def __init__(self, writer=None):
         self.ws = None
         self.active = load_active_coins()
         self.last_refresh = time.time()
         self.subscribed = False
+        self.sub_lock = threading.Lock()
+        self.writer = writer or BookWriter()
 
     # -----------------------------------------
     # WS CALLBACK : open
@@ -93,31 +212,12 @@ class OrderFlowClient:
             inst = instId.replace("/", "")
             snapshot = data["data"][0]
 
-            best_bid = None
-            best_ask = None
-            bid_size = None
-            ask_size = None
-
-            bids = snapshot.get("bids", [])
-            asks = snapshot.get("asks", [])
-
-            if bids:
-                best_bid = float(bids[0][0])
-                bid_size = float(bids[0][1])
-
-            if asks:
-                best_ask = float(asks[0][0])
-                ask_size = float(asks[0][1])
-
+            bids = parse_levels(snapshot.get("bids", []))
+            asks = parse_levels(snapshot.get("asks", []))
             ts = int(snapshot["ts"])
 
-            # save into DB
-            c = conn(DB_OF)
-            c.execute("""
-                REPLACE INTO books1(instId, ts_ms, best_bid, best_ask, bid_size, ask_size)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (inst, ts, best_bid, best_ask, bid_size, ask_size))
-            c.commit()
+            # writer thread : carnet + coalescing + 1 transaction par flush
+            self.writer.put((inst, ts, bids, asks))
 
         except Exception as e:
             log.error(f"[ERR] on_message {e} {traceback.format_exc()}")
@@ -133,36 +233,67 @@ class OrderFlowClient:
     # -----------------------------------------
     def on_close(self, ws, *args):
         log.warning("WS CLOSED")
+        self.subscribed = False
 
     # -----------------------------------------
     # SUBSCRIBE ALL ACTIVE COINS
     # -----------------------------------------
+    def send_op(self, op, insts):
+        insts = sorted(insts)
+        for i in range(0, len(insts), SUB_CHUNK):
+            chunk = insts[i:i + SUB_CHUNK]
+            try:
+                self.ws.send(json.dumps({"op": op, "args": [book_arg(x) for x in chunk]}))
+                log.info(f"[{op.upper()}] {','.join(chunk)}")
+            except Exception as e:
+                log.error(f"[ERR] {op} {chunk} {e}")
+                return False
+            time.sleep(SUB_INTERVAL)
+        return True
+
     def subscribe_all(self):
         if not self.active:
             log.warning("[SUB] No active coins to subscribe")
             return
 
-        for inst in self.active:
-            req = {
-                "op": "subscribe",
-                "args": [{
-                    "instType": "USDT-FUTURES",
-                    "channel": "books1",
-                    "instId": inst,
-                    "debounce": "true"
-                }]
-            }
+        with self.sub_lock:
+            self.send_op("subscribe", self.active)
 
+    # -----------------------------------------
+    # RESUBSCRIBE ON v_active_coins CHANGE
+    # -----------------------------------------
+    def refresh_active(self):
+        coins = load_active_coins()
+        with self.sub_lock:
+            add = coins - self.active
+            rm = self.active - coins
+            if not add and not rm:
+                return
+            self.active = coins
+            if not self.subscribed:
+                return  # on_open abonnera self.active
+            if rm:
+                self.send_op("unsubscribe", rm)
+            if add:
+                self.send_op("subscribe", add)
+        log.info(f"[RESUB] +{len(add)} -{len(rm)} → {len(coins)} coins")
+
+    def refresh_loop(self):
+        while True:
+            time.sleep(REFRESH_EVERY)
             try:
-                self.ws.send(json.dumps(req))
-                log.info(f"[SUB] {inst}")
+                self.refresh_active()
+                self.last_refresh = time.time()
             except Exception as e:
-                log.error(f"[ERR] subscribe {inst} {e}")
+                log.error(f"[ERR] refresh_active {e}")
 
     # -----------------------------------------
     # MAIN LOOP
     # -----------------------------------------
     def run(self):
+        self.writer.start()
+        threading.Thread(target=self.refresh_loop, daemon=True).start()
+
         while True:
             try:
                 self.ws = websocket.WebSocketApp(
@@ -12,15 +12,30 @@ RÈGLES :
 - exec = source de vérité (ledger)
 - recorder = 1 ligne / trade
 - recorder_steps = N lignes / trade (1 par step exec)
+
+INGESTION PAR WATERMARK :
+- gest.close_done relus depuis le watermark ts_status_update (index
+  gest(status, ts_status_update)), avec OVERLAP_MS de recouvrement
+  (horodatage SQL à la seconde, commit après l'UPDATE) ; uids déjà
+  présents dans recorder écartés en 1 requête par lot
+- rescan complet des close_done au démarrage puis toutes les RESYNC_S
+  (ts_status_update NULL, reprise après arrêt)
+- lots de BATCH uids : 1 requête par DB et par lot, recorder +
+  recorder_steps écrits par executemany dans UNE transaction ; lot en
+  échec -> repli uid par uid, uids en erreur retentés au cycle suivant
+- 1 handle par DB (ConnPool), colonnes recorder / exec en cache par
+  schema_version
+- [STATS] toutes les STATS_EVERY_S : trades/s et latence fill de
+  clôture -> recorded (p50 / p95 / max)
 """
 
-import sqlite3
 import time
 import logging
 import traceback
 from pathlib import Path
 
-from db_utils import ensure_column
+from db_utils import SCHEMA, ConnPool, ensure_column
+from db_notify import Listener, ring_if_changed
 
 # ============================================================
 # PATHS
@@ -36,6 +51,11 @@ DB_REC  = ROOT / "data/recorder.db"
 LOG = ROOT / "logs/recorder.log"
 SLEEP = 0.5
 
+OVERLAP_MS    = 5_000     # recouvrement de la relecture gest
+RESYNC_S      = 300       # rescan complet des close_done
+BATCH         = 200       # uids par lot (IN (...) / transaction)
+STATS_EVERY_S = 60
+
 logging.basicConfig(
     filename=str(LOG),
     level=logging.INFO,
@@ -43,6 +63,13 @@ logging.basicConfig(
 )
 log = logging.getLogger("RECORDER")
 
+# Handles longue durée (1 par DB et par process)
+POOL = ConnPool()
+
+# watermark gest (None = rescan complet), uids en erreur à retenter
+STATE = {"wm": None, "resync": 0.0, "retry": set()}
+STATS = {"n": 0, "lat_ms": [], "t": time.monotonic()}
+
 # ============================================================
 # UTILS
 # ============================================================
@@ -50,12 +77,23 @@ log = logging.getLogger("RECORDER")
 def now_ms():
     return int(time.time() * 1000)
 
+def _ensure_recorder(c):
+    # colonnes ajoutées 1 fois par handle (ALTER -> réouverture par begin_loop)
+    if "recorder" in SCHEMA.objects(c):
+        ensure_recorder_schema(c)
+
 def conn(db):
-    c = sqlite3.connect(str(db), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL;")
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    if Path(db) == DB_REC:
+        return POOL.rw(db, isolation_level=None, synchronous="NORMAL",
+                       on_open=_ensure_recorder)
+    return POOL.ro(db, isolation_level=None)
+
+def marks(uids):
+    return ",".join("?" * len(uids))
+
+def chunks(seq, n):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
 
 def rget(row, key, default=None):
     try:
@@ -144,8 +182,6 @@ def ensure_recorder_steps():
             PRIMARY KEY (uid, step)
         );
     """)
-    c.commit()
-    c.close()
 
 # ============================================================
 # LOAD PNL (SOURCE DE VÉRITÉ)
@@ -166,107 +202,117 @@ def ensure_trade_lineage_view():
             r.pnl_net
         FROM recorder r
     """)
-    c.commit()
-    c.close()
 
 
-def validate_uid_lineage(uid, check_recorder=False):
-    if not uid:
+def validate_uid_lineage(t, r, uids):
+    """trigger / gest / recorder : même uid pour tout le lot (avant COMMIT)."""
+    if not uids:
         return
 
-    t_uid = uid
-    with conn(DB_TRIG) as t:
-        tr = t.execute("SELECT uid FROM triggers WHERE uid=? LIMIT 1", (uid,)).fetchone()
-        if tr and tr["uid"]:
-            t_uid = tr["uid"]
+    found_t = {x["uid"] for x in t.execute(
+        f"SELECT uid FROM triggers WHERE uid IN ({marks(uids)})", uids)}
+    found_r = {x["uid"] for x in r.execute(
+        f"SELECT uid FROM recorder WHERE uid IN ({marks(uids)})", uids)}
 
-    with conn(DB_GEST) as g:
-        gr = g.execute("SELECT uid FROM gest WHERE uid=? LIMIT 1", (uid,)).fetchone()
-        g_uid = gr["uid"] if gr else uid
+    # triggers.uid / recorder.uid (PK) : aucun uid hors lot, toutes les lignes recorder écrites
+    t_uid = found_t - set(uids)
+    r_uid = set(uids) - found_r
+    assert not t_uid and not r_uid, f"UID lineage mismatch: trigger={sorted(t_uid)} recorder={sorted(r_uid)}"
 
-    if check_recorder:
-        with conn(DB_REC) as r:
-            rr = r.execute("SELECT uid FROM recorder WHERE uid=? LIMIT 1", (uid,)).fetchone()
-            r_uid = rr["uid"] if rr else uid
-    else:
-        r_uid = uid
-
-    assert t_uid == g_uid == r_uid, f"UID lineage mismatch: trigger={t_uid} gest={g_uid} recorder={r_uid}"
-
-def load_trade_metrics(uid):
-    c = conn(DB_EXEC)
-
-    pnl_cols = table_columns(c, "v_exec_pnl_uid")
-    pnl_col = "pnl_realized"
+def _pnl_col(e):
+    pnl_cols = table_columns(e, "v_exec_pnl_uid")
     for candidate in ("pnl_realized", "pnl_net", "pnl"):
         if candidate in pnl_cols:
-            pnl_col = candidate
-            break
+            return candidate
+    return "pnl_realized"
 
-    pnl_row = c.execute(
+def load_trade_metrics(e, uids):
+    """{uid: métriques} pour le lot (v_exec_pnl_uid + coûts du ledger)."""
+    pnl_col = SCHEMA.query(e, "recorder_pnl_col", _pnl_col)
+
+    pnl = {x["uid"]: x["pnl_realized"] for x in e.execute(
         f"""
-        SELECT {pnl_col} AS pnl_realized
+        SELECT uid, {pnl_col} AS pnl_realized
         FROM v_exec_pnl_uid
-        WHERE uid=?
+        WHERE uid IN ({marks(uids)})
     """,
-        (uid,),
-    ).fetchone()
+        uids,
+    )}
 
-    cost_row = c.execute("""
+    # +status : index uid plutôt que status
+    cost = {x["uid"]: x for x in e.execute(f"""
         SELECT
+            uid,
             SUM(CASE WHEN exec_type IN ('open','pyramide') THEN qty ELSE 0 END) AS qty_in,
             SUM(CASE WHEN exec_type IN ('open','pyramide') THEN qty * price_exec ELSE 0 END) AS notional_in,
             SUM(COALESCE(fee, 0.0)) AS fee_total
         FROM exec
-        WHERE uid=?
-          AND status='done'
-    """, (uid,)).fetchone()
-
-    c.close()
-
-    pnl_realized = float(pnl_row["pnl_realized"]) if pnl_row and pnl_row["pnl_realized"] is not None else 0.0
-    qty_in = float(cost_row["qty_in"]) if cost_row and cost_row["qty_in"] is not None else 0.0
-    notional_in = float(cost_row["notional_in"]) if cost_row and cost_row["notional_in"] is not None else 0.0
-    fee_total = float(cost_row["fee_total"]) if cost_row and cost_row["fee_total"] is not None else 0.0
-    pnl_pct = (pnl_realized / notional_in * 100.0) if notional_in > 0 else 0.0
-
-    return {
-        "pnl_realized": pnl_realized,
-        "pnl_pct": pnl_pct,
-        "fee_total": fee_total,
-        "qty_in": qty_in,
-        "notional_in": notional_in,
-    }
+        WHERE uid IN ({marks(uids)})
+          AND +status='done'
+        GROUP BY uid
+    """, uids)}
+
+    out = {}
+    for uid in uids:
+        pnl_row = pnl.get(uid)
+        cost_row = cost.get(uid)
+        pnl_realized = float(pnl_row) if pnl_row is not None else 0.0
+        qty_in = float(cost_row["qty_in"]) if cost_row and cost_row["qty_in"] is not None else 0.0
+        notional_in = float(cost_row["notional_in"]) if cost_row and cost_row["notional_in"] is not None else 0.0
+        fee_total = float(cost_row["fee_total"]) if cost_row and cost_row["fee_total"] is not None else 0.0
+        pnl_pct = (pnl_realized / notional_in * 100.0) if notional_in > 0 else 0.0
+
+        out[uid] = {
+            "pnl_realized": pnl_realized,
+            "pnl_pct": pnl_pct,
+            "fee_total": fee_total,
+            "qty_in": qty_in,
+            "notional_in": notional_in,
+        }
+    return out
 
 # ============================================================
 # FETCH FINAL TRADES FROM GEST
 # ============================================================
 
-def fetch_close_done_uids():
-    c = conn(DB_GEST)
-    rows = c.execute("""
-        SELECT DISTINCT uid
+def fetch_close_done_uids(g, since_ms=None):
+    """close_done (uid, ts_status_update) ; tous si since_ms est None."""
+    if since_ms is None:
+        return g.execute("""
+            SELECT uid, ts_status_update
+            FROM gest
+            WHERE status='close_done'
+        """).fetchall()
+    return g.execute("""
+        SELECT uid, ts_status_update
         FROM gest
         WHERE status='close_done'
-    """).fetchall()
-    c.close()
-    return rows
-
-def load_gest_uid_rows(uid):
-    c = conn(DB_GEST)
-    rows = c.execute("""
+          AND ts_status_update >= ?
+    """, (since_ms,)).fetchall()
+
+def not_recorded(r, uids):
+    out = []
+    for chunk in chunks(uids, BATCH):
+        have = {x["uid"] for x in r.execute(
+            f"SELECT uid FROM recorder WHERE uid IN ({marks(chunk)})", chunk)}
+        out.extend(u for u in chunk if u not in have)
+    return out
+
+def load_gest_uid_rows(g, uids):
+    rows = {}
+    for x in g.execute(f"""
         SELECT *
         FROM gest
-        WHERE uid=?
+        WHERE uid IN ({marks(uids)})
         ORDER BY
+            uid,
             COALESCE(step, 0) ASC,
             COALESCE(ts_updated, ts_status_update, ts_signal, 0) ASC
-    """, (uid,)).fetchall()
-    c.close()
+    """, uids):
+        rows.setdefault(x["uid"], []).append(x)
     return rows
 
-def build_uid_snapshot(uid):
-    rows = load_gest_uid_rows(uid)
+def build_uid_snapshot(uid, rows):
     if not rows:
         return None
 
@@ -386,18 +432,16 @@ def normalize_required(col, v):
 # RECORD STEPS (EXEC -> recorder_steps)
 # ============================================================
 
-def record_steps(uid):
-    e = conn(DB_EXEC)
-    r = conn(DB_REC)
-
-    exec_cols = table_columns(e, "exec")
+def load_steps(e, uids):
+    """Lignes recorder_steps du lot, dans l'ordre (uid, step)."""
+    exec_cols = SCHEMA.columns(e, "exec")
 
     def sel(col, alias, fallback="NULL"):
         if col in exec_cols:
             return f"{col} AS {alias}"
         return f"{fallback} AS {alias}"
 
-    rows = e.execute(f"""
+    return e.execute(f"""
         SELECT
             uid,
             step,
@@ -413,13 +457,35 @@ def record_steps(uid):
             {sel('mae_atr', 'mae_atr')},
             {sel('golden', 'golden', '0')}
         FROM exec
-        WHERE uid=?
-          AND status='done'
-        ORDER BY step
-    """, (uid,)).fetchall()
+        WHERE uid IN ({marks(uids)})
+          AND +status='done'
+        ORDER BY uid, step
+    """, uids).fetchall()
+
+# ============================================================
+# RECORD TRADES (GEST -> recorder, lot en 1 transaction)
+# ============================================================
 
-    for x in rows:
-        r.execute("""
+def record_batch(t, e, r, snaps):
+    uids = [g["uid"] for g in snaps]
+    metrics = load_trade_metrics(e, uids)
+    steps = load_steps(e, uids)
+
+    rec_cols = sorted(SCHEMA.columns(r, "recorder"))
+    ts_rec = now_ms()
+    rows = [
+        [normalize_required(col, build_value_for_column(col, g, metrics[g["uid"]], ts_rec))
+         for col in rec_cols]
+        for g in snaps
+    ]
+
+    r.execute("BEGIN IMMEDIATE")
+    try:
+        r.executemany(
+            f"INSERT INTO recorder ({','.join(rec_cols)}) VALUES ({marks(rec_cols)})",
+            rows,
+        )
+        r.executemany("""
             INSERT OR IGNORE INTO recorder_steps (
                 uid, step,
                 exec_type, reason,
@@ -427,94 +493,118 @@ def record_steps(uid):
                 sl_be, sl_trail, tp_dyn,
                 mfe_atr, mae_atr, golden
             ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """, (
-            x["uid"],
-            x["step"],
-            x["exec_type"],
-            x["reason"],
-            x["price_exec"],
-            x["qty"],
-            x["ts_exec"],
-            x["sl_be"],
-            x["sl_trail"],
-            x["tp_dyn"],
-            x["mfe_atr"],
-            x["mae_atr"],
-            x["golden"]
-        ))
-
-    r.commit()
-    e.close()
-    r.close()
-
-# ============================================================
-# RECORD TRADE (GEST -> recorder)
-# ============================================================
-
-def record_trade(g):
-    uid = rget(g, "uid")
-    if not uid:
-        return
-
-    c = conn(DB_REC)
-    if c.execute("SELECT 1 FROM recorder WHERE uid=?", (uid,)).fetchone():
-        c.close()
-        return
-
-    ensure_recorder_schema(c)
-    rec_cols = table_columns(c, "recorder")
-    c.close()
-
-    validate_uid_lineage(uid, check_recorder=False)
+        """, [tuple(x) for x in steps])
+        validate_uid_lineage(t, r, uids)
+        r.execute("COMMIT")
+    except BaseException:
+        r.execute("ROLLBACK")
+        raise
+
+    # latence : dernier fill du ledger -> ligne recorder
+    last_fill = {}
+    for x in steps:
+        if x["ts_exec"] is not None:
+            last_fill[x["uid"]] = max(last_fill.get(x["uid"], 0), int(x["ts_exec"]))
+    for uid in uids:
+        m = metrics[uid]
+        STATS["n"] += 1
+        if uid in last_fill:
+            STATS["lat_ms"].append(ts_rec - last_fill[uid])
+        log.info(
+            "[RECORDED] %s pnl=%+.6f pct=%+.4f fee=%.6f (steps copied)",
+            uid,
+            m["pnl_realized"],
+            m["pnl_pct"],
+            m["fee_total"],
+        )
+
+def record_uids(g, t, e, r, uids):
+    """Enregistre un lot ; repli uid par uid si le lot échoue. Retourne les uids en erreur."""
+    rows = load_gest_uid_rows(g, uids)
+    snaps = [s for s in (build_uid_snapshot(uid, rows.get(uid)) for uid in uids) if s]
+    if not snaps:
+        return set()
 
-    metrics = load_trade_metrics(uid)
-    ts_rec = now_ms()
+    try:
+        record_batch(t, e, r, snaps)
+        return set()
+    except Exception:
+        if len(snaps) > 1:
+            log.warning("[BATCH] lot de %d en échec, repli uid par uid", len(snaps))
 
-    values = []
-    for col in rec_cols:
-        v = build_value_for_column(col, g, metrics, ts_rec)
-        v = normalize_required(col, v)
-        values.append(v)
+    failed = set()
+    for snap in snaps:
+        try:
+            record_batch(t, e, r, [snap])
+        except Exception:
+            log.error("[ERR] uid=%s\n%s", snap["uid"], traceback.format_exc())
+            failed.add(snap["uid"])
+    return failed
 
-    placeholders = ",".join(["?"] * len(rec_cols))
-    col_list = ",".join(rec_cols)
+def ingest():
+    g = conn(DB_GEST)
+    t = conn(DB_TRIG)
+    e = conn(DB_EXEC)
+    r = conn(DB_REC)
 
-    c = conn(DB_REC)
-    c.execute(f"INSERT INTO recorder ({col_list}) VALUES ({placeholders})", values)
-    c.commit()
-    c.close()
+    now = time.monotonic()
+    full = STATE["wm"] is None or now - STATE["resync"] >= RESYNC_S
+    closed = fetch_close_done_uids(g, None if full else STATE["wm"] - OVERLAP_MS)
 
-    validate_uid_lineage(uid, check_recorder=True)
-    record_steps(uid)
+    wm = max([STATE["wm"] or 0] + [x["ts_status_update"] or 0 for x in closed])
+    uids = list(dict.fromkeys([x["uid"] for x in closed] + sorted(STATE["retry"])))
 
-    log.info(
-        "[RECORDED] %s pnl=%+.6f pct=%+.4f fee=%.6f (steps copied)",
-        uid,
-        metrics["pnl_realized"],
-        metrics["pnl_pct"],
-        metrics["fee_total"],
-    )
+    failed = set()
+    try:
+        for chunk in chunks(not_recorded(r, uids), BATCH):
+            failed |= record_uids(g, t, e, r, chunk)
+    finally:
+        ring_if_changed(r, DB_REC)
+
+    STATE["wm"] = wm
+    STATE["retry"] = failed
+    if full:
+        STATE["resync"] = now
+        log.info("[RESYNC] close_done=%d watermark=%d retry=%d", len(closed), wm, len(failed))
+
+def log_stats(force=False):
+    now = time.monotonic()
+    dt = now - STATS["t"]
+    if dt < STATS_EVERY_S and not force:
+        return
+    lat = sorted(STATS["lat_ms"])
+    if lat:
+        p50, p95, pmax = lat[len(lat) // 2], lat[int(0.95 * (len(lat) - 1))], lat[-1]
+        log.info("[STATS] recorded=%d rate=%.2f/s close->recorded ms p50=%d p95=%d max=%d",
+                 STATS["n"], STATS["n"] / max(dt, 1e-9), p50, p95, pmax)
+    else:
+        log.info("[STATS] recorded=%d rate=%.2f/s", STATS["n"], STATS["n"] / max(dt, 1e-9))
+    STATS.update(n=0, lat_ms=[], t=now)
 
 # ============================================================
 # MAIN
 # ============================================================
 
+def cycle():
+    POOL.begin_loop(log)
+    try:
+        ingest()
+    except Exception:
+        log.error("[ERR]\n%s", traceback.format_exc())
+    log_stats()
+
+
 def main():
-    log.info("[START] recorder FINAL (with steps)")
+    log.info("[START] recorder FINAL (with steps, watermark)")
     ensure_recorder_steps()
     ensure_trade_lineage_view()
 
+    # Réveil sur commit gest (close_done), sinon SLEEP comme avant
+    listener = Listener("recorder", (DB_GEST,))
+
     while True:
-        try:
-            for x in fetch_close_done_uids():
-                uid = rget(x, "uid")
-                g = build_uid_snapshot(uid)
-                if not g:
-                    continue
-                record_trade(g)
-        except Exception:
-            log.error("[ERR]\n%s", traceback.format_exc())
-        time.sleep(SLEEP)
+        cycle()
+        listener.wait(SLEEP)
 
 if __name__ == "__main__":
     main()
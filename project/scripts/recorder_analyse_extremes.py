@@ -7,12 +7,16 @@ RECORDER — ANALYSE DES EXTREMES (BEST / WORST TRADE)
 - Lecture seule recorder.db
 - Reconstruction FSM complète
 - Focus MFE / MAE / sorties
+- Chemin de prix complet du trade depuis l'archive ticks (tick_archive)
 """
 
 import sqlite3
 from pathlib import Path
 
+from tick_archive import TickArchive
+
 DB = Path("/opt/scalp/project/data/recorder.db")
+ARCH = TickArchive()
 
 # ============================================================
 # UTILS
@@ -88,6 +92,22 @@ def analyse_trade(label, r):
     print(f"Nb pyramide    : {r['nb_pyramide']}")
     print(f"Sortie finale  : {r['reason_close']}")
 
+    # --------------------------------------------------------
+    # CHEMIN TICKS (archive complète, pas le ring ticks_hist)
+    # --------------------------------------------------------
+
+    if r["ts_open"] and r["ts_close"]:
+        w = ARCH.window(r["instId"], r["ts_open"], r["ts_close"])
+        if len(w.ts):
+            p0 = float(w.px[0])
+            up = (float(w.px.max()) - p0) / p0 * 100
+            dn = (float(w.px.min()) - p0) / p0 * 100
+            fav, adv = (up, dn) if r["side"] == "buy" else (-dn, -up)
+            print(f"Ticks archive  : {len(w.ts)} ticks")
+            print(f"MFE / MAE (%)  : {fmt(fav, 3)} / {fmt(adv, 3)}")
+        else:
+            print("Ticks archive  : NA")
+
     # --------------------------------------------------------
     # FSM DETAIL
     # --------------------------------------------------------
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+REPLAY — backtest déterministe de la chaîne FSM sur ticks archivés
+
+- bac à sable : copie des DB de --src (t.db / b.db / dec.db, contracts,
+  budget...), tables d'état FSM vidées ; DB absente -> créée depuis
+  schema_ref.sql
+- les modules de scripts/ sont importés tels quels : chemins
+  /opt/scalp/project/... réécrits vers le bac à sable, module time remplacé
+  par une horloge simulée (time / monotonic = horloge du replay, sleep no-op)
+- flux : ticks de l'archive binaire (tick_archive) fusionnés par ts ;
+  par pas STEP_MS = ticks.flush dans t.db (ticks + ticks_hist + HistRing,
+  comme le writer live), ticks_live / snap_ticks + dec_score recalculés
+  dans dec.db toutes les DEC_EVERY_MS
+- daemons appelés par leur cycle() au rythme prod (LOOP_SLEEP de chacun),
+  ordre fixe : triggers → gest → opener → exec → mfe_mae → follower →
+  closer → recorder ; 1 process, 1 thread, aucun sleep
+- cycle échu sauté si aucune DB lue par l'étage n'a bougé depuis le début
+  de son dernier passage (PRAGMA data_version, comme fsm_fused.Version) : sans
+  entrée nouvelle un cycle ne fait rien, le résultat est identique
+  (--no-skip pour comparer) ; triggers (TTL), mfe_mae (flush) et follower
+  (timeouts) dépendent de l'horloge et tournent toujours
+- dec.db : snap_ctx / snap_range = instantané de --src (la chaîne A/ctx
+  n'est pas rejouée), seuls les prix évoluent
+- sortie : recorder.db du bac à sable (+ --csv), événements simulés / s,
+  ms par daemon
+"""
+
+from __future__ import annotations
+
+import argparse
+import calendar
+import csv
+import importlib
+import logging
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time as _time
+from pathlib import Path
+
+import numpy as np
+
+PROD_ROOT = "/opt/scalp/project"
+SCRIPTS = Path(__file__).resolve().parent
+SCHEMA_REF = SCRIPTS.parent / "schema_ref.sql"
+
+STEP_MS = 250               # = ticks.FLUSH_DELAY
+DEC_EVERY_MS = 2000         # = dec_writer.LOOP_SLEEP
+CHUNK_MS = 3_600_000        # ticks chargés par tranche d'1h
+
+FEED_DBS = ("t", "dec", "b", "contracts", "budget")
+STATE_DBS = ("triggers", "gest", "opener", "exec", "follower", "closer", "recorder", "mfe_mae")
+
+# (module, fonction de cycle, attribut de période en s) — ordre de la chaîne
+STAGES = (
+    ("triggers", "cycle", "ENGINE_SLEEP"),
+    ("gest", "cycle", "LOOP_SLEEP"),
+    ("opener", "cycle", "LOOP_SLEEP"),
+    ("exec", "cycle", "LOOP_SLEEP"),
+    ("mfe_mae", "cycle", "LOOP_SLEEP"),
+    ("follower", "cycle", None),            # listener.wait(1.0)
+    ("closer", "cycle", None),              # listener.wait(0.2)
+    ("recorder", "cycle", "SLEEP"),
+)
+DEFAULT_PERIOD = {"follower": 1.0, "closer": 0.2}
+
+# DB lues par étage (la sienne comprise) ; absent = dépend de l'horloge
+STAGE_INPUTS = {
+    "gest": ("gest", "triggers", "dec", "follower", "opener", "closer"),
+    "opener": ("opener", "gest", "exec", "contracts", "budget"),
+    "exec": ("exec", "t", "opener", "closer"),
+    "closer": ("closer", "gest", "exec"),
+    "recorder": ("recorder", "gest", "triggers", "exec"),
+}
+
+
+# =========================================================
+# HORLOGE SIMULÉE
+# =========================================================
+class SimClock:
+    """Remplace le module time des daemons ; le reste est délégué au vrai module."""
+
+    def __init__(self, t_ms=0):
+        self.ms = int(t_ms)
+
+    def time(self):
+        return self.ms / 1000.0
+
+    def time_ns(self):
+        return self.ms * 1_000_000
+
+    def monotonic(self):
+        return self.ms / 1000.0
+
+    def sleep(self, s):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(_time, name)
+
+
+class DataVersions:
+    """PRAGMA data_version des DB du bac à sable (1 connexion RO gardée par DB).
+
+    La valeur ne bouge que sur un commit d'une autre connexion : daemons,
+    feed et refresh_dec écrivent tous par leurs propres connexions.
+    """
+
+    def __init__(self, data, names):
+        self.c = {n: sqlite3.connect(f"file:{data / f'{n}.db'}?mode=ro", uri=True,
+                                     isolation_level=None) for n in names}
+        self.cache = {}
+
+    def get(self, name):
+        v = self.cache.get(name)
+        if v is None:
+            v = self.cache[name] = self.c[name].execute("PRAGMA data_version").fetchone()[0]
+        return v
+
+    def snapshot(self, names):
+        return tuple(self.get(n) for n in names)
+
+    def invalidate(self):
+        self.cache.clear()
+
+    def close(self):
+        for c in self.c.values():
+            c.close()
+
+
+# =========================================================
+# BAC À SABLE
+# =========================================================
+def schema_ref_ddl(db_name, path=SCHEMA_REF):
+    """CREATE des objets de `db_name` dans schema_ref.sql : tables, index, vues, triggers."""
+    text = Path(path).read_text()
+    m = re.search(rf"^-- DATABASE: {re.escape(db_name)}\.db\n-- =+\n(.*?)(?=^-- =+\n-- DATABASE:|\Z)",
+                  text, re.S | re.M)
+    if not m:
+        return []
+    objs = re.findall(r"^(TABLE|INDEX|VIEW|TRIGGER) \S+ (CREATE .*?)(?=^(?:TABLE|INDEX|VIEW|TRIGGER) \S+ CREATE |\Z)",
+                      m.group(1), re.S | re.M)
+    order = {"TABLE": 0, "INDEX": 1, "VIEW": 2, "TRIGGER": 3}
+    return [sql.strip() for kind, sql in sorted(objs, key=lambda o: order[o[0]])
+            if "sqlite_" not in sql.split("(")[0]]
+
+
+def create_from_ref(path, db_name):
+    c = sqlite3.connect(path)
+    failed = 0
+    for sql in schema_ref_ddl(db_name):
+        try:
+            c.execute(sql)
+        except sqlite3.Error:
+            failed += 1             # vues sur DB attachées, objets dupliqués
+    c.commit()
+    c.close()
+    return failed
+
+
+def copy_db(src, dst):
+    s = sqlite3.connect(f"file:{src}?mode=ro", uri=True)
+    d = sqlite3.connect(dst)
+    s.backup(d)
+    d.close()
+    s.close()
+
+
+def wipe(path, tables=None):
+    c = sqlite3.connect(path)
+    names = tables or [r[0] for r in c.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+    for t in names:
+        try:
+            c.execute(f"DELETE FROM {t}")
+        except sqlite3.Error:
+            pass
+    c.commit()
+    c.close()
+
+
+def build_sandbox(src, root, conf=None, log=None):
+    """root/{data,logs,conf} : DB copiées / créées, état FSM vide."""
+    root = Path(root)
+    data = root / "data"
+    data.mkdir(parents=True, exist_ok=True)
+    (root / "logs").mkdir(exist_ok=True)
+    conf = Path(conf or f"{PROD_ROOT}/conf")
+    if not (root / "conf").exists():
+        (root / "conf").symlink_to(conf.resolve())
+
+    for name in FEED_DBS + STATE_DBS:
+        s, d = Path(src) / f"{name}.db", data / f"{name}.db"
+        if s.exists():
+            copy_db(s, d)
+            how = "copy"
+        else:
+            failed = create_from_ref(d, name)
+            how = f"schema_ref (failed={failed})"
+        if name in STATE_DBS:
+            wipe(d)
+        if log:
+            log.info("[SANDBOX] %s.db <- %s", name, how)
+    wipe(data / "t.db", ("ticks", "ticks_hist"))
+    return root
+
+
+def load_modules(root, clock):
+    """Importe la chaîne, réécrit ses chemins vers `root` et son module time."""
+    if str(SCRIPTS) not in sys.path:
+        sys.path.insert(0, str(SCRIPTS))
+    mods = {name: importlib.import_module(name) for name, _, _ in STAGES}
+    for extra in ("ticks", "dec_score", "db_utils", "db_notify"):
+        mods[extra] = importlib.import_module(extra)
+
+    root = str(root)
+    for m in list(sys.modules.values()):
+        f = getattr(m, "__file__", None)
+        if not f or Path(f).resolve().parent != SCRIPTS or m is sys.modules[__name__]:
+            continue
+        for k, v in list(vars(m).items()):
+            if isinstance(v, (str, Path)) and str(v).startswith(PROD_ROOT):
+                setattr(m, k, type(v)(root + str(v)[len(PROD_ROOT):]))
+            elif v is _time:
+                setattr(m, k, clock)
+    return mods
+
+
+# =========================================================
+# FLUX TICKS
+# =========================================================
+def merged_ticks(archive, insts, t0, t1):
+    """(ts, inst_idx, px, bid, ask) triés par (ts, instId) pour t0 <= ts < t1."""
+    parts = []
+    for k, inst in enumerate(insts):
+        w = archive.window(inst, t0, t1 - 1)
+        if len(w.ts):
+            parts.append((w.ts, np.full(len(w.ts), k, dtype=np.int32), w.px, w.bid, w.ask))
+    if not parts:
+        return None
+    ts, idx, px, bid, ask = (np.concatenate(c) for c in zip(*parts))
+    order = np.lexsort((idx, ts))
+    return ts[order], idx[order], px[order], bid[order], ask[order]
+
+
+def spread_bps(bid, ask):
+    if bid > 0 and ask > 0 and ask > bid:
+        return (ask - bid) / ((bid + ask) / 2) * 10_000
+    return None
+
+
+class Replay:
+    def __init__(self, root, archive, insts, t0, t1, step_ms=STEP_MS, log=None, clock=None,
+                 skip=True):
+        self.root = Path(root)
+        self.archive = archive
+        self.insts = list(insts)
+        self.t0, self.t1 = int(t0), int(t1)
+        self.step_ms = step_ms
+        self.log = log or logging.getLogger("REPLAY")
+        # clock=time : modules en temps réel (feed / refresh_dec seulement, pas run())
+        self.clock = clock or SimClock(t0)
+        self.m = load_modules(self.root, self.clock)
+        self.stats = {"ticks": 0, "steps": 0, "dec": 0, "wall_s": 0.0}
+        self.stage_ms = {name: 0.0 for name, _, _ in STAGES}
+        self.stage_runs = {name: 0 for name, _, _ in STAGES}
+        self.stage_skips = {name: 0 for name, _, _ in STAGES}
+
+        data = self.root / "data"
+        self.t = sqlite3.connect(str(data / "t.db"), isolation_level=None)
+        self.t.execute("PRAGMA journal_mode=WAL;")
+        self.t.execute("PRAGMA synchronous=OFF;")
+        self.ring = self.m["ticks"].HistRing()
+        self.d = sqlite3.connect(str(data / "dec.db"), isolation_level=None)
+        self.d.execute("PRAGMA journal_mode=WAL;")
+        self.d.execute("PRAGMA synchronous=OFF;")
+        ds = self.m["dec_score"]
+        ds.ensure_schema(self.d)
+        cols = self.m["db_utils"].table_columns(self.d, "snap_ticks")
+        self.tick_key = "instId_s" if "instId_s" in cols else "instId"
+        self.scores = ds.load_state(self.d)
+        self.last = {}
+
+        rec = self.m["recorder"]
+        rec.ensure_recorder_steps()
+        rec.ensure_trade_lineage_view()
+        self.cfg = self.m["follower"].load_cfg()
+
+        self.versions = DataVersions(data, sorted({n for v in STAGE_INPUTS.values() for n in v})) \
+            if skip else None
+        self.stages = []
+        for name, fn, attr in STAGES:
+            mod = self.m[name]
+            period = float(getattr(mod, attr)) if attr else DEFAULT_PERIOD[name]
+            call = getattr(mod, fn)
+            if name == "follower":
+                call = (lambda f: lambda: f(self.cfg))(call)
+            inputs = STAGE_INPUTS.get(name) if skip else None
+            # [nom, cycle, période ms, échéance, DB lues, data_version au dernier passage]
+            self.stages.append([name, call, int(period * 1000), self.t0, inputs, None])
+
+    # -----------------------------------------------------
+    def feed(self, rows):
+        """rows = [(instId, lastPr, bid, ask, spread_bps, ts_ms)] : même écriture que ticks.writer."""
+        self.t.execute("BEGIN")
+        self.m["ticks"].flush(self.t, rows, self.ring)
+        self.t.execute("COMMIT")
+        for r in rows:
+            self.last[r[0]] = (r[1], r[5])
+        self.stats["ticks"] += len(rows)
+
+    def refresh_dec(self):
+        """Prix courants -> ticks_live / snap_ticks, puis dec_score (cycle dec_writer)."""
+        if not self.last:
+            return
+        ds = self.m["dec_score"]
+        d = self.d
+        d.execute("BEGIN")
+        d.executemany("INSERT OR REPLACE INTO ticks_live (instId, lastPr, ts_ms) VALUES (?,?,?)",
+                      [(i, p, ts) for i, (p, ts) in self.last.items()])
+        d.executemany(f"INSERT OR REPLACE INTO snap_ticks ({self.tick_key}, lastPr, ts) VALUES (?,?,?)",
+                      [(i, p, ts) for i, (p, ts) in self.last.items()])
+        snaps = [tuple(r) for r in d.execute(
+            "SELECT uid, instId, ctx, score_C, side, atr_fast, atr_slow, vol_regime, ctx_ok, ts_updated "
+            "FROM snap_ctx")]
+        ranges, ticks = ds.load_inputs(d, self.tick_key)
+        self.scores, _ = ds.write(d, ds.compute(snaps, ranges, ticks), self.scores)
+        d.execute("COMMIT")
+        self.stats["dec"] += 1
+
+    def run_stages(self):
+        now = self.clock.ms
+        vers = self.versions
+        if vers:
+            vers.invalidate()
+        for st in self.stages:
+            name, call, period, due, inputs, seen = st
+            if now < due:
+                continue
+            st[3] = now + period
+            if inputs:
+                # avant le cycle : ses propres écritures le relancent une fois
+                # (exec réconcilie opener d'après ses fills du cycle précédent)
+                snap = vers.snapshot(inputs)
+                if snap == seen:
+                    self.stage_skips[name] += 1
+                    continue
+                st[5] = snap
+            t0 = _time.perf_counter()
+            call()
+            self.stage_ms[name] += (_time.perf_counter() - t0) * 1000
+            self.stage_runs[name] += 1
+            if vers:
+                vers.invalidate()
+
+    def run(self):
+        random.seed(0)
+        wall = _time.perf_counter()
+        next_dec = self.t0
+        for c0 in range(self.t0, self.t1, CHUNK_MS):
+            c1 = min(c0 + CHUNK_MS, self.t1)
+            ticks = merged_ticks(self.archive, self.insts, c0, c1)
+            edges = np.arange(c0 + self.step_ms, c1 + self.step_ms, self.step_ms)
+            cuts = np.searchsorted(ticks[0], edges, side="left") if ticks else None
+            lo = 0
+            for k, end in enumerate(edges):
+                self.clock.ms = int(min(end, c1))
+                if ticks is not None and cuts[k] > lo:
+                    hi = cuts[k]
+                    ts, idx, px, bid, ask = (a[lo:hi] for a in ticks)
+                    self.feed([(self.insts[i], float(p), float(b), float(a), spread_bps(b, a), int(t))
+                               for t, i, p, b, a in zip(ts.tolist(), idx.tolist(), px.tolist(),
+                                                        bid.tolist(), ask.tolist())])
+                    lo = hi
+                if self.clock.ms >= next_dec:
+                    self.refresh_dec()
+                    next_dec = self.clock.ms + DEC_EVERY_MS
+                self.run_stages()
+                self.stats["steps"] += 1
+        self.stats["wall_s"] = _time.perf_counter() - wall
+        return self.stats
+
+    def events(self):
+        return self.stats["ticks"] + sum(self.stage_runs.values()) + self.stats["dec"]
+
+    def recorder_rows(self):
+        c = sqlite3.connect(str(self.root / "data/recorder.db"))
+        c.row_factory = sqlite3.Row
+        rows = c.execute("SELECT * FROM recorder ORDER BY ts_close, uid").fetchall()
+        c.close()
+        return rows
+
+    def close(self):
+        self.t.close()
+        self.d.close()
+        if self.versions:
+            self.versions.close()
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        if rows:
+            w.writerow(rows[0].keys())
+        w.writerows(tuple(r) for r in rows)
+
+
+def main():
+    from tick_archive import ARCH_DIR, TickArchive
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--day", required=True, help="YYYYMMDD (UTC) présent dans l'archive")
+    ap.add_argument("--src", default=f"{PROD_ROOT}/data", help="DB sources du bac à sable")
+    ap.add_argument("--archive", default=ARCH_DIR)
+    ap.add_argument("--workdir", help="bac à sable conservé (défaut : dossier temporaire)")
+    ap.add_argument("--hours", type=float, default=24.0)
+    ap.add_argument("--step-ms", type=int, default=STEP_MS)
+    ap.add_argument("--csv", help="export de la table recorder")
+    ap.add_argument("--no-skip", action="store_true",
+                    help="tous les cycles échus tournent, même sans entrée nouvelle")
+    args = ap.parse_args()
+
+    work = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="scalp_replay_"))
+    logging.basicConfig(
+        filename=str(work / "replay.log") if args.workdir else None,
+        level=logging.WARNING,
+        format="%(asctime)s %(name)s %(levelname)s %(message)s",
+    )
+    log = logging.getLogger("REPLAY")
+
+    archive = TickArchive(args.archive)
+    day_dir = Path(args.archive) / args.day
+    insts = sorted(p.name.replace("-", "/") for p in day_dir.iterdir() if p.is_dir())
+    t0 = calendar.timegm(_time.strptime(args.day, "%Y%m%d")) * 1000
+    t1 = t0 + int(args.hours * 3_600_000)
+
+    build_sandbox(args.src, work, log=log)
+    rp = Replay(work, archive, insts, t0, t1, args.step_ms, log, skip=not args.no_skip)
+    s = rp.run()
+    rows = rp.recorder_rows()
+    rp.close()
+
+    pnl = [r["pnl_realized"] or 0.0 for r in rows]
+    print(f"[replay] {args.day} {len(insts)} insts {args.hours:g}h -> {len(rows)} trades "
+          f"pnl={sum(pnl):+.4f} win={sum(p > 0 for p in pnl)}/{len(pnl)}")
+    print(f"[replay] ticks={s['ticks']} steps={s['steps']} wall={s['wall_s']:.1f}s "
+          f"events/s={rp.events() / s['wall_s']:,.0f} sim/wall=x{(t1 - t0) / 1000 / s['wall_s']:.0f}")
+    for name, ms in rp.stage_ms.items():
+        n = rp.stage_runs[name]
+        print(f"[replay] {name:<9} runs={n:>7} skipped={rp.stage_skips[name]:>7} "
+              f"{ms / max(1, n):8.3f} ms/cycle")
+    if args.csv:
+        write_csv(rows, args.csv)
+    if args.workdir:
+        print(f"[replay] recorder.db : {work / 'data/recorder.db'}")
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+RETENTION — purge keyset partagée (ob.db / b.db / oa.db)
+
+- retention_index (par DB) : (tbl, instId) -> n lignes, ts le plus ancien,
+  ts le plus récent ; tenu à jour par les écrivains (added) et recalé par un
+  GROUP BY complet toutes les RESYNC_S (dérive : INSERT OR IGNORE, REPLACE)
+- purge(table) : seulement les instId avec n > keep ; cutoff = ts du
+  keep-ième plus récent (seek sur la PK (instId, ts), pas de COUNT),
+  puis 1 seul DELETE préparé pour toute la table (executemany)
+- keep = nombre de lignes réellement conservées par les anciennes purges
+  (LIMIT H OFFSET L -> H + L : 1950 en 1m, 650 en 3m/5m ; 150 côté OA)
+- vacuum() : PRAGMA incremental_vacuum (auto_vacuum=INCREMENTAL activé une
+  fois par --init-vacuum) au lieu d'un VACUUM complet
+- stats : lignes libérées, instId purgés, ms par table, pages rendues
+- la purge courante tourne dans les écrivains propriétaires (OB_collect,
+  B_feat_builder_incremental, OA_ohlcv) ; le CLI n'est qu'une maintenance
+  ponctuelle (--init-vacuum, rattrapage) et refuse de tourner tant que
+  l'écrivain d'une DB visée est vivant (1 DB = 1 writer)
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+ROOT = "/opt/scalp/project"
+
+DBS = {
+    "ob": f"{ROOT}/data/ob.db",
+    "b": f"{ROOT}/data/b.db",
+    "oa": f"{ROOT}/data/oa.db",
+}
+
+# lignes conservées par (table, instId)
+POLICIES = {
+    "ob": {"ohlcv_1m": 1950, "ohlcv_3m": 650, "ohlcv_5m": 650},
+    "b": {"feat_1m": 1950, "feat_3m": 650, "feat_5m": 650},
+    "oa": {"ohlcv_5m": 150, "ohlcv_15m": 150, "ohlcv_30m": 150},
+}
+
+# écrivain propriétaire de chaque DB
+OWNERS = {
+    "ob": "OB_collect.py",
+    "b": "B_feat_builder_incremental.py",
+    "oa": "OA_ohlcv.py",
+}
+
+RESYNC_S = 3600
+VACUUM_PAGES = 2000         # pages rendues au plus par cycle (0 = toutes)
+
+DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS retention_index (
+        tbl TEXT NOT NULL,
+        instId TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        oldest INTEGER,
+        newest INTEGER,
+        PRIMARY KEY (tbl, instId)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS retention_meta (
+        tbl TEXT PRIMARY KEY,
+        ts_resync INTEGER NOT NULL
+    )
+    """,
+)
+
+SAVE = """
+    INSERT INTO retention_index (tbl, instId, n, oldest, newest) VALUES (?,?,?,?,?)
+    ON CONFLICT(tbl, instId) DO UPDATE SET
+        n=excluded.n, oldest=excluded.oldest, newest=excluded.newest
+"""
+
+
+class Retention:
+    def __init__(self, c, policy, log=None, resync_s=RESYNC_S):
+        self.c = c
+        self.policy = policy
+        self.log = log or logging.getLogger("RETENTION")
+        self.resync_s = resync_s
+        self.idx = {}           # tbl -> {instId: [n, oldest, newest]}
+        self.dirty = {}         # tbl -> set(instId)
+        self.stats = {t: {"runs": 0, "rows": 0, "insts": 0, "ms": 0.0} for t in policy}
+        self.stats["vacuum"] = {"runs": 0, "pages": 0, "ms": 0.0}
+        for ddl in DDL:
+            c.execute(ddl)
+        self.load()
+
+    # ------------------------------------------------------
+    # INDEX
+    # ------------------------------------------------------
+    def load(self):
+        now = time.time()
+        synced = dict(self.c.execute("SELECT tbl, ts_resync FROM retention_meta"))
+        for t in self.policy:
+            if now - synced.get(t, 0) > self.resync_s:
+                self.resync(t)
+                continue
+            self.idx[t] = {
+                r[0]: list(r[1:])
+                for r in self.c.execute(
+                    "SELECT instId, n, oldest, newest FROM retention_index WHERE tbl=?", (t,)
+                )
+            }
+            self.dirty[t] = set()
+
+    def resync(self, t):
+        """Recalage complet : 1 GROUP BY (parcours de la PK) par table."""
+        t0 = time.perf_counter()
+        self.idx[t] = {
+            r[0]: list(r[1:])
+            for r in self.c.execute(
+                f"SELECT instId, COUNT(*), MIN(ts), MAX(ts) FROM {t} GROUP BY instId"
+            )
+        }
+        self.dirty[t] = set()
+        own = not self.c.in_transaction
+        if own:
+            self.c.execute("BEGIN")
+        self.c.execute("DELETE FROM retention_index WHERE tbl=?", (t,))
+        self.c.executemany(SAVE, [(t, i, *v) for i, v in self.idx[t].items()])
+        self.c.execute(
+            "INSERT OR REPLACE INTO retention_meta (tbl, ts_resync) VALUES (?, ?)",
+            (t, int(time.time())),
+        )
+        if own:
+            self.c.execute("COMMIT")
+        self.log.info("[RESYNC] %s insts=%d ms=%.1f", t, len(self.idx[t]),
+                      (time.perf_counter() - t0) * 1000)
+
+    def added(self, t, rows):
+        """Lignes (instId, ts, ...) écrites dans t : seules celles > newest comptent."""
+        idx, dirty = self.idx[t], self.dirty[t]
+        for r in rows:
+            inst, ts = r[0], r[1]
+            e = idx.get(inst)
+            if e is None:
+                idx[inst] = [1, ts, ts]
+            elif e[2] is None or ts > e[2]:
+                e[0] += 1
+                e[2] = ts
+                if e[1] is None:
+                    e[1] = ts
+            elif ts < e[1]:
+                e[0] += 1
+                e[1] = ts
+            else:
+                continue
+            dirty.add(inst)
+
+    # ------------------------------------------------------
+    # PURGE
+    # ------------------------------------------------------
+    def purge(self, t):
+        """1 DELETE préparé par table ; dans la transaction courante si ouverte."""
+        t0 = time.perf_counter()
+        keep = self.policy[t]
+        idx, dirty = self.idx[t], self.dirty[t]
+        c = self.c
+
+        own = not c.in_transaction
+        if own:
+            c.execute("BEGIN")
+        try:
+            cuts = []
+            seek = f"SELECT ts FROM {t} WHERE instId=? ORDER BY ts DESC LIMIT 1 OFFSET ?"
+            for inst, e in idx.items():
+                if e[0] <= keep:
+                    continue
+                r = c.execute(seek, (inst, keep - 1)).fetchone()
+                if r is None:               # index en avance sur la table
+                    e[0] = c.execute(f"SELECT COUNT(*) FROM {t} WHERE instId=?",
+                                     (inst,)).fetchone()[0]
+                    dirty.add(inst)
+                    continue
+                cuts.append((inst, r[0]))
+
+            before = c.total_changes
+            if cuts:
+                c.executemany(f"DELETE FROM {t} WHERE instId=? AND ts<?", cuts)
+            freed = c.total_changes - before
+
+            for inst, cutoff in cuts:
+                e = idx[inst]
+                e[0], e[1] = keep, cutoff
+                dirty.add(inst)
+            if dirty:
+                c.executemany(SAVE, [(t, i, *idx[i]) for i in dirty if i in idx])
+            if own:
+                c.execute("COMMIT")
+        except Exception:
+            if own:
+                c.execute("ROLLBACK")
+            raise
+        dirty.clear()
+
+        ms = (time.perf_counter() - t0) * 1000
+        s = self.stats[t]
+        s["runs"] += 1
+        s["rows"] += freed
+        s["insts"] += len(cuts)
+        s["ms"] += ms
+        self.log.info("[PURGE] %s insts=%d freed=%d keep=%d ms=%.1f",
+                      t, len(cuts), freed, keep, ms)
+        return freed
+
+    def purge_all(self):
+        return sum(self.purge(t) for t in self.policy)
+
+    # ------------------------------------------------------
+    # VACUUM
+    # ------------------------------------------------------
+    def vacuum(self, pages=VACUUM_PAGES):
+        """Rend au plus `pages` pages libres ; no-op hors auto_vacuum=INCREMENTAL."""
+        if self.c.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        t0 = time.perf_counter()
+        free = self.c.execute("PRAGMA freelist_count").fetchone()[0]
+        if free:
+            # execute() ne fait qu'un step (= 1 page) : executescript va au bout
+            self.c.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        freed = free - self.c.execute("PRAGMA freelist_count").fetchone()[0]
+        ms = (time.perf_counter() - t0) * 1000
+        s = self.stats["vacuum"]
+        s["runs"] += 1
+        s["pages"] += freed
+        s["ms"] += ms
+        self.log.info("[VACUUM] pages=%d freelist=%d ms=%.1f", freed, free - freed, ms)
+        return freed
+
+
+def enable_incremental_vacuum(c, log=None):
+    """auto_vacuum=INCREMENTAL : ne prend effet qu'après un VACUUM complet (1 fois)."""
+    if c.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    c.execute("VACUUM")
+    if log:
+        log.info("[VACUUM] auto_vacuum=INCREMENTAL enabled")
+    return True
+
+
+def connect(path):
+    c = sqlite3.connect(path, timeout=10, isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL;")
+    c.execute("PRAGMA busy_timeout=5000;")
+    return c
+
+
+def running_owners(names):
+    """{db: [pids]} des écrivains propriétaires vivants (hors process courant)."""
+    scripts = {OWNERS[n]: n for n in names}
+    found = {}
+    me = os.getpid()
+    for p in Path("/proc").iterdir():
+        if not p.name.isdigit() or int(p.name) == me:
+            continue
+        try:
+            argv = (p / "cmdline").read_bytes().split(b"\0")
+        except OSError:
+            continue
+        for a in argv[1:3]:
+            name = os.path.basename(a.decode(errors="ignore"))
+            if name in scripts:
+                found.setdefault(scripts[name], []).append(int(p.name))
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description="maintenance ponctuelle, écrivains arrêtés")
+    ap.add_argument("--db", choices=(*DBS, "all"), default="all")
+    ap.add_argument("--init-vacuum", action="store_true",
+                    help="active auto_vacuum=INCREMENTAL (VACUUM complet, 1 fois)")
+    ap.add_argument("--vacuum-pages", type=int, default=VACUUM_PAGES)
+    args = ap.parse_args()
+
+    logging.basicConfig(
+        filename=f"{ROOT}/logs/retention.log",
+        level=logging.INFO,
+        format="%(asctime)s RETENTION %(levelname)s %(message)s"
+    )
+    log = logging.getLogger("RETENTION")
+
+    names = tuple(DBS) if args.db == "all" else (args.db,)
+    busy = running_owners(names)
+    if busy:
+        for name, pids in busy.items():
+            msg = f"[REFUSE] {name}.db : {OWNERS[name]} tourne (pid {pids}), 1 DB = 1 writer"
+            log.error(msg)
+            print(msg, file=sys.stderr)
+        sys.exit(1)
+
+    services = {}
+    for name in names:
+        c = connect(DBS[name])
+        if args.init_vacuum:
+            enable_incremental_vacuum(c, log)
+        services[name] = Retention(c, POLICIES[name], log)
+
+    for name, r in services.items():
+        try:
+            r.load()                # index tenu par l'écrivain propriétaire
+            rows = r.purge_all()
+            pages = r.vacuum(args.vacuum_pages)
+            log.info("[CYCLE] %s freed=%d pages=%d", name, rows, pages)
+        except Exception as e:
+            log.error("[CYCLE] %s FAIL %s", name, e)
+        finally:
+            r.c.close()
+
+
+if __name__ == "__main__":
+    main()
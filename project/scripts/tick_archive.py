@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+TICK ARCHIVE — historique ticks complet, colonnaire, 1 dossier / jour / instId
+
+- ticks_hist reste le ring ROLLING_LIMIT (200 / instId) pour le live ;
+  l'archive garde tout le chemin de prix pour MFE/MAE, wticks, backtests
+- layout : ARCH_DIR/YYYYMMDD/BASE-USDT/{ts.i8, px.f8, bid.f8, ask.f8}
+  (jour UTC, tableaux little-endian à largeur fixe, append-only)
+- ArchiveWriter.append() : appelé par ticks.writer après chaque commit ;
+  un tick hors ordre pose le marqueur UNSORTED (trié par la compaction)
+- TickArchive.window(instId, t0, t1) : np.memmap en cache + searchsorted,
+  vues NumPy sans copie (copie seulement si la fenêtre couvre 2 jours ou
+  si le fichier n'est pas encore compacté et hors ordre)
+- compact() : jours clos seulement ; tronque à la longueur commune
+  (écriture interrompue), tri stable par ts, retire les doublons exacts
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+ROOT = "/opt/scalp/project"
+ARCH_DIR = f"{ROOT}/data/ticks_arch"
+
+DAY_MS = 86_400_000
+MAX_OPEN = 512              # handles ouverts par le writer (LRU)
+MAX_MAPS = 1024             # memmaps gardés par le lecteur (LRU)
+
+COLS = (("ts", "<i8"), ("px", "<f8"), ("bid", "<f8"), ("ask", "<f8"))
+UNSORTED = "UNSORTED"
+
+Ticks = namedtuple("Ticks", [name for name, _ in COLS])
+
+
+def day_name(day):
+    return time.strftime("%Y%m%d", time.gmtime(day * 86_400))
+
+
+def inst_dir(instId):
+    return instId.replace("/", "-")
+
+
+def _empty():
+    return Ticks(*(np.empty(0, dtype=dt) for _, dt in COLS))
+
+
+# =========================================================
+# WRITER
+# =========================================================
+class ArchiveWriter:
+    """Un seul writer (thread ticks.writer) ; 1 write() par colonne et par groupe."""
+
+    def __init__(self, root=ARCH_DIR, max_open=MAX_OPEN):
+        self.root = Path(root)
+        self.max_open = max_open
+        self.files = OrderedDict()      # (day, instId) -> [handles par colonne]
+        self.last = {}                  # (day, instId) -> dernier ts écrit
+        self.day = None
+        self.rows = 0
+        self.unsorted = 0
+
+    def _path(self, day, instId):
+        return self.root / day_name(day) / inst_dir(instId)
+
+    def _open(self, key):
+        fh = self.files.get(key)
+        if fh is not None:
+            self.files.move_to_end(key)
+            return fh
+        d = self._path(*key)
+        d.mkdir(parents=True, exist_ok=True)
+        n = self._align(d)
+        fh = self.files[key] = [open(d / f"{name}.{dt[1:]}", "ab") for name, dt in COLS]
+        if key not in self.last and n:
+            with open(d / "ts.i8", "rb") as f:
+                f.seek((n - 1) * 8)
+                self.last[key] = int(np.frombuffer(f.read(8), dtype="<i8")[0])
+        while len(self.files) > self.max_open:
+            self._close(next(iter(self.files)))
+        return fh
+
+    @staticmethod
+    def _align(d):
+        """Colonnes tronquées à la longueur commune avant tout ajout -> nb de lignes.
+
+        Arrêt au milieu d'un append (colonnes écrites une à une) : sans ça les
+        lignes suivantes du jour seraient décalées entre ts et px/bid/ask.
+        """
+        paths = [d / f"{name}.{dt[1:]}" for name, dt in COLS]
+        sizes = [p.stat().st_size if p.exists() else 0 for p in paths]
+        n = min(sizes) // 8
+        for p, size in zip(paths, sizes):
+            if size > n * 8:
+                os.truncate(p, n * 8)
+        return n
+
+    def _close(self, key):
+        for f in self.files.pop(key):
+            f.close()
+
+    def _roll(self, day):
+        """Nouveau jour UTC : fermeture des fichiers des jours clos."""
+        for key in [k for k in self.files if k[0] < day]:
+            self._close(key)
+        for key in [k for k in self.last if k[0] < day - 1]:
+            del self.last[key]
+        self.day = day
+
+    def append(self, rows):
+        """rows = [(instId, lastPr, bidPr, askPr, spread_bps, ts_ms)] (format ticks.flush)."""
+        groups = defaultdict(list)
+        for inst, px, bid, ask, _, ts in rows:
+            groups[(ts // DAY_MS, inst)].append((ts, px, bid or 0.0, ask or 0.0))
+
+        for key, g in groups.items():
+            if self.day is None or key[0] > self.day:
+                self._roll(key[0])
+            ts = np.fromiter((r[0] for r in g), dtype="<i8", count=len(g))
+            vals = np.array([r[1:] for r in g], dtype="<f8")
+            fh = self._open(key)
+            # colonnes valeur d'abord, ts en dernier : le lecteur borne à la plus courte
+            for j, f in enumerate(fh[1:]):
+                f.write(np.ascontiguousarray(vals[:, j]).tobytes())
+            fh[0].write(ts.tobytes())
+            for f in fh:
+                f.flush()
+
+            prev = self.last.get(key)
+            if (prev is not None and ts[0] < prev) or (len(ts) > 1 and np.any(np.diff(ts) < 0)):
+                marker = self._path(*key) / UNSORTED
+                if not marker.exists():
+                    marker.touch()
+                    self.unsorted += 1
+            self.last[key] = max(int(ts.max()), prev or 0)
+            self.rows += len(g)
+
+    def close(self):
+        for key in list(self.files):
+            self._close(key)
+
+
+# =========================================================
+# READER
+# =========================================================
+class TickArchive:
+    """Lecteur mmap ; sûr pendant que le writer ajoute (remap si le fichier a grandi)."""
+
+    def __init__(self, root=ARCH_DIR, max_maps=MAX_MAPS):
+        self.root = Path(root)
+        self.max_maps = max_maps
+        self.maps = OrderedDict()       # (day, instId) -> (taille ts, Ticks)
+        self.paths = {}                 # (day, instId) -> dossier
+
+    def _load(self, day, instId):
+        key = (day, instId)
+        d = self.paths.get(key)
+        if d is None:
+            d = self.paths[key] = self.root / day_name(day) / inst_dir(instId)
+        try:
+            size = os.stat(f"{d}/ts.i8").st_size
+        except FileNotFoundError:
+            self.maps.pop(key, None)
+            return None
+        hit = self.maps.get(key)
+        if hit is not None and hit[0] == size:
+            self.maps.move_to_end(key)
+            return hit[1]
+
+        n = min(os.stat(d / f"{name}.{dt[1:]}").st_size // 8 for name, dt in COLS)
+        if n == 0:
+            cols = _empty()
+        else:
+            cols = Ticks(*(np.memmap(d / f"{name}.{dt[1:]}", dtype=dt, mode="r", shape=(n,))
+                           for name, dt in COLS))
+            if (d / UNSORTED).exists():
+                order = np.argsort(cols.ts, kind="stable")
+                cols = Ticks(*(a[order] for a in cols))
+        self.maps[key] = (size, cols)
+        while len(self.maps) > self.max_maps:
+            self.maps.popitem(last=False)
+        return cols
+
+    def window(self, instId, t0, t1):
+        """Ticks de instId avec t0 <= ts <= t1 (ms) -> Ticks(ts, px, bid, ask)."""
+        parts = []
+        for day in range(t0 // DAY_MS, t1 // DAY_MS + 1):
+            cols = self._load(day, instId)
+            if cols is None or not len(cols.ts):
+                continue
+            i0 = np.searchsorted(cols.ts, t0, side="left")
+            i1 = np.searchsorted(cols.ts, t1, side="right")
+            if i1 > i0:
+                parts.append(Ticks(*(a[i0:i1] for a in cols)))
+        if not parts:
+            return _empty()
+        if len(parts) == 1:
+            return parts[0]
+        return Ticks(*(np.concatenate(c) for c in zip(*parts)))
+
+    def days(self):
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir()) if self.root.exists() else []
+
+
+# =========================================================
+# COMPACTION
+# =========================================================
+def compact_inst(d):
+    """Tronque / trie / dédoublonne un dossier instId -> (lignes avant, après)."""
+    n = min(os.stat(d / f"{name}.{dt[1:]}").st_size // 8 for name, dt in COLS)
+    cols = [np.fromfile(d / f"{name}.{dt[1:]}", dtype=dt, count=n) for name, dt in COLS]
+    marker = d / UNSORTED
+    if marker.exists() or (n > 1 and np.any(np.diff(cols[0]) < 0)):
+        order = np.argsort(cols[0], kind="stable")
+        cols = [a[order] for a in cols]
+    if n > 1:
+        same = np.ones(n - 1, dtype=bool)
+        for a in cols:
+            same &= a[1:] == a[:-1]
+        keep = np.concatenate(([True], ~same))
+        cols = [a[keep] for a in cols]
+    for (name, dt), a in zip(COLS, cols):
+        tmp = d / f".{name}.{dt[1:]}.tmp"
+        a.astype(dt).tofile(tmp)
+        os.replace(tmp, d / f"{name}.{dt[1:]}")
+    if marker.exists():
+        marker.unlink()
+    return n, len(cols[0])
+
+
+def compact(root=ARCH_DIR, day=None, now_ms=None):
+    """Compacte `day` (YYYYMMDD) ou tous les jours clos non compactés."""
+    root = Path(root)
+    today = day_name((now_ms or int(time.time() * 1000)) // DAY_MS)
+    out = {"days": 0, "insts": 0, "rows_in": 0, "rows_out": 0}
+    for p in sorted(root.iterdir()) if root.exists() else []:
+        if not p.is_dir() or (day and p.name != day):
+            continue
+        # jour courant : le writer a encore les fichiers ouverts en append
+        if p.name >= today or (p / ".compacted").exists():
+            continue
+        for d in sorted(x for x in p.iterdir() if x.is_dir()):
+            a, b = compact_inst(d)
+            out["insts"] += 1
+            out["rows_in"] += a
+            out["rows_out"] += b
+        (p / ".compacted").touch()
+        out["days"] += 1
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--root", default=ARCH_DIR)
+    ap.add_argument("--day", help="YYYYMMDD (défaut : tous les jours clos)")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    s = compact(args.root, args.day)
+    print(f"[tick_archive] compact days={s['days']} insts={s['insts']} "
+          f"rows={s['rows_in']}->{s['rows_out']} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
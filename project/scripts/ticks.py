@@ -11,21 +11,39 @@ SCALP — TICKS COLLECTOR v2 (LAST + BID/ASK + SPREAD)
 - UN SEUL WRITER
 - WAL SAFE
 - AUCUN calcul métier (ledger only)
+- WS multiplexé : TickerMux répartit l'univers sur des shards
+  (WS_ARGS_PER_CONN tickers max / connexion), resubscribe à chaud
+  quand v_ctx_latest change, débit msg/s par shard dans les logs
+- ticks_hist : rétention ROLLING_LIMIT ticks / instId via HistRing
+  (ids en mémoire, DELETE par clé primaire : O(batch) par flush)
+- archive binaire complète (tick_archive.py, 1 dossier / jour / instId)
+  alimentée après chaque commit (--no-archive pour couper)
 """
 
+import argparse
 import asyncio
 import websockets
 import json
 import sqlite3
 import threading
 import time
+from collections import deque
 from queue import Queue
 
+from tick_archive import ArchiveWriter
+
 ROOT = "/opt/scalp/project"
 DB_T = f"{ROOT}/data/t.db"
 DB_A = f"{ROOT}/data/a.db"
 
 WS_URL = "wss://ws.bitget.com/v2/ws/public"
+WS_ARGS_PER_CONN = 50      # Bitget : < 50 channels / connexion recommandé
+WS_ARGS_PER_MSG = 10       # args par message subscribe / unsubscribe
+WS_SEND_INTERVAL = 0.1     # Bitget : max 10 messages / s / connexion
+WS_SHARDS = 1              # minimum ; étendu si univers > shards * WS_ARGS_PER_CONN
+WS_PING_EVERY = 25.0
+UNIVERSE_REFRESH_S = 60.0
+RATE_REPORT_S = 60.0
 
 QUEUE_MAX = 8000
 FLUSH_DELAY = 0.25
@@ -72,18 +90,93 @@ def load_symbols():
     c.close()
     return [canon_to_ws(r[0]) for r in rows]
 
+# =========================================================
+# ticks_hist retention
+# =========================================================
+class HistRing:
+    """Ids ticks_hist conservés par instId (ordre d'insertion).
+
+    Le writer est unique et ticks_hist.id est AUTOINCREMENT : un batch inséré
+    par executemany occupe les ids [last_insert_rowid - n + 1, last_insert_rowid].
+    La rétention se fait donc sans sous-requête triée : les ids sortis du
+    ring sont supprimés par clé primaire.
+    """
+
+    def __init__(self, limit=ROLLING_LIMIT):
+        self.limit = limit
+        self.ids: dict[str, deque] = {}
+
+    def load(self, cur):
+        """(Re)construit le ring depuis la DB et purge l'excédent existant."""
+        self.ids = {}
+        expired = []
+        for instId, rid in cur.execute(
+            "SELECT instId, id FROM ticks_hist ORDER BY instId, ts_ms, id"
+        ):
+            ring = self.ids.get(instId)
+            if ring is None:
+                ring = self.ids[instId] = deque()
+            ring.append(rid)
+            if len(ring) > self.limit:
+                expired.append((ring.popleft(),))
+        if expired:
+            cur.executemany("DELETE FROM ticks_hist WHERE id=?;", expired)
+        return len(expired)
+
+    def push(self, buf, last_id):
+        """Enregistre les ids du batch `buf` ; retourne les ids à supprimer."""
+        expired = []
+        first_id = last_id - len(buf) + 1
+        for i, (instId, *_) in enumerate(buf):
+            ring = self.ids.get(instId)
+            if ring is None:
+                ring = self.ids[instId] = deque()
+            ring.append(first_id + i)
+            if len(ring) > self.limit:
+                expired.append((ring.popleft(),))
+        return expired
+
+
+def flush(cur, buf, ring: HistRing):
+    """Écrit un batch de ticks (ticks + ticks_hist + rétention), sans commit."""
+    cur.executemany("""
+        INSERT INTO ticks(instId,lastPr,bidPr,askPr,spread_bps,ts_ms)
+        VALUES (?,?,?,?,?,?)
+        ON CONFLICT(instId) DO UPDATE SET
+            lastPr=excluded.lastPr,
+            bidPr=excluded.bidPr,
+            askPr=excluded.askPr,
+            spread_bps=excluded.spread_bps,
+            ts_ms=excluded.ts_ms;
+    """, buf)
+
+    cur.executemany("""
+        INSERT INTO ticks_hist(instId,lastPr,bidPr,askPr,spread_bps,ts_ms)
+        VALUES (?,?,?,?,?,?);
+    """, buf)
+
+    last_id = cur.execute("SELECT last_insert_rowid();").fetchone()[0]
+    expired = ring.push(buf, last_id)
+    if expired:
+        cur.executemany("DELETE FROM ticks_hist WHERE id=?;", expired)
+
 # =========================================================
 # Writer
 # =========================================================
-def writer():
+def writer(archive: ArchiveWriter | None = None):
     conn = conn_t()
     cur = conn.cursor()
 
+    ring = HistRing()
+    conn.execute("BEGIN")
+    purged = ring.load(cur)
+    conn.commit()
+
     buf = []
     last_flush = time.time()
     last_checkpoint = time.time()
 
-    print("[ticks] Writer started (LAST + BID/ASK + SPREAD).")
+    print(f"[ticks] Writer started (LAST + BID/ASK + SPREAD), ring={len(ring.ids)} inst purged={purged}.")
 
     while not stop_event.is_set():
         try:
@@ -97,39 +190,24 @@ def writer():
         # -------- FLUSH --------
         if buf and (now - last_flush) >= FLUSH_DELAY:
             try:
-                cur.executemany("""
-                    INSERT INTO ticks(instId,lastPr,bidPr,askPr,spread_bps,ts_ms)
-                    VALUES (?,?,?,?,?,?)
-                    ON CONFLICT(instId) DO UPDATE SET
-                        lastPr=excluded.lastPr,
-                        bidPr=excluded.bidPr,
-                        askPr=excluded.askPr,
-                        spread_bps=excluded.spread_bps,
-                        ts_ms=excluded.ts_ms;
-                """, buf)
-
-                cur.executemany("""
-                    INSERT INTO ticks_hist(instId,lastPr,bidPr,askPr,spread_bps,ts_ms)
-                    VALUES (?,?,?,?,?,?);
-                """, buf)
-
-                for instId, *_ in buf:
-                    cur.execute("""
-                        DELETE FROM ticks_hist
-                        WHERE instId=?
-                          AND id NOT IN (
-                            SELECT id FROM ticks_hist
-                            WHERE instId=?
-                            ORDER BY ts_ms DESC
-                            LIMIT ?
-                          );
-                    """, (instId, instId, ROLLING_LIMIT))
-
+                conn.execute("BEGIN")
+                flush(cur, buf, ring)
                 conn.commit()
 
+                if archive is not None:
+                    try:
+                        archive.append(buf)
+                    except Exception as e:
+                        print("[ticks] archive error:", e)
+
             except Exception as e:
                 print("[ticks] DB error:", e)
                 conn.rollback()
+                # le ring a pu avancer sur un batch annulé : resync depuis la DB
+                try:
+                    ring.load(cur)
+                except Exception:
+                    pass
 
             buf.clear()
             last_flush = now
@@ -143,88 +221,253 @@ def writer():
             last_checkpoint = now
 
     conn.close()
+    if archive is not None:
+        archive.close()
+        print(f"[ticks] archive rows={archive.rows} unsorted={archive.unsorted}")
     print("[ticks] Writer stopped.")
 
+
 # =========================================================
-# Websocket
+# Websocket (multiplexé : N tickers par connexion)
 # =========================================================
-async def ws_one(ws_inst):
-    canon = ws_to_canon(ws_inst)
-    if not canon:
-        return
-
-    sub = {
-        "op": "subscribe",
-        "args": [{
-            "instType": "USDT-FUTURES",
-            "channel": "ticker",
-            "instId": ws_inst
-        }]
-    }
-
-    msg = json.dumps(sub)
+def parse_ticker(canon, d):
+    try:
+        lastPr = float(d["lastPr"])
+        bidPr  = float(d.get("bidPr") or 0)
+        askPr  = float(d.get("askPr") or 0)
+        ts_ms  = int(d["ts"])
+    except (KeyError, TypeError, ValueError):
+        return None
 
-    while not stop_event.is_set():
-        try:
-            async with websockets.connect(
-                WS_URL,
-                ping_interval=15,
-                ping_timeout=15,
-                max_size=2**20
-            ) as ws:
+    spread_bps = None
+    if bidPr > 0 and askPr > 0 and askPr > bidPr:
+        mid = (bidPr + askPr) / 2
+        spread_bps = (askPr - bidPr) / mid * 10_000
 
-                await ws.send(msg)
-                print(f"[ticks] {canon} subscribed")
+    return (canon, lastPr, bidPr, askPr, spread_bps, ts_ms)
 
-                async for raw in ws:
-                    data = json.loads(raw)
-                    if "data" not in data:
-                        continue
 
-                    d = data["data"][0]
+def push_tick(row):
+    if not q.full():
+        q.put(row)
+
+
+def ticker_arg(ws_inst):
+    return {"instType": "USDT-FUTURES", "channel": "ticker", "instId": ws_inst}
 
-                    try:
-                        lastPr = float(d["lastPr"])
-                        bidPr  = float(d.get("bidPr") or 0)
-                        askPr  = float(d.get("askPr") or 0)
-                        ts_ms  = int(d["ts"])
-                    except:
-                        continue
 
-                    spread_bps = None
-                    if bidPr > 0 and askPr > 0 and askPr > bidPr:
-                        mid = (bidPr + askPr) / 2
-                        spread_bps = (askPr - bidPr) / mid * 10_000
+class Shard:
+    """Une connexion WS portant au plus WS_ARGS_PER_CONN tickers."""
 
-                    if not q.full():
-                        q.put((canon, lastPr, bidPr, askPr, spread_bps, ts_ms))
+    def __init__(self, idx, url, sink):
+        self.idx = idx
+        self.url = url
+        self.sink = sink
+        self.wanted: set[str] = set()       # ws ids attribués au shard
+        self.subscribed: set[str] = set()   # ws ids confirmés côté socket
+        self.ws = None
+        self.msgs = 0
+        self.reconnects = 0
+        self._lock = asyncio.Lock()
 
+    async def _send_op(self, ws, op, ws_ids):
+        ws_ids = sorted(ws_ids)
+        for i in range(0, len(ws_ids), WS_ARGS_PER_MSG):
+            chunk = ws_ids[i:i + WS_ARGS_PER_MSG]
+            await ws.send(json.dumps({"op": op, "args": [ticker_arg(x) for x in chunk]}))
+            await asyncio.sleep(WS_SEND_INTERVAL)
+
+    async def sync(self):
+        """Aligne les abonnements du socket sur `wanted` (sans reconnexion).
+
+        Erreur d'envoi (socket fermé en cours de route) : avalée, le socket
+        est fermé et run() reconnecte puis réabonne tout `wanted`.
+        """
+        async with self._lock:
+            ws = self.ws
+            if ws is None:
+                return
+            add = self.wanted - self.subscribed
+            rm = self.subscribed - self.wanted
+            try:
+                if rm:
+                    await self._send_op(ws, "unsubscribe", rm)
+                    self.subscribed -= rm
+                if add:
+                    await self._send_op(ws, "subscribe", add)
+                    self.subscribed |= add
+            except Exception as e:
+                print(f"[ticks] shard={self.idx} resubscribe error:", e)
+                await ws.close()
+                return
+            if add or rm:
+                print(f"[ticks] shard={self.idx} +{len(add)} -{len(rm)} → {len(self.subscribed)} tickers")
+
+    async def _ping(self, ws):
+        # heartbeat applicatif Bitget ("ping" texte -> "pong")
+        while True:
+            await asyncio.sleep(WS_PING_EVERY)
+            await ws.send("ping")
+
+    async def run(self):
+        while not stop_event.is_set():
+            ping = None
+            try:
+                async with websockets.connect(
+                    self.url,
+                    ping_interval=15,
+                    ping_timeout=15,
+                    max_size=2**20
+                ) as ws:
+                    self.ws = ws
+                    self.subscribed = set()
+                    await self.sync()
+                    ping = asyncio.create_task(self._ping(ws))
+
+                    async for raw in ws:
+                        if raw == "pong":
+                            continue
+                        data = json.loads(raw)
+                        if "data" not in data:
+                            continue
+
+                        self.msgs += 1
+                        canon = ws_to_canon(data.get("arg", {}).get("instId", ""))
+                        if not canon:
+                            continue
+                        for d in data["data"]:
+                            row = parse_ticker(canon, d)
+                            if row:
+                                self.sink(row)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ticks] shard={self.idx} WS error:", e)
+            finally:
+                self.ws = None
+                if ping:
+                    ping.cancel()
+
+            if not stop_event.is_set():
+                self.reconnects += 1
+                await asyncio.sleep(1.0)
+
+
+class TickerMux:
+    """Répartit l'univers sur des shards WS ; resubscribe à chaud."""
+
+    def __init__(self, url=WS_URL, shards=WS_SHARDS, per_conn=WS_ARGS_PER_CONN, sink=push_tick):
+        self.url = url
+        self.min_shards = shards
+        self.per_conn = per_conn
+        self.sink = sink
+        self.shards: list[Shard] = []
+        self.tasks: dict[int, asyncio.Task] = {}
+
+    def _new_shard(self):
+        sh = Shard(len(self.shards), self.url, self.sink)
+        self.shards.append(sh)
+        self.tasks[sh.idx] = asyncio.create_task(sh.run())
+        return sh
+
+    def assign(self, symbols):
+        """Affectation stable : un ticker reste sur son shard tant qu'il est dans l'univers."""
+        symbols = {s for s in symbols if ws_to_canon(s)}
+        need = max(self.min_shards, -(-len(symbols) // self.per_conn))
+        while len(self.shards) < need:
+            self._new_shard()
+
+        placed = set()
+        for sh in self.shards:
+            sh.wanted &= symbols
+            placed |= sh.wanted
+
+        for s in sorted(symbols - placed):
+            sh = min(self.shards, key=lambda x: len(x.wanted))
+            if len(sh.wanted) >= self.per_conn:
+                sh = self._new_shard()
+            sh.wanted.add(s)
+
+    async def apply(self, symbols):
+        self.assign(symbols)
+        await asyncio.gather(*(sh.sync() for sh in self.shards))
+
+    def rates(self, dt):
+        """[(shard, tickers, msg/s, reconnects)] depuis le dernier appel."""
+        out = []
+        for sh in self.shards:
+            out.append((sh.idx, len(sh.subscribed), sh.msgs / dt if dt > 0 else 0.0, sh.reconnects))
+            sh.msgs = 0
+        return out
+
+    async def close(self):
+        for t in self.tasks.values():
+            t.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+
+async def refresh_universe(mux, loader=None):
+    loader = loader or load_symbols
+    last = None
+    while not stop_event.is_set():
+        await asyncio.sleep(UNIVERSE_REFRESH_S)
+        try:
+            syms = set(await asyncio.to_thread(loader))
         except Exception as e:
-            print(f"[ticks] {canon} WS error:", e)
-            await asyncio.sleep(1.0)
+            print("[ticks] universe refresh error:", e)
+            continue
+        if syms != last:
+            await mux.apply(syms)
+            last = syms
+
+
+async def report_rates(mux):
+    t_last = time.monotonic()
+    while not stop_event.is_set():
+        await asyncio.sleep(RATE_REPORT_S)
+        now = time.monotonic()
+        for idx, n, rate, rec in mux.rates(now - t_last):
+            print(f"[ticks] shard={idx} tickers={n} rate={rate:.1f} msg/s reconnects={rec}")
+        t_last = now
 
 # =========================================================
 # MAIN
 # =========================================================
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shards", type=int, default=WS_SHARDS,
+                    help="nombre minimal de connexions WS")
+    ap.add_argument("--no-archive", action="store_true",
+                    help="ne pas écrire l'archive binaire des ticks")
+    args = ap.parse_args()
+
     syms = load_symbols()
     print(f"[ticks] Starting {len(syms)} instruments")
 
-    wt = threading.Thread(target=writer, daemon=True)
+    archive = None if args.no_archive else ArchiveWriter()
+    wt = threading.Thread(target=writer, args=(archive,), daemon=True)
     wt.start()
 
     try:
-        asyncio.run(run_all(syms))
+        asyncio.run(run_all(syms, args.shards))
     except KeyboardInterrupt:
         pass
     finally:
         stop_event.set()
         wt.join()
 
-async def run_all(symbols):
-    tasks = [asyncio.create_task(ws_one(s)) for s in symbols]
-    await asyncio.gather(*tasks)
+async def run_all(symbols, shards=WS_SHARDS):
+    mux = TickerMux(shards=shards)
+    await mux.apply(symbols)
+    try:
+        await asyncio.gather(
+            refresh_universe(mux),
+            report_rates(mux),
+            *mux.tasks.values(),
+        )
+    finally:
+        await mux.close()
 
 if __name__ == "__main__":
     main()
-
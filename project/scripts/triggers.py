@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import sqlite3
 import time
 import yaml
+import sqlite3
 import logging
 from pathlib import Path
 
-from db_utils import ensure_column
+from db_utils import STATS_EVERY_S, ConnPool, ensure_columns
+from db_notify import ring_if_changed
 
 ROOT = Path("/opt/scalp/project")
 
@@ -53,56 +54,107 @@ log = logging.getLogger("TRIG")
 def now_ms():
     return int(time.time() * 1000)
 
+# Handles longue durée : triggers.db en écriture, le reste en lecture seule.
+POOL = ConnPool()
+
+
 def conn(db):
-    c = sqlite3.connect(str(db), timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL;")
-    c.execute("PRAGMA busy_timeout=10000;")
-    return c
+    if db == DB_TRIG:
+        return POOL.rw(db)
+    return POOL.ro(db)
+
 
+def _in(xs):
+    return ",".join("?" for _ in xs)
 
-# 🔥 PRIX LIVE DIRECT (sans vue)
-def live_price(instId):
+
+# ==========================================================
+# ADMISSION (1 requête par DB et par cycle)
+# ==========================================================
+# 🔥 PRIX LIVE DIRECT (sans vue) : dernier tick ticks_hist par instId
+def live_prices(instIds):
+    if not instIds:
+        return {}
     with conn(DB_TICKS) as c:
-        r = c.execute("""
-            SELECT lastPr
+        rows = c.execute("""
+            SELECT instId, lastPr, MAX(ts_ms)
             FROM ticks_hist
-            WHERE instId=?
-            ORDER BY ts_ms DESC
-            LIMIT 1
-        """, (instId,)).fetchone()
-        return float(r["lastPr"]) if r else None
+            WHERE instId IN (""" + _in(instIds) + """)
+            GROUP BY instId
+        """, tuple(instIds)).fetchall()
+    return {r["instId"]: float(r["lastPr"]) for r in rows if r["lastPr"] is not None}
 
 
-def uid_exists_anywhere(uid):
+def active_instids():
     with conn(DB_GEST) as g:
-        if g.execute("SELECT 1 FROM gest WHERE uid=? LIMIT 1", (uid,)).fetchone():
-            return True
-    with conn(DB_RECORDER) as r:
-        if r.execute("SELECT 1 FROM recorder WHERE uid=? LIMIT 1", (uid,)).fetchone():
-            return True
-    return False
-
-
-def instid_active(instId):
+        return {
+            r["instId"] for r in g.execute("""
+                SELECT DISTINCT instId FROM gest
+                WHERE status IN (""" + _in(ACTIVE_GEST_STATUSES) + """)
+            """, ACTIVE_GEST_STATUSES)
+        }
+
+
+def fire_instids(t):
+    return {
+        r["instId"] for r in t.execute("""
+            SELECT DISTINCT instId FROM triggers WHERE status='fire'
+        """)
+    }
+
+
+def known_uids(t, uids):
+    """uids déjà présents dans triggers, gest ou recorder (lookup indexé sur uid)."""
+    if not uids:
+        return set()
+    found = {r["uid"] for r in t.execute(
+        "SELECT uid FROM triggers WHERE uid IN (" + _in(uids) + ")", tuple(uids)
+    )}
+    rest = [u for u in uids if u not in found]
+    if not rest:
+        return found
     with conn(DB_GEST) as g:
-        placeholders = ",".join("?" for _ in ACTIVE_GEST_STATUSES)
-        return g.execute("""
-            SELECT 1 FROM gest
-            WHERE instId=?
-              AND status IN (""" + placeholders + """)
-            LIMIT 1
-        """, (instId, *ACTIVE_GEST_STATUSES)).fetchone() is not None
-
-
-def trigger_active(instId):
-    with conn(DB_TRIG) as t:
-        return t.execute("""
-            SELECT 1 FROM triggers
-            WHERE instId=?
-              AND status='fire'
-            LIMIT 1
-        """, (instId,)).fetchone() is not None
+        found |= {r["uid"] for r in g.execute(
+            "SELECT uid FROM gest WHERE uid IN (" + _in(rest) + ")", tuple(rest)
+        )}
+    rest = [u for u in rest if u not in found]
+    if rest:
+        with conn(DB_RECORDER) as r:
+            found |= {x["uid"] for x in r.execute(
+                "SELECT uid FROM recorder WHERE uid IN (" + _in(rest) + ")", tuple(rest)
+            )}
+    return found
+
+
+def attempt_uid(uid, now):
+    """uid d'une nouvelle tentative : dec_writer garde l'uid tant que le setup
+    ne change pas, un trigger annulé (TTL) ou un trade clos l'a déjà consommé."""
+    return f"{uid}-{now}"
+
+
+# ==========================================================
+# STATS (candidats/s, temps par étape)
+# ==========================================================
+STAGES = ("load", "price", "state", "eval", "insert")
+STATS = {"cycles": 0, "candidates": 0, "fired": 0, "skipped": 0, **{k: 0.0 for k in STAGES}}
+_stats_t0 = time.monotonic()
+
+
+def report_stats(force=False):
+    global _stats_t0
+    dt = time.monotonic() - _stats_t0
+    if not force and dt < STATS_EVERY_S:
+        return
+    n = max(STATS["cycles"], 1)
+    log.info(
+        "[STATS] cycles=%d candidates=%d (%.1f/s) fired=%d dec_unchanged=%d | ms/cycle %s",
+        STATS["cycles"], STATS["candidates"], STATS["candidates"] / dt if dt > 0 else 0.0,
+        STATS["fired"], STATS["skipped"],
+        " ".join(f"{k}={STATS[k] * 1000 / n:.2f}" for k in STAGES),
+    )
+    for k in STATS:
+        STATS[k] = 0 if isinstance(STATS[k], int) else 0.0
+    _stats_t0 = time.monotonic()
 
 
 def purge_expired_triggers(t, now):
@@ -116,33 +168,64 @@ def purge_expired_triggers(t, now):
             log.info("[TTL_EXPIRE] %s", r["uid"])
 
 
+# v_dec_fire relu seulement quand dec_writer publie une nouvelle génération
+_DEC_CACHE = {"gen": None, "rows": []}
+
+
+def dec_generation(c):
+    try:
+        r = c.execute("SELECT v FROM dec_meta WHERE k='generation'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return r["v"] if r else None
+
+
 def load_dec_fires():
     with conn(DB_DEC) as c:
-        return c.execute("""
+        gen = dec_generation(c)
+        if gen is not None and gen == _DEC_CACHE["gen"]:
+            STATS["skipped"] += 1
+            return _DEC_CACHE["rows"]
+        rows = c.execute("""
             SELECT uid, instId, side, atr, dec_mode, score_C, ctx
             FROM v_dec_fire
             WHERE fire = 1
         """).fetchall()
+    _DEC_CACHE["gen"], _DEC_CACHE["rows"] = gen, rows
+    return rows
 
 
 def write_triggers():
     now = now_ms()
+    t0 = time.perf_counter()
     rows = load_dec_fires()
+    t1 = time.perf_counter()
+    STATS["cycles"] += 1
+    STATS["load"] += t1 - t0
     if not rows:
         return
 
     with conn(DB_TRIG) as t:
-        for col, typ in (
-            ("trigger_strength", "REAL"),
-            ("trigger_age_ms", "INTEGER"),
-            ("trigger_distance_atr", "REAL"),
-            ("spread_entry", "REAL"),
-            ("signal_age_ms", "INTEGER"),
-        ):
-            ensure_column(t, "triggers", col, typ, log)
+        ensure_columns(t, "triggers", {
+            "trigger_strength": "REAL",
+            "trigger_age_ms": "INTEGER",
+            "trigger_distance_atr": "REAL",
+            "spread_entry": "REAL",
+            "signal_age_ms": "INTEGER",
+        }, log)
 
         purge_expired_triggers(t, now)
 
+        inst_ids = sorted({r["instId"] for r in rows if r["instId"]})
+        prices = live_prices(inst_ids)  # 🔥 prix réel
+        t2 = time.perf_counter()
+
+        # un coin est bloqué par un trade en cours ou un trigger déjà en fire
+        blocked = active_instids() | fire_instids(t)
+        known = known_uids(t, sorted({r["uid"] for r in rows if r["uid"]}))
+        t3 = time.perf_counter()
+
+        batch = []
         for r in rows:
             instId = r["instId"]
             side   = r["side"]
@@ -151,18 +234,20 @@ def write_triggers():
             scoreC = float(r["score_C"] or 0.0)
             ctx    = r["ctx"]
 
-            price = live_price(instId)  # 🔥 prix réel
+            price = prices.get(instId)
 
             if not instId or side not in ("buy", "sell"):
                 continue
             if price is None or atr is None or atr <= 0:
                 continue
-            if instid_active(instId) or trigger_active(instId):
+            if instId in blocked:
                 continue
 
             uid = r["uid"]
-            if not uid or uid_exists_anywhere(uid):
+            if not uid:
                 continue
+            if uid in known:
+                uid = attempt_uid(uid, now)
 
             sc = abs(scoreC)
             score_of = sc
@@ -170,17 +255,7 @@ def write_triggers():
             score_br = 0.45 if mode == "MOMENTUM" else 0.30
             score_force = min(1.0, 0.5 + sc)
 
-            t.execute("""
-                INSERT INTO triggers (
-                    uid, instId, side, entry_reason,
-                    score_of, score_mo, score_br, score_force,
-                    price, atr, ts, status, ts_fire,
-                    phase, fire_reason, ctx,
-                    score_ctx, dec_score_C, dec_mode, ts_created,
-                    trigger_strength, trigger_age_ms, trigger_distance_atr,
-                    spread_entry, signal_age_ms
-                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            """, (
+            batch.append((
                 uid, instId, side,
                 f"DEC:{mode}",
                 score_of, score_mo, score_br, score_force,
@@ -193,17 +268,53 @@ def write_triggers():
                 sc, 0, 0.0,
                 0.0, 0
             ))
+            # même sémantique que la version ligne à ligne : le trigger inséré
+            # bloque les candidats suivants du même coin / uid dans ce cycle
+            blocked.add(instId)
+            known.add(uid)
+        t4 = time.perf_counter()
+
+        if batch:
+            t.executemany("""
+                INSERT INTO triggers (
+                    uid, instId, side, entry_reason,
+                    score_of, score_mo, score_br, score_force,
+                    price, atr, ts, status, ts_fire,
+                    phase, fire_reason, ctx,
+                    score_ctx, dec_score_C, dec_mode, ts_created,
+                    trigger_strength, trigger_age_ms, trigger_distance_atr,
+                    spread_entry, signal_age_ms
+                ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+            """, batch)
+
+            for b in batch:
+                log.info("[FIRED] %s %s uid=%s price=%.6f", b[1], b[2], b[0], b[8])
+
+    t5 = time.perf_counter()
+    STATS["candidates"] += len(rows)
+    STATS["fired"] += len(batch)
+    STATS["price"] += t2 - t1
+    STATS["state"] += t3 - t2
+    STATS["eval"] += t4 - t3
+    STATS["insert"] += t5 - t4
+
+    # `with conn` a commité : réveiller gest sans attendre son LOOP_SLEEP.
+    ring_if_changed(t, DB_TRIG)
+
 
-            log.info("[FIRED] %s %s uid=%s price=%.6f", instId, side, uid, price)
+def cycle():
+    POOL.begin_loop(log)
+    try:
+        write_triggers()
+    except Exception:
+        log.exception("[ERR]")
+    report_stats()
 
 
 def main():
     log.info("[START] triggers engine (DEC → TRIGGERS)")
     while True:
-        try:
-            write_triggers()
-        except Exception:
-            log.exception("[ERR]")
+        cycle()
         time.sleep(ENGINE_SLEEP)
 
 
@@ -4,8 +4,9 @@
 import sqlite3, time, logging, traceback
 import statistics
 
+from tick_archive import TickArchive
+
 ROOT="/opt/scalp/project"
-DB_T=f"{ROOT}/data/t.db"
 DB_TR=f"{ROOT}/data/trigger.db"
 DB_W=f"{ROOT}/data/wticks.db"
 
@@ -17,6 +18,8 @@ logging.basicConfig(
 )
 log=logging.getLogger("WTICKS")
 
+ARCH=TickArchive()
+
 def conn(path):
     c=sqlite3.connect(path,timeout=3,isolation_level=None)
     c.execute("PRAGMA journal_mode=WAL;")
@@ -31,17 +34,18 @@ def fetch_tasks():
     """).fetchall()
     return rows
 
+def canon(instId_raw):
+    s=str(instId_raw or "").upper().split(":")[0].replace("/","")
+    return f"{s[:-4]}/USDT" if s.endswith("USDT") else s
+
 def fetch_ticks(instId_raw, ts_signal):
-    c=conn(DB_T)
+    # chemin complet depuis l'archive binaire (ticks_hist ne garde que 200 ticks)
     t_min = ts_signal - 10_000
     t_max = ts_signal + 30_000
-    rows=c.execute("""
-        SELECT ts, price, bid, ask, q_buy, q_sell
-        FROM ticks
-        WHERE instId=? AND ts BETWEEN ? AND ?
-        ORDER BY ts ASC
-    """,(instId_raw, t_min, t_max)).fetchall()
-    return rows
+    w=ARCH.window(canon(instId_raw), t_min, t_max)
+    # pas de flux trades : q_buy / q_sell à 0 (pressure_bias neutre)
+    return [(int(ts), float(px), float(b), float(a), 0.0, 0.0)
+            for ts, px, b, a in zip(w.ts, w.px, w.bid, w.ask)]
 
 def compute_metrics(rows, price_signal, ts_signal):
     if not rows:
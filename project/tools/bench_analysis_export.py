@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+analysis export — Arrow IPC day partitions vs SELECT * per analysis module
+
+- recorder.db built from schema_ref.sql in a temp dir: N trades spread over
+  ~60 days (every recorder column filled with plausible values, a few
+  NULLs) and 4 recorder_steps rows per trade
+- Legacy: pandas read_sql_query("SELECT * FROM recorder") once per module
+  that loads it in analysis.run_all (LOADS_PER_RUN times)
+- New: analysis.export.update (full, then incremental after new trades),
+  analysis.db.load_table through the export: first load (memory-map +
+  tail rows still in SQLite), cached loads, projected load of 5 columns
+- Checks: exported frames == SQLite frames (values, row order) for both
+  tables, with and without un-exported tail rows; interrupted compaction
+  leaves no duplicate
+
+Usage:
+    python project/tools/bench_analysis_export.py [--trades 100000]
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+sys.path.insert(0, str(SCRIPT_DIR.parents[1]))
+
+import pandas as pd  # noqa: E402
+
+import replay  # noqa: E402
+from analysis import db, export  # noqa: E402
+
+T0 = 1_700_000_000_000
+DAY_MS = 86_400_000
+LOADS_PER_RUN = 40          # db.load_table(conn, "recorder") calls in run_all
+
+
+def fill(c, k0, n, rnd):
+    cols = [(r[1], (r[2] or "").upper()) for r in c.execute("PRAGMA table_info(recorder)")]
+    rows, steps = [], []
+    for k in range(k0, k0 + n):
+        ts_open = T0 + int(k * 60 * DAY_MS / max(n + k0, 1)) + rnd.randrange(60_000)
+        row = []
+        for name, decl in cols:
+            if name == "uid":
+                v = f"U{k:07d}"
+            elif name in ("instId",):
+                v = rnd.choice(("BTC/USDT", "ETH/USDT", "SOL/USDT", "DOGE/USDT"))
+            elif name == "side":
+                v = rnd.choice(("buy", "sell"))
+            elif name.startswith("ts_") or name.endswith("_ts"):
+                v = ts_open + (rnd.randrange(1000, 900_000) if name in ("ts_close", "ts_recorded") else 0)
+            elif "INT" in decl:
+                v = rnd.randrange(5)
+            elif "TEXT" in decl:
+                v = rnd.choice(("TP_DYN", "SL_BE", "SL_TRAIL", None))
+            else:
+                v = None if rnd.random() < 0.03 else rnd.gauss(0, 1)
+            if v is None and name in ("price_signal",):
+                v = 0.0
+            row.append(v)
+        rows.append(row)
+        for step, et in enumerate(("open", "pyramide", "partial", "close"), 1):
+            steps.append((f"U{k:07d}", step, et, "BENCH", 10 + rnd.random(), 1.0, ts_open + step * 1000,
+                          None, None, None, rnd.random(), rnd.random(), 0))
+    c.execute("BEGIN")
+    c.executemany(f"INSERT INTO recorder ({','.join(n for n, _ in cols)}) VALUES ({','.join('?' * len(cols))})",
+                  rows)
+    c.executemany("INSERT INTO recorder_steps VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", steps)
+    c.execute("COMMIT")
+
+
+def frames_equal(a, b):
+    if list(a.columns) != list(b.columns) or len(a) != len(b):
+        return False
+    for col in a.columns:
+        x, y = a[col], b[col]
+        xn = pd.to_numeric(x, errors="coerce")
+        if xn.notna().sum() == x.notna().sum() and x.notna().any():
+            yn = pd.to_numeric(y, errors="coerce")
+            if not ((xn - yn).abs().fillna(0) < 1e-12).all() or not (xn.isna() == yn.isna()).all():
+                return False
+        elif not (x.astype(object).where(x.notna(), None).tolist()
+                  == y.astype(object).where(y.notna(), None).tolist()):
+            return False
+    return True
+
+
+def check(label, ok, errors):
+    print(f"[{'OK' if ok else 'FAIL'}] {label}")
+    if not ok:
+        errors.append(label)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--trades", type=int, default=100_000)
+    ap.add_argument("--legacy-loads", type=int, default=5, help="SELECT * timed (x LOADS_PER_RUN)")
+    args = ap.parse_args()
+
+    errors = []
+    rnd = random.Random(11)
+    with tempfile.TemporaryDirectory(prefix="scalp_export_") as tmp:
+        path = Path(tmp) / "recorder.db"
+        replay.create_from_ref(path, "recorder")
+        c = sqlite3.connect(path, isolation_level=None)
+        c.execute("PRAGMA journal_mode=WAL;")
+        fill(c, 0, args.trades, rnd)
+        print(f"[BENCH] recorder.db: {args.trades} trades, {4 * args.trades} steps, "
+              f"{path.stat().st_size / 1e6:.0f} MB")
+
+        conn = db.connect_db(path)
+        t0 = time.perf_counter()
+        for _ in range(args.legacy_loads):
+            ref = pd.read_sql_query("SELECT * FROM recorder", conn)
+        s_sql = (time.perf_counter() - t0) / args.legacy_loads
+        print(f"[BENCH] legacy: SELECT * recorder {s_sql * 1000:.0f} ms -> x{LOADS_PER_RUN} per run_all "
+              f"= {s_sql * LOADS_PER_RUN:.1f}s")
+
+        t0 = time.perf_counter()
+        res = export.update(path)
+        s_full = time.perf_counter() - t0
+        fill(c, args.trades, 1000, rnd)
+        t0 = time.perf_counter()
+        res_inc = export.update(path)
+        s_inc = time.perf_counter() - t0
+        print(f"[BENCH] export: full {s_full:.1f}s ({res['recorder']['rows']} + {res['recorder_steps']['rows']} rows), "
+              f"incremental +1000 trades {s_inc * 1000:.0f} ms ({res_inc['recorder']['rows']} rows)")
+
+        # tail : lignes enregistrées après l'export, lues depuis SQLite
+        fill(c, args.trades + 1000, 500, rnd)
+        db._FRAMES.clear()
+        t0 = time.perf_counter()
+        first = db.load_table(conn, "recorder")
+        s_first = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(LOADS_PER_RUN - 1):
+            db.load_table(conn, "recorder")
+        s_cached = (time.perf_counter() - t0) / (LOADS_PER_RUN - 1)
+        t0 = time.perf_counter()
+        db._FRAMES.clear()
+        proj = db.load_table(conn, "recorder", ["uid", "instId", "pnl_net", "ts_open", "ts_close"])
+        s_proj = time.perf_counter() - t0
+        s_run = s_first + s_cached * (LOADS_PER_RUN - 1)
+        print(f"[BENCH] new: first load {s_first * 1000:.0f} ms (mmap + 500 tail rows), cached copy "
+              f"{s_cached * 1000:.1f} ms -> x{LOADS_PER_RUN} per run_all = {s_run:.2f}s "
+              f"(x{s_sql * LOADS_PER_RUN / s_run:.0f}) | 5-column projection {s_proj * 1000:.0f} ms")
+
+        ref = pd.read_sql_query("SELECT * FROM recorder", conn)
+        check(f"recorder frame == SELECT * ({len(first)} rows, export + tail)", frames_equal(ref, first), errors)
+        check("projected frame == SELECT of the same columns",
+              frames_equal(pd.read_sql_query('SELECT uid, instId, pnl_net, ts_open, ts_close FROM recorder', conn),
+                           proj), errors)
+        steps = db.load_table(conn, "recorder_steps")
+        check(f"recorder_steps frame == SELECT * ({len(steps)} rows)",
+              frames_equal(pd.read_sql_query("SELECT * FROM recorder_steps", conn), steps), errors)
+
+        # compaction interrompue : parts déjà couvertes laissées sur disque
+        for _ in range(export.MAX_PARTS + 1):
+            fill(c, args.trades + 1500 + _, 1, rnd)
+            export.update(path)
+        day_dirs = sorted((export.export_root(path) / "recorder").glob("day=*"))
+        n_parts = max(len(list(d.glob("part-*.arrow"))) for d in day_dirs)
+        last_day = max(day_dirs, key=lambda d: max(p.stat().st_mtime for p in d.glob("part-*.arrow")))
+        compacted = sorted(last_day.glob("part-*.arrow"))[-1]
+        stale = compacted.with_name(f"part-{export._part_range(compacted)[1]:012d}-"
+                                    f"{export._part_range(compacted)[1]:012d}.arrow")
+        export._write(stale, export.read_part(compacted).slice(len(export.read_part(compacted)) - 1))
+        db._FRAMES.clear()
+        again = db.load_table(conn, "recorder")
+        check(f"after compaction (max {n_parts} parts / day) + stale part: frame == SELECT * ({len(again)} rows)",
+              frames_equal(pd.read_sql_query("SELECT * FROM recorder", conn), again), errors)
+        conn.close()
+        c.close()
+
+    for err in errors:
+        print(f"[FAIL] {err}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
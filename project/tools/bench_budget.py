@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+budget — running-total aggregator vs full-history SUMs per cycle
+
+- exec.db / recorder.db / budget.db built from schema_ref.sql in a temp
+  dir; exec ledger from bench_exec_position.ledger (a few % of uids stay
+  open), one recorder row per closed uid (default 100k trades)
+- Legacy: the former recompute_budget SQL (SUM recorder, SUM exec fee,
+  GROUP BY uid over every open/pyramide row, DELETE + re-insert of
+  budget_exposure), timed per cycle
+- New: scripts/budget.recompute_budget on the same DBs: first cycle
+  (reconcile), idle cycles, cycles with new fills / trades
+- Checks: pnl / fee totals == full SUMs, budget_exposure == open uids of
+  the legacy exposure, same-ms fill committed after a folded one is
+  counted once, --reconcile drift == 0
+
+Usage:
+    python project/tools/bench_budget.py [--trades 100000] [--cycles 50]
+"""
+
+import argparse
+import logging
+import math
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+sys.path.insert(0, str(SCRIPT_DIR))
+
+logging.basicConfig(level=logging.CRITICAL)
+
+import budget  # noqa: E402
+import exec_position as ep  # noqa: E402
+import replay  # noqa: E402
+from bench_exec_position import ledger  # noqa: E402
+
+INSERT_EXEC = """INSERT INTO exec (exec_id, uid, step, exec_type, side, qty, price_exec, fee,
+                 status, ts_exec) VALUES (?,?,?,?,?,?,?,?,'done',?)"""
+
+
+def legacy_cycle(e, r, b, ts):
+    pnl = r.execute("SELECT COALESCE(SUM(pnl_realized), 0.0) FROM recorder").fetchone()[0]
+    fee = e.execute("SELECT COALESCE(SUM(fee), 0.0) FROM exec").fetchone()[0]
+    exposures = {u: n or 0.0 for u, n in e.execute("""
+        SELECT uid, SUM(ABS(qty * price_exec)) FROM exec
+        WHERE exec_type IN ('open','pyramide') GROUP BY uid""")}
+    b.execute("DELETE FROM budget_exposure")
+    for uid, n in exposures.items():
+        b.execute("INSERT INTO budget_exposure(uid, notional_engaged, ts_update) VALUES (?,?,?)",
+                  (uid, n, ts))
+    b.commit()
+    return pnl, fee, exposures
+
+
+def setup(tmp, rows):
+    for name in ("exec", "recorder", "budget"):
+        replay.create_from_ref(tmp / f"{name}.db", name)
+    e = sqlite3.connect(tmp / "exec.db", isolation_level=None)
+    e.execute("PRAGMA journal_mode=WAL;")
+    ep.ensure_schema(e)
+    e.execute("BEGIN")
+    e.executemany(INSERT_EXEC, rows)
+    e.execute("COMMIT")
+
+    rnd = random.Random(4)
+    closed = sorted({r[1] for r in rows if r[3] == "close"})
+    rc = sqlite3.connect(tmp / "recorder.db", isolation_level=None)
+    rc.execute("PRAGMA journal_mode=WAL;")
+    rc.execute("BEGIN")
+    rc.executemany("""INSERT INTO recorder (uid, instId, side, ts_signal, price_signal, ts_recorded,
+                      pnl_realized) VALUES (?,?,?,?,?,?,?)""",
+                   [(u, "C/USDT", "buy", 0, 1.0, 0, rnd.gauss(0, 2)) for u in closed])
+    rc.execute("COMMIT")
+
+    b = sqlite3.connect(tmp / "budget.db")
+    # budget_state de schema_ref = ancien layout ; celui de budget.py est recréé
+    b.execute("DROP TABLE IF EXISTS budget_state")
+    b.execute("INSERT INTO balance (id, balance_usdt) VALUES (1, 10000.0)")
+    b.commit()
+    b.close()
+
+    budget.DB_EXEC, budget.DB_REC, budget.DB_BUDGET = tmp / "exec.db", tmp / "recorder.db", tmp / "budget.db"
+    budget.init_budget_db()
+    return e, rc, len(closed)
+
+
+def close_enough(a, b):
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--trades", type=int, default=100_000)
+    ap.add_argument("--cycles", type=int, default=50)
+    args = ap.parse_args()
+
+    errors = []
+    # ~4 fills / uid, ~97 % fermés : taille du ledger pour `trades` trades
+    rows = ledger(int(args.trades * 4.06 / 0.97))
+    with tempfile.TemporaryDirectory(prefix="scalp_budget_") as tmp:
+        tmp = Path(tmp)
+        e, rc, n_trades = setup(tmp, rows)
+        print(f"[BENCH] {n_trades} recorded trades, {len(rows)} exec rows")
+
+        le = sqlite3.connect(f"file:{tmp / 'exec.db'}?mode=ro", uri=True)
+        lr = sqlite3.connect(f"file:{tmp / 'recorder.db'}?mode=ro", uri=True)
+        lb = sqlite3.connect(tmp / "legacy_budget.db")
+        lb.execute("CREATE TABLE budget_exposure (uid TEXT PRIMARY KEY, notional_engaged REAL, ts_update INTEGER)")
+        t0 = time.perf_counter()
+        for _ in range(3):
+            legacy_cycle(le, lr, lb, 0)
+        ms_legacy = (time.perf_counter() - t0) / 3 * 1000
+
+        t0 = time.perf_counter()
+        budget.recompute_budget()
+        ms_first = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        for _ in range(args.cycles):
+            budget.recompute_budget()
+        ms_idle = (time.perf_counter() - t0) / args.cycles * 1000
+
+        # cycles avec activité : 20 fills + 5 trades enregistrés par cycle
+        rnd = random.Random(8)
+        ts = rows[-1][8]
+        k = 0
+        t_busy = 0.0
+        for _ in range(args.cycles):
+            fills = []
+            for _ in range(20):
+                ts += 1
+                uid = f"N{k // 4:07d}"
+                et = ("open", "pyramide", "partial", "close")[k % 4]
+                qty = 1.0 if et != "partial" else 0.5
+                qty = 1.5 if et == "close" else qty
+                fills.append((f"{uid}-{k % 4 + 1}", uid, k % 4 + 1, et, "buy", qty,
+                              10 + rnd.random(), 0.01, ts))
+                k += 1
+            e.execute("BEGIN")
+            e.executemany(INSERT_EXEC, fills)
+            e.execute("COMMIT")
+            rc.execute("BEGIN")
+            rc.executemany("""INSERT INTO recorder (uid, instId, side, ts_signal, price_signal,
+                              ts_recorded, pnl_realized) VALUES (?,?,?,?,?,?,?)""",
+                           [(f"R{k}-{j}", "C/USDT", "buy", 0, 1.0, 0, rnd.gauss(0, 2)) for j in range(5)])
+            rc.execute("COMMIT")
+            t0 = time.perf_counter()
+            budget.recompute_budget()
+            t_busy += time.perf_counter() - t0
+        ms_busy = t_busy / args.cycles * 1000
+
+        # même ms qu'un fill déjà compté, exec_id plus petit : doit être compté
+        budget.recompute_budget()
+        e.execute(INSERT_EXEC, ("A-late", "A-late", 1, "open", "sell", 2.0, 5.0, 0.25, ts))
+        budget.recompute_budget()
+        budget.recompute_budget()
+
+        pnl, fee, exposures = legacy_cycle(le, lr, lb, 0)
+        b = sqlite3.connect(tmp / "budget.db")
+        got_pnl, got_fee = b.execute("SELECT pnl_realized, fee_total FROM budget_state WHERE id=1").fetchone()
+        ok = close_enough(got_pnl, pnl) and close_enough(got_fee, fee)
+        print(f"[{'OK' if ok else 'FAIL'}] running totals == full SUMs (pnl {got_pnl:.4f} / {pnl:.4f}, "
+              f"fee {got_fee:.4f} / {fee:.4f})")
+        if not ok:
+            errors.append("totals")
+
+        open_uids = set(budget.open_positions(budget.conn(budget.DB_EXEC, ro=True)))
+        want = {u: n for u, n in exposures.items() if u in open_uids}
+        got = dict(b.execute("SELECT uid, notional_engaged FROM budget_exposure"))
+        ok = set(got) == set(want) and all(close_enough(got[u], want[u]) for u in want)
+        print(f"[{'OK' if ok else 'FAIL'}] budget_exposure == open uids ({len(got)} open, "
+              f"legacy kept {len(exposures)} uids)")
+        if not ok:
+            errors.append("exposure")
+        b.close()
+
+        bb = budget.conn(budget.DB_BUDGET)
+        drift = budget.reconcile(budget.conn(budget.DB_EXEC, ro=True), budget.conn(budget.DB_REC, ro=True),
+                                 bb, 0)
+        bb.rollback()
+        ok = all(v is not None and abs(v) < 1e-6 for v in drift.values())
+        print(f"[{'OK' if ok else 'FAIL'}] reconcile drift {drift}")
+        if not ok:
+            errors.append("reconcile drift")
+
+        print(f"[BENCH] legacy cycle {ms_legacy:8.1f} ms | new: first (reconcile) {ms_first:8.1f} ms, "
+              f"idle {ms_idle:6.2f} ms, busy (20 fills + 5 trades) {ms_busy:6.2f} ms "
+              f"(x{ms_legacy / ms_busy:.0f})")
+        for c in (e, rc, le, lr, lb):
+            c.close()
+
+    for err in errors:
+        print(f"[FAIL] {err}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
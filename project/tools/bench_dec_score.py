@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+dec_score (materialised) vs legacy v_dec_score_s / v_dec_fire views
+
+- Throw-away dec.db with snap_ctx / snap_range / snap_ticks / ticks_live for
+  N instruments (random ranges, prices around the range edges)
+- Legacy views (v_dec_flags, v_dec_score_s, v_dec_fire) are taken verbatim
+  from schema_ref.sql and created in a second DB with the same data
+- Parity: every score / flag column of legacy v_dec_score_s and the
+  v_dec_fire row set must match dec_score.compute
+- Latency: per-lookup time of gest.load_dec_payload-style queries
+  (by instId on the legacy view, by uid / instId on the thin view) and
+  full v_dec_fire scans, plus the per-cycle compute + write cost
+
+Usage:
+    python project/tools/bench_dec_score.py [--instruments 400] [--lookups 2000]
+"""
+
+import argparse
+import math
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import dec_score  # noqa: E402
+
+SCHEMA_REF = SCRIPT_DIR.parent / "schema_ref.sql"
+
+DDL = (
+    """CREATE TABLE snap_ctx (uid TEXT, instId TEXT PRIMARY KEY, ctx TEXT, score_C REAL, side TEXT,
+        ctx_ok INTEGER, ts_updated INTEGER, atr_fast REAL, atr_slow REAL, vol_regime TEXT)""",
+    """CREATE TABLE snap_range (instId TEXT PRIMARY KEY, high_20 REAL, low_20 REAL, atr REAL,
+        bb_width REAL, compression_ok INTEGER, ts INTEGER)""",
+    "CREATE TABLE snap_ticks (instId_s TEXT PRIMARY KEY, lastPr REAL NOT NULL, ts INTEGER NOT NULL)",
+    "CREATE TABLE ticks_live (instId TEXT PRIMARY KEY, lastPr REAL NOT NULL, ts_ms INTEGER NOT NULL)",
+)
+
+SCORE_COLS = (
+    "lastPr", "high_20", "low_20", "atr", "compression_ok",
+    "cont_ok", "trend_ok", "drift_ok",
+    "s_struct", "s_timing", "s_quality", "s_vol", "s_confirm", "score_S",
+)
+WANTED = ("uid", "instId", "score_C", "ctx", "dec_mode", "compression_ok",
+          "score_S", "s_struct", "s_quality", "s_vol", "s_confirm")
+
+
+def legacy_view(name):
+    """CREATE VIEW statement of `name` as dumped in schema_ref.sql (dec.db section)."""
+    text = SCHEMA_REF.read_text()
+    dec = text[text.index("-- DATABASE: dec.db"):]
+    m = re.search(rf"^VIEW {name} (CREATE VIEW .*?)(?=^(?:VIEW|TABLE|INDEX|TRIGGER) |^-- =)",
+                  dec, re.S | re.M)
+    return m.group(1)
+
+
+def synth(n, seed=3):
+    rnd = random.Random(seed)
+    snaps, ranges, ticks = [], {}, {}
+    for i in range(n):
+        inst = f"C{i:04d}/USDT"
+        side = rnd.choice(("buy", "sell", "buy", "sell", None))
+        ctx = rnd.choice(("bullish", "bearish", "neutral"))
+        vol = rnd.choice(("EXPAND", "NORMAL", "COMPRESS", "UNKNOWN"))
+        sc = None if rnd.random() < 0.05 else rnd.uniform(-1, 1)
+        snaps.append((f"U{i}", inst, ctx, sc, side, rnd.uniform(0.1, 2), rnd.uniform(0.5, 3), vol, 1, 1000 + i))
+        lo = rnd.uniform(50, 150)
+        hi = lo + rnd.uniform(-1, 10)                      # includes hi <= lo ranges
+        atr = None if rnd.random() < 0.05 else rnd.choice((0.0, rnd.uniform(0.1, 3)))
+        if rnd.random() < 0.9:
+            ranges[inst] = (hi if rnd.random() > 0.03 else None, lo, atr,
+                            rnd.uniform(0, 1), rnd.choice((0, 1, None)))
+        if rnd.random() < 0.95:
+            ticks[inst] = (rnd.uniform(lo - 5, hi + 5), 2000 + i)
+    return snaps, ranges, ticks
+
+
+def fill(c, snaps, ranges, ticks):
+    for ddl in DDL:
+        c.execute(ddl)
+    c.executemany("""INSERT INTO snap_ctx (uid, instId, ctx, score_C, side, atr_fast, atr_slow,
+        vol_regime, ctx_ok, ts_updated) VALUES (?,?,?,?,?,?,?,?,?,?)""", snaps)
+    c.executemany("INSERT INTO snap_range VALUES (?,?,?,?,?,?,0)", [(k, *v) for k, v in ranges.items()])
+    c.executemany("INSERT INTO snap_ticks VALUES (?,?,?)", [(k, *v) for k, v in ticks.items()])
+    c.executemany("INSERT INTO ticks_live VALUES (?,?,?)", [(k, v[0], v[1]) for k, v in ticks.items()])
+
+
+def same(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return math.isclose(float(a), float(b), rel_tol=1e-9, abs_tol=1e-12)
+
+
+def per_lookup(c, sql, keys, n):
+    t0 = time.perf_counter()
+    for k in range(n):
+        c.execute(sql, (keys[k % len(keys)],)).fetchone()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, default=400)
+    ap.add_argument("--lookups", type=int, default=2000)
+    args = ap.parse_args()
+
+    snaps, ranges, ticks = synth(args.instruments)
+    errors = []
+
+    with tempfile.TemporaryDirectory(prefix="scalp_dec_") as tmp:
+        old = sqlite3.connect(Path(tmp) / "legacy.db")
+        old.row_factory = sqlite3.Row
+        fill(old, snaps, ranges, ticks)
+        for name in ("v_dec_flags", "v_dec_score_s", "v_dec_fire"):
+            old.execute(legacy_view(name))
+        old.commit()
+
+        new = sqlite3.connect(Path(tmp) / "dec.db")
+        new.row_factory = sqlite3.Row
+        fill(new, snaps, ranges, ticks)
+        dec_score.ensure_schema(new)
+        t0 = time.perf_counter()
+        r, t = dec_score.load_inputs(new, "instId_s")
+        dec_score.write(new, dec_score.compute(snaps, r, t), {})
+        new.commit()
+        t_cycle = (time.perf_counter() - t0) * 1000
+
+        # ---- parity
+        legacy = {x["instId"]: x for x in old.execute("SELECT * FROM v_dec_score_s")}
+        thin = {x["instId"]: x for x in new.execute("SELECT * FROM v_dec_score_s")}
+        if set(legacy) != set(thin):
+            errors.append(f"v_dec_score_s row set differs ({len(legacy)} vs {len(thin)})")
+        bad = [(i, k, legacy[i][k], thin[i][k]) for i in legacy.keys() & thin.keys()
+               for k in SCORE_COLS if not same(legacy[i][k], thin[i][k])]
+        errors += [f"{i} {k}: legacy={a} new={b}" for i, k, a, b in bad[:10]]
+        print(f"[{'OK' if not bad and set(legacy) == set(thin) else 'FAIL'}] "
+              f"v_dec_score_s parity ({len(thin)} rows x {len(SCORE_COLS)} cols)")
+
+        fire_old = sorted(tuple(x) for x in old.execute("SELECT * FROM v_dec_fire ORDER BY instId"))
+        fire_new = sorted(tuple(x) for x in new.execute("SELECT * FROM v_dec_fire ORDER BY instId"))
+        ok = fire_old == fire_new
+        if not ok:
+            errors.append("v_dec_fire rows differ")
+        print(f"[{'OK' if ok else 'FAIL'}] v_dec_fire parity ({len(fire_new)} rows)")
+
+        # ---- latency
+        insts = [s[1] for s in snaps]
+        uids = [s[0] for s in snaps]
+        old_cols = [c for c in WANTED if c in legacy[next(iter(legacy))].keys()]
+        new_cols = list(WANTED)
+        q_old = f"SELECT {', '.join(old_cols)} FROM v_dec_score_s WHERE instId=? LIMIT 1"
+        q_uid = f"SELECT {', '.join(new_cols)} FROM v_dec_score_s WHERE uid=? LIMIT 1"
+        q_inst = (f"SELECT {', '.join(new_cols)} FROM v_dec_score_s WHERE instId=? "
+                  "ORDER BY COALESCE(ts_updated, 0) DESC LIMIT 1")
+        n = args.lookups
+        us_old = per_lookup(old, q_old, insts, max(1, n // 10))
+        us_uid = per_lookup(new, q_uid, uids, n)
+        us_inst = per_lookup(new, q_inst, insts, n)
+        print(f"[BENCH] lookup legacy v_dec_score_s by instId : {us_old:10.1f} us")
+        print(f"[BENCH] lookup dec_score view by uid          : {us_uid:10.1f} us  (x{us_old / us_uid:.0f})")
+        print(f"[BENCH] lookup dec_score view by instId       : {us_inst:10.1f} us  (x{us_old / us_inst:.0f})")
+
+        for label, c in (("legacy", old), ("thin  ", new)):
+            t0 = time.perf_counter()
+            for _ in range(20):
+                c.execute("SELECT * FROM v_dec_fire WHERE fire = 1").fetchall()
+            print(f"[BENCH] v_dec_fire scan {label}: {(time.perf_counter() - t0) / 20 * 1000:8.2f} ms")
+        print(f"[BENCH] dec_writer compute + write ({len(snaps)} snaps): {t_cycle:.2f} ms / cycle")
+
+        old.close()
+        new.close()
+
+    for e in errors:
+        print(f"[FAIL] {e}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+exec_position — incremental position ledger vs legacy v_exec_position CTEs
+
+- Synthetic exec ledger (status done): per uid an open, pyramides,
+  partials and usually a close, with random prices / fees
+- Legacy: exec table + v_exec_ledger / v_exec_position / v_exec_pnl_uid
+  exactly as in schema_ref.sql (full re-aggregation). Their cost grows
+  faster than linearly, so they are measured on --legacy-rows only
+- New: scripts/exec_position.ensure_schema (rebuild from the ledger) then
+  the thin views over exec_position
+- Parity on the legacy-sized ledger: every row of v_exec_position /
+  v_exec_pnl_uid, rebuild vs legacy and fill-by-fill apply() vs legacy
+- Timings on the 1M-row ledger: rebuild, closer full scan (uid, qty_open),
+  by-uid lookups on both views, cost of UPDATE exec + apply() per fill
+  (WAL, synchronous=NORMAL like ConnPool writers)
+
+Usage:
+    python project/tools/bench_exec_position.py [--rows 1000000] [--legacy-rows 20000]
+"""
+
+import argparse
+import math
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import exec_position as ep  # noqa: E402
+import replay  # noqa: E402
+
+POS_COLS = ("side", "qty_open", "avg_price_open", "fee_total",
+            "last_exec_type", "last_step", "last_price_exec", "last_ts_exec")
+
+
+def ledger(n_rows, seed=9):
+    """[(exec_id, uid, step, exec_type, side, qty, price_exec, fee, ts_exec)]"""
+    rnd = random.Random(seed)
+    rows = []
+    ts = 1_700_000_000_000
+    k = 0
+    while len(rows) < n_rows:
+        uid = f"U{k:07d}"
+        side = "buy" if k % 2 else "sell"
+        px = 10 + 90 * rnd.random()
+        types = ["open"] + ["pyramide"] * rnd.randrange(3) + ["partial"] * rnd.randrange(3)
+        if rnd.random() < 0.97:
+            types.append("close")
+        for step, t in enumerate(types, 1):
+            px *= 1 + rnd.gauss(0, 0.003)
+            qty = round(rnd.uniform(0.1, 5.0), 3)
+            ts += rnd.randrange(1, 500)
+            rows.append((f"{uid}-{step}", uid, step, t, side, qty, px, qty * px * 0.0006, ts))
+        k += 1
+    return rows[:n_rows]
+
+
+def make_db(path, rows):
+    replay.create_from_ref(path, "exec")
+    c = sqlite3.connect(path, isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL;")
+    c.execute("PRAGMA synchronous=NORMAL;")
+    c.execute("BEGIN")
+    c.executemany("""INSERT INTO exec (exec_id, uid, step, exec_type, side, qty, price_exec, fee,
+                     status, ts_exec) VALUES (?,?,?,?,?,?,?,?,'done',?)""", rows)
+    c.execute("COMMIT")
+    return c
+
+
+def same(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+def compare(ref, new, label):
+    bad = 0
+    for uid, r in ref.items():
+        n = new.get(uid)
+        if n is None or not all(same(x, y) for x, y in zip(r, n)):
+            bad += 1
+    bad += len(set(new) - set(ref))
+    print(f"[{'OK' if not bad else 'FAIL'}] {label} ({len(ref)} uids, bad={bad})")
+    return bad == 0
+
+
+def snapshot(c, uids=None):
+    pos = {r[0]: r[1:] for r in c.execute(f"SELECT uid, {', '.join(POS_COLS)} FROM v_exec_position")}
+    pnl = {r[0]: r[1:] for r in c.execute("SELECT uid, pnl_realized FROM v_exec_pnl_uid")}
+    if uids is not None:
+        pos = {u: v for u, v in pos.items() if u in uids}
+        pnl = {u: v for u, v in pnl.items() if u in uids}
+    return pos, pnl
+
+
+def timings(c, uids, scan=True):
+    out = {}
+    if scan:
+        t0 = time.perf_counter()
+        out["n"] = len(c.execute("SELECT uid, qty_open FROM v_exec_position").fetchall())
+        out["scan_ms"] = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    for u in uids:
+        c.execute("SELECT qty_open, avg_price_open FROM v_exec_position WHERE uid=?", (u,)).fetchone()
+    out["pos_us"] = (time.perf_counter() - t0) / len(uids) * 1e6
+    t0 = time.perf_counter()
+    for u in uids:
+        c.execute("SELECT pnl_realized FROM v_exec_pnl_uid WHERE uid=?", (u,)).fetchone()
+    out["pnl_us"] = (time.perf_counter() - t0) / len(uids) * 1e6
+    return out
+
+
+def fill_loop(c, fills, with_apply):
+    """UPDATE exec status done (+ apply) fill par fill, 1 transaction / fill."""
+    c.executemany("""INSERT INTO exec (exec_id, uid, step, exec_type, side, qty, price_exec, fee,
+                     status, ts_exec) VALUES (?,?,?,?,?,?,?,?,'open',?)""", fills)
+    t0 = time.perf_counter()
+    for exec_id, uid, step, et, side, qty, px, fee, ts in fills:
+        c.execute("BEGIN")
+        c.execute("UPDATE exec SET status='done' WHERE exec_id=?", (exec_id,))
+        if with_apply:
+            ep.apply(c, uid, side, et, qty, px, fee, step, ts)
+        c.execute("COMMIT")
+    return (time.perf_counter() - t0) / len(fills) * 1e6
+
+
+def parity(tmp, rows, errors):
+    legacy = make_db(tmp / "legacy.db", rows)
+    new = make_db(tmp / "new.db", rows)
+    ep.ensure_schema(new)
+    ref_pos, ref_pnl = snapshot(legacy)
+    new_pos, new_pnl = snapshot(new)
+    if not compare(ref_pos, new_pos, "rebuild v_exec_position == legacy"):
+        errors.append("rebuild position")
+    if not compare(ref_pnl, new_pnl, "rebuild v_exec_pnl_uid == legacy"):
+        errors.append("rebuild pnl")
+
+    # fill par fill, comme exec.py (UPDATE done + apply dans la même transaction)
+    inc = make_db(tmp / "inc.db", [])
+    ep.ensure_schema(inc)
+    fill_loop(inc, rows, True)
+    inc_pos, inc_pnl = snapshot(inc)
+    if not compare(ref_pos, inc_pos, "apply() v_exec_position == legacy"):
+        errors.append("apply position")
+    if not compare(ref_pnl, inc_pnl, "apply() v_exec_pnl_uid == legacy"):
+        errors.append("apply pnl")
+    inc.close()
+    new.close()
+    return legacy
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--legacy-rows", type=int, default=20_000)
+    ap.add_argument("--lookups", type=int, default=5000)
+    ap.add_argument("--fills", type=int, default=5000)
+    args = ap.parse_args()
+
+    errors = []
+    rnd = random.Random(2)
+
+    with tempfile.TemporaryDirectory(prefix="scalp_execpos_") as tmp:
+        tmp = Path(tmp)
+        small = ledger(args.legacy_rows)
+        legacy = parity(tmp, small, errors)
+        uids = sorted({r[1] for r in small})
+        lg = timings(legacy, [rnd.choice(uids) for _ in range(3)])
+        legacy.close()
+        print(f"[BENCH] legacy views, {len(small)} rows / {lg['n']} uids: closer scan {lg['scan_ms']:,.0f} ms, "
+              f"by uid: position {lg['pos_us'] / 1000:,.1f} ms  pnl {lg['pnl_us'] / 1000:,.0f} ms")
+
+        rows = ledger(args.rows + args.fills)
+        big, fills = rows[:args.rows], rows[args.rows:]
+        uids = sorted({r[1] for r in big})
+        new = make_db(tmp / "big.db", big)
+        t0 = time.perf_counter()
+        ep.ensure_schema(new)
+        print(f"[BENCH] exec_position, {len(big)} rows / {len(uids)} uids: "
+              f"ensure_schema + rebuild {time.perf_counter() - t0:.1f}s")
+        nw = timings(new, [rnd.choice(uids) for _ in range(args.lookups)])
+        print(f"[BENCH] exec_position: closer scan {nw['scan_ms']:,.0f} ms, "
+              f"by uid: position {nw['pos_us']:.1f} us  pnl {nw['pnl_us']:.1f} us")
+        half = len(fills) // 2
+        us_plain = fill_loop(new, fills[:half], False)
+        us_apply = fill_loop(new, fills[half:], True)
+        print(f"[BENCH] fill on {len(big)}-row ledger: UPDATE exec {us_plain:.1f} us, "
+              f"UPDATE exec + apply() {us_apply:.1f} us (+{us_apply - us_plain:.1f} us / fill)")
+        new.close()
+
+    for e in errors:
+        print(f"[FAIL] {e}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+feat_xm backfill benchmark — row loop vs NumPy batch
+
+- Loop  : compute_feat on a 200-candle rolling buffer + 1 INSERT per row
+          (historical B_feat_builder_incremental path)
+- Batch : B_feat_vector.compute_feat_batch + 1 executemany per coin
+- Both write into a throw-away feat_1m table (in-memory SQLite)
+- Parity is checked on every row (exit code 1 on mismatch)
+
+Usage:
+    python project/tools/bench_feat_backfill.py [--coins 20] [--candles 1500]
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+from B_feat_builder_incremental import compute_feat  # noqa: E402
+from B_feat_vector import compute_feat_batch  # noqa: E402
+from check_feat_engine import COLS, same, synth_candles  # noqa: E402
+
+DDL = (
+    "CREATE TABLE feat_1m (instId TEXT, "
+    + ", ".join(f"{c} {'TEXT' if c == 'ctx' else 'REAL'}" for c in COLS)
+    + ", PRIMARY KEY (instId, ts))"
+)
+INSERT = f"INSERT OR REPLACE INTO feat_1m VALUES ({','.join('?' * (len(COLS) + 1))})"
+
+
+def db():
+    c = sqlite3.connect(":memory:", isolation_level=None)
+    c.execute(DDL)
+    return c
+
+
+def run_loop(series):
+    c = db()
+    t0 = time.perf_counter()
+    out = {}
+    c.execute("BEGIN")
+    for inst, candles in series.items():
+        buf = []
+        rows = []
+        for r in candles:
+            buf.append(r)
+            if len(buf) > 200:
+                buf.pop(0)
+            feat = compute_feat(buf)
+            if feat:
+                c.execute(INSERT, (inst,) + feat)
+                rows.append(feat)
+        out[inst] = rows
+    c.execute("COMMIT")
+    return out, time.perf_counter() - t0
+
+
+def run_batch(series):
+    c = db()
+    t0 = time.perf_counter()
+    out = {}
+    c.execute("BEGIN")
+    for inst, candles in series.items():
+        rows = compute_feat_batch(candles)
+        c.executemany(INSERT, [(inst,) + f for f in rows])
+        out[inst] = rows
+    c.execute("COMMIT")
+    return out, time.perf_counter() - t0
+
+
+def parity(ref, got):
+    errors = 0
+    for inst, rows in ref.items():
+        other = got[inst]
+        if len(rows) != len(other):
+            print(f"[FAIL] {inst}: {len(rows)} rows vs {len(other)}")
+            errors += 1
+            continue
+        for a, b in zip(rows, other):
+            for col, x, y in zip(COLS, a, b):
+                if not same(x, y):
+                    if errors < 20:
+                        print(f"[FAIL] {inst} ts={a[0]} {col}: loop={x!r} batch={y!r}")
+                    errors += 1
+    return errors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--coins", type=int, default=20)
+    ap.add_argument("--candles", type=int, default=1500)
+    args = ap.parse_args()
+
+    series = {
+        f"C{i:03d}/USDT": synth_candles(args.candles, seed=i)
+        for i in range(args.coins)
+    }
+
+    ref, t_loop = run_loop(series)
+    got, t_batch = run_batch(series)
+
+    errors = parity(ref, got)
+    n = sum(len(r) for r in ref.values())
+
+    if errors:
+        print(f"[FAIL] parity: {errors} mismatches")
+    else:
+        print(f"[OK] parity on {n} rows ({args.coins} coins)")
+    print(f"[BENCH] loop  : {n / t_loop:12,.0f} rows/s")
+    print(f"[BENCH] batch : {n / t_batch:12,.0f} rows/s  (x{t_loop / t_batch:.1f})")
+
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
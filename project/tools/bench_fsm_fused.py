@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+fsm_fused — trigger -> follower latency, 5 daemons vs 1 fused process
+
+- Sandbox built like bench_replay (synthetic dec.db / contracts / budget,
+  replay.build_sandbox) and run in real time
+- Main thread plays the upstream: random-walk ticks into t.db every
+  FEED_MS (ticks.flush), dec_score refresh every DEC_MS, triggers.cycle()
+  at its ENGINE_SLEEP. Instruments start ticking one at a time, evenly
+  spread over the run: each one fires its own trigger, so p50 / p90 come
+  from one sample per instrument instead of a single burst
+- "daemons": gest / opener / exec / closer / follower each in its own
+  thread, cycle() + db_notify.Listener.wait(period) exactly like main()
+- "fused": scripts/fsm_fused.Fused in one thread
+- Latency = time from the triggers commit of a uid (status fire) to the
+  first follower row for that uid; reports p50 / p90 / max per layout
+
+Usage:
+    python project/tools/bench_fsm_fused.py [--instruments 40] [--seconds 60] [--repeat 1]
+"""
+
+import argparse
+import logging
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import replay  # noqa: E402
+from bench_replay import CONF, seed_src  # noqa: E402
+
+FEED_MS = 250
+DEC_MS = 1000
+TRIG_TTL_MS = 3000
+
+
+def drop_modules():
+    # état mémoire des daemons (POOL, caches) remis à zéro entre layouts
+    for name in list(sys.modules):
+        f = getattr(sys.modules[name], "__file__", None)
+        if f and Path(f).resolve().parent == replay.SCRIPTS and name not in ("replay", "tick_archive"):
+            del sys.modules[name]
+
+
+def daemon_threads(fused_mod, stop):
+    import importlib
+    from db_notify import Listener
+
+    def loop(role, subs):
+        mod = importlib.import_module(role)
+        period = float(getattr(mod, "LOOP_SLEEP", fused_mod.DEFAULT_PERIOD.get(role, 0.2)))
+        call = mod.cycle
+        if role == "follower":
+            cfg = mod.load_cfg()
+            call = (lambda f, c: lambda: f(c))(call, cfg)
+        listener = Listener(role, [fused_mod.db_path(s) for s in subs])
+        while not stop.is_set():
+            call()
+            listener.wait(period)
+        listener.close()
+
+    return [threading.Thread(target=loop, args=(role, subs), daemon=True)
+            for role, _, subs in fused_mod.ROLES]
+
+
+def fused_thread(fused_mod, stop):
+    def run():
+        f = fused_mod.Fused()
+        while not stop.is_set():
+            f.step()
+            f.wait()
+        f.close()
+        run.stats = (f.passes, f.chained, f.stats)
+    t = threading.Thread(target=run, daemon=True)
+    t.run_ref = run
+    return t
+
+
+def run_layout(mode, src, work, insts, px0, seconds):
+    drop_modules()
+    replay.build_sandbox(src, work, conf=CONF)
+    import fsm_fused
+    now = int(time.time() * 1000)
+    rp = replay.Replay(work, None, insts, now, now, clock=time)
+    trig = rp.m["triggers"]
+    # gest lit les 10 'fire' les plus anciens : TTL court pour que les triggers
+    # suivis n'occupent pas la fenêtre jusqu'à la fin du run
+    trig.ARM_TTL_MS = TRIG_TTL_MS
+
+    stop = threading.Event()
+    threads = daemon_threads(fsm_fused, stop) if mode == "daemons" else [fused_thread(fsm_fused, stop)]
+    for t in threads:
+        t.start()
+
+    rnd = random.Random(11)
+    px = dict(px0)
+    t_trig = sqlite3.connect(str(work / "data/triggers.db"), isolation_level=None)
+    t_fol = sqlite3.connect(str(work / "data/follower.db"), isolation_level=None)
+    fired, followed = {}, {}
+    next_feed = next_dec = next_trig = 0.0
+    t_start = time.monotonic()
+    t_end = t_start + seconds
+    # dernière activation à 75 % du run : la dernière instrument a le temps d'être suivie
+    spread = 0.75 * seconds / max(1, len(insts))
+    while time.monotonic() < t_end:
+        m = time.monotonic()
+        if m >= next_feed:
+            ts = int(time.time() * 1000)
+            rows = []
+            for inst in insts[:1 + int((m - t_start) / spread)]:
+                px[inst] *= 1 + rnd.gauss(0, 8e-4)
+                p = px[inst]
+                rows.append((inst, p, p * 0.9999, p * 1.0001, 2.0, ts))
+            rp.feed(rows)
+            next_feed = m + FEED_MS / 1000
+        if m >= next_dec:
+            rp.refresh_dec()
+            next_dec = m + DEC_MS / 1000
+        if m >= next_trig:
+            trig.cycle()
+            t_done = time.perf_counter()
+            for (uid,) in t_trig.execute("SELECT uid FROM triggers"):
+                fired.setdefault(uid, t_done)
+            next_trig = m + trig.ENGINE_SLEEP
+        for (uid,) in t_fol.execute("SELECT uid FROM follower"):
+            if uid in fired and uid not in followed:
+                followed[uid] = time.perf_counter()
+        time.sleep(0.002)
+
+    stop.set()
+    for t in threads:
+        t.join(timeout=5)
+    t_trig.close()
+    t_fol.close()
+    rp.close()
+    lat = sorted((followed[u] - fired[u]) * 1000 for u in followed)
+    extra = getattr(threads[0], "run_ref", None)
+    return len(fired), lat, getattr(extra, "stats", None)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, default=40)
+    ap.add_argument("--seconds", type=float, default=60)
+    ap.add_argument("--repeat", type=int, default=1, help="runs per layout (samples pooled)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    insts = [f"C{i:03d}/USDT" for i in range(args.instruments)]
+    errors = []
+
+    with tempfile.TemporaryDirectory(prefix="scalp_fused_") as tmp:
+        tmp = Path(tmp)
+        src = tmp / "src"
+        src.mkdir()
+        px0 = seed_src(src, insts)
+
+        res = {}
+        for mode in ("daemons", "fused"):
+            n, lat, stats = 0, [], None
+            for k in range(args.repeat):
+                nk, latk, stats = run_layout(mode, src, tmp / f"{mode}{k}", insts, px0, args.seconds)
+                n += nk
+                lat += latk
+            lat.sort()
+            res[mode] = lat
+            if not lat:
+                errors.append(f"{mode}: no trigger reached follower")
+                print(f"[FAIL] {mode}: {n} triggers, none followed")
+                continue
+            q = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))]  # noqa: E731
+            print(f"[BENCH] {mode:<8} {len(lat)}/{n} followed  trigger->follower "
+                  f"p50={statistics.median(lat):7.1f} ms  p90={q(0.9):7.1f} ms  max={lat[-1]:7.1f} ms")
+            if stats:
+                passes, chained, per = stats
+                parts = " ".join(f"{r}={k}/{ms / max(1, k):.2f}ms" for r, (k, ms) in per.items())
+                print(f"[BENCH] fused passes={passes} chained={chained} {parts}")
+
+        if res.get("daemons") and res.get("fused"):
+            print(f"[BENCH] p50 speedup x{statistics.median(res['daemons']) / statistics.median(res['fused']):.1f}")
+
+    for e in errors:
+        print(f"[FAIL] {e}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
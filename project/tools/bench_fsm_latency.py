@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+FSM hop latency benchmark (triggers insert -> exec done)
+
+- Builds throw-away triggers/gest/opener/exec DBs in a temp dir
+- Runs one thread per role (1 writer per DB), same hops as prod:
+  triggers(fire) -> gest(open_req) -> opener(open_stdby) -> exec(done)
+- Mode "sleep"  : readers poll with the prod LOOP_SLEEP values
+- Mode "notify" : readers block on db_notify.Listener, writers ring()
+- Prints p50 / p95 / max end-to-end latency per mode
+
+Usage:
+    python project/tools/bench_fsm_latency.py [--trades 50] [--mode both]
+"""
+
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+from db_notify import Listener, ring_if_changed  # noqa: E402
+
+# prod values (gest.py / opener.py / exec.py)
+SLEEP_GEST = 0.2
+SLEEP_OPENER = 0.3
+SLEEP_EXEC = 0.2
+
+SCHEMAS = {
+    "triggers": "CREATE TABLE triggers (uid TEXT PRIMARY KEY, instId TEXT, status TEXT, ts INTEGER)",
+    "gest": "CREATE TABLE gest (uid TEXT PRIMARY KEY, instId TEXT, status TEXT, ts_created INTEGER)",
+    "opener": "CREATE TABLE opener (uid TEXT PRIMARY KEY, instId TEXT, status TEXT, ts_open INTEGER)",
+    "exec": "CREATE TABLE exec (exec_id TEXT PRIMARY KEY, uid TEXT, instId TEXT, status TEXT, ts_exec INTEGER)",
+}
+
+
+def conn(db):
+    c = sqlite3.connect(str(db), timeout=10)
+    c.row_factory = sqlite3.Row
+    c.execute("PRAGMA journal_mode=WAL;")
+    c.execute("PRAGMA busy_timeout=10000;")
+    return c
+
+
+def init_dbs(root: Path):
+    dbs = {}
+    for name, ddl in SCHEMAS.items():
+        db = root / f"{name}.db"
+        c = conn(db)
+        c.execute(ddl)
+        c.commit()
+        c.close()
+        dbs[name] = db
+    return dbs
+
+
+def stage(role, src_db, src_sql, dst_db, dst_sql, sleep_s, use_notify, stop):
+    listener = Listener(role, (src_db,)) if use_notify else None
+    try:
+        while not stop.is_set():
+            s = conn(src_db)
+            d = conn(dst_db)
+            try:
+                for r in s.execute(src_sql).fetchall():
+                    d.execute(dst_sql, (r["uid"], r["instId"]))
+                d.commit()
+            finally:
+                if use_notify:
+                    ring_if_changed(d, dst_db)
+                s.close()
+                d.close()
+
+            if listener:
+                listener.wait(sleep_s)
+            else:
+                time.sleep(sleep_s)
+    finally:
+        if listener:
+            listener.close()
+
+
+def run(mode, trades, gap_s):
+    use_notify = mode == "notify"
+    with tempfile.TemporaryDirectory(prefix="scalp_bench_") as tmp:
+        dbs = init_dbs(Path(tmp))
+        stop = threading.Event()
+
+        stages = [
+            ("gest", dbs["triggers"],
+             "SELECT uid, instId FROM triggers WHERE status='fire'",
+             dbs["gest"],
+             "INSERT OR IGNORE INTO gest (uid, instId, status, ts_created) "
+             "VALUES (?, ?, 'open_req', strftime('%s','now')*1000)",
+             SLEEP_GEST),
+            ("opener", dbs["gest"],
+             "SELECT uid, instId FROM gest WHERE status='open_req'",
+             dbs["opener"],
+             "INSERT OR IGNORE INTO opener (uid, instId, status, ts_open) "
+             "VALUES (?, ?, 'open_stdby', strftime('%s','now')*1000)",
+             SLEEP_OPENER),
+            ("exec", dbs["opener"],
+             "SELECT uid, instId FROM opener WHERE status='open_stdby'",
+             dbs["exec"],
+             "INSERT OR IGNORE INTO exec (exec_id, uid, instId, status, ts_exec) "
+             "VALUES (?1 || ':open:0', ?1, ?2, 'done', strftime('%s','now')*1000)",
+             SLEEP_EXEC),
+        ]
+
+        threads = []
+        for role, src, src_sql, dst, dst_sql, sleep_s in stages:
+            th = threading.Thread(
+                target=stage,
+                args=(role, src, src_sql, dst, dst_sql, sleep_s, use_notify, stop),
+                daemon=True,
+            )
+            th.start()
+            threads.append(th)
+
+        time.sleep(0.5)  # listeners bound
+
+        t_insert = {}
+        t = conn(dbs["triggers"])
+        e = conn(dbs["exec"])
+        latencies = []
+        try:
+            for i in range(trades):
+                uid = f"BENCH/USDT:{i}"
+                t.execute(
+                    "INSERT INTO triggers (uid, instId, status, ts) VALUES (?, 'BENCH/USDT', 'fire', ?)",
+                    (uid, int(time.time() * 1000)),
+                )
+                t.commit()
+                t_insert[uid] = time.perf_counter()
+                if use_notify:
+                    ring_if_changed(t, dbs["triggers"])
+
+                deadline = time.perf_counter() + 5.0
+                while time.perf_counter() < deadline:
+                    if e.execute("SELECT 1 FROM exec WHERE uid=?", (uid,)).fetchone():
+                        latencies.append((time.perf_counter() - t_insert[uid]) * 1000)
+                        break
+                    time.sleep(0.001)
+                time.sleep(gap_s)
+        finally:
+            stop.set()
+            t.close()
+            e.close()
+            for th in threads:
+                th.join(timeout=2)
+
+    return latencies
+
+
+def report(mode, lat):
+    if not lat:
+        print(f"[{mode}] no completed trade")
+        return
+    lat = sorted(lat)
+    p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+    print(
+        f"[{mode:6}] trades={len(lat):4d}  "
+        f"p50={statistics.median(lat):7.1f} ms  p95={p95:7.1f} ms  max={lat[-1]:7.1f} ms"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--trades", type=int, default=50)
+    ap.add_argument("--gap", type=float, default=0.05, help="pause between trades (s)")
+    ap.add_argument("--mode", choices=("sleep", "notify", "both"), default="both")
+    args = ap.parse_args()
+
+    modes = ("sleep", "notify") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        report(mode, run(mode, args.trades, args.gap))
+
+
+if __name__ == "__main__":
+    main()
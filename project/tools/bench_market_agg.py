@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+market_collector CPU per cycle — legacy ticks re-read vs TickAgg
+
+- Throw-away t.db / market.db, N instruments (default 500)
+- Between cycles the feed inserts TICKS_PER_CYCLE ticks per instrument
+  into ticks + ticks_hist (as ticks.py does)
+- "legacy" : historical update_ticks (re-read `ticks`) + 1 autocommit
+             upsert per instrument
+- "agg"    : TickAgg.poll (ticks_hist by id watermark) + market_rows +
+             write_market (1 transaction)
+- Reports process CPU (and wall) ms per cycle and checks agg ticks_5s against the
+  real number of ticks inserted in the window
+
+Usage:
+    python project/tools/bench_market_agg.py [--instruments 500] [--cycles 20]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import market_collector as mc  # noqa: E402
+
+TICKS_PER_CYCLE = 3
+CYCLE_MS = 1000
+
+DDL_T = (
+    """CREATE TABLE ticks (instId TEXT PRIMARY KEY, lastPr REAL NOT NULL, ts_ms INTEGER NOT NULL,
+        bidPr REAL, askPr REAL, spread_bps REAL)""",
+    """CREATE TABLE ticks_hist (id INTEGER PRIMARY KEY AUTOINCREMENT, instId TEXT NOT NULL,
+        lastPr REAL NOT NULL, ts_ms INTEGER NOT NULL, bidPr REAL, askPr REAL, spread_bps REAL)""",
+    "CREATE INDEX idx_ticks_hist_inst_ts ON ticks_hist(instId, ts_ms DESC)",
+)
+DDL_M = """CREATE TABLE market_latest (instId TEXT PRIMARY KEY, ticks_5s INTEGER,
+    spread_bps REAL, staleness_ms INTEGER, ts_update INTEGER)"""
+
+
+def feed(ct, insts, t_ms, rnd):
+    rows = []
+    for k in range(TICKS_PER_CYCLE):
+        ts = t_ms - CYCLE_MS + (k + 1) * CYCLE_MS // TICKS_PER_CYCLE
+        for inst in insts:
+            px = 100 + rnd.random()
+            rows.append((inst, px, px - 0.01, px + 0.01, 2.0, ts))
+    ct.execute("BEGIN")
+    ct.executemany("""
+        INSERT INTO ticks(instId,lastPr,bidPr,askPr,spread_bps,ts_ms) VALUES (?,?,?,?,?,?)
+        ON CONFLICT(instId) DO UPDATE SET lastPr=excluded.lastPr, bidPr=excluded.bidPr,
+            askPr=excluded.askPr, spread_bps=excluded.spread_bps, ts_ms=excluded.ts_ms
+    """, rows)
+    ct.executemany(
+        "INSERT INTO ticks_hist(instId,lastPr,bidPr,askPr,spread_bps,ts_ms) VALUES (?,?,?,?,?,?)",
+        rows,
+    )
+    ct.execute("COMMIT")
+
+
+def legacy_cycle(ct, cm, insts, now_ms, tick_buf):
+    rows = ct.execute(
+        "SELECT instId, lastPr, ts_ms FROM ticks WHERE ts_ms > ?", (now_ms - 5000,)
+    ).fetchall()
+    for r in rows:
+        tick_buf[r["instId"]].append((r["ts_ms"], r["lastPr"]))
+
+    for inst in insts:
+        buf = tick_buf.get(inst)
+        snap = mc.snapshot_cache.get(inst)
+        if not buf or not snap or snap["last"] <= 0:
+            continue
+        ticks_5s = sum(1 for ts, _ in buf if ts > now_ms - 5000)
+        staleness = now_ms - buf[-1][0]
+        spread_bps = (snap["ask"] - snap["bid"]) / snap["last"] * 10000
+        cm.execute("""
+            INSERT INTO market_latest (instId, ticks_5s, spread_bps, staleness_ms, ts_update)
+            VALUES (?,?,?,?,?)
+            ON CONFLICT(instId) DO UPDATE SET
+                ticks_5s=excluded.ticks_5s, spread_bps=excluded.spread_bps,
+                staleness_ms=excluded.staleness_ms, ts_update=excluded.ts_update
+        """, (inst, ticks_5s, spread_bps, staleness, now_ms))
+
+
+def run(mode, n_inst, cycles):
+    rnd = random.Random(n_inst)
+    insts = [f"C{i:04d}/USDT" for i in range(n_inst)]
+    mc.snapshot_cache.clear()
+    mc.snapshot_cache.update({i: {"last": 100.0, "bid": 99.99, "ask": 100.01, "volume_24h": 1.0} for i in insts})
+
+    with tempfile.TemporaryDirectory(prefix="scalp_market_") as tmp:
+        ct = mc.conn(Path(tmp) / "t.db")
+        for ddl in DDL_T:
+            ct.execute(ddl)
+        cm = mc.conn(Path(tmp) / "market.db")
+        cm.execute(DDL_M)
+
+        agg = mc.TickAgg()
+        tick_buf = defaultdict(lambda: deque(maxlen=500))
+        now_ms = int(time.time() * 1000)
+        cpu = wall = 0.0
+        for _ in range(cycles):
+            now_ms += CYCLE_MS
+            feed(ct, insts, now_ms, rnd)
+            t0 = time.process_time()
+            w0 = time.perf_counter()
+            if mode == "legacy":
+                legacy_cycle(ct, cm, insts, now_ms, tick_buf)
+            else:
+                agg.poll(ct, now_ms)
+                mc.write_market(cm, mc.market_rows(agg, insts, now_ms))
+            cpu += time.process_time() - t0
+            wall += time.perf_counter() - w0
+
+        got = {r[0] for r in cm.execute("SELECT DISTINCT ticks_5s FROM market_latest")}
+        ct.close()
+        cm.close()
+
+    return cpu / cycles * 1000, wall / cycles * 1000, got
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, default=500)
+    ap.add_argument("--cycles", type=int, default=20)
+    args = ap.parse_args()
+
+    expected = {TICKS_PER_CYCLE * (mc.TICK_WINDOW_MS // CYCLE_MS)}
+    ok = True
+    res = {}
+    for mode in ("legacy", "agg"):
+        ms, wall, got = run(mode, args.instruments, args.cycles)
+        res[mode] = ms
+        print(f"[BENCH] inst={args.instruments} {mode:6}: {ms:8.2f} ms CPU / cycle  "
+              f"{wall:8.2f} ms wall  ticks_5s={sorted(got)}")
+        if mode == "agg" and got != expected:
+            print(f"[FAIL] agg ticks_5s {sorted(got)} != {sorted(expected)}")
+            ok = False
+    print(f"[BENCH] speedup x{res['legacy'] / res['agg']:.1f}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+orderbook.BookTable throughput on recorded (or synthetic) books5 frames
+
+- Frames are raw Bitget WS messages (one JSON per line), e.g. captured
+  from wss://ws.bitget.com/v2/ws/public with channel books5; without
+  --frames a deterministic random walk over N instruments is generated
+  (--record writes it out so the same file can be replayed)
+- Measures the WS-thread path (json.loads + parse_levels) and the
+  writer path (BookTable.update) separately, then one flush of all
+  dirty rows into a throw-away orderflow.db
+- Checks microprice / imbalance / slopes / OFI of every instrument
+  against a naive recomputation from its last frames
+
+Usage:
+    python project/tools/bench_orderbook.py [--instruments 300] [--frames-per-inst 200]
+    python project/tools/bench_orderbook.py --frames books5.jsonl
+"""
+
+import argparse
+import json
+import math
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import orderbook as ob  # noqa: E402
+
+
+def synth_frames(n_inst, per_inst, seed=7):
+    rnd = random.Random(seed)
+    mids = {f"C{i:04d}USDT": 10 + 90 * rnd.random() for i in range(n_inst)}
+    ts = 1_700_000_000_000
+    out = []
+    for _ in range(per_inst):
+        for inst, mid in mids.items():
+            mid *= 1 + rnd.gauss(0, 2e-4)
+            mids[inst] = mid
+            tick = mid * 1e-4
+            ts += 1
+            bids = [[f"{mid - tick * (k + 0.5):.6f}", f"{rnd.uniform(0.1, 50):.4f}"] for k in range(ob.DEPTH)]
+            asks = [[f"{mid + tick * (k + 0.5):.6f}", f"{rnd.uniform(0.1, 50):.4f}"] for k in range(ob.DEPTH)]
+            out.append(json.dumps({
+                "action": "snapshot",
+                "arg": {"instType": "USDT-FUTURES", "channel": "books5", "instId": inst},
+                "data": [{"bids": bids, "asks": asks, "ts": str(ts)}],
+            }))
+    return out
+
+
+def naive(history):
+    """Recompute features of the last frame of one instrument from scratch."""
+    ts, bids, asks = history[-1]
+    (bb, bs), (ba, as_) = bids[0], asks[0]
+    mid = (bb + ba) / 2
+    bd, ad = sum(s for _, s in bids), sum(s for _, s in asks)
+    ofi = 0.0
+    for (_, pb, pa), (_, b, a) in zip(history, history[1:]):
+        ofi += (b[0][1] if b[0][0] >= pb[0][0] else 0) - (pb[0][1] if b[0][0] <= pb[0][0] else 0)
+        ofi += (pa[0][1] if a[0][0] >= pa[0][0] else 0) - (a[0][1] if a[0][0] <= pa[0][0] else 0)
+    return {
+        "mid": mid,
+        "microprice": (bb * as_ + ba * bs) / (bs + as_),
+        "imbalance": (bd - ad) / (bd + ad),
+        "bid_slope": bd / ((mid - bids[-1][0]) / mid * 1e4),
+        "ask_slope": ad / ((asks[-1][0] - mid) / mid * 1e4),
+        "ofi": ofi,
+        "updates": len(history),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, default=300)
+    ap.add_argument("--frames-per-inst", type=int, default=200)
+    ap.add_argument("--frames", help="recorded books5 frames (JSONL)")
+    ap.add_argument("--record", help="write the synthetic frames to this file")
+    args = ap.parse_args()
+
+    if args.frames:
+        frames = Path(args.frames).read_text().splitlines()
+    else:
+        frames = synth_frames(args.instruments, args.frames_per_inst)
+        if args.record:
+            Path(args.record).write_text("\n".join(frames) + "\n")
+
+    # WS thread : parse
+    t0 = time.perf_counter()
+    parsed = []
+    for msg in frames:
+        d = json.loads(msg)
+        if "data" not in d or not d.get("arg", {}).get("instId"):
+            continue
+        snap = d["data"][0]
+        parsed.append((
+            d["arg"]["instId"].replace("/", ""), int(snap["ts"]),
+            ob.parse_levels(snap.get("bids", [])), ob.parse_levels(snap.get("asks", [])),
+        ))
+    t_parse = time.perf_counter() - t0
+
+    # writer thread : carnet + features
+    table = ob.BookTable()
+    t0 = time.perf_counter()
+    for inst, ts, bids, asks in parsed:
+        table.update(inst, ts, bids, asks)
+    t_update = time.perf_counter() - t0
+
+    with tempfile.TemporaryDirectory(prefix="scalp_ob_") as tmp:
+        c = sqlite3.connect(Path(tmp) / "orderflow.db", isolation_level=None)
+        ob.ensure_schema(c)
+        snapshot = {inst: table.get(inst) for inst in table.inst}
+        t0 = time.perf_counter()
+        c.execute("BEGIN")
+        n_rows = table.flush(c)
+        c.execute("COMMIT")
+        t_flush = time.perf_counter() - t0
+        buckets = dict(c.execute("SELECT of_bucket, COUNT(*) FROM v_orderflow_bucket GROUP BY 1"))
+        c.close()
+
+    n = len(parsed)
+    print(f"[BENCH] frames={n} instruments={len(table.inst)} depth={ob.DEPTH}")
+    print(f"[BENCH] parse  : {n / t_parse:10.0f} frames/s ({t_parse / n * 1e6:.1f} us/frame)")
+    print(f"[BENCH] update : {n / t_update:10.0f} frames/s ({t_update / n * 1e6:.1f} us/frame)")
+    print(f"[BENCH] flush  : {n_rows} rows in {t_flush * 1000:.2f} ms  buckets={buckets}")
+
+    history = {}
+    for inst, ts, bids, asks in parsed:
+        if bids and asks:
+            history.setdefault(inst, []).append((ts, bids, asks))
+    bad = 0
+    for inst, h in history.items():
+        ref, got = naive(h), snapshot[inst]
+        for k, v in ref.items():
+            if not math.isclose(got[k], v, rel_tol=1e-9, abs_tol=1e-9):
+                bad += 1
+                if bad <= 5:
+                    print(f"[FAIL] {inst} {k}: {got[k]} != {v}")
+    print(f"[{'OK' if not bad else 'FAIL'}] features vs naive recomputation ({len(history)} instruments)")
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
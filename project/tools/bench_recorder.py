@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+recorder — watermark / batch ingestion vs per-uid full rescan
+
+- gest.db / triggers.db / exec.db / recorder.db built from schema_ref.sql in
+  a temp dir: N closed trades (gest close_done, trigger row, exec ledger
+  from bench_exec_position.ledger, exec_position kept by ensure_schema)
+- Legacy: the former cycle (SELECT every close_done uid, then per uid fresh
+  connections for snapshot / existence / lineage / metrics / insert and
+  row-by-row recorder_steps with their own commit)
+- New: scripts/recorder.cycle on the same data (ConnPool, watermark on
+  gest.ts_status_update, batches in one transaction)
+- Timings: backlog drain (records/s), steady-state cycles with the history
+  already recorded and a few new closes per cycle, close -> recorded
+  latency from recorder.STATS
+- Checks: recorder and recorder_steps rows identical (ts_recorded aside),
+  no uid recorded twice, late close_done inside the overlap window picked up
+
+Usage:
+    python project/tools/bench_recorder.py [--trades 5000] [--cycles 20]
+"""
+
+import argparse
+import logging
+import math
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+sys.path.insert(0, str(SCRIPT_DIR))
+
+logging.basicConfig(level=logging.CRITICAL)
+
+import exec_position as ep  # noqa: E402
+import recorder as rec  # noqa: E402
+import replay  # noqa: E402
+from bench_exec_position import ledger  # noqa: E402
+
+INSERT_EXEC = """INSERT INTO exec (exec_id, uid, step, exec_type, side, qty, price_exec, fee,
+                 status, ts_exec, reason) VALUES (?,?,?,?,?,?,?,?,'done',?,?)"""
+INSERT_GEST = """INSERT INTO gest (uid, instId, side, ts_signal, price_signal, atr_signal, entry,
+                 qty, ts_open, ts_close, mfe_price, mae_price, step, status, ts_status_update)
+                 VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+INSERT_TRIG = """INSERT INTO triggers (uid, instId, side, entry_reason, score_of, score_mo,
+                 score_br, score_force, price, atr, ts, status)
+                 VALUES (?,?,?,'BENCH',0,0,0,0.5,?,?,?,'consumed')"""
+
+
+def trades(rows, rnd, status="close_done", ts_status=None):
+    """gest / triggers rows for the closed uids of an exec ledger."""
+    by_uid = {}
+    for r in rows:
+        by_uid.setdefault(r[1], []).append(r)
+    gest, trig = [], []
+    for uid, fills in by_uid.items():
+        if fills[-1][3] != "close":
+            continue
+        side = fills[0][4]
+        px = fills[0][6]
+        atr = px * 0.002
+        ts0 = fills[0][8] - rnd.randrange(1000, 60_000)
+        gest.append((uid, "C/USDT", side, ts0, px * (1 + rnd.gauss(0, 0.001)), atr, px,
+                     fills[0][5], fills[0][8], fills[-1][8], px * 1.01, px * 0.99, len(fills),
+                     status, ts_status if ts_status is not None else fills[-1][8]))
+        trig.append((uid, "C/USDT", side, px, atr, ts0))
+    return gest, trig
+
+
+def open_db(path):
+    c = sqlite3.connect(path, isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL;")
+    return c
+
+
+def setup(d, rows, rnd):
+    for name in ("gest", "triggers", "exec", "recorder"):
+        replay.create_from_ref(d / f"{name}.db", name)
+    e = open_db(d / "exec.db")
+    e.execute("BEGIN")
+    e.executemany(INSERT_EXEC, [r + ("BENCH",) for r in rows])
+    e.execute("COMMIT")
+    ep.ensure_schema(e)
+
+    gest, trig = trades(rows, rnd)
+    g = open_db(d / "gest.db")
+    g.execute("BEGIN")
+    g.executemany(INSERT_GEST, gest)
+    g.execute("COMMIT")
+    # index créé par gest.py (on_open du writer)
+    g.execute("CREATE INDEX IF NOT EXISTS ix_gest_status_ts ON gest(status, ts_status_update)")
+    t = open_db(d / "triggers.db")
+    t.execute("BEGIN")
+    t.executemany(INSERT_TRIG, trig)
+    t.execute("COMMIT")
+    return e, g, t, len(gest)
+
+
+# ------------------------------------------------------------
+# legacy : 1 connexion par étape et par uid, rescan complet
+# ------------------------------------------------------------
+def legacy_conn(db):
+    c = sqlite3.connect(str(db), timeout=10)
+    c.row_factory = sqlite3.Row
+    c.execute("PRAGMA journal_mode=WAL;")
+    c.execute("PRAGMA busy_timeout=10000;")
+    return c
+
+
+def legacy_lineage(d, uid, check_recorder):
+    for name, table in (("triggers", "triggers"), ("gest", "gest")) + ((("recorder", "recorder"),)
+                                                                        if check_recorder else ()):
+        c = legacy_conn(d / f"{name}.db")
+        c.execute(f"SELECT uid FROM {table} WHERE uid=? LIMIT 1", (uid,)).fetchone()
+        c.close()
+
+
+def legacy_cycle(d):
+    g = legacy_conn(d / "gest.db")
+    uids = [x["uid"] for x in g.execute("SELECT DISTINCT uid FROM gest WHERE status='close_done'")]
+    g.close()
+    n = 0
+    for uid in uids:
+        g = legacy_conn(d / "gest.db")
+        rows = g.execute("""SELECT * FROM gest WHERE uid=?
+                            ORDER BY COALESCE(step, 0), COALESCE(ts_updated, ts_status_update, ts_signal, 0)""",
+                         (uid,)).fetchall()
+        g.close()
+        snap = rec.build_uid_snapshot(uid, rows)
+        if not snap:
+            continue
+        c = legacy_conn(d / "recorder.db")
+        if c.execute("SELECT 1 FROM recorder WHERE uid=?", (uid,)).fetchone():
+            c.close()
+            continue
+        rec.ensure_recorder_schema(c)
+        rec_cols = rec.table_columns(c, "recorder")
+        c.close()
+        legacy_lineage(d, uid, False)
+
+        e = legacy_conn(d / "exec.db")
+        metrics = rec.load_trade_metrics(e, [uid])[uid]
+        e.close()
+        ts_rec = rec.now_ms()
+        values = [rec.normalize_required(col, rec.build_value_for_column(col, snap, metrics, ts_rec))
+                  for col in rec_cols]
+        c = legacy_conn(d / "recorder.db")
+        c.execute(f"INSERT INTO recorder ({','.join(rec_cols)}) VALUES ({rec.marks(rec_cols)})", values)
+        c.commit()
+        c.close()
+        legacy_lineage(d, uid, True)
+
+        e = legacy_conn(d / "exec.db")
+        r = legacy_conn(d / "recorder.db")
+        rec.table_columns(e, "exec")
+        for x in rec.load_steps(e, [uid]):
+            r.execute("INSERT OR IGNORE INTO recorder_steps VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", tuple(x))
+        r.commit()
+        e.close()
+        r.close()
+        n += 1
+    return n
+
+
+# ------------------------------------------------------------
+# checks
+# ------------------------------------------------------------
+def same(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+def dump(path):
+    c = sqlite3.connect(path)
+    c.row_factory = sqlite3.Row
+    recs = {}
+    for x in c.execute("SELECT * FROM recorder"):
+        recs[x["uid"]] = {k: x[k] for k in x.keys() if k != "ts_recorded"}
+    steps = {(x[0], x[1]): tuple(x) for x in c.execute("SELECT * FROM recorder_steps")}
+    c.close()
+    return recs, steps
+
+
+def parity(a, b):
+    ra, sa = dump(a)
+    rb, sb = dump(b)
+    bad = len(set(ra) ^ set(rb)) + len(set(sa) ^ set(sb))
+    for uid in set(ra) & set(rb):
+        if not all(same(ra[uid][k], rb[uid].get(k)) for k in ra[uid]):
+            bad += 1
+    for k in set(sa) & set(sb):
+        if not all(same(x, y) for x, y in zip(sa[k], sb[k])):
+            bad += 1
+    return len(ra), len(sa), bad
+
+
+def point(d):
+    for name in ("gest", "triggers", "exec", "recorder"):
+        setattr(rec, {"gest": "DB_GEST", "triggers": "DB_TRIG", "exec": "DB_EXEC",
+                      "recorder": "DB_REC"}[name], d / f"{name}.db")
+    rec.POOL.close_all()
+    rec.STATE.update(wm=None, resync=0.0, retry=set())
+    rec.STATS.update(n=0, lat_ms=[], t=time.monotonic())
+    rec.STATS_EVERY_S = float("inf")    # garder toutes les latences pour le rapport
+
+
+def close_some(dbs, rnd, k0, n, now):
+    """n new trades: fills at `now`, gest -> close_done (horloge SQL comme gest.py)."""
+    e, g, t, _n = dbs
+    rows = []
+    for i in range(n):
+        uid = f"N{k0 + i:07d}"
+        px = 10 + 90 * rnd.random()
+        for step, et in enumerate(("open", "pyramide", "close"), 1):
+            qty = 1.0 if et != "close" else 2.0
+            rows.append((f"{uid}-{step}", uid, step, et, "buy", qty, px * (1 + 0.001 * step),
+                         qty * px * 0.0006, now - 10 * (3 - step)))
+    e.execute("BEGIN")
+    for r in rows:
+        e.execute(INSERT_EXEC, r + ("BENCH",))
+        ep.apply(e, r[1], r[4], r[3], r[5], r[6], r[7], r[2], r[8])
+    e.execute("COMMIT")
+    gest, trig = trades(rows, rnd, status="close_req")
+    g.execute("BEGIN")
+    g.executemany(INSERT_GEST, gest)
+    g.execute("""UPDATE gest SET status='close_done', ts_status_update=strftime('%s','now')*1000
+                 WHERE status='close_req'""")
+    g.execute("COMMIT")
+    t.executemany(INSERT_TRIG, trig)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--trades", type=int, default=5000)
+    ap.add_argument("--cycles", type=int, default=20)
+    ap.add_argument("--per-cycle", type=int, default=5)
+    args = ap.parse_args()
+
+    errors = []
+    rows = ledger(int(args.trades * 4.06 / 0.97))
+    with tempfile.TemporaryDirectory(prefix="scalp_recorder_") as tmp:
+        tmp = Path(tmp)
+        dirs = {}
+        for name in ("legacy", "new"):
+            dirs[name] = tmp / name
+            dirs[name].mkdir()
+            dirs[name + "_dbs"] = setup(dirs[name], rows, random.Random(5))
+        n_trades = dirs["new_dbs"][3]
+        print(f"[BENCH] {n_trades} closed trades, {len(rows)} exec rows")
+
+        # --- backlog : recorder vide, tous les close_done à enregistrer
+        t0 = time.perf_counter()
+        n_leg = legacy_cycle(dirs["legacy"])
+        s_leg = time.perf_counter() - t0
+
+        point(dirs["new"])
+        rec.ensure_recorder_steps()
+        rec.ensure_trade_lineage_view()
+        t0 = time.perf_counter()
+        rec.cycle()
+        s_new = time.perf_counter() - t0
+        n_new = len(rec.conn(rec.DB_REC).execute("SELECT uid FROM recorder").fetchall())
+        print(f"[BENCH] backlog: legacy {n_leg} trades in {s_leg:.1f}s ({n_leg / s_leg:,.0f}/s) | "
+              f"new {n_new} in {s_new:.2f}s ({n_new / s_new:,.0f}/s)")
+
+        n, n_steps, bad = parity(dirs["legacy"] / "recorder.db", dirs["new"] / "recorder.db")
+        ok = bad == 0 and n == n_trades
+        print(f"[{'OK' if ok else 'FAIL'}] recorder / recorder_steps == legacy ({n} trades, "
+              f"{n_steps} steps, bad={bad})")
+        if not ok:
+            errors.append("backlog parity")
+
+        # --- régime : historique enregistré, quelques clôtures par cycle
+        k = 0
+        t_leg = 0.0
+        t_new = 0.0
+        rec.STATS.update(n=0, lat_ms=[])
+        for _ in range(args.cycles):
+            now = rec.now_ms()
+            close_some(dirs["new_dbs"], random.Random(k), k, args.per_cycle, now)
+            t0 = time.perf_counter()
+            rec.cycle()
+            t_new += time.perf_counter() - t0
+            close_some(dirs["legacy_dbs"], random.Random(k), k, args.per_cycle, now)
+            t0 = time.perf_counter()
+            legacy_cycle(dirs["legacy"])
+            t_leg += time.perf_counter() - t0
+            k += args.per_cycle
+        ms_leg = t_leg / args.cycles * 1000
+        ms_new = t_new / args.cycles * 1000
+        lat = sorted(rec.STATS["lat_ms"])
+        print(f"[BENCH] steady ({args.per_cycle} closes / cycle on {n_trades} recorded): "
+              f"legacy {ms_leg:8.1f} ms/cycle | new {ms_new:6.2f} ms/cycle (x{ms_leg / ms_new:.0f})")
+        if lat:
+            print(f"[BENCH] close fill -> recorded (new, in-cycle): p50 {lat[len(lat) // 2]} ms  "
+                  f"max {lat[-1]} ms over {len(lat)} trades")
+
+        # idle : rien de nouveau
+        t0 = time.perf_counter()
+        for _ in range(args.cycles):
+            rec.cycle()
+        print(f"[BENCH] idle cycle: new {(time.perf_counter() - t0) / args.cycles * 1000:.2f} ms")
+
+        # close_done dont le ts_status_update est déjà derrière le watermark (dans l'overlap)
+        now = rec.now_ms()
+        close_some(dirs["new_dbs"], random.Random(k), k, 1, now)
+        dirs["new_dbs"][1].execute(f"UPDATE gest SET ts_status_update = ts_status_update - "
+                                   f"{rec.OVERLAP_MS // 2} WHERE uid='N{k:07d}'")
+        close_some(dirs["legacy_dbs"], random.Random(k), k, 1, now)
+        legacy_cycle(dirs["legacy"])
+        rec.cycle()
+        rec.cycle()
+
+        n, n_steps, bad = parity(dirs["legacy"] / "recorder.db", dirs["new"] / "recorder.db")
+        want = n_trades + k + 1
+        ok = bad == 0 and n == want
+        print(f"[{'OK' if ok else 'FAIL'}] after steady + late close_done: recorder == legacy "
+              f"({n} / {want} trades, {n_steps} steps, bad={bad})")
+        if not ok:
+            errors.append("steady parity")
+
+        rec.POOL.close_all()
+        for name in ("legacy", "new"):
+            for c in dirs[name + "_dbs"][:3]:
+                c.close()
+
+    for err in errors:
+        print(f"[FAIL] {err}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+replay — end-to-end FSM backtest on a synthetic day, throughput + determinism
+
+- Source DBs built from schema_ref.sql in a temp dir: dec.db seeded with
+  snap_ctx / snap_range for N instruments (bullish / bearish setups that
+  pass dec_score admission), contracts.db and budget.db reference rows
+- Tick archive (tick_archive.ArchiveWriter): random walk, TICK_MS per
+  instrument, H hours from 00:00 UTC
+- scripts/replay.py drives triggers -> gest -> opener -> exec -> mfe_mae ->
+  follower -> closer -> recorder on the sandbox with the simulated clock
+- Runs the same replay twice: the recorder tables must be identical
+- snap_ctx uids stay fixed for the whole run (the setup never changes): a
+  setup must still re-enter after its trade closes, under a new attempt uid
+- Runs it once more with stage skipping off (every due cycle runs): the
+  recorder table must match the skipping runs
+- Reports trades, simulated events/s, simulated time / wall time with and
+  without skipping, ms per daemon cycle and skipped cycles
+
+Usage:
+    python project/tools/bench_replay.py [--instruments 10] [--hours 1]
+"""
+
+import argparse
+import logging
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import replay  # noqa: E402
+import tick_archive as ta  # noqa: E402
+
+CONF = SCRIPT_DIR.parent / "conf"
+T0 = 1_700_006_400_000            # 00:00 UTC
+TICK_MS = 1000
+
+
+def seed_src(src, insts, seed=3):
+    rnd = random.Random(seed)
+    for name in ("dec", "contracts", "budget"):
+        replay.create_from_ref(src / f"{name}.db", name)
+
+    c = sqlite3.connect(src / "dec.db")
+    px0 = {}
+    for k, inst in enumerate(insts):
+        bull = k % 2 == 0
+        px0[inst] = p = 10 + 90 * rnd.random()
+        c.execute("""INSERT INTO snap_ctx (uid, instId, ctx, score_C, side, ctx_ok, ts_updated,
+                     atr_fast, atr_slow, vol_regime) VALUES (?,?,?,?,?,1,?,?,?,?)""",
+                  (f"{inst.split('/')[0]}-{'buy' if bull else 'sell'}-000000-{k:04x}", inst,
+                   "bullish" if bull else "bearish", 0.6 if bull else -0.6,
+                   "buy" if bull else "sell", T0, p * 0.002, p * 0.004,
+                   "EXPAND" if bull else "NORMAL"))
+        c.execute("INSERT INTO snap_range VALUES (?,?,?,?,?,?,?)",
+                  (inst, p * 1.01, p * 0.99, p * 0.002, 0.02, 1, T0))
+    c.commit()
+    c.close()
+
+    c = sqlite3.connect(src / "contracts.db")
+    c.executemany("""INSERT INTO contracts (symbol, baseCoin, quoteCoin, minTradeNum, minTradeUSDT,
+                     pricePlace, volumePlace, sizeMultiplier, minLever, maxLever, makerFee, takerFee,
+                     symbolStatus) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+                  [(i.replace("/", ""), i.split("/")[0], "USDT", 0.001, 5.0, 4, 3, 0.001,
+                    1, 50, 0.0002, 0.0006, "normal") for i in insts])
+    c.commit()
+    c.close()
+
+    c = sqlite3.connect(src / "budget.db")
+    c.execute("INSERT INTO balance (id, balance_usdt) VALUES (1, 1000.0)")
+    c.commit()
+    c.close()
+    return px0
+
+
+def write_archive(root, px0, hours, seed=5):
+    rnd = random.Random(seed)
+    w = ta.ArchiveWriter(root)
+    px = dict(px0)
+    for t in range(T0, T0 + hours * 3_600_000, TICK_MS):
+        batch = []
+        for inst in px:
+            px[inst] *= 1 + rnd.gauss(0, 8e-4)
+            p = px[inst]
+            batch.append((inst, p, p * 0.9999, p * 1.0001, 2.0, t + rnd.randrange(TICK_MS)))
+        w.append(batch)
+    w.close()
+    return w.rows
+
+
+def run_once(src, arch, insts, hours, work, skip=True):
+    replay.build_sandbox(src, work, conf=CONF)
+    rp = replay.Replay(work, ta.TickArchive(arch), insts, T0, T0 + hours * 3_600_000, skip=skip)
+    s = rp.run()
+    rows = [tuple(r) for r in rp.recorder_rows()]
+    rp.close()
+    return rp, s, rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, default=10)
+    ap.add_argument("--hours", type=int, default=1)
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    insts = [f"C{i:03d}/USDT" for i in range(args.instruments)]
+    errors = []
+
+    with tempfile.TemporaryDirectory(prefix="scalp_replay_") as tmp:
+        tmp = Path(tmp)
+        src = tmp / "src"
+        src.mkdir()
+        px0 = seed_src(src, insts)
+        t0 = time.perf_counter()
+        n = write_archive(tmp / "arch", px0, args.hours)
+        print(f"[BENCH] archive: {n} ticks in {time.perf_counter() - t0:.1f}s")
+
+        runs = []
+        for k, skip in enumerate((True, True, False)):
+            runs.append(run_once(src, tmp / "arch", insts, args.hours, tmp / f"work{k}", skip))
+            # les modules sont partagés entre runs : état mémoire des daemons remis à zéro
+            for name in list(sys.modules):
+                if getattr(sys.modules[name], "__file__", "") and \
+                        Path(sys.modules[name].__file__).parent == replay.SCRIPTS and name != "replay" \
+                        and name != "tick_archive":
+                    del sys.modules[name]
+
+        rp, s, rows = runs[0]
+        ok = rows == runs[1][2]
+        print(f"[{'OK' if ok else 'FAIL'}] deterministic recorder ({len(rows)} trades, 2 runs)")
+        if not ok:
+            errors.append("replay not deterministic")
+        if not rows:
+            errors.append("no trade recorded")
+        uids = {r[0] for r in rows}
+        reentries = sum(1 for u in uids if u.rsplit("-", 1)[0] in uids)
+        print(f"[{'OK' if reentries else 'FAIL'}] re-entry with a stable dec uid ({reentries} attempt uids)")
+        if not reentries:
+            errors.append("no re-entry after a closed trade")
+        ok = rows == runs[2][2]
+        print(f"[{'OK' if ok else 'FAIL'}] skipping cycles without new input leaves the recorder unchanged")
+        if not ok:
+            errors.append("stage skipping changes the recorder")
+
+        sim_s = args.hours * 3600
+        for label, (rp_, s_, _) in (("skip", runs[0]), ("no-skip", runs[2])):
+            ev = rp_.events()
+            print(f"[BENCH] {label:<7} {args.instruments} insts x {args.hours}h: {s_['ticks']} ticks, "
+                  f"{ev} events in {s_['wall_s']:.1f}s -> {ev / s_['wall_s']:,.0f} events/s, "
+                  f"sim/wall x{sim_s / s_['wall_s']:.0f} "
+                  f"(full day ~ {86400 / (sim_s / s_['wall_s']) / 60:.1f} min)")
+        for name, ms in rp.stage_ms.items():
+            runs_ = rp.stage_runs[name]
+            print(f"[BENCH] {name:<9} runs={runs_:>6} skipped={rp.stage_skips[name]:>6} "
+                  f"{ms / max(1, runs_):7.3f} ms/cycle")
+
+    for e in errors:
+        print(f"[FAIL] {e}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
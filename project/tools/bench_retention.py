@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+retention (keyset, 1 DELETE per table) vs legacy per-instrument purge
+
+- Throw-away ob.db with ohlcv_1m for N instruments, uneven history lengths
+  (some below keep, some far above), then K steady-state cycles where every
+  instrument gains one bar
+- Legacy: OB_collect.purge_ob as it was (COUNT(*) + ORDER BY ts DESC
+  LIMIT H OFFSET L per instrument, H=1500 / L=450)
+- New: retention.Retention (index + seek + executemany DELETE)
+- Parity: identical remaining (instId, ts) sets after every cycle, and the
+  index row counts match COUNT(*) per instrument
+- Reports ms per cycle (first purge and steady state), rows freed and pages
+  returned by incremental_vacuum on an auto_vacuum=INCREMENTAL copy
+
+Usage:
+    python project/tools/bench_retention.py [--instruments 300] [--cycles 20]
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import retention  # noqa: E402
+
+T0 = 1_700_000_000_000
+MS = 60_000
+H, L = 1500, 450
+KEEP = retention.POLICIES["ob"]["ohlcv_1m"]
+
+DDL = """CREATE TABLE ohlcv_1m (instId TEXT NOT NULL, ts INTEGER NOT NULL,
+    o REAL, h REAL, l REAL, c REAL, v REAL, PRIMARY KEY(instId, ts))"""
+
+
+def legacy_purge(c, inst):
+    count = c.execute("SELECT COUNT(*) FROM ohlcv_1m WHERE instId=?", (inst,)).fetchone()[0]
+    if count <= H:
+        return
+    rows = c.execute("SELECT ts FROM ohlcv_1m WHERE instId=? ORDER BY ts DESC LIMIT ? OFFSET ?",
+                     (inst, H, L)).fetchall()
+    if rows:
+        c.execute("DELETE FROM ohlcv_1m WHERE instId=? AND ts < ?", (inst, rows[-1][0]))
+
+
+def history(n_inst, seed=11):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n_inst):
+        inst = f"C{i:04d}/USDT"
+        n = rnd.choice((300, 1700, 1950, 2600, 4000))
+        rows += [(inst, T0 + k * MS, 1.0, 1.0, 1.0, 1.0, 1.0) for k in range(n)]
+    return rows
+
+
+def open_db(path, rows, incremental=False):
+    c = sqlite3.connect(path, isolation_level=None)
+    if incremental:
+        c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    c.execute(DDL)
+    c.execute("BEGIN")
+    c.executemany("INSERT INTO ohlcv_1m VALUES (?,?,?,?,?,?,?)", rows)
+    c.execute("COMMIT")
+    return c
+
+
+def snapshot(c):
+    return set(c.execute("SELECT instId, ts FROM ohlcv_1m"))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, default=300)
+    ap.add_argument("--cycles", type=int, default=20)
+    args = ap.parse_args()
+
+    rows = history(args.instruments)
+    insts = sorted({r[0] for r in rows})
+    errors = []
+
+    with tempfile.TemporaryDirectory(prefix="scalp_ret_") as tmp:
+        old = open_db(Path(tmp) / "legacy.db", rows)
+        new = open_db(Path(tmp) / "ob.db", rows, incremental=True)
+        ret = retention.Retention(new, {"ohlcv_1m": KEEP})
+        pages0 = new.execute("PRAGMA page_count").fetchone()[0]
+
+        t_old, t_new = [], []
+        freed = 0
+        last_ts = {i: max(r[1] for r in rows if r[0] == i) for i in insts}
+        for cycle in range(args.cycles + 1):
+            if cycle:
+                batch = []
+                for i in insts:
+                    last_ts[i] += MS
+                    batch.append((i, last_ts[i], 1.0, 1.0, 1.0, 1.0, 1.0))
+                for c in (old, new):
+                    c.executemany("INSERT INTO ohlcv_1m VALUES (?,?,?,?,?,?,?)", batch)
+                ret.added("ohlcv_1m", batch)
+
+            t0 = time.perf_counter()
+            old.execute("BEGIN")
+            for i in insts:
+                legacy_purge(old, i)
+            old.execute("COMMIT")
+            t_old.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            freed += ret.purge("ohlcv_1m")
+            t_new.append(time.perf_counter() - t0)
+
+            if snapshot(old) != snapshot(new):
+                errors.append(f"cycle {cycle}: remaining rows differ")
+
+        counts = dict(new.execute("SELECT instId, COUNT(*) FROM ohlcv_1m GROUP BY instId"))
+        drift = [i for i, e in ret.idx["ohlcv_1m"].items() if counts.get(i) != e[0]]
+        if drift:
+            errors.append(f"index drift on {len(drift)} instruments")
+
+        print(f"[{'OK' if not errors else 'FAIL'}] parity legacy purge == retention "
+              f"({len(insts)} insts, {args.cycles + 1} cycles, index drift={len(drift)})")
+
+        t0 = time.perf_counter()
+        pages = ret.vacuum(0)
+        t_vac = (time.perf_counter() - t0) * 1000
+        pages1 = new.execute("PRAGMA page_count").fetchone()[0]
+
+        steady_old = sum(t_old[1:]) / max(1, len(t_old) - 1) * 1000
+        steady_new = sum(t_new[1:]) / max(1, len(t_new) - 1) * 1000
+        print(f"[BENCH] first purge  legacy : {t_old[0] * 1000:8.2f} ms   retention : {t_new[0] * 1000:8.2f} ms")
+        print(f"[BENCH] steady cycle legacy : {steady_old:8.2f} ms   retention : {steady_new:8.2f} ms "
+              f"(x{steady_old / steady_new:.1f})")
+        print(f"[BENCH] rows freed {freed}, incremental_vacuum {pages} pages in {t_vac:.2f} ms "
+              f"(page_count {pages0} -> {pages1})")
+        print(f"[BENCH] stats {ret.stats['ohlcv_1m']}")
+        old.close()
+        new.close()
+
+    for e in errors:
+        print(f"[FAIL] {e}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
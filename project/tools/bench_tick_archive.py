@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+tick_archive — write / read throughput and correctness of the mmap archive
+
+- ArchiveWriter.append fed with ticks.flush-shaped batches for N instruments
+  over H hours (crossing a UTC day boundary), with a few out-of-order ticks
+- Window reads: random (instId, t0, t1) windows (wticks-sized 40 s and
+  trade-sized 30 min) via TickArchive.window, checked against a plain
+  Python filter of the source ticks; per-call latency in microseconds
+- Same windows on an indexed SQLite ticks_hist holding the full history,
+  as the reference for what the archive replaces
+- Full-scan read throughput (ticks/s) and compact() on the closed day
+- Restart after a crash mid-append (value columns written, ts not): the
+  next writer realigns the columns, later rows keep ts / px paired
+
+Usage:
+    python project/tools/bench_tick_archive.py [--instruments 50] [--hours 4] [--reads 5000]
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import tick_archive as ta  # noqa: E402
+
+T0 = 1_700_006_400_000 - 3 * 3_600_000    # 3 h before a UTC midnight
+STEP_MS = 1000
+FLUSH = 4                                  # ticks per instrument per flush
+
+
+def stream(n_inst, hours, seed=7):
+    rnd = random.Random(seed)
+    px = {f"C{i:04d}/USDT": 10 + 90 * rnd.random() for i in range(n_inst)}
+    t_end = T0 + hours * 3_600_000
+    buf = []
+    for t in range(T0, t_end, STEP_MS):
+        for inst in px:
+            px[inst] *= 1 + rnd.gauss(0, 5e-4)
+            ts = t + rnd.randrange(STEP_MS)
+            if rnd.random() < 1e-4:
+                ts -= 5_000                # late tick
+            p = px[inst]
+            buf.append((inst, p, p * 0.9999, p * 1.0001, 2.0, ts))
+        if (t - T0) // STEP_MS % FLUSH == FLUSH - 1:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, default=50)
+    ap.add_argument("--hours", type=int, default=4)
+    ap.add_argument("--reads", type=int, default=5000)
+    args = ap.parse_args()
+
+    errors = []
+    rnd = random.Random(1)
+
+    with tempfile.TemporaryDirectory(prefix="scalp_tarch_") as tmp:
+        root = Path(tmp) / "ticks_arch"
+        w = ta.ArchiveWriter(root)
+        src = defaultdict(list)
+        sq = sqlite3.connect(Path(tmp) / "t.db", isolation_level=None)
+        sq.execute("""CREATE TABLE ticks_hist (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            instId TEXT NOT NULL, lastPr REAL NOT NULL, ts_ms INTEGER NOT NULL,
+            bidPr REAL, askPr REAL, spread_bps REAL)""")
+        sq.execute("CREATE INDEX idx_ticks_hist_inst_ts ON ticks_hist(instId, ts_ms DESC)")
+
+        t_write = 0.0
+        n = 0
+        for batch in stream(args.instruments, args.hours):
+            t0 = time.perf_counter()
+            w.append(batch)
+            t_write += time.perf_counter() - t0
+            n += len(batch)
+            for r in batch:
+                src[r[0]].append((r[5], r[1], r[2], r[3]))
+            sq.execute("BEGIN")
+            sq.executemany("INSERT INTO ticks_hist(instId,lastPr,bidPr,askPr,spread_bps,ts_ms) "
+                           "VALUES (?,?,?,?,?,?)", batch)
+            sq.execute("COMMIT")
+        w.close()
+        print(f"[BENCH] append : {n / t_write:12.0f} ticks/s ({n} ticks, unsorted files={w.unsorted})")
+
+        for inst in src:
+            src[inst].sort(key=lambda r: r[0])
+        insts = sorted(src)
+        t_end = T0 + args.hours * 3_600_000
+
+        reader = ta.TickArchive(root)
+        for label, span in (("40s", 40_000), ("30m", 1_800_000)):
+            wins = []
+            for _ in range(args.reads):
+                t0 = rnd.randrange(T0, t_end - span)
+                wins.append((rnd.choice(insts), t0, t0 + span))
+
+            bad = 0
+            for inst, a, b in wins[:200]:
+                ref = [r for r in src[inst] if a <= r[0] <= b]
+                got = reader.window(inst, a, b)
+                if (len(ref) != len(got.ts)
+                        or not np.array_equal(got.ts, [r[0] for r in ref])
+                        or not np.allclose(got.px, [r[1] for r in ref])):
+                    bad += 1
+            print(f"[{'OK' if not bad else 'FAIL'}] window {label} == source ticks (200 windows, bad={bad})")
+            if bad:
+                errors.append(f"window {label}")
+
+            t0 = time.perf_counter()
+            rows = 0
+            for inst, a, b in wins:
+                rows += len(reader.window(inst, a, b).ts)
+            us_arch = (time.perf_counter() - t0) / len(wins) * 1e6
+
+            t0 = time.perf_counter()
+            for inst, a, b in wins:
+                sq.execute("SELECT ts_ms, lastPr, bidPr, askPr FROM ticks_hist "
+                           "WHERE instId=? AND ts_ms BETWEEN ? AND ? ORDER BY ts_ms",
+                           (inst, a, b)).fetchall()
+            us_sql = (time.perf_counter() - t0) / len(wins) * 1e6
+            print(f"[BENCH] window {label}: archive {us_arch:9.1f} us  sqlite {us_sql:9.1f} us  "
+                  f"(x{us_sql / us_arch:.0f}, {rows / len(wins):.0f} ticks / window)")
+
+        t0 = time.perf_counter()
+        total = 0
+        for inst in insts:
+            x = reader.window(inst, T0 - 60_000, t_end + 60_000)
+            total += len(x.ts)
+            float(x.px.sum())
+        dt = time.perf_counter() - t0
+        ok = total == n
+        print(f"[{'OK' if ok else 'FAIL'}] full scan {total} ticks ({total / dt:,.0f} ticks/s)")
+        if not ok:
+            errors.append("full scan count")
+
+        t0 = time.perf_counter()
+        s = ta.compact(root, now_ms=t_end)
+        dt = time.perf_counter() - t0
+        after = ta.TickArchive(root)
+        day = ta.day_name(T0 // ta.DAY_MS)
+        left = [d.name for d in (root / day).iterdir() if (d / ta.UNSORTED).exists()]
+        sorted_ok = all(np.all(np.diff(after.window(i, T0, t_end).ts) >= 0) for i in insts)
+        ok = s["days"] == 1 and not left and sorted_ok
+        print(f"[{'OK' if ok else 'FAIL'}] compact closed day {day}: {s} in {dt * 1000:.1f} ms")
+        if not ok:
+            errors.append("compact")
+        sq.close()
+
+        # crash au milieu d'un append : px / bid écrits, ask / ts non
+        crash = Path(tmp) / "crash"
+        rows = [("X/USDT", 100.0 + k, 99.0 + k, 101.0 + k, 2.0, T0 + k) for k in range(10)]
+        w = ta.ArchiveWriter(crash)
+        w.append(rows[:5])
+        w.close()
+        d = w._path(T0 // ta.DAY_MS, "X/USDT")
+        for name in ("px", "bid"):
+            with open(d / f"{name}.f8", "ab") as f:
+                f.write(np.array([1.0, 2.0], dtype="<f8").tobytes())
+        w = ta.ArchiveWriter(crash)
+        w.append(rows[5:])
+        w.close()
+        got = ta.TickArchive(crash).window("X/USDT", T0, T0 + 10)
+        ok = (np.array_equal(got.ts, [r[5] for r in rows])
+              and np.array_equal(got.px, [r[1] for r in rows])
+              and np.array_equal(got.ask, [r[3] for r in rows]))
+        print(f"[{'OK' if ok else 'FAIL'}] restart after a partial append keeps columns aligned")
+        if not ok:
+            errors.append("partial append realign")
+
+    for e in errors:
+        print(f"[FAIL] {e}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
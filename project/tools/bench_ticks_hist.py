@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+ticks_hist write-throughput benchmark — per-tick DELETE NOT IN vs HistRing
+
+- Throw-away t.db (same ticks / ticks_hist schema and index as prod)
+- Each instrument is pre-filled with ROLLING_LIMIT rows (steady state)
+- A flush = TICKS_PER_INST ticks for every instrument, 1 transaction
+- "legacy" : historical ticks.writer retention (sorted subquery per tick)
+- "ring"   : ticks.flush + HistRing (DELETE by primary key)
+- Prints ticks/sec per mode and checks the final row count per instrument
+
+Usage:
+    python project/tools/bench_ticks_hist.py [--instruments 150 500] [--flushes 40]
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+from ticks import ROLLING_LIMIT, HistRing, flush  # noqa: E402
+
+TICKS_PER_INST = 2
+
+DDL = (
+    """CREATE TABLE ticks (
+        instId TEXT PRIMARY KEY,
+        lastPr REAL NOT NULL,
+        ts_ms  INTEGER NOT NULL,
+        bidPr REAL, askPr REAL, spread_bps REAL)""",
+    """CREATE TABLE ticks_hist (
+        id     INTEGER PRIMARY KEY AUTOINCREMENT,
+        instId TEXT NOT NULL,
+        lastPr REAL NOT NULL,
+        ts_ms  INTEGER NOT NULL,
+        bidPr REAL, askPr REAL, spread_bps REAL)""",
+    "CREATE INDEX idx_ticks_hist_inst_ts ON ticks_hist(instId, ts_ms DESC)",
+)
+
+
+def conn(db):
+    c = sqlite3.connect(str(db), isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL;")
+    c.execute("PRAGMA synchronous=NORMAL;")
+    return c
+
+
+def batch(insts, ts, rnd):
+    out = []
+    for k in range(TICKS_PER_INST):
+        for inst in insts:
+            px = 100 + rnd.random()
+            out.append((inst, px, px - 0.01, px + 0.01, 2.0, ts + k))
+    return out
+
+
+def flush_legacy(cur, buf):
+    cur.executemany("""
+        INSERT INTO ticks(instId,lastPr,bidPr,askPr,spread_bps,ts_ms)
+        VALUES (?,?,?,?,?,?)
+        ON CONFLICT(instId) DO UPDATE SET
+            lastPr=excluded.lastPr,
+            bidPr=excluded.bidPr,
+            askPr=excluded.askPr,
+            spread_bps=excluded.spread_bps,
+            ts_ms=excluded.ts_ms;
+    """, buf)
+    cur.executemany("""
+        INSERT INTO ticks_hist(instId,lastPr,bidPr,askPr,spread_bps,ts_ms)
+        VALUES (?,?,?,?,?,?);
+    """, buf)
+    for instId, *_ in buf:
+        cur.execute("""
+            DELETE FROM ticks_hist
+            WHERE instId=?
+              AND id NOT IN (
+                SELECT id FROM ticks_hist
+                WHERE instId=?
+                ORDER BY ts_ms DESC
+                LIMIT ?
+              );
+        """, (instId, instId, ROLLING_LIMIT))
+
+
+def run(mode, n_inst, flushes):
+    rnd = random.Random(n_inst)
+    insts = [f"C{i:04d}/USDT" for i in range(n_inst)]
+
+    with tempfile.TemporaryDirectory(prefix="scalp_ticks_") as tmp:
+        c = conn(Path(tmp) / "t.db")
+        for ddl in DDL:
+            c.execute(ddl)
+        cur = c.cursor()
+
+        ts = 1_700_000_000_000
+        c.execute("BEGIN")
+        for _ in range(ROLLING_LIMIT // TICKS_PER_INST):
+            buf = batch(insts, ts, rnd)
+            cur.executemany(
+                "INSERT INTO ticks_hist(instId,lastPr,bidPr,askPr,spread_bps,ts_ms) VALUES (?,?,?,?,?,?)",
+                buf,
+            )
+            ts += 250
+        c.commit()
+
+        ring = HistRing()
+        if mode == "ring":
+            ring.load(cur)
+
+        n = 0
+        t0 = time.perf_counter()
+        for _ in range(flushes):
+            buf = batch(insts, ts, rnd)
+            c.execute("BEGIN")
+            if mode == "ring":
+                flush(cur, buf, ring)
+            else:
+                flush_legacy(cur, buf)
+            c.commit()
+            n += len(buf)
+            ts += 250
+        dt = time.perf_counter() - t0
+
+        counts = {r[0] for r in c.execute("SELECT COUNT(*) FROM ticks_hist GROUP BY instId")}
+        c.close()
+
+    return n / dt, counts
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, nargs="+", default=[150, 500])
+    ap.add_argument("--flushes", type=int, default=40)
+    args = ap.parse_args()
+
+    ok = True
+    for n_inst in args.instruments:
+        rates = {}
+        for mode in ("legacy", "ring"):
+            rate, counts = run(mode, n_inst, args.flushes)
+            rates[mode] = rate
+            if counts != {ROLLING_LIMIT}:
+                print(f"[FAIL] {mode} inst={n_inst}: rows per instId {sorted(counts)}")
+                ok = False
+            print(f"[BENCH] inst={n_inst:4d} {mode:6}: {rate:12,.0f} ticks/s")
+        print(f"[BENCH] inst={n_inst:4d} speedup x{rates['ring'] / rates['legacy']:.1f}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+candle_builder — REST upsert and 1m -> 3m parity on synthetic candles
+
+- 1m bars built from a random-walk price stream over N instruments for
+  M minutes (~TICKS_PER_S prices / s / instrument), random volume
+- REST window upsert (OB_collect path): a 1m bar stored while still open is
+  corrected by the next fetch of the same bar
+- Incremental 3m from 1m (OB_collect.aggregate_3m path, fold_1m) against
+  the previous full-table window-function SQL, and the cost of both
+
+Usage:
+    python project/tools/check_candle_builder.py [--instruments 200] [--minutes 40]
+"""
+
+import argparse
+import math
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import candle_builder as cb  # noqa: E402
+
+TICKS_PER_S = 2
+T0 = 1_700_000_040_000          # not aligned on 30m: first bars are partial
+
+DDL = """CREATE TABLE IF NOT EXISTS ohlcv_{tf} (instId TEXT NOT NULL, ts INTEGER NOT NULL,
+    o REAL, h REAL, l REAL, c REAL, v REAL, PRIMARY KEY(instId, ts))"""
+
+LEGACY_3M = """
+    INSERT OR REPLACE INTO ohlcv_3m(instId, ts, o, h, l, c, v)
+    SELECT instId, (ts/180000)*180000 AS ts,
+           FIRST_VALUE(o) OVER w, MAX(h) OVER w, MIN(l) OVER w,
+           LAST_VALUE(c) OVER w, SUM(v) OVER w
+    FROM ohlcv_1m
+    WINDOW w AS (PARTITION BY instId, (ts/180000) ORDER BY ts
+                 ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+"""
+
+
+def stream(n_inst, minutes, seed=5):
+    rnd = random.Random(seed)
+    px = {f"C{i:04d}/USDT": 10 + 90 * rnd.random() for i in range(n_inst)}
+    step = 1000 // TICKS_PER_S
+    for t in range(T0, T0 + minutes * 60_000, step):
+        for inst in px:
+            px[inst] *= 1 + rnd.gauss(0, 5e-4)
+            yield inst, px[inst], t + rnd.randrange(step)
+
+
+def naive(ticks, tf):
+    ms = cb.TF_MS[tf]
+    out = {}
+    first = {}
+    for inst, p, ts in ticks:
+        b = ts - ts % ms
+        first.setdefault(inst, b)
+        k = (inst, b)
+        if k not in out:
+            out[k] = [p, p, p, p]
+        else:
+            r = out[k]
+            r[1], r[2], r[3] = max(r[1], p), min(r[2], p), p
+    return {k: v for k, v in out.items() if k[1] != first[k[0]]}
+
+
+def close(a, b):
+    return all(math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-9) for x, y in zip(a, b))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--instruments", type=int, default=200)
+    ap.add_argument("--minutes", type=int, default=40)
+    args = ap.parse_args()
+
+    ticks = list(stream(args.instruments, args.minutes))
+    errors = []
+
+    with tempfile.TemporaryDirectory(prefix="scalp_candles_") as tmp:
+        # ---- ob.db : 1m REST (volume du fetch) upsertées par fenêtre
+        c = sqlite3.connect(Path(tmp) / "ob.db", isolation_level=None)
+        for tf in ("1m", "3m"):
+            c.execute(DDL.format(tf=tf))
+        rnd = random.Random(9)
+        rest = sorted((inst, ts, *ohlc, rnd.uniform(1, 100))
+                      for (inst, ts), ohlc in naive(ticks, "1m").items())
+        last_ts = max(r[1] for r in rest)
+        # run précédent : dernière bougie stockée encore ouverte (h/l/c/v partiels)
+        c.execute("BEGIN")
+        cb.upsert(c, "1m", [r if r[1] < last_ts else (*r[:3], r[2], r[2], r[2], 0.5) for r in rest])
+        c.execute("COMMIT")
+        # run suivant : fenêtre depuis le dernier ts stocké, upsertée
+        window = [r for r in rest if r[1] >= last_ts]
+        c.execute("BEGIN")
+        cb.upsert(c, "1m", window)
+        c.execute("COMMIT")
+        got = {(r[0], r[1]): r[2:] for r in c.execute("SELECT * FROM ohlcv_1m WHERE ts=?", (last_ts,))}
+        ok = len(got) == len(window) and all(close(got[(r[0], r[1])], r[2:]) for r in window)
+        print(f"[{'OK' if ok else 'FAIL'}] REST window upsert corrects {len(window)} bars stored while open")
+        if not ok:
+            errors.append("REST window upsert")
+
+        # ---- 3m depuis 1m : incrémental vs fenêtre SQL sur toute la table
+        c.execute("DELETE FROM ohlcv_3m")
+        t0 = time.perf_counter()
+        c.execute(LEGACY_3M)
+        t_legacy = time.perf_counter() - t0
+        legacy = {(r[0], r[1]): r[2:] for r in c.execute("SELECT * FROM ohlcv_3m")}
+
+        last_min = max(r[0] for r in c.execute("SELECT ts FROM ohlcv_1m"))
+        new_1m = c.execute("SELECT * FROM ohlcv_1m WHERE ts >= ?", (last_min - 5 * 60_000,)).fetchall()
+        c.execute("DELETE FROM ohlcv_3m")
+        t0 = time.perf_counter()
+        all_1m = c.execute("SELECT * FROM ohlcv_1m ORDER BY instId, ts").fetchall()
+        full = cb.fold_1m(all_1m, ("3m",))["3m"]
+        t_full = time.perf_counter() - t0
+        inc = defaultdict(list)
+        for r in new_1m:
+            inc[r[0]].append(r)
+        t0 = time.perf_counter()
+        first = {i: min(r[1] for r in rs) // 180_000 * 180_000 for i, rs in inc.items()}
+        touched = 0
+        for inst, since in first.items():
+            rs = c.execute("SELECT * FROM ohlcv_1m WHERE instId=? AND ts>=? ORDER BY ts", (inst, since)).fetchall()
+            touched += len(cb.fold_1m(rs, ("3m",)).get("3m", []))
+        t_inc = time.perf_counter() - t0
+
+        bad = [r for r in full if not close(r[2:], legacy[(r[0], r[1])])]
+        ok = not bad and len(full) == len(legacy)
+        print(f"[{'OK' if ok else 'FAIL'}] fold_1m 3m == window SQL ({len(full)} bars)")
+        if not ok:
+            errors.append("fold_1m 3m")
+        print(f"[BENCH] 3m full-table window SQL : {t_legacy * 1000:8.2f} ms")
+        print(f"[BENCH] 3m full-table fold_1m    : {t_full * 1000:8.2f} ms")
+        print(f"[BENCH] 3m incremental (last 5m) : {t_inc * 1000:8.2f} ms ({touched} buckets)")
+        c.close()
+
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+B_feat streaming engine — parity check + throughput benchmark
+
+- Parity : B_feat_engine.FeatStream vs B_feat_builder_incremental.compute_feat
+  (same 200-candle rolling buffer as the historical loop), on a synthetic
+  random walk with flat segments; state is saved / restored (JSON) mid-stream
+- Throughput : candles/sec for both paths
+- Exit code 1 on any mismatch
+
+Usage:
+    python project/tools/check_feat_engine.py [--candles 5000] [--seed 7]
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+from B_feat_builder_incremental import compute_feat  # noqa: E402
+from B_feat_engine import FeatStream  # noqa: E402
+
+REL_TOL = 1e-9
+ABS_TOL = 1e-9
+
+COLS = (
+    "ts", "o", "h", "l", "c", "v",
+    "ema9", "ema12", "ema21", "ema26", "ema50",
+    "macd", "macdsignal", "macdhist",
+    "rsi", "atr",
+    "bb_mid", "bb_std", "bb_up", "bb_low", "bb_width",
+    "mom", "roc", "slope",
+    "ctx", "plus_di", "minus_di", "adx",
+)
+
+
+def synth_candles(n, seed):
+    rnd = random.Random(seed)
+    px = 100.0
+    ts = 1_700_000_000_000
+    out = []
+    for i in range(n):
+        if (i // 300) % 5 == 4:
+            # flat segment: exercises zero std / zero loss branches
+            o = h = l = c = px
+        else:
+            o = px
+            c = max(0.01, px * (1 + rnd.gauss(0, 0.002)))
+            h = max(o, c) * (1 + abs(rnd.gauss(0, 0.001)))
+            l = min(o, c) * (1 - abs(rnd.gauss(0, 0.001)))
+            px = c
+        out.append((ts + i * 60_000, o, h, l, c, rnd.uniform(10, 1000)))
+    return out
+
+
+def reference(candles):
+    buf = []
+    out = []
+    for r in candles:
+        buf.append(r)
+        if len(buf) > 200:
+            buf.pop(0)
+        out.append(compute_feat(buf))
+    return out
+
+
+def engine(candles, restore_every=0):
+    st = FeatStream()
+    out = []
+    for i, r in enumerate(candles):
+        if restore_every and i and i % restore_every == 0:
+            st = FeatStream.from_json(st.to_json())
+        out.append(st.update(r))
+    return out
+
+
+def same(a, b):
+    if a is None or b is None:
+        return a is b
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    return math.isclose(a, b, rel_tol=REL_TOL, abs_tol=ABS_TOL)
+
+
+def parity(ref, got):
+    errors = 0
+    for i, (a, b) in enumerate(zip(ref, got)):
+        if a is None or b is None:
+            if a is not b:
+                print(f"[FAIL] candle {i}: ref={a is not None} engine={b is not None}")
+                errors += 1
+            continue
+        for col, x, y in zip(COLS, a, b):
+            if not same(x, y):
+                if errors < 20:
+                    print(f"[FAIL] candle {i} {col}: ref={x!r} engine={y!r}")
+                errors += 1
+    return errors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--candles", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    candles = synth_candles(args.candles, args.seed)
+
+    t0 = time.perf_counter()
+    ref = reference(candles)
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    got = engine(candles)
+    t_eng = time.perf_counter() - t0
+
+    errors = parity(ref, got)
+    errors += parity(ref, engine(candles, restore_every=137))
+
+    if errors:
+        print(f"[FAIL] parity: {errors} mismatches")
+    else:
+        print(f"[OK] parity on {len(candles)} candles (rel_tol={REL_TOL})")
+
+    n = len(candles)
+    print(f"[BENCH] compute_feat loop : {n / t_ref:12,.0f} candles/s")
+    print(f"[BENCH] FeatStream        : {n / t_eng:12,.0f} candles/s  (x{t_ref / t_eng:.1f})")
+
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
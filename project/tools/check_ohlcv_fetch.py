@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+OA_ohlcv / OB_collect async fetch — local stub exchange harness
+
+- StubExchange mimics ccxt.async_support.bitget.fetch_ohlcv:
+  deterministic candles aligned on the timeframe, since / limit honoured,
+  per-request latency, RateLimitExceeded above a concurrency budget
+- OA_ohlcv.main and OB_collect.main run against throw-away universe /
+  oa / ob DBs (module paths re-pointed to a temp dir)
+- Checks: every (coin, tf) stored, no duplicate rows, second run fetches
+  with since = last stored ts, in-flight requests bounded, RateLimitExceeded
+  retried with backoff
+- Prints wall time for sequential (concurrency=1) vs parallel fetch
+
+Usage:
+    python project/tools/check_ohlcv_fetch.py [--coins 60] [--latency 0.02]
+"""
+
+import argparse
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import ccxt
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import OA_ohlcv  # noqa: E402
+import OB_collect  # noqa: E402
+import ohlcv_fetch  # noqa: E402
+from ohlcv_fetch import TF_MS  # noqa: E402
+
+
+class StubExchange:
+    def __init__(self, latency, max_inflight):
+        self.latency = latency
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.peak = 0
+        self.calls = []
+        self.rejected = 0
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=100):
+        self.calls.append((symbol, timeframe, since, limit))
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+        try:
+            if self.inflight > self.max_inflight:
+                self.rejected += 1
+                raise ccxt.RateLimitExceeded("stub: too many requests")
+            await asyncio.sleep(self.latency)
+            step = TF_MS[timeframe]
+            now = int(time.time() * 1000) // step * step
+            start = now - (limit - 1) * step if since is None else since // step * step
+            out = []
+            seed = sum(map(ord, symbol))
+            for ts in range(start, now + 1, step)[:limit]:
+                px = 100 + (seed + ts // step) % 50
+                out.append([ts, px, px + 1, px - 1, px + 0.5, 10.0])
+            return out
+        finally:
+            self.inflight -= 1
+
+    async def close(self):
+        pass
+
+
+def setup(root, coins):
+    u = sqlite3.connect(root / "universe.db")
+    u.execute("CREATE TABLE v_universe_tradable (instId TEXT)")
+    u.executemany("INSERT INTO v_universe_tradable VALUES (?)", [(c,) for c in coins])
+    u.commit()
+    u.close()
+
+    oa = sqlite3.connect(root / "oa.db")
+    for tf in OA_ohlcv.TF_MAP:
+        oa.execute(f"""CREATE TABLE ohlcv_{tf} (
+            instId TEXT, ts INTEGER, open REAL, high REAL, low REAL, close REAL, volume REAL,
+            PRIMARY KEY (instId, ts))""")
+    oa.commit()
+    oa.close()
+
+    ob = sqlite3.connect(root / "ob.db")
+    for tf in ("1m", "3m", "5m"):
+        ob.execute(f"""CREATE TABLE ohlcv_{tf} (
+            instId TEXT, ts INTEGER, o REAL, h REAL, l REAL, c REAL, v REAL,
+            PRIMARY KEY (instId, ts))""")
+    ob.commit()
+    ob.close()
+
+    OA_ohlcv.DB_U = OB_collect.DB_U = str(root / "universe.db")
+    OA_ohlcv.DB_OA = str(root / "oa.db")
+    OB_collect.DB_OB = str(root / "ob.db")
+
+
+def count(db, table):
+    c = sqlite3.connect(db)
+    n, k = c.execute(f"SELECT COUNT(*), COUNT(DISTINCT instId) FROM {table}").fetchone()
+    dup = c.execute(
+        f"SELECT COUNT(*) FROM (SELECT instId, ts FROM {table} GROUP BY 1, 2 HAVING COUNT(*) > 1)"
+    ).fetchone()[0]
+    c.close()
+    return n, k, dup
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--coins", type=int, default=60)
+    ap.add_argument("--latency", type=float, default=0.02)
+    args = ap.parse_args()
+
+    coins = [f"C{i:03d}/USDT" for i in range(args.coins)]
+    errors = []
+
+    def check(ok, msg):
+        print(f"[{'OK' if ok else 'FAIL'}] {msg}")
+        if not ok:
+            errors.append(msg)
+
+    ohlcv_fetch.BACKOFF_S = 0.01
+
+    with tempfile.TemporaryDirectory(prefix="scalp_ohlcv_") as tmp:
+        setup(Path(tmp), coins)
+        budget = ohlcv_fetch.FETCH_CONCURRENCY
+
+        for name, mod, tables in (
+            ("OA", OA_ohlcv, [f"ohlcv_{tf}" for tf in OA_ohlcv.TF_MAP]),
+            ("OB", OB_collect, [f"ohlcv_{tf}" for tf in OB_collect.TFS]),
+        ):
+            db = OA_ohlcv.DB_OA if mod is OA_ohlcv else OB_collect.DB_OB
+
+            ex = StubExchange(args.latency, budget)
+            t0 = time.perf_counter()
+            mod.main(exchange=ex)
+            dt = time.perf_counter() - t0
+            print(f"[RUN] {name} first run: {len(ex.calls)} requests in {dt:.2f}s "
+                  f"(peak in-flight {ex.peak}, rejected {ex.rejected})")
+            check(ex.peak <= budget, f"{name} in-flight bounded ({ex.peak} <= {budget})")
+            for table in tables:
+                n, k, dup = count(db, table)
+                check(k == len(coins) and dup == 0, f"{name} {table}: rows={n} coins={k} dup={dup}")
+
+            ex = StubExchange(args.latency, budget)
+            mod.main(exchange=ex)
+            check(all(since is not None for _, _, since, _ in ex.calls),
+                  f"{name} second run incremental (since set on {len(ex.calls)} requests)")
+            for table in tables:
+                _, _, dup = count(db, table)
+                check(dup == 0, f"{name} {table}: no duplicate after re-run")
+
+        # exchange rejects above half the budget: backoff + retry must recover
+        jobs = [(c, "5m", None, 100) for c in coins]
+        ex = StubExchange(args.latency, max(1, budget // 2))
+        got = ohlcv_fetch.run_fetch(jobs, exchange=ex)
+        empty = sum(1 for rows in got.values() if not rows)
+        check(ex.rejected > 0 and empty == 0,
+              f"rate-limit retries recovered ({ex.rejected} rejected, {empty} empty)")
+
+        # sequential vs parallel fetch wall time (fetch stage only)
+        jobs = [(c, tf, None, 100) for c in coins for tf in OA_ohlcv.TF_MAP]
+        for conc in (1, budget):
+            ex = StubExchange(args.latency, budget)
+            t0 = time.perf_counter()
+            ohlcv_fetch.run_fetch(jobs, exchange=ex, concurrency=conc)
+            dt = time.perf_counter() - t0
+            print(f"[BENCH] concurrency={conc:2d}: {len(jobs)} requests in {dt:.2f}s "
+                  f"({len(jobs) / dt:.0f} req/s)")
+
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
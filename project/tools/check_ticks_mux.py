@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+ticks.TickerMux harness — local fake Bitget WS server
+
+- FakeBitgetWS speaks the v2 public protocol subset used by ticks.py:
+  subscribe / unsubscribe (many args per message), text ping -> pong,
+  ticker pushes for every subscribed instId
+- Frames are replayed from a JSONL capture (--frames, one raw WS frame per
+  line, re-targeted to each subscribed instId) or synthesised when absent
+- --record N captures N real ticker frames from Bitget into --frames
+  (needs network access)
+
+Scenario (exit code 1 on any failure):
+  1. 120 symbols, 50 per connection -> 3 sockets, every symbol ticks
+  2. universe change (40 removed, 40 added) -> resubscribe in place,
+     no reconnect, removed symbols stop, added symbols tick
+  3. server drops every socket -> shards reconnect and resubscribe
+  4. sockets dropped in the middle of a resubscribe -> apply() does not
+     raise, shards reconnect onto the new universe
+  + per-shard message rates
+
+Usage:
+    python project/tools/check_ticks_mux.py [--frames ticker.jsonl] [--record 200]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import websockets
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "scripts"))
+
+import ticks  # noqa: E402
+from ticks import TickerMux, ws_to_canon  # noqa: E402
+
+PUSH_EVERY = 0.05
+PER_CONN = 50
+
+
+# ==========================================================
+# FRAMES
+# ==========================================================
+def synth_frame(rnd):
+    px = 100 * (1 + rnd.gauss(0, 0.01))
+    return json.dumps({
+        "action": "snapshot",
+        "arg": {"instType": "USDT-FUTURES", "channel": "ticker", "instId": "XUSDT"},
+        "data": [{
+            "instId": "XUSDT",
+            "lastPr": f"{px:.4f}",
+            "bidPr": f"{px - 0.01:.4f}",
+            "askPr": f"{px + 0.01:.4f}",
+            "ts": str(int(time.time() * 1000)),
+        }],
+        "ts": int(time.time() * 1000),
+    })
+
+
+def retarget(raw, ws_inst):
+    frame = json.loads(raw)
+    frame["arg"]["instId"] = ws_inst
+    for d in frame.get("data", []):
+        d["instId"] = ws_inst
+        d["symbol"] = ws_inst
+        d["ts"] = str(int(time.time() * 1000))
+    return json.dumps(frame)
+
+
+async def record(path, n):
+    sub = {"op": "subscribe", "args": [ticks.ticker_arg(s) for s in ("BTCUSDT", "ETHUSDT", "SOLUSDT")]}
+    got = 0
+    async with websockets.connect(ticks.WS_URL, ping_interval=15) as ws, \
+            open(path, "w") as f:
+        await ws.send(json.dumps(sub))
+        async for raw in ws:
+            if raw == "pong" or '"data"' not in raw:
+                continue
+            f.write(raw.strip() + "\n")
+            got += 1
+            if got >= n:
+                break
+    print(f"[REC] {got} frames -> {path}")
+
+
+# ==========================================================
+# FAKE SERVER
+# ==========================================================
+class FakeBitgetWS:
+    def __init__(self, frames):
+        self.frames = frames
+        self.conns = {}          # ws -> set(ws ids)
+        self.connects = 0
+        self.max_args = 0
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await websockets.serve(self.handler, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return f"ws://127.0.0.1:{self.port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def drop_all(self):
+        for ws in list(self.conns):
+            await ws.close()
+
+    def subscribed(self):
+        out = set()
+        for s in self.conns.values():
+            out |= s
+        return out
+
+    async def handler(self, ws, *_):
+        self.connects += 1
+        subs = self.conns[ws] = set()
+        pusher = asyncio.create_task(self.push(ws, subs))
+        try:
+            async for raw in ws:
+                if raw == "ping":
+                    await ws.send("pong")
+                    continue
+                msg = json.loads(raw)
+                ids = {a["instId"] for a in msg.get("args", [])}
+                if msg.get("op") == "subscribe":
+                    subs |= ids
+                elif msg.get("op") == "unsubscribe":
+                    subs -= ids
+                self.max_args = max(self.max_args, len(subs))
+                for a in msg.get("args", []):
+                    await ws.send(json.dumps({"event": msg.get("op"), "arg": a}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            pusher.cancel()
+            self.conns.pop(ws, None)
+
+    async def push(self, ws, subs):
+        i = 0
+        while True:
+            await asyncio.sleep(PUSH_EVERY)
+            for s in list(subs):
+                await ws.send(retarget(self.frames[i % len(self.frames)], s))
+                i += 1
+
+
+# ==========================================================
+# SCENARIO
+# ==========================================================
+async def wait_for(cond, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def scenario(frames):
+    errors = []
+
+    def check(ok, msg):
+        print(f"[{'OK' if ok else 'FAIL'}] {msg}")
+        if not ok:
+            errors.append(msg)
+
+    srv = FakeBitgetWS(frames)
+    url = await srv.start()
+
+    seen = Counter()
+    mux = TickerMux(url=url, shards=1, per_conn=PER_CONN, sink=lambda row: seen.update([row[0]]))
+
+    uni_a = {f"C{i:03d}USDT" for i in range(120)}
+    canon_a = {ws_to_canon(s) for s in uni_a}
+
+    # 1. initial sharding
+    t0 = time.monotonic()
+    await mux.apply(uni_a)
+    ok = await wait_for(lambda: canon_a <= set(seen))
+    check(ok, f"all {len(uni_a)} symbols ticking ({time.monotonic() - t0:.2f}s)")
+    check(len(srv.conns) == 3, f"sockets={len(srv.conns)} (expected 3)")
+    check(srv.max_args <= PER_CONN, f"max args per socket={srv.max_args} (limit {PER_CONN})")
+
+    # 2. universe change, in place
+    removed = set(sorted(uni_a)[:40])
+    added = {f"N{i:03d}USDT" for i in range(40)}
+    uni_b = (uni_a - removed) | added
+    connects = srv.connects
+    await mux.apply(uni_b)
+    ok = await wait_for(lambda: srv.subscribed() == uni_b)
+    check(ok, "server subscriptions == new universe")
+    check(srv.connects == connects, f"no reconnect on resubscribe (connects={srv.connects})")
+    ok = await wait_for(lambda: {ws_to_canon(s) for s in added} <= set(seen))
+    check(ok, "added symbols ticking")
+    await asyncio.sleep(0.2)
+    before = {s: seen[ws_to_canon(s)] for s in removed}
+    await asyncio.sleep(0.5)
+    check(all(seen[ws_to_canon(s)] == n for s, n in before.items()), "removed symbols stopped")
+
+    # 3. server drops everything
+    await srv.drop_all()
+    seen.clear()
+    ok = await wait_for(lambda: {ws_to_canon(s) for s in uni_b} <= set(seen), timeout=15)
+    check(ok, "reconnected and resubscribed after drop")
+    check(srv.subscribed() == uni_b, "subscriptions restored")
+
+    # 4. sockets dropped in the middle of a resubscribe (chunked sends)
+    uni_c = {f"R{i:03d}USDT" for i in range(100)}
+    resub = asyncio.create_task(mux.apply(uni_c))
+    await asyncio.sleep(1.5 * ticks.WS_SEND_INTERVAL)
+    await srv.drop_all()
+    try:
+        await resub
+        check(True, "apply() during a drop does not raise")
+    except Exception as e:
+        check(False, f"apply() during a drop raised {type(e).__name__}: {e}")
+    seen.clear()
+    ok = await wait_for(lambda: {ws_to_canon(s) for s in uni_c} <= set(seen), timeout=15)
+    check(ok and srv.subscribed() == uni_c, "reconnected onto the new universe")
+
+    # rates
+    mux.rates(1.0)
+    await asyncio.sleep(1.0)
+    for idx, n, rate, rec in mux.rates(1.0):
+        print(f"[RATE] shard={idx} tickers={n} rate={rate:.1f} msg/s reconnects={rec}")
+
+    ticks.stop_event.set()
+    await mux.close()
+    await srv.stop()
+    return errors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", help="JSONL capture of raw ticker frames")
+    ap.add_argument("--record", type=int, default=0, help="capture N frames from Bitget into --frames")
+    args = ap.parse_args()
+
+    if args.record:
+        if not args.frames:
+            ap.error("--record needs --frames")
+        asyncio.run(record(args.frames, args.record))
+        return
+
+    if args.frames:
+        frames = [line for line in Path(args.frames).read_text().splitlines() if line.strip()]
+    else:
+        rnd = random.Random(7)
+        frames = [synth_frame(rnd) for _ in range(200)]
+
+    errors = asyncio.run(scenario(frames))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()